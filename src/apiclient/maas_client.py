@@ -7,16 +7,20 @@ __all__ = [
     'MAASClient',
     'MAASDispatcher',
     'MAASOAuth',
+    'MAASPooledDispatcher',
     ]
 
 import collections
 import gzip
+import http.client
 from io import BytesIO
 import random
+import threading
 import time
 import urllib.error
 import urllib.parse
 import urllib.request
+import urllib.response
 import uuid
 
 from apiclient.encode_json import encode_json_data
@@ -147,6 +151,175 @@ class MAASDispatcher:
         return res
 
 
+class MAASPooledDispatcher(MAASDispatcher):
+    """Dispatch requests to MAAS over persistent, pooled connections.
+
+    Connections are kept alive and reused between requests to the same host,
+    saving a TCP (and possibly TLS) handshake for each. At most
+    `max_connections` are open to each host at once; requests beyond that
+    wait for a connection to be released. Requests are never pipelined: a
+    connection carries one request at a time.
+
+    Responses are read in full before they're returned, so that their
+    connection can be reused, and are returned in the same form as from
+    `MAASDispatcher`. A 503 response is retried, backing off exponentially
+    or as the server asks with Retry-After. Requests that would go via a
+    proxy are handed to `MAASDispatcher` unchanged.
+
+    This is safe to share between threads, and is intended to be long-lived.
+    """
+
+    def __init__(
+            self, max_connections=4, retries=3, backoff=0.1,
+            max_backoff=5.0, decode_gzip=True, timeout=60.0,
+            ssl_context=None):
+        """Initialise the dispatcher.
+
+        :param max_connections: The most connections to open to each host.
+        :param retries: The number of times to try a request that is
+            answered with 503 Service Unavailable.
+        :param backoff: Seconds to wait before the first retry; this doubles
+            for each subsequent retry, with some jitter.
+        :param max_backoff: The longest to wait before any retry.
+        :param decode_gzip: Whether to ask for, and decode, gzip-encoded
+            responses when the caller has not set Accept-Encoding.
+        :param timeout: Socket timeout, in seconds.
+        :param ssl_context: An `ssl.SSLContext` for HTTPS connections.
+        """
+        super(MAASPooledDispatcher, self).__init__()
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.decode_gzip = decode_gzip
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self._lock = threading.Lock()
+        self._idle = collections.defaultdict(list)
+        self._slots = {}
+
+    def _get_slots(self, key):
+        with self._lock:
+            try:
+                return self._slots[key]
+            except KeyError:
+                slots = self._slots[key] = threading.BoundedSemaphore(
+                    self.max_connections)
+                return slots
+
+    def _acquire(self, key):
+        """Return an open connection to `key`, and whether it's been used.
+
+        The caller must hold one of the key's slots.
+        """
+        with self._lock:
+            idle = self._idle[key]
+            if len(idle) > 0:
+                return idle.pop(), True
+        scheme, host, port = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(
+                host, port, timeout=self.timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(
+                host, port, timeout=self.timeout)
+        return conn, False
+
+    def _release(self, key, conn):
+        with self._lock:
+            self._idle[key].append(conn)
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, collections.defaultdict(list)
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _request(self, url, method, headers, data):
+        """Make a request to `url`, returning its status, reason, headers
+        and body.
+
+        A connection that has been used before may have been closed by the
+        server while idle, in which case the request is tried again, once,
+        on a new connection.
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = parts.scheme, parts.hostname, parts.port
+        path = urllib.parse.urlunsplit(
+            ("", "", parts.path or "/", parts.query, ""))
+        slots = self._get_slots(key)
+        with slots:
+            while True:
+                conn, reused = self._acquire(key)
+                try:
+                    conn.request(method, path, body=data, headers=headers)
+                    response = conn.getresponse()
+                    body = response.read()
+                except (http.client.RemoteDisconnected,
+                        ConnectionResetError, BrokenPipeError):
+                    conn.close()
+                    if reused:
+                        continue
+                    raise
+                except Exception:
+                    conn.close()
+                    raise
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._release(key, conn)
+                return response.status, response.reason, response.msg, body
+
+    def _get_delay(self, try_count, headers):
+        """Return how long to wait before retrying after a 503."""
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None and retry_after.strip().isdigit():
+            return min(int(retry_after), self.max_backoff)
+        delay = min(self.backoff * (2 ** try_count), self.max_backoff)
+        # Jitter reduces the chance of clients retrying in lock-step.
+        return delay * random.uniform(0.5, 1.0)
+
+    def dispatch_query(self, request_url, headers, method="GET", data=None):
+        """Synchronously dispatch an OAuth-signed request to L{request_url}.
+
+        See `MAASDispatcher.dispatch_query`.
+        """
+        if isinstance(request_url, bytes):
+            request_url = request_url.decode("ascii")
+        host = urllib.parse.urlsplit(request_url).hostname
+        proxies = urllib.request.getproxies()
+        if proxies and not urllib.request.proxy_bypass(host):
+            return super(MAASPooledDispatcher, self).dispatch_query(
+                request_url, headers, method=method, data=data)
+        headers = dict(headers)
+        set_accept_encoding = self.decode_gzip and not any(
+            key.lower() == 'accept-encoding' for key in headers)
+        if set_accept_encoding:
+            headers['Accept-Encoding'] = 'gzip'
+        # Encode 'non-bytes' data into utf-8 bytes as urllib would require.
+        if data is not None and not isinstance(data, bytes):
+            data = bytes(data, 'utf-8')
+        for try_count in range(self.retries):
+            status, reason, res_headers, body = self._request(
+                request_url, method, headers, data)
+            if status != http.client.SERVICE_UNAVAILABLE:
+                break
+            elif try_count < self.retries - 1:
+                # MAAS might still be starting, or the action hit a conflict;
+                # a retry should work.
+                time.sleep(self._get_delay(try_count, res_headers))
+        content_encoding = res_headers.get('Content-Encoding')
+        if set_accept_encoding and content_encoding == 'gzip':
+            body = gzip.decompress(body)
+        if status < 200 or status >= 300:
+            raise urllib.error.HTTPError(
+                request_url, status, reason, res_headers, BytesIO(body))
+        return urllib.response.addinfourl(
+            BytesIO(body), res_headers, request_url, status)
+
+
 class MAASClient:
     """Base class for connecting to MAAS servers.
 
@@ -5,6 +5,8 @@
 
 __all__ = [
     'encode_multipart_data',
+    'encode_multipart_stream',
+    'MultipartStream',
     ]
 
 from collections import (
@@ -20,6 +22,8 @@ from io import (
 )
 from itertools import chain
 import mimetypes
+import os
+import uuid
 
 
 def get_content_type(*names):
@@ -147,3 +151,168 @@ def encode_multipart_data(data=(), files=()):
     message = build_multipart_message(chain(data, files))
     headers, body = encode_multipart_message(message)
     return body, dict(headers)
+
+
+def get_file_size(content):
+    """Return the number of bytes remaining to be read from `content`."""
+    position = content.tell()
+    try:
+        return os.fstat(content.fileno()).st_size - position
+    except (AttributeError, OSError):
+        # Not backed by a real file, e.g. `BytesIO`.
+        size = content.seek(0, os.SEEK_END) - position
+        content.seek(position)
+        return size
+
+
+def quote_header_value(value):
+    return '"%s"' % value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def make_part_header(name, content_type, filename=None):
+    disposition = "form-data; name=%s" % quote_header_value(name)
+    if filename is not None:
+        disposition += "; filename=%s" % quote_header_value(filename)
+    return (
+        "Content-Disposition: %s\r\n"
+        "Content-Type: %s\r\n\r\n" % (disposition, content_type)
+    ).encode("utf-8")
+
+
+def make_stream_parts(name, content):
+    """Yield ``header, body, size`` for each part of `name` and `content`.
+
+    `content` is interpreted as by `make_payloads`. `body` is a byte string,
+    a file ready to be read, or an opener for a file.
+    """
+    if isinstance(content, bytes):
+        yield (
+            make_part_header(name, "application/octet-stream"),
+            content, len(content))
+    elif isinstance(content, str):
+        content = content.encode("utf-8")
+        yield (
+            make_part_header(name, 'text/plain; charset="utf-8"'),
+            content, len(content))
+    elif isinstance(content, IOBase):
+        content_type = get_content_type(name, getattr(content, "name", None))
+        yield (
+            make_part_header(name, content_type, filename=name),
+            content, get_file_size(content))
+    elif callable(content):
+        # Open now to find the size, and again when the body is read.
+        with content() as fd:
+            for header, _, size in make_stream_parts(name, fd):
+                yield header, content, size
+    elif isinstance(content, Iterable):
+        for part in content:
+            yield from make_stream_parts(name, part)
+    else:
+        raise AssertionError(
+            "%r is unrecognised: %r" % (name, content))
+
+
+class MultipartStream(IOBase):
+    """A MIME multipart message body, read on demand.
+
+    The contents of file parts are read in chunks as the body is read, so
+    that the whole message need never be held in memory. The length of the
+    body is known up front; `len()` returns it.
+    """
+
+    def __init__(self, boundary, parts, chunk_size=(1 << 16)):
+        """Initialise the stream.
+
+        :param boundary: The boundary between parts, as a byte string.
+        :param parts: A list of ``header, body, size`` tuples as yielded by
+            `make_stream_parts`.
+        :param chunk_size: The most to read from a file at once.
+        """
+        super(MultipartStream, self).__init__()
+        self.boundary = boundary
+        self.parts = parts
+        self.chunk_size = chunk_size
+        self.length = sum(
+            len(self._delimiter) + len(header) + size + 2
+            for header, _, size in parts) + len(self._close_delimiter)
+        self._chunks = self._generate()
+        self._buffer = b""
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def _delimiter(self):
+        return b"--" + self.boundary + b"\r\n"
+
+    @property
+    def _close_delimiter(self):
+        return b"--" + self.boundary + b"--\r\n"
+
+    def readable(self):
+        return True
+
+    def _read_file(self, fd, size):
+        while size > 0:
+            data = fd.read(min(size, self.chunk_size))
+            if len(data) == 0:
+                raise IOError(
+                    "%r was truncated while being sent." % (fd,))
+            size -= len(data)
+            yield data
+
+    def _generate(self):
+        for header, body, size in self.parts:
+            yield self._delimiter + header
+            if isinstance(body, bytes):
+                yield body
+            elif callable(body):
+                with body() as fd:
+                    yield from self._read_file(fd, size)
+            else:
+                yield from self._read_file(body, size)
+            yield b"\r\n"
+        yield self._close_delimiter
+
+    def read(self, size=-1):
+        """Read up to `size` bytes, or the rest of the body."""
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            chunks.append(chunk)
+            length += len(chunk)
+        data = b"".join(chunks)
+        if size < 0:
+            self._buffer = b""
+            return data
+        else:
+            self._buffer = data[size:]
+            return data[:size]
+
+
+def encode_multipart_stream(data):
+    """Encode `data` as a MIME multipart/form-data body, read on demand.
+
+    Unlike `encode_multipart_message`, files are not read into memory nor
+    base64 encoded; they are read in chunks as the body is read. A file must
+    not change size between calling this and reading the body.
+
+    :param data: An iterable of ``name, content`` tuples. See
+        `make_payloads` for how `content` is interpreted.
+    :return: A 2-tuple of ``headers, body``, where `headers` is a list of
+        ``name, value`` tuples and `body` is a `MultipartStream`.
+    """
+    boundary = uuid.uuid4().hex
+    parts = [
+        part for name, content in data
+        for part in make_stream_parts(name, content)
+    ]
+    body = MultipartStream(boundary.encode("ascii"), parts)
+    headers = [
+        ("Content-Type", "multipart/form-data; boundary=%s" % boundary),
+        ("Content-Length", "%d" % len(body)),
+    ]
+    return headers, body
@@ -64,7 +64,8 @@ class APIClientTestCase(MAASTestCase):
             "HTTP_CONTENT_LENGTH": headers["Content-Length"],
             }
         parser = multipartparser.MultiPartParser(
-            META=meta, input_data=BytesIO(body.encode("ascii")),
+            META=meta, input_data=BytesIO(
+                body if isinstance(body, bytes) else body.encode("ascii")),
             upload_handlers=[handler])
         return parser.parse()
 
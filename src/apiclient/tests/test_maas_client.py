@@ -6,10 +6,14 @@
 __all__ = []
 
 import gzip
+import http.client
 from io import BytesIO
 import json
 from random import randint
-from unittest.mock import ANY
+from unittest.mock import (
+    ANY,
+    Mock,
+)
 import urllib.error
 import urllib.parse
 from urllib.parse import (
@@ -23,11 +27,20 @@ from apiclient.maas_client import (
     MAASClient,
     MAASDispatcher,
     MAASOAuth,
+    MAASPooledDispatcher,
 )
+from apiclient import maas_client
 from apiclient.testing.django import APIClientTestCase
 from maastesting.factory import factory
 from maastesting.fixtures import TempWDFixture
-from maastesting.httpd import HTTPServerFixture
+from maastesting.httpd import (
+    HTTPServerFixture,
+    SilentHTTPRequestHandler,
+)
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase
 from testtools.matchers import (
     AfterPreprocessing,
@@ -182,6 +195,143 @@ class TestMAASDispatcher(MAASTestCase):
             self.assertEqual(503, err.code)
 
 
+class TestMAASPooledDispatcher(MAASTestCase):
+
+    def setUp(self):
+        super(TestMAASPooledDispatcher, self).setUp()
+        self.useFixture(TempWDFixture())
+        # Keep connections open between requests.
+        self.patch(SilentHTTPRequestHandler, "protocol_version", "HTTP/1.1")
+        self.httpd = self.useFixture(HTTPServerFixture())
+        self.dispatcher = MAASPooledDispatcher(backoff=0)
+        self.addCleanup(self.dispatcher.close)
+
+    def make_url(self, content=None):
+        name = factory.make_string()
+        if content is None:
+            content = factory.make_string(300).encode('ascii')
+        factory.make_file(location='.', name=name, contents=content)
+        return urljoin(self.httpd.url, name)
+
+    def test_dispatch_query_returns_response(self):
+        content = factory.make_string(300).encode('ascii')
+        url = self.make_url(content)
+        response = self.dispatcher.dispatch_query(url, {})
+        self.assertEqual(200, response.code)
+        self.assertEqual(url, response.geturl())
+        self.assertEqual(content, response.read())
+
+    def test_dispatch_query_reuses_connections(self):
+        url = self.make_url()
+        key = ("http",) + self.httpd.server.server_address
+        self.dispatcher.dispatch_query(url, {})
+        [conn] = self.dispatcher._idle[key]
+        sock = conn.sock
+        self.dispatcher.dispatch_query(url, {})
+        self.assertIsNotNone(sock)
+        self.assertIs(sock, conn.sock)
+        self.assertEqual([conn], self.dispatcher._idle[key])
+
+    def test_dispatch_query_retries_dropped_connection(self):
+        url = self.make_url()
+        key = ("http",) + self.httpd.server.server_address
+        stale = Mock()
+        stale.request.side_effect = http.client.RemoteDisconnected()
+        self.dispatcher._release(key, stale)
+        response = self.dispatcher.dispatch_query(url, {})
+        self.assertEqual(200, response.code)
+        self.assertThat(stale.close, MockCalledOnceWith())
+
+    def test_dispatch_query_encodes_string_data(self):
+        request = self.patch(self.dispatcher, "_request")
+        request.return_value = (200, "OK", http.client.HTTPMessage(), b"")
+        url = self.make_url()
+        self.dispatcher.dispatch_query(url, {}, method="POST", data="foo")
+        self.assertThat(request, MockCalledOnceWith(
+            url, "POST", {'Accept-Encoding': 'gzip'}, b"foo"))
+
+    def test_dispatch_query_decodes_gzip(self):
+        content = factory.make_string(300).encode('ascii')
+        url = self.make_url(content)
+        response = self.dispatcher.dispatch_query(url, {})
+        self.assertEqual('gzip', response.info().get('Content-Encoding'))
+        self.assertEqual(content, response.read())
+
+    def test_dispatch_query_doesnt_override_accept_encoding(self):
+        content = factory.make_string(300).encode('ascii')
+        url = self.make_url(content)
+        response = self.dispatcher.dispatch_query(
+            url, {'Accept-encoding': 'gzip'})
+        self.assertEqual(content, gzip.decompress(response.read()))
+
+    def test_dispatch_query_raises_HTTPError(self):
+        url = urljoin(self.httpd.url, factory.make_string())
+        error = self.assertRaises(
+            urllib.error.HTTPError, self.dispatcher.dispatch_query, url, {})
+        self.assertEqual(404, error.code)
+        self.assertIsNotNone(error.fp.read())
+
+    def test_dispatch_query_retries_on_503(self):
+        sleep = self.patch(maas_client.time, "sleep")
+        request = self.patch(self.dispatcher, "_request")
+        request.side_effect = [
+            (503, "Service Unavailable", http.client.HTTPMessage(), b""),
+            (200, "OK", http.client.HTTPMessage(), b"content"),
+        ]
+        response = self.dispatcher.dispatch_query(self.make_url(), {})
+        self.assertEqual(b"content", response.read())
+        self.assertEqual(2, request.call_count)
+        self.assertEqual(1, sleep.call_count)
+
+    def test_dispatch_query_raises_503_after_retries(self):
+        self.patch(maas_client.time, "sleep")
+        request = self.patch(self.dispatcher, "_request")
+        request.return_value = (
+            503, "Service Unavailable", http.client.HTTPMessage(), b"")
+        error = self.assertRaises(
+            urllib.error.HTTPError, self.dispatcher.dispatch_query,
+            self.make_url(), {})
+        self.assertEqual(503, error.code)
+        self.assertEqual(self.dispatcher.retries, request.call_count)
+
+    def test_get_delay_backs_off_exponentially(self):
+        dispatcher = MAASPooledDispatcher(backoff=1, max_backoff=3)
+        headers = http.client.HTTPMessage()
+        self.assertTrue(0.5 <= dispatcher._get_delay(0, headers) <= 1)
+        self.assertTrue(1 <= dispatcher._get_delay(1, headers) <= 2)
+        self.assertTrue(1.5 <= dispatcher._get_delay(5, headers) <= 3)
+
+    def test_get_delay_honours_retry_after(self):
+        dispatcher = MAASPooledDispatcher(max_backoff=3)
+        headers = http.client.HTTPMessage()
+        headers["Retry-After"] = "2"
+        self.assertEqual(2, dispatcher._get_delay(0, headers))
+        headers.replace_header("Retry-After", "20")
+        self.assertEqual(3, dispatcher._get_delay(0, headers))
+
+    def test_get_slots_limits_connections_per_host(self):
+        dispatcher = MAASPooledDispatcher(max_connections=2)
+        slots = dispatcher._get_slots(("http", "example.com", None))
+        self.assertIs(slots, dispatcher._get_slots(
+            ("http", "example.com", None)))
+        self.assertTrue(slots.acquire(blocking=False))
+        self.assertTrue(slots.acquire(blocking=False))
+        self.assertFalse(slots.acquire(blocking=False))
+
+    def test_dispatch_query_uses_urllib_via_proxy(self):
+        self.patch(maas_client.urllib.request, "getproxies").return_value = {
+            "http": "http://proxy.example.com:3128/"}
+        self.patch(maas_client.urllib.request, "proxy_bypass").return_value = (
+            False)
+        dispatch_query = self.patch(MAASDispatcher, "dispatch_query")
+        request = self.patch(self.dispatcher, "_request")
+        url = self.make_url()
+        self.dispatcher.dispatch_query(url, {})
+        self.assertThat(dispatch_query, MockCalledOnceWith(
+            url, {}, method="GET", data=None))
+        self.assertThat(request, MockNotCalled())
+
+
 def make_path():
     """Create an arbitrary resource path."""
     return "/" + '/'.join(factory.make_string() for counter in range(2))
@@ -10,7 +10,9 @@ from os import urandom
 
 from apiclient.multipart import (
     encode_multipart_data,
+    encode_multipart_stream,
     get_content_type,
+    MultipartStream,
 )
 from apiclient.testing.django import APIClientTestCase
 from django.utils.datastructures import MultiValueDict
@@ -121,3 +123,67 @@ class TestMultiPart(APIClientTestCase):
             self.parse_headers_and_body_with_django(headers, body))
         self.assertEqual({'one': ['ABC', 'XYZ', 'UVW']}, params_out)
         self.assertSetEqual(set(), set(files_out))
+
+
+class TestMultiPartStream(APIClientTestCase):
+
+    def test_encode_multipart_stream(self):
+        params = [("op", "add"), ("foo", "bar\u1234"), ("raw", b"\x00\xff")]
+        random_data = urandom(32)
+        files = [("baz", BytesIO(random_data))]
+        headers, body = encode_multipart_stream(params + files)
+        headers = dict(headers)
+        self.assertIsInstance(body, MultipartStream)
+        self.assertThat(
+            headers["Content-Type"],
+            StartsWith("multipart/form-data; boundary="))
+        body = body.read()
+        self.assertEqual("%s" % len(body), headers["Content-Length"])
+        # Round-trip through Django's multipart code.
+        post, files = self.parse_headers_and_body_with_django(headers, body)
+        self.assertEqual(
+            {"op": ["add"], "foo": ["bar\u1234"], "raw": ["\x00\ufffd"]},
+            post)
+        self.assertSetEqual({"baz"}, set(files))
+        self.assertEqual(random_data, files["baz"].read())
+
+    def test_encode_multipart_stream_multiple_params(self):
+        data = [
+            ("one", "ABC"),
+            ("two", ["DEF", "UVW"]),
+            ("f-one", open(self.make_file(contents=b"f1"), "rb")),
+            ("f-two", lambda: open(self.make_file(contents=b"f2"), "rb")),
+        ]
+        headers, body = encode_multipart_stream(data)
+        post, files = self.parse_headers_and_body_with_django(
+            dict(headers), body.read())
+        self.assertEqual({"one": ["ABC"], "two": ["DEF", "UVW"]}, post)
+        self.assertEqual(
+            {"f-one": b"f1", "f-two": b"f2"},
+            {name: buf.read() for name, buf in files.items()})
+
+    def test_encode_multipart_stream_reads_files_in_chunks(self):
+        random_data = urandom(1000)
+        content = BytesIO(random_data)
+        headers, body = encode_multipart_stream([("file", content)])
+        body.chunk_size = 100
+        self.assertEqual(0, content.tell())
+        chunks = list(iter(lambda: body.read(50), b""))
+        self.assertEqual(len(body), sum(len(chunk) for chunk in chunks))
+        self.assertIn(random_data, b"".join(chunks))
+
+    def test_encode_multipart_stream_sends_files_from_current_position(self):
+        content = BytesIO(b"skipped, sent")
+        content.seek(9)
+        headers, body = encode_multipart_stream([("file", content)])
+        post, files = self.parse_headers_and_body_with_django(
+            dict(headers), body.read())
+        self.assertEqual(b"sent", files["file"].read())
+
+    def test_encode_multipart_stream_rejects_truncated_file(self):
+        filename = self.make_file(contents=b"content")
+        headers, body = encode_multipart_stream(
+            [("file", lambda: open(filename, "rb"))])
+        with open(filename, "wb"):
+            pass  # Truncate.
+        self.assertRaises(IOError, body.read)
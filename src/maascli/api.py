@@ -29,6 +29,7 @@ from apiclient.maas_client import MAASOAuth
 from apiclient.multipart import (
     build_multipart_message,
     encode_multipart_message,
+    encode_multipart_stream,
 )
 from apiclient.utils import (
     ascii_url,
@@ -210,7 +211,9 @@ class Action(Command):
 
         - For GET requests, encode parameters in the query string.
 
-        - Otherwise always encode parameters in the request body.
+        - Otherwise always encode parameters in the request body. When
+          there are files, e.g. from ``name@=filename`` on the command-line,
+          the body is a stream from which the files are read as it's sent.
 
         - Except op; this can always go in the query string.
 
@@ -234,6 +237,8 @@ class Action(Command):
         else:
             if data is None or len(data) == 0:
                 body, headers = None, []
+            elif any(callable(value) for _, value in data):
+                headers, body = encode_multipart_stream(data)
             else:
                 message = build_multipart_message(data)
                 headers, body = encode_multipart_message(message)
@@ -386,20 +391,30 @@ def get_action_class_bases(handler, action):
     return (Action,)
 
 
-def register_actions(profile, handler, parser):
-    """Register a handler's actions."""
+def register_actions(profile, handler, parser, action_name=None):
+    """Register a handler's actions.
+
+    :param action_name: If given, only this action is registered in full;
+        the others are registered with only their help, which is all that's
+        needed unless they are named on the command-line.
+    """
     for action in handler["actions"]:
         help_title, help_body = parse_docstring(action["doc"])
-        action_name = safe_name(action["name"])
+        name = safe_name(action["name"])
+        if action_name is not None and name != action_name:
+            parser.subparsers.add_parser(
+                name, help=help_title, description=help_title,
+                epilog=help_body)
+            continue
         action_bases = get_action_class_bases(handler, action)
         action_ns = {
             "action": action,
             "handler": handler,
             "profile": profile,
             }
-        action_class = type(action_name, action_bases, action_ns)
+        action_class = type(name, action_bases, action_ns)
         action_parser = parser.subparsers.add_parser(
-            action_name, help=help_title, description=help_title,
+            name, help=help_title, description=help_title,
             epilog=help_body, add_help=False)
         action_parser.add_argument(
             '--help', '-h', action=ActionHelp, nargs=0,
@@ -407,51 +422,132 @@ def register_actions(profile, handler, parser):
         action_parser.set_defaults(execute=action_class(action_parser))
 
 
-def register_handler(profile, handler, parser):
+def register_handler(profile, handler, parser, action_name=None):
     """Register a resource's handler."""
     help_title, help_body = parse_docstring(handler["doc"])
     handler_name = handler_command_name(handler["name"])
     handler_parser = parser.subparsers.add_parser(
         handler_name, help=help_title, description=help_title,
         epilog=help_body)
-    register_actions(profile, handler, handler_parser)
+    register_actions(profile, handler, handler_parser, action_name)
+
 
+def get_resource_handler(profile, resource):
+    """Return the handler with which to represent `resource`.
 
-def register_resources(profile, parser):
-    """Register a profile's resources."""
-    anonymous = profile["credentials"] is None
-    description = profile["description"]
-    resources = description["resources"]
+    This merges the actions of the resource's authenticated and anonymous
+    handlers, as is appropriate for `profile`.
+
+    :return: A handler description, or `None` if the resource has no
+        actions available to `profile`.
+    """
+    # Don't consider the authenticated handler if this profile has no
+    # credentials associated with it.
+    if profile["credentials"] is None:
+        handlers = [resource["anon"]]
+    else:
+        handlers = [resource["auth"], resource["anon"]]
+    # Merge actions from the active handlers. This could be slightly
+    # simpler using a dict and going through the handlers in reverse, but
+    # doing it forwards with a defaultdict(list) leaves an easier-to-debug
+    # structure, and ought to be easier to understand.
+    actions = defaultdict(list)
+    for handler in handlers:
+        if handler is not None:
+            for action in handler["actions"]:
+                action_name = action["name"]
+                actions[action_name].append(action)
+    if len(actions) == 0:
+        return None
+    # Always represent this resource using the authenticated handler, if
+    # defined, before the fall-back anonymous handler, even if this
+    # profile does not have credentials.
+    represent_as = dict(
+        resource["auth"] or resource["anon"],
+        name=resource["name"], actions=[])
+    # Each value in the actions dict is a list of one or more action
+    # descriptions. Here we represent the handler with only the first of
+    # each of those.
+    represent_as["actions"].extend(
+        value[0] for value in actions.values())
+    return represent_as
+
+
+def build_command_tree(profile):
+    """Return the command tree for `profile`'s API.
+
+    This is a list of ``[command-name, help-title, help-body, resource]``
+    lists, one for each handler, in the order they're registered. It holds
+    only plain data so that it can be cached; see `get_command_tree`.
+    """
+    tree = []
+    resources = profile["description"]["resources"]
     for resource in sorted(resources, key=itemgetter("name")):
-        # Don't consider the authenticated handler if this profile has no
-        # credentials associated with it.
-        if anonymous:
-            handlers = [resource["anon"]]
+        handler = get_resource_handler(profile, resource)
+        if handler is not None:
+            help_title, help_body = parse_docstring(handler["doc"])
+            tree.append([
+                handler_command_name(handler["name"]),
+                help_title, help_body, resource["name"]])
+    return tree
+
+
+def get_command_tree(profile, config=None):
+    """Return the command tree for `profile`'s API, from `config` if cached.
+
+    The tree is cached against the API description's hash, so a refreshed
+    description causes it to be rebuilt. Descriptions from servers that do
+    not provide a hash are never cached.
+    """
+    description_hash = profile["description"].get("hash")
+    if config is None or description_hash is None:
+        return build_command_tree(profile)
+    key = "%s:%s" % (
+        description_hash, "anon" if profile["credentials"] is None
+        else "auth")
+    tree = config.get_command_tree(profile["name"], key)
+    if tree is None:
+        tree = build_command_tree(profile)
+        config.set_command_tree(profile["name"], key, tree)
+    return tree
+
+
+def register_resources(profile, parser, config=None, names=None):
+    """Register a profile's resources.
+
+    :param config: The `ProfileConfig` in which to cache the command tree.
+    :param names: The handler and action names given on the command-line,
+        if any. Only the named handler's actions are registered, and only
+        the named action in full. All are registered if this is `None`.
+    """
+    resources = {
+        resource["name"]: resource
+        for resource in profile["description"]["resources"]
+    }
+    tree = get_command_tree(profile, config)
+    for handler_name, help_title, help_body, resource_name in tree:
+        if names is None:
+            action_name = None
+        elif names[:1] == [handler_name]:
+            action_name = names[1] if len(names) > 1 else ""
         else:
-            handlers = [resource["auth"], resource["anon"]]
-        # Merge actions from the active handlers. This could be slightly
-        # simpler using a dict and going through the handlers in reverse, but
-        # doing it forwards with a defaultdict(list) leaves an easier-to-debug
-        # structure, and ought to be easier to understand.
-        actions = defaultdict(list)
-        for handler in handlers:
-            if handler is not None:
-                for action in handler["actions"]:
-                    action_name = action["name"]
-                    actions[action_name].append(action)
-        # Always represent this resource using the authenticated handler, if
-        # defined, before the fall-back anonymous handler, even if this
-        # profile does not have credentials.
-        represent_as = dict(
-            resource["auth"] or resource["anon"],
-            name=resource["name"], actions=[])
-        # Each value in the actions dict is a list of one or more action
-        # descriptions. Here we register the handler with only the first of
-        # each of those.
-        if len(actions) != 0:
-            represent_as["actions"].extend(
-                value[0] for value in actions.values())
-            register_handler(profile, represent_as, parser)
+            parser.subparsers.add_parser(
+                handler_name, help=help_title, description=help_title,
+                epilog=help_body)
+            continue
+        handler = get_resource_handler(profile, resources[resource_name])
+        register_handler(profile, handler, parser, action_name)
+
+
+def get_command_names(argv):
+    """Return the command names given on the command-line `argv`.
+
+    None of the parsers between the top-level and an API action accept
+    options with values, so the first three positional arguments name the
+    profile, handler and action, where given.
+    """
+    return [arg for arg in argv[1:] if not arg.startswith("-")][:3]
+
 
 profile_help_paragraphs = [
     """\
@@ -471,8 +567,14 @@ profile_help = '\n\n'.join(
     fill(dedent(paragraph)) for paragraph in profile_help_paragraphs)
 
 
-def register_api_commands(parser):
-    """Register all profiles as subcommands on `parser`."""
+def register_api_commands(parser, argv=None):
+    """Register all profiles as subcommands on `parser`.
+
+    :param argv: The command-line. When given, only the profile, handler and
+        action named on it are registered in full. Every profile's handlers
+        are registered when `None`.
+    """
+    names = None if argv is None else get_command_names(argv)
     with ProfileConfig.open() as config:
         for profile_name in config:
             profile = config[profile_name]
@@ -482,4 +584,8 @@ def register_api_commands(parser):
                     "Issue commands to the MAAS region controller at %(url)s."
                     % profile),
                 epilog=profile_help)
-            register_resources(profile, profile_parser)
+            if names is None:
+                register_resources(profile, profile_parser, config)
+            elif names[:1] == [profile_name]:
+                register_resources(
+                    profile, profile_parser, config, names[1:])
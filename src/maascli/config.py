@@ -31,6 +31,11 @@ class ProfileConfig:
                 "(id INTEGER PRIMARY KEY,"
                 " name TEXT NOT NULL UNIQUE,"
                 " data BLOB)")
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS commands "
+                "(name TEXT PRIMARY KEY,"
+                " key TEXT NOT NULL,"
+                " data BLOB)")
         self.__fill_cache()
 
     def cursor(self):
@@ -82,11 +87,36 @@ class ProfileConfig:
             cursor.execute(
                 "DELETE FROM profiles"
                 " WHERE name = ?", (name,))
+            cursor.execute(
+                "DELETE FROM commands"
+                " WHERE name = ?", (name,))
         try:
             del self.cache[name]
         except KeyError:
             pass
 
+    def get_command_tree(self, name, key):
+        """Return the cached command tree for profile `name`.
+
+        :param key: Identifies the API description the tree was built from.
+        :return: The tree, or `None` if there's no tree cached for `key`.
+        """
+        with self.cursor() as cursor:
+            data = cursor.execute(
+                "SELECT data FROM commands"
+                " WHERE name = ? AND key = ?", (name, key)).fetchone()
+        if data is None:
+            return None
+        else:
+            return json.loads(data[0])
+
+    def set_command_tree(self, name, key, tree):
+        """Cache the command tree for profile `name`, replacing any other."""
+        with self.cursor() as cursor:
+            cursor.execute(
+                "INSERT OR REPLACE INTO commands (name, key, data) "
+                "VALUES (?, ?, ?)", (name, key, json.dumps(tree)))
+
     @classmethod
     def create_database(cls, dbpath):
         # Initialise the database file with restrictive permissions.
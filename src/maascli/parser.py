@@ -69,7 +69,7 @@ def prepare_parser(argv):
         description=help_body, prog=os.path.basename(argv[0]),
         epilog="http://maas.io/")
     register_cli_commands(parser)
-    api.register_api_commands(parser)
+    api.register_api_commands(parser, argv)
     parser.add_argument(
         '--debug', action='store_true', default=False,
         help=argparse.SUPPRESS)
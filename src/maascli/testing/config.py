@@ -14,12 +14,23 @@ from maastesting.factory import factory
 
 class FakeConfig(dict):
     """Fake `ProfileConfig`.  A dict that's also a context manager."""
+
+    def __init__(self, *args, **kwargs):
+        super(FakeConfig, self).__init__(*args, **kwargs)
+        self.command_trees = {}
+
     def __enter__(self, *args, **kwargs):
         return self
 
     def __exit__(self, *args, **kwargs):
         pass
 
+    def get_command_tree(self, name, key):
+        return self.command_trees.get((name, key))
+
+    def set_command_tree(self, name, key, tree):
+        self.command_trees[name, key] = tree
+
 
 def make_handler():
     """Create a fake handler entry."""
@@ -5,10 +5,10 @@
 
 __all__ = []
 
-from base64 import b64encode
 from functools import partial
 import http.client
 import json
+from operator import itemgetter
 import sys
 from textwrap import dedent
 from unittest.mock import (
@@ -23,14 +23,20 @@ from maascli.actions.sshkeys_import import SSHKeysImportAction
 from maascli.command import CommandError
 from maascli.config import ProfileConfig
 from maascli.parser import ArgumentParser
-from maascli.testing.config import make_configs
+from maascli.testing.config import (
+    make_configs,
+    make_resource,
+)
 from maascli.utils import (
     handler_command_name,
     safe_name,
 )
 from maastesting.factory import factory
 from maastesting.fixtures import CaptureStandardIO
-from maastesting.matchers import MockCalledOnceWith
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase
 from testtools.matchers import (
     EndsWith,
@@ -39,6 +45,7 @@ from testtools.matchers import (
     MatchesAll,
     MatchesListwise,
     Not,
+    StartsWith,
 )
 
 
@@ -79,6 +86,101 @@ class TestRegisterAPICommands(MAASTestCase):
                     (profile_name, handler_name, action_name))
                 self.assertIsInstance(options.execute, api.Action)
 
+    def test_argv_registers_only_named_action_in_full(self):
+        profile = self.make_profile()
+        [profile_name] = profile
+        resource = list(profile.values())[0]["description"]["resources"][0]
+        handler_name = handler_command_name(resource["name"])
+        action_name = safe_name(resource["auth"]["actions"][0]["name"])
+        other_action_name = safe_name(resource["anon"]["actions"][0]["name"])
+        parser = ArgumentParser()
+        api.register_api_commands(
+            parser, ["maas", profile_name, handler_name, action_name])
+        options = parser.parse_args(
+            (profile_name, handler_name, action_name))
+        self.assertIsInstance(options.execute, api.Action)
+        options = parser.parse_args(
+            (profile_name, handler_name, other_action_name))
+        self.assertFalse(hasattr(options, "execute"))
+
+    def test_argv_registers_other_handlers_without_actions(self):
+        profile = self.make_profile()
+        [profile_name] = profile
+        resources = list(profile.values())[0]["description"]["resources"]
+        handler_name = handler_command_name(resources[0]["name"])
+        parser = ArgumentParser()
+        api.register_api_commands(parser, ["maas", profile_name])
+        profile_parser = parser.subparsers.choices[profile_name]
+        handler_parser = profile_parser.subparsers.choices[handler_name]
+        self.assertIsNone(handler_parser._subparsers)
+
+    def test_argv_does_not_register_other_profiles(self):
+        profile = self.make_profile()
+        [profile_name] = profile
+        parser = ArgumentParser()
+        api.register_api_commands(parser, ["maas", "login"])
+        profile_parser = parser.subparsers.choices[profile_name]
+        self.assertIsNone(profile_parser._subparsers)
+
+
+class TestCommandTree(MAASTestCase):
+    """Tests for building and caching the command tree."""
+
+    def make_profile(self, description_hash=None):
+        config = make_configs()
+        [profile] = config.values()
+        if description_hash is not None:
+            profile["description"]["hash"] = description_hash
+        return config, profile
+
+    def test_build_command_tree(self):
+        config, profile = self.make_profile()
+        resources = sorted(
+            profile["description"]["resources"], key=itemgetter("name"))
+        self.assertEqual([
+            [handler_command_name(resource["name"]), "Short", "Long",
+             resource["name"]]
+            for resource in resources
+        ], api.build_command_tree(profile))
+
+    def test_build_command_tree_omits_resources_without_actions(self):
+        config, profile = self.make_profile()
+        profile["credentials"] = None
+        resource = make_resource(anon=False)
+        profile["description"]["resources"].append(resource)
+        self.assertNotIn(
+            resource["name"],
+            [entry[3] for entry in api.build_command_tree(profile)])
+
+    def test_get_command_tree_caches_by_hash(self):
+        config, profile = self.make_profile("abc")
+        tree = api.get_command_tree(profile, config)
+        build_command_tree = self.patch(api, "build_command_tree")
+        self.assertEqual(tree, api.get_command_tree(profile, config))
+        self.assertThat(build_command_tree, MockNotCalled())
+        self.assertEqual(
+            tree, config.get_command_tree(profile["name"], "abc:auth"))
+
+    def test_get_command_tree_rebuilds_for_new_hash(self):
+        config, profile = self.make_profile("abc")
+        api.get_command_tree(profile, config)
+        profile["description"]["hash"] = "def"
+        build_command_tree = self.patch(api, "build_command_tree")
+        build_command_tree.return_value = []
+        self.assertEqual([], api.get_command_tree(profile, config))
+        self.assertThat(build_command_tree, MockCalledOnceWith(profile))
+
+    def test_get_command_tree_does_not_cache_without_hash(self):
+        config, profile = self.make_profile()
+        api.get_command_tree(profile, config)
+        self.assertEqual({}, config.command_trees)
+
+    def test_get_command_names(self):
+        self.assertEqual(
+            ["admin", "machine", "read"], api.get_command_names(
+                ["maas", "--debug", "admin", "machine", "read", "abc"]))
+        self.assertEqual(["admin"], api.get_command_names(["maas", "admin"]))
+
 
 class TestFunctions(MAASTestCase):
     """Test for miscellaneous functions in `maascli.api`."""
@@ -654,17 +756,21 @@ class TestPayloadPreparationWithFiles(MAASTestCase):
         uri, body, headers = api.Action.prepare_payload(
             op=None, method="POST", uri="http://localhost", data=data)
 
-        expected_body_template = """\
-            --...
-            Content-Transfer-Encoding: base64
-            Content-Disposition: form-data; ...name="%s"; ...name="%s"
-            MIME-Version: 1.0
-            Content-Type: application/octet-stream
-
-            %s
-            --...--
-            """
-        expected_body = expected_body_template % (
-            parameter, parameter, b64encode(contents).decode("ascii"))
-
-        self.assertDocTestMatches(expected_body, body)
+        # The file is streamed as-is, not base64 encoded.
+        headers = dict(headers)
+        body = body.read()
+        self.assertEqual("%d" % len(body), headers["Content-Length"])
+        expected_part = (
+            b'Content-Disposition: form-data; name="%s"; filename="%s"\r\n'
+            b'Content-Type: application/octet-stream\r\n\r\n%s\r\n' % (
+                parameter.encode("ascii"), parameter.encode("ascii"),
+                contents))
+        self.assertIn(expected_part, body)
+        self.assertThat(body, StartsWith(b"--"))
+        self.assertThat(body, EndsWith(b"--\r\n"))
+
+    def test_data_without_files_is_not_streamed(self):
+        data = [("foo", "bar")]
+        uri, body, headers = api.Action.prepare_payload(
+            op=None, method="POST", uri="http://localhost", data=data)
+        self.assertIsInstance(body, str)
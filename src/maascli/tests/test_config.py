@@ -88,6 +88,25 @@ class TestProfileConfig(MAASTestCase):
         del config["alice"]
         self.assertEqual(set(), set(config))
 
+    def test_command_tree_cache(self):
+        database = sqlite3.connect(":memory:")
+        config = api.ProfileConfig(database)
+        self.assertIsNone(config.get_command_tree("alice", "key"))
+        config.set_command_tree("alice", "key", [["machine", "a", "b"]])
+        self.assertEqual(
+            [["machine", "a", "b"]], config.get_command_tree("alice", "key"))
+        # Only one tree is kept for each profile.
+        config.set_command_tree("alice", "other", [])
+        self.assertIsNone(config.get_command_tree("alice", "key"))
+
+    def test_removing_profile_removes_command_tree(self):
+        database = sqlite3.connect(":memory:")
+        config = api.ProfileConfig(database)
+        config["alice"] = {"abc": 123}
+        config.set_command_tree("alice", "key", [])
+        del config["alice"]
+        self.assertIsNone(config.get_command_tree("alice", "key"))
+
     def test_open_and_close(self):
         # ProfileConfig.open() returns a context manager that closes the
         # database on exit.
@@ -13,7 +13,6 @@ import http.client
 import os
 
 from django.conf import settings
-from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from maasserver.api.support import (
@@ -45,7 +44,7 @@ from maasserver.models import (
     BootResourceFile,
 )
 from maasserver.utils.django_urls import reverse
-from maasserver.utils.orm import post_commit_do
+from maasserver.utils.orm import post_commit_do_once
 from piston3.emitters import JSONEmitter
 from piston3.handler import typemapper
 from piston3.utils import rc
@@ -67,14 +66,6 @@ ALLOW_UPLOAD_RTYPES = [
     ]
 
 
-def get_content_parameter(request):
-    """Get the "content" parameter from a POST or PUT."""
-    content = get_optional_param(request.FILES, 'content', None)
-    if content is None:
-        return None
-    return content.read()
-
-
 def boot_resource_file_to_dict(rfile):
     """Return dictionary representation of `BootResourceFile`."""
     dict_representation = {
@@ -142,6 +133,8 @@ class BootResourcesHandler(OperationsHandler):
     api_doc_section_name = "Boot resources"
 
     update = delete = None
+    change_channels = ('bootresource',)
+    streamed_uploads = ('content',)
 
     def read(self, request):
         """List all boot resources.
@@ -194,11 +187,10 @@ class BootResourcesHandler(OperationsHandler):
             data = {}
         if 'filetype' not in data:
             data['filetype'] = 'tgz'
-        file_content = get_content_parameter(request)
-        if file_content is not None:
-            content = SimpleUploadedFile(
-                content=file_content, name='file',
-                content_type='application/octet-stream')
+        # The content is streamed into a large object as it is uploaded; see
+        # `streamed_uploads`.
+        content = get_optional_param(request.FILES, 'content', None)
+        if content is not None:
             form = BootResourceForm(data=data, files={
                 'content': content,
                 })
@@ -210,12 +202,13 @@ class BootResourcesHandler(OperationsHandler):
 
         # If an upload contained the full file, then we can have the clusters
         # sync a new resource.
-        if file_content is not None:
+        if content is not None:
             # Avoid circular import.
             from maasserver.clusterrpc.boot_images import (
                 RackControllersImporter,
             )
-            post_commit_do(RackControllersImporter.schedule)
+            post_commit_do_once(
+                "import-boot-images", RackControllersImporter.schedule)
 
         stream = json_object(
             boot_resource_to_dict(resource, with_sets=True), request)
@@ -333,7 +326,8 @@ class BootResourceFileUploadHandler(OperationsHandler):
             from maasserver.clusterrpc.boot_images import (
                 RackControllersImporter,
             )
-            post_commit_do(RackControllersImporter.schedule)
+            post_commit_do_once(
+                "import-boot-images", RackControllersImporter.schedule)
         return rc.ALL_OK
 
     @classmethod
@@ -0,0 +1,191 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Conditional GET support for API read operations.
+
+Handlers declare the database notification channels that their
+representations depend upon in `change_channels`. Read operations on those
+handlers are given an ``ETag`` and a ``Last-Modified`` derived from a count
+of the changes notified on those channels, and a request that carries a
+matching ``If-None-Match`` or ``If-Modified-Since`` is answered with
+``304 Not Modified`` before the handler queries anything.
+"""
+
+__all__ = [
+    "change_tracker",
+    "ChangeTracker",
+    "ConditionalState",
+    "is_not_modified",
+    "make_not_modified_response",
+    "set_conditional_headers",
+]
+
+from collections import (
+    Counter,
+    namedtuple,
+)
+from functools import partial
+import hashlib
+import math
+import os
+
+from django.http import HttpResponseNotModified
+from django.utils.http import (
+    http_date,
+    parse_http_date_safe,
+)
+from twisted.internet import reactor
+
+
+ConditionalState = namedtuple("ConditionalState", ("etag", "last_modified"))
+
+
+class ChangeTracker:
+    """Count the changes notified by the database on each channel.
+
+    Channels are registered with the listener the first time they are asked
+    about. Notifications sent while the listener is not connected are lost,
+    so no state is given out until it is, and the listener's generation is
+    folded into every ETag so that none survive a reconnection. Counts are
+    kept per process, so a token unique to this process is folded in too.
+
+    Notifications arrive a short while after a change is committed, so a
+    client that polls immediately after a change made via another process
+    can briefly see the previous ETag.
+    """
+
+    def __init__(self, clock=reactor):
+        super(ChangeTracker, self).__init__()
+        self.clock = clock
+        self.listener = None
+        self.handlers = {}
+        self.changes = Counter()
+        self.modified = {}
+        self.generation = None
+        self.since = None
+        self.token = None
+
+    def install(self, listener):
+        """Count changes notified via `listener`.
+
+        This must be called from the reactor.
+        """
+        self.uninstall()
+        self.listener = listener
+        # Choose the token here rather than at import, so that workers forked
+        # from a process that has imported this module do not share it.
+        self.token = os.urandom(8).hex()
+
+    def uninstall(self):
+        """Stop counting changes.
+
+        This must be called from the reactor.
+        """
+        listener, self.listener = self.listener, None
+        handlers, self.handlers = self.handlers, {}
+        if listener is not None:
+            for channel, handler in handlers.items():
+                listener.unregister(channel, handler)
+        self.changes.clear()
+        self.modified.clear()
+
+    def track(self, channel):
+        """Start counting changes notified on `channel`.
+
+        This must be called from the reactor.
+        """
+        if self.listener is not None and channel not in self.handlers:
+            handler = partial(self.changed, channel)
+            self.listener.register(channel, handler)
+            self.modified[channel] = self.clock.seconds()
+            self.handlers[channel] = handler
+
+    def changed(self, channel, action, obj_id):
+        """Called by the listener when `channel` is notified."""
+        self.changes[channel] += 1
+        self.modified[channel] = self.clock.seconds()
+
+    def get_state(self, channels, *extra):
+        """Return the `ConditionalState` of a representation.
+
+        This can be called from any thread.
+
+        :param channels: The channels whose changes affect the
+            representation.
+        :param extra: Anything else that the representation depends upon,
+            e.g. the requesting user. It must have a stable `repr`.
+        :return: A `ConditionalState`, or `None` if changes to `channels`
+            are not being reliably counted. Its `last_modified` is `None` if
+            they have changed within the current second.
+        """
+        listener = self.listener
+        if listener is None:
+            return None
+        untracked = [
+            channel for channel in channels
+            if channel not in self.handlers
+        ]
+        if len(untracked) > 0:
+            for channel in untracked:
+                reactor.callFromThread(self.track, channel)
+            return None
+        if not (listener.registeredChannels and listener.connected()):
+            return None
+        # Read the counts before anything else; a change notified after this
+        # can only make the state look older than it is.
+        changes = tuple(self.changes[channel] for channel in channels)
+        generation = listener.generation
+        if generation != self.generation:
+            # Changes may have been missed while reconnecting.
+            self.generation, self.since = generation, self.clock.seconds()
+        last_modified = max(
+            self.since, *(self.modified[channel] for channel in channels))
+        key = repr((self.token, generation, tuple(channels), changes, extra))
+        etag = '"%s"' % hashlib.sha1(key.encode("utf-8")).hexdigest()
+        # Last-Modified has a resolution of one second. Rounding down would
+        # let a later change in the same second go unnoticed, so round up,
+        # but only once that second has passed; until then there can be no
+        # Last-Modified that a later change in this second would not share.
+        last_modified = math.ceil(last_modified)
+        if last_modified > self.clock.seconds():
+            last_modified = None
+        return ConditionalState(etag, last_modified)
+
+
+# The tracker used by this process. The web application installs it.
+change_tracker = ChangeTracker()
+
+
+def is_not_modified(request, state):
+    """Return whether the client's copy of a representation is current.
+
+    ``If-None-Match`` takes precedence over ``If-Modified-Since``.
+    """
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etags = {etag.strip() for etag in if_none_match.split(",")}
+        # Weak comparison is used for If-None-Match.
+        return state.etag in etags or "W/" + state.etag in etags
+    if_modified_since = request.META.get("HTTP_IF_MODIFIED_SINCE")
+    if if_modified_since is not None:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        return (
+            if_modified_since is not None and
+            state.last_modified is not None and
+            state.last_modified <= if_modified_since)
+    return False
+
+
+def set_conditional_headers(response, state):
+    """Set the ``ETag`` and ``Last-Modified`` headers on `response`."""
+    response["ETag"] = state.etag
+    if state.last_modified is not None:
+        response["Last-Modified"] = http_date(state.last_modified)
+    return response
+
+
+def make_not_modified_response(state):
+    """Return a ``304 Not Modified`` response for `state`."""
+    return set_conditional_headers(HttpResponseNotModified(), state)
@@ -1,4 +1,4 @@
-# Copyright 2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2016-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """API handlers: `Discovery`."""
@@ -181,14 +181,15 @@ class DiscoveriesHandler(OperationsHandler):
 
         This command causes each connected rack controller to execute the
         'maas-rack scan-network' command, which will scan all CIDRs configured
-        on the rack controller using 'nmap' (if it is installed) or 'ping'.
+        on the rack controller by sweeping them with ARP, or using 'nmap' (if
+        it is installed) or 'ping' if it cannot.
 
         Network discovery must not be set to 'disabled' for this command to be
         useful.
 
         Scanning will be started in the background, and could take a long time
         on rack controllers that do not have 'nmap' installed and are connected
-        to large networks.
+        to large networks. Its progress can be followed with 'scan_progress'.
 
         If the call is a success, this method will return a dictionary of
         results as follows:
@@ -220,9 +221,9 @@ class DiscoveriesHandler(OperationsHandler):
             network.) Default: False.
         :param always_use_ping: If True, will force the scan to use 'ping' even
             if 'nmap' is installed. Default: False.
-        :param slow: If True, and 'nmap' is being used, will limit the scan
-            to nine packets per second. If the scanner is 'ping', this option
-            has no effect. Default: False.
+        :param slow: If True, will limit the scan to nine packets per second
+            on each subnet. If the scanner is 'ping', this option has no
+            effect. Default: False.
         :param threads: The number of threads to use during scanning. If 'nmap'
             is the scanner, the default is one thread per 'nmap' process. If
             'ping' is the scanner, the default is four threads per CPU.
@@ -262,6 +263,32 @@ class DiscoveriesHandler(OperationsHandler):
                 threads=threads)
         return user_friendly_scan_results(results)
 
+    @operation(idempotent=True)
+    def scan_progress(self, request, **kwargs):
+        """Report the progress of neighbour discovery scans on rack networks.
+
+        Returns a dictionary of results as follows:
+
+        progress: A list with an entry for each rack controller that
+        reported its progress, with its 'system_id' and 'hostname', whether
+        it is 'scanning', and the 'subnets' its current (or most recent) scan
+        has swept. Each subnet has its 'interface' and 'cidr', the number of
+        'hosts' on it, how many have been 'probed' so far and are 'up', and
+        whether its sweep is 'done'. Subnets are only reported by rack
+        controllers that sweep with ARP.
+
+        failed_to_connect_to: A list of rack controllers where the RPC
+        connection failed.
+
+        rpc_call_timed_out_on: A list of rack controllers where the RPC
+        connection was made, but the call timed out before a ten second
+        timeout elapsed.
+
+        failures: A list of the errors from rack controllers that could not
+        report their progress.
+        """
+        return user_friendly_scan_progress(get_rack_scan_progress())
+
 
 def get_scan_result_string_for_humans(rpc_results: RPCResults) -> str:
     """Return a human-readable string with the results of `ScanNetworks`."""
@@ -371,6 +398,34 @@ def scan_all_rack_networks(
     return rpc_results
 
 
+def get_rack_scan_progress() -> RPCResults:
+    """Call each rack controller and ask for the progress of its scan."""
+    return call_racks_synchronously(cluster.GetScanNetworksProgress)
+
+
+def user_friendly_scan_progress(rpc_results: RPCResults) -> dict:
+    """Given the specified `RPCResults` object, returns a user-friendly dict.
+
+    Pairs each `GetScanNetworksProgress` response with the rack controller
+    that sent it.
+    """
+    progress = []
+    for controller, response in zip(rpc_results.success, rpc_results.results):
+        [summary] = get_controller_summary([controller])
+        summary['scanning'] = response['scanning']
+        summary['subnets'] = response['subnets']
+        progress.append(summary)
+    return {
+        "progress": progress,
+        "failed_to_connect_to":
+            get_controller_summary(rpc_results.unavailable),
+        "rpc_call_timed_out_on":
+            get_controller_summary(rpc_results.timeout),
+        "failures":
+            get_failure_summary(rpc_results.failures),
+    }
+
+
 def user_friendly_scan_results(rpc_results: RPCResults) -> dict:
     """Given the specified `RPCResults` object, returns a user-friendly dict.
 
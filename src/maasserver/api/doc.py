@@ -1,4 +1,4 @@
-# Copyright 2012-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2012-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Utilities to help document/describe the public facing API."""
@@ -34,8 +34,6 @@ from piston3.authentication import NoAuthentication
 from piston3.doc import generate_doc
 from piston3.handler import BaseHandler
 from piston3.resource import Resource
-from provisioningserver.drivers.pod.registry import PodDriverRegistry
-from provisioningserver.drivers.power.registry import PowerDriverRegistry
 
 
 def accumulate_api_resources(resolver, accumulator):
@@ -81,6 +79,9 @@ def generate_power_types_doc():
 
     The documentation is derived from the `PowerDriverRegistry`.
     """
+    # Import here; only the API documentation needs all the drivers.
+    from provisioningserver.drivers.power.registry import PowerDriverRegistry
+
     output = StringIO()
     line = partial(print, file=output)
 
@@ -123,6 +124,9 @@ def generate_pod_types_doc():
 
     The documentation is derived from the `PodDriverRegistry`.
     """
+    # Import here; only the API documentation needs all the drivers.
+    from provisioningserver.drivers.pod.registry import PodDriverRegistry
+
     output = StringIO()
     line = partial(print, file=output)
 
@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Restful MAAS API.
@@ -68,7 +68,6 @@ from textwrap import dedent
 
 from django.http import HttpResponse
 from django.shortcuts import render
-from docutils import core
 from maasserver.api.annotations import APIDocstringParser
 from maasserver.api.doc import (
     describe_api,
@@ -205,6 +204,8 @@ def render_api_docs():
 
 
 def reST_to_html_fragment(a_str):
+    # Import here; docutils is slow to load and only the API docs need it.
+    from docutils import core
     parts = core.publish_parts(source=a_str, writer_name='html')
     return parts['body_pre_docinfo'] + parts['fragment']
 
@@ -30,6 +30,11 @@ from maasserver.models import (
     PackageRepository,
 )
 from piston3.utils import rc
+from provisioningserver.utils.profiler import PROFILER
+from provisioningserver.utils.twisted import (
+    asynchronous,
+    FOREVER,
+)
 
 
 class MigratedConfigValue:
@@ -118,6 +123,37 @@ class MaasHandler(OperationsHandler):
     # about the available configuration items.
     get_config.__doc__ %= get_config_doc(indentation=8)
 
+    @admin_method
+    @operation(idempotent=True, exported_as="profiler")
+    def get_profiler(self, request):
+        """Report on the sampling profiler of a regiond process.
+
+        The request is answered by a single regiond process, identified in
+        the report by its PID.
+        """
+        return PROFILER.get_report()
+
+    @admin_method
+    @operation(idempotent=False, exported_as="profiler")
+    def control_profiler(self, request):
+        """Start, stop or reset the sampling profiler of a regiond process,
+        then report on it.
+
+        The request is answered by a single regiond process, identified in
+        the report by its PID.
+
+        :param action: One of "start", "stop" or "reset".
+        """
+        action = get_mandatory_param(
+            request.data, 'action',
+            validators.OneOf(["start", "stop", "reset"]))
+        if action == "start":
+            # The profiler must be started from the reactor.
+            asynchronous(PROFILER.start, timeout=FOREVER)()
+        else:
+            getattr(PROFILER, action)()
+        return PROFILER.get_report()
+
     @classmethod
     def resource_uri(cls, *args, **kwargs):
         return ('maas_handler', [])
@@ -194,6 +194,25 @@ DISPLAYED_ANON_MACHINE_FIELDS = (
     'node_type',
 )
 
+# The notification channels on which every change to a machine's
+# representation on the API is notified, either directly or via the machine.
+# A machine's status_message comes from its latest event, which is notified
+# only on the event channel.
+MACHINE_CHANGE_CHANNELS = (
+    'domain',
+    'event',
+    'fabric',
+    'machine',
+    'pod',
+    'resourcepool',
+    'space',
+    'subnet',
+    'tag',
+    'user',
+    'vlan',
+    'zone',
+)
+
 
 AllocationOptions = namedtuple(
     'AllocationOptions', (
@@ -320,6 +339,7 @@ class MachineHandler(NodeHandler, OwnerDataMixin, PowerMixin):
 
     model = Machine
     fields = DISPLAYED_MACHINE_FIELDS
+    change_channels = MACHINE_CHANGE_CHANNELS
 
     def delete(self, request, system_id):
         """Delete a specific machine.
@@ -1385,6 +1405,7 @@ class MachinesHandler(NodesHandler, PowersMixin):
     anonymous = AnonMachinesHandler
     base_model = Machine
     fields = DISPLAYED_MACHINE_FIELDS
+    change_channels = MACHINE_CHANGE_CHANNELS
 
     def create(self, request):
         # Note: this docstring is duplicated above. Be sure to update both.
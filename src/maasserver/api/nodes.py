@@ -8,7 +8,12 @@ __all__ = [
     "store_node_power_parameters",
 ]
 
-from base64 import b64decode
+from base64 import (
+    b64decode,
+    urlsafe_b64decode,
+    urlsafe_b64encode,
+)
+import binascii
 from itertools import chain
 import json
 
@@ -16,11 +21,15 @@ import bson
 from django.db.models import Prefetch
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from formencode.validators import Int
 from maasserver.api.support import (
     admin_method,
     AnonymousOperationsHandler,
+    get_model_handler,
     operation,
     OperationsHandler,
+    render_json_list,
+    restrict_fields,
 )
 from maasserver.api.utils import (
     get_mandatory_param,
@@ -63,6 +72,7 @@ from metadataserver.enum import (
     SCRIPT_STATUS_CHOICES,
 )
 from metadataserver.models.scriptset import get_status_from_qs
+from piston3.handler import typemapper
 from piston3.utils import rc
 from provisioningserver.drivers.power import UNKNOWN_POWER_TYPE
 
@@ -162,6 +172,99 @@ NODES_PREFETCH = [
     'nodemetadata_set',
 ]
 
+# The fields that need each of the relations in `NODES_PREFETCH`, keyed by the
+# first part of its lookup. A relation not listed here is always prefetched.
+NODES_PREFETCH_FIELDS = {
+    'domain': {'domain', 'fqdn'},
+    'ownerdata_set': {'owner_data'},
+    'special_filesystems': {'special_filesystems'},
+    'gateway_link_ipv4': {'default_gateways'},
+    'gateway_link_ipv6': {'default_gateways'},
+    'blockdevice_set': {
+        'bcaches', 'blockdevice_set', 'boot_disk', 'cache_sets',
+        'iscsiblockdevice_set', 'physicalblockdevice_set', 'raids',
+        'storage', 'virtualblockdevice_set', 'volume_groups'},
+    'boot_interface': {'boot_interface'},
+    'interface_set': {
+        'boot_interface', 'default_gateways', 'interface_set',
+        'ip_addresses'},
+    'tags': {'tag_names'},
+    'nodemetadata_set': {'hardware_info'},
+}
+
+# Nodes are fetched, and their relations prefetched, this many at a time when
+# rendering a listing.
+NODES_BATCH_SIZE = 500
+
+
+def get_prefetch_lookup(prefetch):
+    """Return the lookup of `prefetch`, a string or `Prefetch`."""
+    if isinstance(prefetch, Prefetch):
+        return prefetch.prefetch_through
+    else:
+        return prefetch
+
+
+def get_nodes_prefetch(fields=None):
+    """Return the subset of `NODES_PREFETCH` needed to render `fields`.
+
+    :param fields: The names of the fields that will be rendered, or `None`
+        for all of them.
+    """
+    if fields is None:
+        return list(NODES_PREFETCH)
+    needed = []
+    for prefetch in NODES_PREFETCH:
+        relation = get_prefetch_lookup(prefetch).split('__')[0]
+        if relation not in NODES_PREFETCH_FIELDS:
+            needed.append(prefetch)
+        elif not NODES_PREFETCH_FIELDS[relation].isdisjoint(fields):
+            needed.append(prefetch)
+    return needed
+
+
+def encode_nodes_cursor(node_id):
+    """Return an opaque cursor for listing the nodes after `node_id`."""
+    return urlsafe_b64encode(str(node_id).encode("ascii")).decode("ascii")
+
+
+def decode_nodes_cursor(cursor):
+    """Return the node ID encoded in `cursor`; see `encode_nodes_cursor`."""
+    try:
+        return int(urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise MAASAPIBadRequest("Invalid cursor: %r" % (cursor,))
+
+
+def prefetch_nodes(nodes, prefetch):
+    """Fetch `nodes` with their related objects, in ID order.
+
+    Related nodes are set on the prefetched interfaces and block devices so
+    no extra queries are needed to reach them.
+    """
+    nodes = nodes.select_related(*NODES_SELECT_RELATED)
+    nodes = prefetch_queryset(nodes, prefetch).order_by('id')
+    prefetched = {
+        get_prefetch_lookup(lookup).split('__')[0] for lookup in prefetch}
+    for node in nodes:
+        if 'interface_set' in prefetched:
+            for interface in node.interface_set.all():
+                interface.node = node
+        if 'blockdevice_set' in prefetched:
+            for block_device in node.blockdevice_set.all():
+                block_device.node = node
+    return nodes
+
+
+def iter_nodes_in_batches(model, node_ids, prefetch):
+    """Yield the nodes with `node_ids`, fetching `NODES_BATCH_SIZE` at a
+    time so that only one batch of nodes and related objects is in memory.
+    """
+    for start in range(0, len(node_ids), NODES_BATCH_SIZE):
+        batch = model.objects.filter(
+            id__in=node_ids[start:start + NODES_BATCH_SIZE])
+        yield from prefetch_nodes(batch, prefetch)
+
 
 def store_node_power_parameters(node, request):
     """Store power parameters in request.
@@ -616,6 +719,21 @@ class NodesHandler(OperationsHandler):
         :param agent_name: An optional agent name.  Only nodes relating to the
             nodes with matching agent names will be returned.
         :type agent_name: unicode
+
+        :param fields: An optional list of the fields to return for each node,
+            as repeated parameters or separated by commas. All fields are
+            returned by default. Not supported when listing all nodes.
+        :type fields: unicode
+
+        :param limit: An optional maximum number of nodes to return. If more
+            nodes match, the response has a ``Link`` header with a URL for the
+            next page, marked ``rel="next"``. Not supported when listing all
+            nodes.
+        :type limit: int
+
+        :param after: An optional cursor, from the URL for the next page of a
+            previous listing, after which to list nodes.
+        :type after: unicode
         """
 
         if self.base_model == Node:
@@ -626,27 +744,79 @@ class NodesHandler(OperationsHandler):
             from maasserver.api.regioncontrollers import (
                 RegionControllersHandler
             )
-            racks = RackControllersHandler().read(request).order_by("id")
+            racks = RackControllersHandler().get_nodes(request)
             nodes = list(chain(
-                DevicesHandler().read(request).order_by("id"),
-                MachinesHandler().read(request).order_by("id"),
+                DevicesHandler().get_nodes(request),
+                MachinesHandler().get_nodes(request),
                 racks,
-                RegionControllersHandler().read(request).exclude(
+                RegionControllersHandler().get_nodes(request).exclude(
                     id__in=racks).order_by("id"),
             ))
             return nodes
         else:
-            nodes = filtered_nodes_list_from_request(request, self.base_model)
-            nodes = nodes.select_related(*NODES_SELECT_RELATED)
-            nodes = prefetch_queryset(
-                nodes, NODES_PREFETCH).order_by('id')
-            # Set related node parents so no extra queries are needed.
-            for node in nodes:
-                for interface in node.interface_set.all():
-                    interface.node = node
-                for block_device in node.blockdevice_set.all():
-                    block_device.node = node
-            return nodes
+            return self.render_nodes(request)
+
+    def get_nodes(self, request):
+        """Return the nodes for `read`, with all their related objects."""
+        nodes = filtered_nodes_list_from_request(request, self.base_model)
+        return prefetch_nodes(nodes, NODES_PREFETCH)
+
+    def get_fields(self, request):
+        """Return the names of the fields requested, or `None` for all."""
+        names = get_optional_list(request.GET, 'fields')
+        if names is None:
+            return None
+        names = {
+            name.strip() for value in names
+            for name in value.split(',') if name.strip() != ''}
+        handler = get_model_handler(self.base_model)
+        unknown = names.difference(
+            field[0] if isinstance(field, tuple) else field
+            for field in handler.fields)
+        if len(names) == 0 or len(unknown) != 0:
+            raise MAASAPIValidationError(
+                "Unknown field(s): %s" % ", ".join(sorted(unknown)))
+        return names
+
+    def render_nodes(self, request):
+        """Render the nodes matching `request`, optionally a page at a time.
+
+        Only node IDs are fetched up-front; the nodes themselves, with only
+        the related objects needed for the requested fields, are fetched and
+        rendered in batches.
+        """
+        fields = self.get_fields(request)
+        limit = get_optional_param(request.GET, 'limit', validator=Int(min=1))
+        after = get_optional_param(request.GET, 'after')
+
+        nodes = filtered_nodes_list_from_request(request, self.base_model)
+        if after is not None:
+            nodes = nodes.filter(id__gt=decode_nodes_cursor(after))
+        node_ids = nodes.values_list('id', flat=True)
+        if limit is None:
+            node_ids = list(node_ids)
+            last_id = None
+        else:
+            node_ids = list(node_ids[:limit + 1])
+            last_id = node_ids[limit - 1] if len(node_ids) > limit else None
+            node_ids = node_ids[:limit]
+
+        if fields is None:
+            typemap = typemapper
+        else:
+            typemap = restrict_fields(self.base_model, fields)
+        nodes = iter_nodes_in_batches(
+            self.base_model, node_ids, get_nodes_prefetch(fields))
+        response = HttpResponse(
+            render_json_list(nodes, request, typemap),
+            content_type='application/json; charset=utf-8')
+        if last_id is not None:
+            query = request.GET.copy()
+            query['after'] = encode_nodes_cursor(last_id)
+            response['Link'] = '<%s>; rel="next"' % (
+                request.build_absolute_uri(
+                    '%s?%s' % (request.path, query.urlencode())))
+        return response
 
     @operation(idempotent=True)
     def is_registered(self, request):
@@ -26,7 +26,7 @@ from maasserver.enum import NODE_PERMISSION
 from maasserver.exceptions import MAASAPIValidationError
 from maasserver.forms import ControllerForm
 from maasserver.models import RackController
-from maasserver.utils.orm import post_commit_do
+from maasserver.utils.orm import post_commit_do_once
 from piston3.utils import rc
 
 # Rack controller's fields exposed on the API.
@@ -169,7 +169,9 @@ class RackControllerHandler(NodeHandler, PowerMixin):
 
         rack = self.model.objects.get_node_or_404(
             system_id=system_id, user=request.user, perm=NODE_PERMISSION.EDIT)
-        post_commit_do(RackControllersImporter.schedule, rack.system_id)
+        post_commit_do_once(
+            ("import-boot-images", rack.system_id),
+            RackControllersImporter.schedule, rack.system_id)
         return HttpResponse(
             "Import of boot images started on %s" % rack.hostname,
             content_type=("text/plain; charset=%s" % settings.DEFAULT_CHARSET))
@@ -208,7 +210,8 @@ class RackControllersHandler(NodesHandler, PowersMixin):
         # Avoid circular import.
         from maasserver.clusterrpc.boot_images import RackControllersImporter
 
-        post_commit_do(RackControllersImporter.schedule)
+        post_commit_do_once(
+            "import-boot-images", RackControllersImporter.schedule)
         return HttpResponse(
             "Import of boot images started on all rack controllers",
             content_type=("text/plain; charset=%s" % settings.DEFAULT_CHARSET))
@@ -36,12 +36,22 @@ DISPLAYED_SUBNET_FIELDS = (
     'managed',
 )
 
+# The notification channels on which every change to a subnet's
+# representation on the API is notified.
+SUBNET_CHANGE_CHANNELS = (
+    'fabric',
+    'space',
+    'subnet',
+    'vlan',
+)
+
 
 class SubnetsHandler(OperationsHandler):
     """Manage subnets."""
     api_doc_section_name = "Subnets"
     update = delete = None
     fields = DISPLAYED_SUBNET_FIELDS
+    change_channels = SUBNET_CHANGE_CHANNELS
 
     @classmethod
     def resource_uri(cls, *args, **kwargs):
@@ -141,6 +151,7 @@ class SubnetHandler(OperationsHandler):
     create = None
     model = Subnet
     fields = DISPLAYED_SUBNET_FIELDS
+    change_channels = SUBNET_CHANGE_CHANNELS
 
     @classmethod
     def resource_uri(cls, subnet=None):
@@ -6,10 +6,13 @@
 __all__ = [
     'admin_method',
     'AnonymousOperationsHandler',
+    'get_model_handler',
     'ModelCollectionOperationsHandler',
     'ModelOperationsHandler',
     'operation',
     'OperationsHandler',
+    'render_json_list',
+    'restrict_fields',
     ]
 
 from abc import (
@@ -21,18 +24,29 @@ from functools import wraps
 from django.core.exceptions import PermissionDenied
 from django.http import Http404
 from django.shortcuts import get_object_or_404
+from maasserver.api.conditional import (
+    change_tracker,
+    is_not_modified,
+    make_not_modified_response,
+    set_conditional_headers,
+)
 from maasserver.api.doc import get_api_description_hash
 from maasserver.exceptions import (
     MAASAPIBadRequest,
     MAASAPIValidationError,
 )
 from maasserver.utils.orm import get_one
+from maasserver.utils.uploads import LargeObjectUploadHandler
 from piston3.authentication import NoAuthentication
-from piston3.emitters import Emitter
+from piston3.emitters import (
+    Emitter,
+    JSONEmitter,
+)
 from piston3.handler import (
     AnonymousBaseHandler,
     BaseHandler,
     HandlerMetaClass,
+    typemapper,
 )
 from piston3.resource import Resource
 from piston3.utils import (
@@ -40,6 +54,7 @@ from piston3.utils import (
     rc,
 )
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 
 
 log = LegacyLogger()
@@ -66,9 +81,23 @@ class OperationsResource(Resource):
         return False
 
     def __call__(self, request, *args, **kwargs):
+        upload_handler = None
+        streamed_uploads = getattr(self.handler, "streamed_uploads", ())
+        if len(streamed_uploads) > 0 and request.method in ("POST", "PUT"):
+            # This has no effect if the body has already been parsed.
+            upload_handler = LargeObjectUploadHandler(
+                request, streamed_uploads)
+            request.upload_handlers.insert(0, upload_handler)
         upcall = super(OperationsResource, self).__call__
         response = upcall(request, *args, **kwargs)
+        if upload_handler is not None and response.status_code != 500:
+            # The transaction will be committed; don't leave large objects
+            # behind that the handler did not use. A 500 rolls them back.
+            upload_handler.discard_unused()
         response["X-MAAS-API-Hash"] = get_api_description_hash()
+        state = getattr(request, "conditional_state", None)
+        if state is not None and response.status_code == 200:
+            set_conditional_headers(response, state)
         return response
 
     def error_handler(self, e, request, meth, em_format):
@@ -299,6 +328,23 @@ class OperationsHandlerMixin:
     # Specified by subclasses.
     anonymous = None
 
+    # The notification channels (see `maasserver.triggers.websocket`) on
+    # which every change to the result of this handler's `read` is notified.
+    # When specified, reads are given an ETag and can be answered with 304
+    # Not Modified; see `maasserver.api.conditional`.
+    change_channels = ()
+
+    # The names of file fields that are streamed into large objects as they
+    # are uploaded, instead of into memory or temporary files; see
+    # `maasserver.utils.uploads`.
+    streamed_uploads = ()
+
+    @PROMETHEUS_METRICS.record_call_latency(
+        "maas_api_call_latency",
+        get_labels=lambda handler, request, *args, **kwargs: {
+            "handler": type(handler).__name__,
+            "method": request.method.upper(),
+            "op": request.GET.get("op") or request.POST.get("op") or ""})
     def dispatch(self, request, *args, **kwargs):
         op = request.GET.get("op") or request.POST.get("op")
         signature = request.method.upper(), op
@@ -306,8 +352,18 @@ class OperationsHandlerMixin:
         if function is None:
             raise MAASAPIBadRequest(
                 "Unrecognised signature: method=%s op=%s" % signature)
-        else:
-            return function(self, request, *args, **kwargs)
+        if signature == ("GET", None) and len(self.change_channels) > 0:
+            state = change_tracker.get_state(
+                self.change_channels, request.user.id,
+                request.get_full_path(), get_api_description_hash())
+            if state is not None:
+                if is_not_modified(request, state):
+                    PROMETHEUS_METRICS.update(
+                        "maas_api_not_modified", "inc",
+                        labels={"handler": type(self).__name__})
+                    return make_not_modified_response(state)
+                request.conditional_state = state
+        return function(self, request, *args, **kwargs)
 
     @classmethod
     def decorate(cls, func):
@@ -368,6 +424,62 @@ def method_fields_reserved_fields_patch(self, handler, fields):
 Emitter.method_fields = method_fields_reserved_fields_patch
 
 
+class SparseFieldsHandler:
+    """Stand-in for a handler that renders only some of its `fields`.
+
+    Piston takes the fields to render for a model from the handler registered
+    for that model in the type-mapper, so to render fewer the emitter is given
+    a type-mapper that points at one of these instead. Everything else is
+    looked up on the real handler.
+    """
+
+    def __init__(self, handler, fields):
+        self.handler = handler
+        self.fields = fields
+
+    def __getattr__(self, name):
+        return getattr(self.handler, name)
+
+
+def get_model_handler(model, typemap=typemapper):
+    """Return the handler piston uses to render instances of `model`."""
+    for handler, (handler_model, anonymous) in typemap.items():
+        if handler_model is model and not anonymous:
+            return handler
+    return None
+
+
+def restrict_fields(model, names, typemap=typemapper):
+    """Return a copy of `typemap` that renders only `names` for `model`.
+
+    Nested field specifications, like ``('interface_set', (...))``, are
+    selected by their name.
+    """
+    typemap = dict(typemap)
+    handler = get_model_handler(model, typemap)
+    fields = tuple(
+        field for field in handler.fields
+        if (field[0] if isinstance(field, tuple) else field) in names)
+    typemap[SparseFieldsHandler(handler, fields)] = typemap.pop(handler)
+    return typemap
+
+
+def render_json_list(items, request, typemap=typemapper):
+    """Render `items` as a JSON list, yielding it in encoded chunks.
+
+    Piston's `JSONEmitter` builds the representation of a whole list before
+    serialising it. This renders one item at a time instead, so only the
+    output, and not every item's representation, is held at once.
+    """
+    yield b"["
+    for index, item in enumerate(items):
+        if index != 0:
+            yield b","
+        emitter = JSONEmitter(item, typemap, None, (), False)
+        yield emitter.render(request).encode("utf-8")
+    yield b"]"
+
+
 class ModelOperationsHandlerType(OperationsHandlerType, ABCMeta):
     """Metaclass for ModelOperationsHandler"""
 
@@ -8,6 +8,7 @@ __all__ = []
 import http.client
 import random
 
+from django.db import connection
 from maasserver.api import boot_resources
 from maasserver.api.boot_resources import (
     boot_resource_file_to_dict,
@@ -34,6 +35,7 @@ from maasserver.utils.orm import (
     post_commit_hooks,
     reload_object,
 )
+from maasserver.utils.uploads import LargeObjectUploadedFile
 from maastesting.matchers import MockCalledOnceWith
 from maastesting.utils import sample_binary_data
 from testtools.matchers import ContainsAll
@@ -207,6 +209,24 @@ class TestBootResourcesAPI(APITestCase.ForUser):
             reverse('boot_resources_handler'), params)
         self.assertEqual(http.client.FORBIDDEN, response.status_code)
 
+    def test_POST_requires_admin_leaves_no_upload_behind(self):
+        params = {
+            'name': factory.make_name('name'),
+            'architecture': make_usable_architecture(self),
+            'content': (
+                factory.make_file_upload(content=sample_binary_data)),
+        }
+        count_large_objects = "SELECT count(*) FROM pg_largeobject_metadata"
+        with connection.cursor() as cursor:
+            cursor.execute(count_large_objects)
+            before = cursor.fetchone()
+            response = self.client.post(
+                reverse('boot_resources_handler'), params)
+            cursor.execute(count_large_objects)
+            after = cursor.fetchone()
+        self.assertEqual(http.client.FORBIDDEN, response.status_code)
+        self.assertEqual(before, after)
+
     def pick_filetype(self):
         filetypes = {
             'tgz': BOOT_RESOURCE_FILE_TYPE.ROOT_TGZ,
@@ -253,6 +273,27 @@ class TestBootResourcesAPI(APITestCase.ForUser):
             written_data = stream.read()
         self.assertEqual(sample_binary_data, written_data)
 
+    def test_POST_streams_content_into_largefile(self):
+        prevent_scheduling_of_image_imports(self)
+        self.become_admin()
+        get_or_create_file_from_upload = (
+            LargeFile.objects.get_or_create_file_from_upload)
+        from_upload = self.patch(
+            LargeFile.objects, "get_or_create_file_from_upload")
+        from_upload.side_effect = get_or_create_file_from_upload
+        params = {
+            'name': factory.make_name('name'),
+            'architecture': make_usable_architecture(self),
+            'content': (
+                factory.make_file_upload(content=sample_binary_data)),
+        }
+        response = self.client.post(
+            reverse('boot_resources_handler'), params)
+        self.assertEqual(http.client.CREATED, response.status_code)
+        [upload], _ = from_upload.call_args
+        self.assertIsInstance(upload, LargeObjectUploadedFile)
+        self.assertEqual(len(sample_binary_data), upload.size)
+
     def test_POST_creates_boot_resource_with_default_filetype(self):
         prevent_scheduling_of_image_imports(self)
         self.become_admin()
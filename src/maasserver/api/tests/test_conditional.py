@@ -0,0 +1,266 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.api.conditional`."""
+
+__all__ = []
+
+import http.client
+from unittest.mock import Mock
+
+from django.test.client import RequestFactory
+from django.utils.http import http_date
+from maasserver.api import (
+    conditional,
+    support,
+)
+from maasserver.api.conditional import (
+    ChangeTracker,
+    ConditionalState,
+    is_not_modified,
+    make_not_modified_response,
+)
+from maasserver.api.machines import MACHINE_CHANGE_CHANNELS
+from maasserver.api.subnets import SubnetsHandler
+from maasserver.testing.api import APITestCase
+from maasserver.testing.factory import factory
+from maasserver.utils.django_urls import reverse
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockNotCalled,
+)
+from maastesting.testcase import MAASTestCase
+from twisted.internet.task import Clock
+
+
+def make_listener(connected=True):
+    listener = Mock(registeredChannels=connected, generation=1)
+    listener.connected.return_value = connected
+    return listener
+
+
+def make_tracker(listener, channels=()):
+    tracker = ChangeTracker(clock=Clock())
+    tracker.install(listener)
+    for channel in channels:
+        tracker.track(channel)
+    return tracker
+
+
+class TestChangeTracker(MAASTestCase):
+
+    def test_track_registers_with_listener_once(self):
+        listener = make_listener()
+        tracker = make_tracker(listener, ["zone", "zone"])
+        self.assertThat(
+            listener.register,
+            MockCalledOnceWith("zone", tracker.handlers["zone"]))
+
+    def test_uninstall_unregisters_from_listener(self):
+        listener = make_listener()
+        tracker = make_tracker(listener, ["zone"])
+        handler = tracker.handlers["zone"]
+        tracker.uninstall()
+        self.assertThat(
+            listener.unregister, MockCalledOnceWith("zone", handler))
+        self.assertIsNone(tracker.listener)
+        self.assertEqual({}, tracker.handlers)
+
+    def test_get_state_returns_None_when_not_installed(self):
+        tracker = ChangeTracker(clock=Clock())
+        self.assertIsNone(tracker.get_state(["zone"]))
+
+    def test_get_state_tracks_unknown_channels(self):
+        callFromThread = self.patch(conditional.reactor, "callFromThread")
+        tracker = make_tracker(make_listener())
+        self.assertIsNone(tracker.get_state(["zone"]))
+        self.assertThat(
+            callFromThread, MockCalledOnceWith(tracker.track, "zone"))
+
+    def test_get_state_returns_None_when_not_connected(self):
+        tracker = make_tracker(make_listener(connected=False), ["zone"])
+        self.assertIsNone(tracker.get_state(["zone"]))
+
+    def test_get_state_is_stable(self):
+        tracker = make_tracker(make_listener(), ["zone"])
+        self.assertEqual(
+            tracker.get_state(["zone"], 1), tracker.get_state(["zone"], 1))
+
+    def test_get_state_changes_with_extra(self):
+        tracker = make_tracker(make_listener(), ["zone"])
+        self.assertNotEqual(
+            tracker.get_state(["zone"], 1).etag,
+            tracker.get_state(["zone"], 2).etag)
+
+    def test_get_state_changes_when_channel_is_notified(self):
+        tracker = make_tracker(make_listener(), ["zone", "space"])
+        before = tracker.get_state(["zone"])
+        tracker.changed("space", "update", "1")
+        self.assertEqual(before, tracker.get_state(["zone"]))
+        tracker.clock.advance(10)
+        tracker.changed("zone", "update", "1")
+        after = tracker.get_state(["zone"])
+        self.assertNotEqual(before.etag, after.etag)
+        self.assertEqual(before.last_modified + 10, after.last_modified)
+
+    def test_get_state_rounds_last_modified_up(self):
+        tracker = make_tracker(make_listener(), ["zone"])
+        tracker.clock.advance(10.5)
+        tracker.changed("zone", "update", "1")
+        tracker.clock.advance(0.5)
+        self.assertEqual(11, tracker.get_state(["zone"]).last_modified)
+
+    def test_get_state_omits_last_modified_within_second_of_change(self):
+        tracker = make_tracker(make_listener(), ["zone"])
+        tracker.clock.advance(10.5)
+        tracker.changed("zone", "update", "1")
+        tracker.clock.advance(0.4)
+        self.assertIsNone(tracker.get_state(["zone"]).last_modified)
+
+    def test_get_state_changes_when_listener_reconnects(self):
+        listener = make_listener()
+        tracker = make_tracker(listener, ["zone"])
+        before = tracker.get_state(["zone"])
+        tracker.clock.advance(10)
+        listener.generation += 1
+        after = tracker.get_state(["zone"])
+        self.assertNotEqual(before.etag, after.etag)
+        self.assertEqual(before.last_modified + 10, after.last_modified)
+
+    def test_get_state_differs_between_processes(self):
+        listener = make_listener()
+        self.assertNotEqual(
+            make_tracker(listener, ["zone"]).get_state(["zone"]).etag,
+            make_tracker(listener, ["zone"]).get_state(["zone"]).etag)
+
+    def test_install_chooses_a_new_token(self):
+        tracker = make_tracker(make_listener(), ["zone"])
+        token = tracker.token
+        tracker.install(make_listener())
+        self.assertIsNotNone(token)
+        self.assertNotEqual(token, tracker.token)
+
+
+class TestIsNotModified(MAASTestCase):
+
+    state = ConditionalState('"abc"', 1000000000)
+
+    def make_request(self, **headers):
+        return RequestFactory().get("/", **headers)
+
+    def test_unconditional(self):
+        self.assertFalse(is_not_modified(self.make_request(), self.state))
+
+    def test_if_none_match(self):
+        self.assertTrue(is_not_modified(self.make_request(
+            HTTP_IF_NONE_MATCH='"xyz", "abc"'), self.state))
+        self.assertTrue(is_not_modified(self.make_request(
+            HTTP_IF_NONE_MATCH='W/"abc"'), self.state))
+        self.assertTrue(is_not_modified(self.make_request(
+            HTTP_IF_NONE_MATCH='*'), self.state))
+        self.assertFalse(is_not_modified(self.make_request(
+            HTTP_IF_NONE_MATCH='"xyz"'), self.state))
+
+    def test_if_none_match_takes_precedence(self):
+        self.assertFalse(is_not_modified(self.make_request(
+            HTTP_IF_NONE_MATCH='"xyz"',
+            HTTP_IF_MODIFIED_SINCE=http_date(self.state.last_modified)),
+            self.state))
+
+    def test_if_modified_since(self):
+        self.assertTrue(is_not_modified(self.make_request(
+            HTTP_IF_MODIFIED_SINCE=http_date(self.state.last_modified)),
+            self.state))
+        self.assertFalse(is_not_modified(self.make_request(
+            HTTP_IF_MODIFIED_SINCE=http_date(self.state.last_modified - 1)),
+            self.state))
+        self.assertFalse(is_not_modified(self.make_request(
+            HTTP_IF_MODIFIED_SINCE="garbage"), self.state))
+
+    def test_if_modified_since_without_last_modified(self):
+        self.assertFalse(is_not_modified(self.make_request(
+            HTTP_IF_MODIFIED_SINCE=http_date(self.state.last_modified)),
+            self.state._replace(last_modified=None)))
+
+    def test_make_not_modified_response(self):
+        response = make_not_modified_response(self.state)
+        self.assertEqual(http.client.NOT_MODIFIED, response.status_code)
+        self.assertEqual('"abc"', response["ETag"])
+        self.assertEqual(
+            http_date(self.state.last_modified), response["Last-Modified"])
+
+    def test_make_not_modified_response_without_last_modified(self):
+        response = make_not_modified_response(
+            self.state._replace(last_modified=None))
+        self.assertEqual('"abc"', response["ETag"])
+        self.assertNotIn("Last-Modified", response)
+
+
+class TestConditionalRead(APITestCase.ForUser):
+
+    def setUp(self):
+        super(TestConditionalRead, self).setUp()
+        self.tracker = make_tracker(make_listener(), [
+            "fabric", "space", "subnet", "vlan"])
+        self.patch(support, "change_tracker", self.tracker)
+
+    def test_read_returns_etag(self):
+        response = self.client.get(reverse('subnets_handler'))
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertEqual(
+            self.tracker.get_state(
+                ("fabric", "space", "subnet", "vlan"), self.user.id,
+                reverse('subnets_handler'),
+                support.get_api_description_hash()).etag,
+            response["ETag"])
+        self.assertIn("Last-Modified", response)
+
+    def test_read_returns_not_modified_without_querying(self):
+        factory.make_Subnet()
+        uri = reverse('subnets_handler')
+        etag = self.client.get(uri)["ETag"]
+        read = Mock()
+        self.patch(SubnetsHandler, "exports", {("GET", None): read})
+        response = self.client.get(uri, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(http.client.NOT_MODIFIED, response.status_code)
+        self.assertEqual(etag, response["ETag"])
+        self.assertThat(read, MockNotCalled())
+
+    def test_read_returns_content_after_change(self):
+        uri = reverse('subnets_handler')
+        etag = self.client.get(uri)["ETag"]
+        self.tracker.changed("vlan", "update", "1")
+        response = self.client.get(uri, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_machine_read_returns_content_after_event(self):
+        # A machine's status_message comes from its latest event.
+        tracker = make_tracker(make_listener(), MACHINE_CHANGE_CHANNELS)
+        self.patch(support, "change_tracker", tracker)
+        machine = factory.make_Node()
+        uri = reverse('machine_handler', args=[machine.system_id])
+        etag = self.client.get(uri)["ETag"]
+        factory.make_Event(node=machine)
+        tracker.changed("event", "create", "1")
+        response = self.client.get(uri, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_other_operations_are_unconditional(self):
+        subnet = factory.make_Subnet()
+        uri = reverse('subnet_handler', args=[subnet.id])
+        response = self.client.get(uri, {"op": "statistics"})
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertNotIn("ETag", response)
+
+    def test_handlers_without_channels_are_unconditional(self):
+        response = self.client.get(reverse('zones_handler'))
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertNotIn("ETag", response)
+
+    def test_unconditional_when_not_tracked(self):
+        self.tracker.listener.connected.return_value = False
+        response = self.client.get(reverse('subnets_handler'))
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertNotIn("ETag", response)
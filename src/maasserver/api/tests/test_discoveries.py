@@ -1,4 +1,4 @@
-# Copyright 2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2016-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for Discoveries API."""
@@ -16,8 +16,10 @@ from maasserver.api import discoveries as discoveries_module
 from maasserver.api.discoveries import (
     get_controller_summary,
     get_failure_summary,
+    get_rack_scan_progress,
     get_scan_result_string_for_humans,
     scan_all_rack_networks,
+    user_friendly_scan_progress,
     user_friendly_scan_results,
 )
 from maasserver.clusterrpc.utils import RPCResults
@@ -311,6 +313,32 @@ class TestDiscoveriesScanAPI(APITestCase.ForUser):
         response = self.client.post(uri, {'op': 'clear', 'neighbours': 'true'})
         self.assertEqual(204, response.status_code, response.content)
 
+    def test__scan_progress(self):
+        rack = factory.make_RackController()
+        subnets = [{
+            "interface": "eth0", "cidr": "192.168.0.0/24", "hosts": 254,
+            "probed": 32, "up": 1, "done": False,
+        }]
+        call_racks_sync_mock = self.patch(
+            discoveries_module, 'call_racks_synchronously')
+        call_racks_sync_mock.return_value = make_RPCResults(
+            results=[{"scanning": True, "subnets": subnets}],
+            success=[rack], unavailable=[], timeout=[], failures=[])
+        response = self.client.get(
+            get_discoveries_uri(), {'op': 'scan_progress'})
+        self.assertThat(response, HasStatusCode(http.client.OK))
+        self.assertThat(
+            json.loads(response.content.decode(settings.DEFAULT_CHARSET)),
+            Equals({
+                "progress": [{
+                    "system_id": rack.system_id, "hostname": rack.hostname,
+                    "scanning": True, "subnets": subnets,
+                }],
+                "failed_to_connect_to": [],
+                "rpc_call_timed_out_on": [],
+                "failures": [],
+            }))
+
 
 class TestDiscoveryAPI(APITestCase.ForUser):
 
@@ -547,3 +575,39 @@ class TestScanAllRackNetworksInterpretsRPCResults(MAASServerTestCase):
             self.call_racks_sync_mock, MockCalledOnceWith(
                 cluster.ScanNetworks, controllers=None,
                 kwargs={'slow': True}))
+
+
+class TestScanProgressInterpretsRPCResults(MAASServerTestCase):
+
+    def test__calls_racks_synchronously(self):
+        call_racks_sync_mock = self.patch(
+            discoveries_module, 'call_racks_synchronously')
+        get_rack_scan_progress()
+        self.assertThat(
+            call_racks_sync_mock, MockCalledOnceWith(
+                cluster.GetScanNetworksProgress))
+
+    def test__pairs_progress_with_racks(self):
+        r1 = factory.make_RackController()
+        r2 = factory.make_RackController()
+        r3 = factory.make_RackController()
+        r4 = factory.make_RackController()
+        failures = [Failure(Exception("foo"))]
+        result = user_friendly_scan_progress(make_RPCResults(
+            results=[
+                {"scanning": True, "subnets": []},
+                {"scanning": False, "subnets": []},
+            ],
+            success=[r1, r2], unavailable=[r3], timeout=[r4],
+            failures=failures))
+        self.assertThat(result, Equals({
+            "progress": [
+                {"system_id": r1.system_id, "hostname": r1.hostname,
+                 "scanning": True, "subnets": []},
+                {"system_id": r2.system_id, "hostname": r2.hostname,
+                 "scanning": False, "subnets": []},
+            ],
+            "failed_to_connect_to": get_controller_summary([r3]),
+            "rpc_call_timed_out_on": get_controller_summary([r4]),
+            "failures": get_failure_summary(failures),
+        }))
@@ -8,9 +8,11 @@ __all__ = []
 import http.client
 import json
 from operator import itemgetter
+import os
 import random
 
 from django.conf import settings
+from maasserver.api import maas as maas_module
 from maasserver.forms.settings import CONFIG_ITEMS_KEYS
 from maasserver.models import PackageRepository
 from maasserver.models.config import (
@@ -25,7 +27,11 @@ from maasserver.testing.osystems import (
     patch_usable_osystems,
 )
 from maasserver.utils.django_urls import reverse
-from maastesting.matchers import DocTestMatches
+from maastesting.matchers import (
+    DocTestMatches,
+    MockCalledOnceWith,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase
 from testtools.content import text_content
 from testtools.matchers import (
@@ -349,6 +355,50 @@ class MAASHandlerAPITest(APITestCase.ForUser):
             Config.objects.get_config("maas_internal_domain"))
 
 
+class MAASHandlerAPITestForProfiler(APITestCase.ForUser):
+
+    def test_profiler_reports_to_admin(self):
+        self.become_admin()
+        response = self.client.get(
+            reverse('maas_handler'), {"op": "profiler"})
+        self.assertEqual(
+            http.client.OK, response.status_code, response.content)
+        report = json.loads(response.content.decode(settings.DEFAULT_CHARSET))
+        self.assertEqual(os.getpid(), report["pid"])
+
+    def test_profiler_is_forbidden_to_non_admin(self):
+        response = self.client.get(
+            reverse('maas_handler'), {"op": "profiler"})
+        self.assertEqual(
+            http.client.FORBIDDEN, response.status_code, response.content)
+
+    def test_profiler_runs_action(self):
+        self.become_admin()
+        reset = self.patch(maas_module.PROFILER, "reset")
+        response = self.client.post(
+            reverse('maas_handler'), {"op": "profiler", "action": "reset"})
+        self.assertEqual(
+            http.client.OK, response.status_code, response.content)
+        self.assertThat(reset, MockCalledOnceWith())
+
+    def test_profiler_rejects_unknown_action(self):
+        self.become_admin()
+        reset = self.patch(maas_module.PROFILER, "reset")
+        response = self.client.post(
+            reverse('maas_handler'), {"op": "profiler", "action": "explode"})
+        self.assertEqual(
+            http.client.BAD_REQUEST, response.status_code, response.content)
+        self.assertThat(reset, MockNotCalled())
+
+    def test_profiler_actions_are_forbidden_to_non_admin(self):
+        reset = self.patch(maas_module.PROFILER, "reset")
+        response = self.client.post(
+            reverse('maas_handler'), {"op": "profiler", "action": "reset"})
+        self.assertEqual(
+            http.client.FORBIDDEN, response.status_code, response.content)
+        self.assertThat(reset, MockNotCalled())
+
+
 class MAASHandlerAPITestForProxyPort(APITestCase.ForUser):
 
     scenarios = [
@@ -371,7 +371,7 @@ class TestMachinesAPI(APITestCase.ForUser):
         # `default_gateways`, `health_status`, 'special_filesystems' and
         # 'resource_pool' the number of queries is not the same but it is
         # proportional to the number of machines.
-        DEFAULT_NUM = 62
+        DEFAULT_NUM = 63
         self.assertEqual(DEFAULT_NUM + (10 * 6), num_queries1)
         self.assertEqual(DEFAULT_NUM + (20 * 6), num_queries2)
 
@@ -392,6 +392,62 @@ class TestMachinesAPI(APITestCase.ForUser):
             [machine.system_id for machine in machines],
             extract_system_ids(parsed_result))
 
+    def test_GET_with_fields_returns_only_those_fields(self):
+        factory.make_Node()
+        response = self.client.get(reverse('machines_handler'), {
+            'fields': ['hostname,status', 'interface_set'],
+        })
+        self.assertEqual(http.client.OK, response.status_code)
+        [parsed_machine] = json.loads(
+            response.content.decode(settings.DEFAULT_CHARSET))
+        self.assertEqual(
+            {'hostname', 'status', 'interface_set'},
+            set(parsed_machine) - {'resource_uri'})
+
+    def test_GET_with_fields_issues_fewer_queries(self):
+        for _ in range(3):
+            node = factory.make_Node_with_Interface_on_Subnet()
+            factory.make_VirtualBlockDevice(node=node)
+        num_queries_all, _ = count_queries(
+            self.client.get, reverse('machines_handler'))
+        num_queries_some, response = count_queries(
+            self.client.get, reverse('machines_handler'),
+            {'fields': 'system_id'})
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertLess(num_queries_some, num_queries_all)
+
+    def test_GET_with_unknown_fields_returns_bad_request(self):
+        response = self.client.get(reverse('machines_handler'), {
+            'fields': ['hostname', 'password'],
+        })
+        self.assertEqual(
+            http.client.BAD_REQUEST, response.status_code, response.content)
+
+    def test_GET_with_limit_returns_pages(self):
+        machines = [factory.make_Node() for _ in range(3)]
+        response = self.client.get(
+            reverse('machines_handler'), {'limit': 2})
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertSequenceEqual(
+            [machine.system_id for machine in machines[:2]],
+            extract_system_ids(json.loads(
+                response.content.decode(settings.DEFAULT_CHARSET))))
+        link, rel = response['Link'].split('; ')
+        self.assertEqual('rel="next"', rel)
+        response = self.client.get(link.strip('<>'))
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertSequenceEqual(
+            [machines[2].system_id],
+            extract_system_ids(json.loads(
+                response.content.decode(settings.DEFAULT_CHARSET))))
+        self.assertFalse(response.has_header('Link'))
+
+    def test_GET_with_invalid_cursor_returns_bad_request(self):
+        response = self.client.get(
+            reverse('machines_handler'), {'after': 'not-a-cursor'})
+        self.assertEqual(
+            http.client.BAD_REQUEST, response.status_code, response.content)
+
     def test_GET_with_id_returns_matching_machines(self):
         # The "read" operation takes optional "id" parameters.  Only
         # machines with matching ids will be returned.
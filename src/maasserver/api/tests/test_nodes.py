@@ -20,12 +20,16 @@ from maasserver.enum import (
     NODE_TYPE,
     NODE_TYPE_CHOICES,
 )
-from maasserver.exceptions import MAASAPIValidationError
+from maasserver.exceptions import (
+    MAASAPIBadRequest,
+    MAASAPIValidationError,
+)
 from maasserver.testing.api import APITestCase
 from maasserver.testing.factory import factory
 from maasserver.utils import ignore_unused
 from maasserver.utils.django_urls import reverse
 from maasserver.utils.orm import reload_object
+from maastesting.testcase import MAASTestCase
 
 
 class TestIsRegisteredAnonAPI(APITestCase.ForAnonymousAndUserAndAdmin):
@@ -384,6 +388,34 @@ class TestFilteredNodesListFromRequest(APITestCase.ForUser):
             extract_system_ids_from_nodes(node_list))
 
 
+class TestNodesPrefetch(MAASTestCase):
+
+    def test_get_nodes_prefetch_returns_all_by_default(self):
+        self.assertEqual(
+            nodes_module.NODES_PREFETCH, nodes_module.get_nodes_prefetch())
+
+    def test_get_nodes_prefetch_returns_relations_for_fields(self):
+        prefetch = nodes_module.get_nodes_prefetch({'tag_names'})
+        self.assertIn('tags', prefetch)
+        self.assertNotIn('ownerdata_set', prefetch)
+        self.assertNotIn('interface_set__vlan__space', prefetch)
+        # Relations not associated with any field are always prefetched.
+        self.assertIn('boot_interface__node', prefetch)
+        self.assertNotIn(
+            'boot_interface__node',
+            nodes_module.get_nodes_prefetch({'hostname'}))
+
+    def test_nodes_cursor_round_trip(self):
+        node_id = random.randint(1, 100000)
+        self.assertEqual(
+            node_id, nodes_module.decode_nodes_cursor(
+                nodes_module.encode_nodes_cursor(node_id)))
+
+    def test_decode_nodes_cursor_rejects_garbage(self):
+        self.assertRaises(
+            MAASAPIBadRequest, nodes_module.decode_nodes_cursor, "garbage!")
+
+
 class TestNodesAPI(APITestCase.ForUser):
     """Tests for /api/2.0/nodes/."""
 
@@ -8,6 +8,7 @@ __all__ = []
 
 from collections import namedtuple
 import http.client
+import json
 from unittest.mock import (
     call,
     Mock,
@@ -15,14 +16,20 @@ from unittest.mock import (
 )
 
 from django.core.exceptions import PermissionDenied
+from django.test import RequestFactory
 from maasserver.api.doc import get_api_description_hash
+from maasserver.api.fabrics import FabricHandler
 from maasserver.api.support import (
     admin_method,
     AdminRestrictedResource,
+    get_model_handler,
     OperationsHandlerMixin,
     OperationsResource,
+    render_json_list,
+    restrict_fields,
     RestrictedResource,
 )
+from maasserver.models import Fabric
 from maasserver.models.config import (
     Config,
     ConfigManager,
@@ -191,3 +198,34 @@ class TestOperationsHandlerMixin(MAASTestCase):
         handler.decorate(lambda thing: str(thing).upper())
         self.assertEqual({"foo": "SENTINEL.FOO"}, handler.exports)
         self.assertEqual({"bar": "SENTINEL.BAR"}, handler.anonymous.exports)
+
+
+class TestRenderJSONList(MAASServerTestCase):
+
+    def render(self, items, *args):
+        request = RequestFactory().get("/")
+        return json.loads(
+            b"".join(render_json_list(items, request, *args)).decode("utf-8"))
+
+    def test_get_model_handler(self):
+        self.assertIs(FabricHandler, get_model_handler(Fabric))
+
+    def test_renders_empty_list(self):
+        self.assertEqual([], self.render([]))
+
+    def test_renders_items_with_their_handlers(self):
+        fabrics = [factory.make_Fabric() for _ in range(3)]
+        rendered = self.render(fabrics)
+        self.assertEqual(
+            [fabric.name for fabric in fabrics],
+            [fabric["name"] for fabric in rendered])
+        self.assertIn("vlans", rendered[0])
+
+    def test_renders_restricted_fields(self):
+        fabric = factory.make_Fabric()
+        [rendered] = self.render(
+            [fabric], restrict_fields(Fabric, {"name"}))
+        self.assertEqual(
+            {"name": fabric.name},
+            {key: value for key, value in rendered.items()
+             if key != "resource_uri"})
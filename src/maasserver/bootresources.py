@@ -15,6 +15,7 @@ __all__ = [
 ]
 
 from datetime import timedelta
+import http.client
 from operator import itemgetter
 import os
 from subprocess import CalledProcessError
@@ -138,6 +139,40 @@ def get_simplestream_endpoint():
         }
 
 
+def get_byte_range(header, size):
+    """Return the first and last bytes requested by the ``Range`` `header`.
+
+    Only a single range of bytes is supported. `None` is returned for any
+    other, or no, `header`, in which case the whole file should be sent.
+
+    :param size: The size of the file in bytes.
+    :raise ValueError: When the range can't be satisfied for the file.
+    """
+    if header is None:
+        return None
+    unit, _, spec = header.partition("=")
+    first, sep, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or sep != "-":
+        return None
+    if not (first.isdigit() or first == "") or not (
+            last.isdigit() or last == "") or first == last == "":
+        return None
+    if first == "":
+        # The last `last` bytes of the file.
+        if int(last) == 0:
+            raise ValueError("Empty suffix range: %r" % header)
+        first, last = max(0, size - int(last)), size - 1
+    elif last == "":
+        first, last = int(first), size - 1
+    elif int(last) < int(first):
+        return None
+    else:
+        first, last = int(first), min(int(last), size - 1)
+    if first >= size:
+        raise ValueError("Range %r is beyond %d bytes." % (header, size))
+    return first, last
+
+
 class ConnectionWrapper:
     """Wraps `LargeObjectFile` in a new database connection.
 
@@ -146,11 +181,16 @@ class ConnectionWrapper:
 
     A new database connection is made at the start of the interation and is
     closed upon close of wrapper.
+
+    :ivar offset: The byte at which to start reading.
+    :ivar length: The number of bytes to read, or `None` to read to the end.
     """
 
-    def __init__(self, largeobject, alias="default"):
+    def __init__(self, largeobject, alias="default", offset=0, length=None):
         self.largeobject = largeobject
         self.alias = alias
+        self.offset = offset
+        self.length = length
         self._connection = None
         self._stream = None
 
@@ -174,15 +214,24 @@ class ConnectionWrapper:
         if self._stream is None:
             self._stream = self.largeobject.open(
                 'rb', connection=self._connection)
+            if self.offset > 0:
+                self._stream.seek(self.offset)
 
     def __iter__(self):
         return self
 
     def __next__(self):
+        size = self.largeobject.block_size
+        if self.length is not None:
+            size = min(size, self.length)
+            if size == 0:
+                raise StopIteration
         self._set_up()
-        data = self._stream.read(self.largeobject.block_size)
+        data = self._stream.read(size)
         if len(data) == 0:
             raise StopIteration
+        if self.length is not None:
+            self.length -= len(data)
         return data
 
     def close(self):
@@ -349,7 +398,11 @@ class SimpleStreamsHandler:
 
     def files_handler(
             self, request, os, arch, subarch, series, version, filename):
-        """Handles requests for getting the boot resource data."""
+        """Handles requests for getting the boot resource data.
+
+        A request for a single range of bytes, as sent by a rack controller
+        resuming an interrupted download, is answered with just those bytes.
+        """
         if os == "custom":
             name = series
         else:
@@ -365,10 +418,30 @@ class SimpleStreamsHandler:
             rfile = resource_set.files.get(filename=filename)
         except BootResourceFile.DoesNotExist:
             raise Http404()
-        response = StreamingHttpResponse(
-            ConnectionWrapper(rfile.largefile.content),
-            content_type='application/octet-stream')
-        response['Content-Length'] = rfile.largefile.total_size
+        size = rfile.largefile.total_size
+        try:
+            byte_range = get_byte_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(
+                status=http.client.REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = 'bytes */%d' % size
+            return response
+        if byte_range is None:
+            response = StreamingHttpResponse(
+                ConnectionWrapper(rfile.largefile.content),
+                content_type='application/octet-stream')
+            response['Content-Length'] = size
+        else:
+            first, last = byte_range
+            response = StreamingHttpResponse(
+                ConnectionWrapper(
+                    rfile.largefile.content, offset=first,
+                    length=last - first + 1),
+                status=http.client.PARTIAL_CONTENT,
+                content_type='application/octet-stream')
+            response['Content-Range'] = 'bytes %d-%d/%d' % (first, last, size)
+            response['Content-Length'] = last - first + 1
+        response['Accept-Ranges'] = 'bytes'
         return response
 
 
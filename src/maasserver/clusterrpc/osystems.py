@@ -37,15 +37,20 @@ def get_uploaded_resource_with_name(resources, name):
 
 
 def fix_custom_osystem_release_titles(osystem):
-    """Fix all release titles for the custom OS."""
+    """Return a copy of the custom OS with all its release titles fixed.
+
+    The given `osystem` may be shared, so is not changed.
+    """
     custom_resources = BootResource.objects.filter(
         rtype=BOOT_RESOURCE_TYPE.UPLOADED)
+    releases = []
     for release in osystem["releases"]:
         resource = get_uploaded_resource_with_name(
             custom_resources, release["name"])
         if resource is not None and "title" in resource.extra:
-            release["title"] = resource.extra["title"]
-    return osystem
+            release = dict(release, title=resource.extra["title"])
+        releases.append(release)
+    return dict(osystem, releases=releases)
 
 
 def suppress_failures(responses):
@@ -58,11 +58,27 @@ class RegionConfiguration(Configuration, metaclass=RegionConfigurationMeta):
         "database_conn_max_age",
         "The lifetime of a database connection, in seconds.",
         Int(if_missing=(5 * 60), accept_python=False, min=0))
+    database_pool_idle_timeout = ConfigurationOption(
+        "database_pool_idle_timeout",
+        "Close database connections held by regiond threads that have been "
+        "idle for this many seconds.",
+        Int(if_missing=60, accept_python=False, min=0))
+    database_pooler = ConfigurationOption(
+        "database_pooler",
+        "The database is reached through a transaction-level connection "
+        "pooler, such as pgbouncer. Connections are not held between "
+        "transactions and server-side cursors are not used.",
+        StringBool(if_missing=False))
 
     # Worker options.
     num_workers = ConfigurationOption(
         "num_workers", "The number of regiond worker process to run.",
         Int(if_missing=4, accept_python=False, min=1))
+    preload_workers = ConfigurationOption(
+        "preload_workers",
+        "Load the region once and fork the worker processes from it, "
+        "instead of starting each worker from scratch.",
+        StringBool(if_missing=False))
 
     # Debug options.
     debug = ConfigurationOption(
@@ -78,3 +94,8 @@ class RegionConfiguration(Configuration, metaclass=RegionConfigurationMeta):
         "debug_http",
         "Enable HTTP debugging. Logs all HTTP requests and HTTP responses.",
         StringBool(if_missing=False))
+    debug_profiler = ConfigurationOption(
+        "debug_profiler",
+        "Sample the reactor and thread-pools to find what blocks regiond. "
+        "See `maas-region profiler`.",
+        StringBool(if_missing=False))
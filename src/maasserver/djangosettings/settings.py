@@ -117,6 +117,12 @@ try:
                 'CONN_MAX_AGE': config.database_conn_max_age,
             }
         }
+        if config.database_pooler:
+            # A transaction-level pooler hands out a server connection per
+            # transaction, so nothing may outlive one: don't keep connections
+            # and don't use server-side cursors.
+            DATABASES['default']['CONN_MAX_AGE'] = 0
+            DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
         DEBUG = config.debug
         DEBUG_QUERIES = config.debug_queries
         DEBUG_HTTP = config.debug_http
@@ -225,6 +231,9 @@ MIDDLEWARE = (
     # with un-compressed responses.
     'maasserver.middleware.DebuggingLoggerMiddleware',
 
+    # Records database query counts and timings for Prometheus.
+    'maasserver.middleware.PrometheusRequestMetricsMiddleware',
+
     # Compress responses.
     'django.middleware.gzip.GZipMiddleware',
 
@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Event-loop support for the MAAS Region Controller.
@@ -104,11 +104,21 @@ def make_StatsService():
     return stats.StatsService()
 
 
+def make_StatsSummaryService(postgresListener):
+    from maasserver import stats
+    return stats.StatsSummaryService(postgresListener)
+
+
 def make_PrometheusService():
     from maasserver import prometheus
     return prometheus.PrometheusService()
 
 
+def make_RuntimeMetricsService(postgresListener):
+    from maasserver import prometheus
+    return prometheus.RegionRuntimeMetricsService(postgresListener)
+
+
 def make_ImportResourcesService():
     from maasserver import bootresources
     return bootresources.ImportResourcesService()
@@ -179,8 +189,11 @@ def make_WebApplicationService(postgresListener, statusWorker):
 
 
 def make_WorkersService():
-    from maasserver.workers import WorkersService
-    return WorkersService(reactor)
+    from maasserver import workers
+    if workers.PRELOAD_WORKERS:
+        return workers.PreloadedWorkersService(reactor)
+    else:
+        return workers.WorkersService(reactor)
 
 
 def make_IPCMasterService(workers=None):
@@ -264,11 +277,21 @@ class RegionEventLoop:
             "factory": make_StatsService,
             "requires": [],
         },
+        "stats-summary": {
+            "only_on_master": True,
+            "factory": make_StatsSummaryService,
+            "requires": ["postgres-listener-master"],
+        },
         "prometheus": {
             "only_on_master": True,
             "factory": make_PrometheusService,
             "requires": [],
         },
+        "runtime-metrics": {
+            "only_on_master": False,
+            "factory": make_RuntimeMetricsService,
+            "requires": ["postgres-listener-worker"],
+        },
         "import-resources": {
             "only_on_master": False,
             "import_service": True,
@@ -14,6 +14,7 @@ from functools import partial
 import os
 from socket import gethostname
 
+from django.db import connection
 from maasserver import (
     eventloop,
     workers,
@@ -34,6 +35,7 @@ from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
 from netaddr import IPAddress
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.rpc.common import RPCProtocol
 from provisioningserver.utils.network import (
     get_all_interface_addresses,
@@ -47,7 +49,10 @@ from provisioningserver.utils.twisted import (
 from twisted.application import service
 from twisted.internet.defer import (
     CancelledError,
+    Deferred,
+    DeferredLock,
     inlineCallbacks,
+    maybeDeferred,
 )
 from twisted.internet.endpoints import (
     connectProtocol,
@@ -137,16 +142,26 @@ class IPCMaster(RPCProtocol):
 
     @RPCRegisterConnection.responder
     def rpc_register_connection(self, pid, connid, ident, host, port):
-        """Register worker has connection from RPC client."""
-        self.factory.service.registerWorkerRPCConnection(
+        """Register worker has connection from RPC client.
+
+        Answers once the connection has been recorded in the database.
+        """
+        d = maybeDeferred(
+            self.factory.service.registerWorkerRPCConnection,
             pid, connid, ident, host, port)
-        return {}
+        d.addCallback(lambda _: {})
+        return d
 
     @RPCUnregisterConnection.responder
     def rpc_unregister_connection(self, pid, connid):
-        """Unregister worker lost connection from RPC client."""
-        self.factory.service.unregisterWorkerRPCConnection(pid, connid)
-        return {}
+        """Unregister worker lost connection from RPC client.
+
+        Answers once the connection has been removed from the database.
+        """
+        d = maybeDeferred(
+            self.factory.service.unregisterWorkerRPCConnection, pid, connid)
+        d.addCallback(lambda _: {})
+        return d
 
 
 class IPCMasterService(service.Service, object):
@@ -160,6 +175,10 @@ class IPCMasterService(service.Service, object):
 
     REMOVE_INTERVAL = 90  # 90 seconds.
 
+    # Seconds to gather RPC connections being registered and unregistered
+    # before writing them to the database together.
+    CONNECTION_WRITE_DELAY = 0.1
+
     connections = None
 
     def __init__(
@@ -178,6 +197,13 @@ class IPCMasterService(service.Service, object):
         self.factory = Factory.forProtocol(IPCMaster)
         self.factory.service = self
         self.updateLoop = LoopingCall(self.update)
+        # RPC connections registered or unregistered since they were last
+        # written to the database: {pid: {connid: (registered, conn)}}.
+        self._pendingConnections = {}
+        self._pendingWaiters = []
+        self._connectionWriter = None
+        # Serialises writing connections to the database with `update`.
+        self._writeLock = DeferredLock()
 
     @asynchronous
     def startService(self):
@@ -217,6 +243,12 @@ class IPCMasterService(service.Service, object):
     def stopService(self):
         """Stop listening."""
         self.starting.cancel()
+        # Every process is about to be deleted, and its connections with it.
+        if self._connectionWriter is not None:
+            self._connectionWriter.cancel()
+            self._connectionWriter = None
+        self._pendingConnections.clear()
+        self._notifyWaiters()
         if self.port:
             self.port, port = None, self.port
             yield port.stopListening()
@@ -307,6 +339,8 @@ class IPCMasterService(service.Service, object):
 
             def remove_conn_kill_worker(pid):
                 del self.connections[pid]
+                # Its connections were deleted along with the process.
+                self._pendingConnections.pop(pid, None)
                 if self.workers:
                     self.workers.killWorker(pid)
                 return pid
@@ -396,94 +430,183 @@ class IPCMasterService(service.Service, object):
             return d
 
     @synchronous
-    @transactional
-    def _registerConnection(self, process, ident, host, port, force_save=True):
-        rackd = RackController.objects.get(system_id=ident)
-        endpoint, _ = RegionControllerProcessEndpoint.objects.get_or_create(
-            process=process, address=host, port=port)
-        connection, created = RegionRackRPCConnection.objects.get_or_create(
-            endpoint=endpoint, rack_controller=rackd)
-        if not created and force_save:
-            # Force the save so that signals connected to the
-            # RegionRackRPCConnection are performed.
-            connection.save(force_update=True)
-        return connection
+    def _recordConnections(
+            self, process, registered, unregistered=(), exclusive=False):
+        """Record the RPC connections into `process` in the database.
+
+        Each connection is an ``(ident, host, port)`` tuple. Connections in
+        `registered` are created if they don't exist yet, and connections in
+        `unregistered` are deleted, unless they are also in `registered`,
+        e.g. when a rack controller reconnects before the change is written.
+        If `exclusive` is True, all connections into `process` not in
+        `registered` are deleted too.
+
+        Connections are inserted and deleted in bulk, so the signals that
+        update the rack controllers' rackd services are not sent; callers
+        must call `_updateRackdStatus` instead.
+
+        :return: The IDs of the rack controllers with connections created or
+            deleted.
+        """
+        existing = {
+            (ident, str(address), port): (conn_id, rack_id)
+            for conn_id, rack_id, ident, address, port in (
+                RegionRackRPCConnection.objects.filter(
+                    endpoint__process=process).values_list(
+                    "id", "rack_controller_id", "rack_controller__system_id",
+                    "endpoint__address", "endpoint__port"))
+        }
+        if exclusive:
+            unregistered = set(existing)
+        unregistered = set(unregistered).difference(registered)
+        to_delete = {
+            existing[conn] for conn in unregistered if conn in existing}
+        to_create = set(registered).difference(existing)
+        changed = {rack_id for _, rack_id in to_delete}
+
+        if len(to_delete) > 0:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM maasserver_regionrackrpcconnection "
+                    "WHERE id = ANY(%s)", [
+                        [conn_id for conn_id, _ in to_delete]])
+
+        if len(to_create) > 0:
+            racks = {
+                rack.system_id: rack
+                for rack in RackController.objects.filter(
+                    system_id__in={ident for ident, _, _ in to_create})
+            }
+            endpoints = {
+                (str(endpoint.address), endpoint.port): endpoint
+                for endpoint in RegionControllerProcessEndpoint.objects.filter(
+                    process=process)
+            }
+            created = now()
+            connections = []
+            for ident, host, port in to_create:
+                rack = racks.get(ident)
+                if rack is None:
+                    # The rack controller has been deleted.
+                    continue
+                endpoint = endpoints.get((host, port))
+                if endpoint is None:
+                    endpoint = endpoints[host, port] = (
+                        RegionControllerProcessEndpoint.objects.create(
+                            process=process, address=host, port=port))
+                connections.append(RegionRackRPCConnection(
+                    endpoint=endpoint, rack_controller=rack,
+                    created=created, updated=created))
+                changed.add(rack.id)
+            # Insert all the connections in one query.
+            RegionRackRPCConnection.objects.bulk_create(connections)
+
+        return changed
 
-    def registerWorkerRPCConnection(self, pid, connid, ident, host, port):
-        """Register the worker with `pid` has RPC an RPC connection."""
-        if pid in self.connections:
+    @synchronous
+    def _updateRackdStatus(self, rack_ids):
+        """Update the rackd service of each rack controller in `rack_ids`."""
+        for rack in RackController.objects.filter(id__in=rack_ids):
+            Service.objects.create_services_for(rack)
+            rack.update_rackd_status()
 
-            @transactional
-            def register_connection(pid, connid, ident, host, port):
-                process = self._getProcessObjFor(pid)
-                self._registerConnection(process, ident, host, port)
-                return (pid, connid, ident, host, port)
+    def _queueConnectionChange(self, pid, connid, conn, registered):
+        """Queue writing a registered or unregistered connection.
 
-            def log_connection(result):
-                pid, conn = result[0], result[1:]
-                log.msg(
-                    "Worker pid:%d registered RPC connection to %s." % (
-                        pid, conn[1:]))
-                return conn
+        Changes are gathered for `CONNECTION_WRITE_DELAY` seconds, and for as
+        long as the previous lot takes to write, then written together.
 
-            def set_result(conn):
-                connid, conn = conn[0], conn[1:]
-                self.connections[pid]['rpc']['connections'][connid] = conn
+        :return: A `Deferred` that fires once the change has been written.
+        """
+        changes = self._pendingConnections.setdefault(pid, {})
+        if not registered and connid in changes:
+            # The connection has not been written yet; nothing to remove.
+            del changes[connid]
+        else:
+            changes[connid] = (registered, conn)
+        if self._connectionWriter is None:
+            self._connectionWriter = self.reactor.callLater(
+                self.CONNECTION_WRITE_DELAY, self._writePendingConnections)
+        waiter = Deferred()
+        self._pendingWaiters.append(waiter)
+        return waiter
+
+    def _notifyWaiters(self, waiters=None):
+        if waiters is None:
+            waiters, self._pendingWaiters = self._pendingWaiters, []
+        for waiter in waiters:
+            waiter.callback(None)
 
-            d = deferToDatabase(
-                register_connection, pid, connid, ident, host, port)
-            d.addCallback(log_connection)
-            d.addCallback(set_result)
-            return d
+    @asynchronous
+    def _writePendingConnections(self):
+        """Write the pending connection changes in one transaction."""
+        self._connectionWriter = None
+        pending, self._pendingConnections = self._pendingConnections, {}
+        waiters, self._pendingWaiters = self._pendingWaiters, []
+        changes = {
+            pid: changes
+            for pid, changes in pending.items()
+            if pid in self.connections and len(changes) > 0
+        }
 
-    @transactional
-    def _unregisterConnection(self, process, ident, host, port):
-        """Unregister the connection into the database."""
-        try:
-            endpoint = RegionControllerProcessEndpoint.objects.get(
-                process=process, address=host, port=port)
-        except RegionControllerProcessEndpoint.DoesNotExist:
-            # Endpoint no longer exists, nothing to do.
-            pass
-        else:
-            try:
-                rackd = RackController.objects.get(system_id=ident)
-            except RackController.DoesNotExist:
-                # No rack controller, nothing to do.
-                pass
-            else:
-                RegionRackRPCConnection.objects.filter(
-                    endpoint=endpoint, rack_controller=rackd).delete()
+        @transactional
+        def write_connections(changes):
+            changed = set()
+            for pid, pid_changes in changes.items():
+                process = self._getProcessObjFor(pid)
+                registered = {
+                    conn for is_registered, conn in pid_changes.values()
+                    if is_registered
+                }
+                unregistered = {
+                    conn for is_registered, conn in pid_changes.values()
+                    if not is_registered
+                }
+                changed |= self._recordConnections(
+                    process, registered, unregistered)
+                # Registering a connection that was already recorded still
+                # refreshes its rack controller's rackd service.
+                changed.update(
+                    RackController.objects.filter(
+                        system_id__in={
+                            ident for ident, _, _ in registered}).values_list(
+                        "id", flat=True))
+            self._updateRackdStatus(changed)
+
+        d = self._writeLock.run(deferToDatabase, write_connections, changes)
+        d.addErrback(
+            log.err, "Failed to write RPC connections; they will be "
+            "written again by the next update.")
+        d.addCallback(lambda _: self._notifyWaiters(waiters))
+        return d
+
+    def registerWorkerRPCConnection(self, pid, connid, ident, host, port):
+        """Register the worker with `pid` has RPC an RPC connection.
+
+        :return: A `Deferred` that fires once the connection has been written
+            to the database, or None if the worker is not known.
+        """
+        if pid in self.connections:
+            conn = (ident, host, port)
+            self.connections[pid]['rpc']['connections'][connid] = conn
+            log.msg(
+                "Worker pid:%d registered RPC connection to %s." % (
+                    pid, conn))
+            return self._queueConnectionChange(pid, connid, conn, True)
 
     def unregisterWorkerRPCConnection(self, pid, connid):
-        """Unregister connection for worker with `pid`."""
+        """Unregister connection for worker with `pid`.
+
+        :return: A `Deferred` that fires once the connection has been removed
+            from the database, or None if the connection is not known.
+        """
         if pid in self.connections:
             connections = self.connections[pid]['rpc']['connections']
-            conn = connections.get(connid, None)
+            conn = connections.pop(connid, None)
             if conn is not None:
-
-                @transactional
-                def unregister_connection(pid, connid, ident, host, port):
-                    process = self._getProcessObjFor(pid)
-                    self._unregisterConnection(process, ident, host, port)
-                    return (pid, connid, ident, host, port)
-
-                def log_disconnect(result):
-                    pid, conn = result[0], result[1:]
-                    log.msg(
-                        "Worker pid:%d lost RPC connection to %s." % (
-                            pid, conn[1:]))
-                    return conn
-
-                def set_result(conn):
-                    connid = conn[0]
-                    connections.pop(connid, None)
-
-                d = deferToDatabase(
-                    unregister_connection, pid, connid, *conn)
-                d.addCallback(log_disconnect)
-                d.addCallback(set_result)
-                return d
+                log.msg(
+                    "Worker pid:%d lost RPC connection to %s." % (pid, conn))
+                return self._queueConnectionChange(pid, connid, conn, False)
 
     @synchronous
     def _updateConnections(self, process, connections):
@@ -493,21 +616,9 @@ class IPCMasterService(service.Service, object):
         because another process removed its references in the database and
         the existing connections need to be re-created.
         """
-        if not connections:
-            RegionRackRPCConnection.objects.filter(
-                endpoint__process=process).delete()
-        else:
-            previous_connection_ids = set(
-                RegionRackRPCConnection.objects.filter(
-                    endpoint__process=process).values_list(
-                    "id", flat=True))
-            for _, (ident, host, port) in connections.items():
-                db_conn = self._registerConnection(
-                    process, ident, host, port, force_save=False)
-                previous_connection_ids.discard(db_conn.id)
-            if previous_connection_ids:
-                RegionRackRPCConnection.objects.filter(
-                    id__in=previous_connection_ids).delete()
+        changed = self._recordConnections(
+            process, set(connections.values()), exclusive=True)
+        self._updateRackdStatus(changed)
 
     @synchronous
     def _updateService(self, region_obj):
@@ -594,7 +705,7 @@ class IPCMasterService(service.Service, object):
         def ignore_cancel(failure):
             failure.trap(CancelledError)
 
-        d = deferToDatabase(self._update)
+        d = self._writeLock.run(deferToDatabase, self._update)
         d.addErrback(ignore_cancel)
         d.addErrback(
             log.err, "Failed to update regiond's processes and endpoints; "
@@ -686,8 +797,14 @@ class IPCWorkerService(service.Service, object):
         return d
 
     @asynchronous
+    @PROMETHEUS_METRICS.record_call_latency(
+        'maas_rpc_connection_registration_lag',
+        get_labels=lambda *args, **kwargs: {'action': 'register'})
     def rpcRegisterConnection(self, connid, ident, host, port):
-        """Register RPC connection on master."""
+        """Register RPC connection on master.
+
+        Fires once the master has recorded the connection in the database.
+        """
         d = self.protocol.get()
         d.addCallback(
             lambda protocol: protocol.callRemote(
@@ -696,8 +813,14 @@ class IPCWorkerService(service.Service, object):
         return d
 
     @asynchronous
+    @PROMETHEUS_METRICS.record_call_latency(
+        'maas_rpc_connection_registration_lag',
+        get_labels=lambda *args, **kwargs: {'action': 'unregister'})
     def rpcUnregisterConnection(self, connid):
-        """Unregister RPC connection on master."""
+        """Unregister RPC connection on master.
+
+        Fires once the master has removed the connection from the database.
+        """
         d = self.protocol.get()
         d.addCallback(
             lambda protocol: protocol.callRemote(
@@ -78,6 +78,10 @@ class PostgresListenerService(Service, object):
         other times.
     :ivar disconnecting: a :class:`Deferred` while disconnecting, `None`
         at all other times.
+    :ivar generation: The number of times channels have been registered on a
+        new connection. Notifications may have been missed between two
+        generations, so anything derived from them should be reset when this
+        changes.
     """
 
     # Seconds to wait to handle new notifications. When the notifications set
@@ -97,6 +101,7 @@ class PostgresListenerService(Service, object):
         self.connecting = None
         self.disconnecting = None
         self.registeredChannels = False
+        self.generation = 0
         self.log = Logger(__name__, self)
 
     def startService(self):
@@ -378,6 +383,7 @@ class PostgresListenerService(Service, object):
         for channel in self.listeners.keys():
             self.registerChannel(channel)
         self.registeredChannels = True
+        self.generation += 1
 
     def convertChannel(self, channel):
         """Convert the postgres channel to a registered channel and action.
@@ -0,0 +1,49 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Django command: show or control the sampling profiler of regiond."""
+
+__all__ = []
+
+from argparse import Namespace
+from urllib.error import URLError
+
+from apiclient.creds import convert_string_to_tuple
+from apiclient.maas_client import MAASOAuth
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from provisioningserver.utils import profiler
+
+
+class Command(BaseCommand):
+    help = (
+        "Show or control the sampling profiler of regiond, through the MAAS "
+        "API as an administrator. Each request is answered by a single "
+        "regiond process, identified in the report by its PID.")
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        profiler.add_arguments(parser)
+        parser.add_argument(
+            "--apikey", required=True,
+            help="The API key of an administrator, as shown by "
+            "`maas-region apikey`.")
+        parser.set_defaults(
+            url="http://localhost:5240/MAAS/api/2.0/maas/?op=profiler")
+
+    def handle(self, *args, **options):
+        try:
+            credentials = convert_string_to_tuple(options["apikey"])
+        except ValueError as error:
+            raise CommandError(error)
+        headers = {}
+        MAASOAuth(*credentials).sign_request(options["url"], headers)
+        try:
+            profiler.run(
+                Namespace(**options), stdout=self.stdout, headers=headers)
+        except URLError as error:
+            raise CommandError(
+                "Unable to reach the profiler at %s: %s" % (
+                    options["url"], error))
@@ -24,6 +24,10 @@ from django.core.exceptions import (
     ValidationError,
 )
 from django.core.handlers.exception import get_exception_response
+from django.db import (
+    connection,
+    reset_queries,
+)
 from django.http import (
     Http404,
     HttpResponse,
@@ -52,6 +56,7 @@ from maasserver.rpc import getAllClients
 from maasserver.utils.django_urls import reverse
 from maasserver.utils.orm import is_retryable_failure
 from maasserver.views.combo import MERGE_VIEWS
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.rpc.exceptions import (
     NoConnectionsAvailable,
     PowerActionAlreadyInProgress,
@@ -491,3 +496,37 @@ class ExternalAuthInfoMiddleware:
                 domain=auth_domain, admin_group=auth_admin_group)
         request.external_auth_info = auth_info
         return self.get_response(request)
+
+
+class PrometheusRequestMetricsMiddleware:
+    """Record the database queries made by each request.
+
+    The number of queries and the time spent running them are observed on
+    Prometheus histograms. This does nothing unless runtime metrics are being
+    collected by this process.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not PROMETHEUS_METRICS.enabled:
+            return self.get_response(request)
+
+        # Have Django record queries as it would in debug mode.
+        force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        reset_queries()
+        try:
+            return self.get_response(request)
+        finally:
+            connection.force_debug_cursor = force_debug_cursor
+            queries = connection.queries
+            labels = {"method": request.method}
+            PROMETHEUS_METRICS.update(
+                "maas_http_request_query_count", "observe",
+                value=len(queries), labels=labels)
+            PROMETHEUS_METRICS.update(
+                "maas_http_request_query_latency", "observe",
+                value=sum(float(query.get("time", 0)) for query in queries),
+                labels=labels)
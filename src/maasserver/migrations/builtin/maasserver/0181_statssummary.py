@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.11 on 2018-10-25 10:12
+from __future__ import unicode_literals
+
+from django.db import (
+    migrations,
+    models,
+)
+import maasserver.fields
+import maasserver.models.cleansave
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maasserver', '0180_rbaclastsync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(editable=False)),
+                ('updated', models.DateTimeField(editable=False)),
+                ('name', models.CharField(editable=False, max_length=255, unique=True)),
+                ('data', maasserver.fields.JSONObjectField(editable=False)),
+            ],
+            options={
+                'verbose_name': 'Statistics summary',
+                'verbose_name_plural': 'Statistics summaries',
+            },
+            bases=(maasserver.models.cleansave.CleanSave, models.Model, object),
+        ),
+    ]
@@ -76,6 +76,7 @@ __all__ = [
     'SSLKey',
     'StaticIPAddress',
     'StaticRoute',
+    'StatsSummary',
     'Subnet',
     'Switch',
     'Tag',
@@ -187,6 +188,7 @@ from maasserver.models.sshkey import SSHKey
 from maasserver.models.sslkey import SSLKey
 from maasserver.models.staticipaddress import StaticIPAddress
 from maasserver.models.staticroute import StaticRoute
+from maasserver.models.statssummary import StatsSummary
 from maasserver.models.subnet import Subnet
 from maasserver.models.switch import Switch
 from maasserver.models.tag import Tag
@@ -26,6 +26,7 @@ from maasserver.utils.orm import (
     transactional,
 )
 from maasserver.utils.threads import deferToDatabase
+from maasserver.utils.uploads import LargeObjectUploadedFile
 from provisioningserver.logger import LegacyLogger
 from provisioningserver.utils.twisted import (
     asynchronous,
@@ -55,9 +56,14 @@ class FileStorageManager(Manager):
         that sha256 already exists then it is returned instead of a new one
         being created.
 
+        If `content` is a `LargeObjectUploadedFile` its large object is used
+        as-is; it was hashed as it was uploaded.
+
         :param content: File-like object.
         :return: `LargeFile`.
         """
+        if isinstance(content, LargeObjectUploadedFile):
+            return self.get_or_create_file_from_upload(content)
         sha256 = hashlib.sha256()
         for data in content:
             sha256.update(data)
@@ -76,6 +82,25 @@ class FileStorageManager(Manager):
         return self.create(
             sha256=hexdigest, size=length, total_size=length, content=objfile)
 
+    def get_or_create_file_from_upload(self, upload):
+        """Return file based on a `LargeObjectUploadedFile`.
+
+        If largefile with the upload's sha256 already exists then it is
+        returned instead of a new one being created, and the upload is
+        discarded.
+
+        :param upload: `LargeObjectUploadedFile`.
+        :return: `LargeFile`.
+        """
+        largefile = self.get_file(upload.sha256)
+        if largefile is not None:
+            upload.discard()
+            return largefile
+        content, upload.content = upload.content, None
+        return self.create(
+            sha256=upload.sha256, size=upload.size, total_size=upload.size,
+            content=content)
+
 
 class LargeFile(CleanSave, TimestampedModel):
     """Files that are stored in the large object storage.
@@ -1,4 +1,4 @@
-# Copyright 2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2016-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Model definition for Neighbour."""
@@ -7,6 +7,7 @@ __all__ = [
     'Neighbour',
 ]
 
+from django.db import connection
 from django.db.models import (
     CASCADE,
     ForeignKey,
@@ -21,12 +22,19 @@ from maasserver.fields import (
 )
 from maasserver.models.cleansave import CleanSave
 from maasserver.models.interface import Interface
-from maasserver.models.timestampedmodel import TimestampedModel
+from maasserver.models.timestampedmodel import (
+    now,
+    TimestampedModel,
+)
 from maasserver.utils.orm import (
     get_one,
     MAASQueriesMixin,
     UniqueViolation,
 )
+from netaddr import (
+    EUI,
+    IPAddress,
+)
 from provisioningserver.logger import get_maas_logger
 from provisioningserver.utils.network import get_mac_organization
 
@@ -132,6 +140,51 @@ class NeighbourManager(Manager, NeighbourQueriesMixin):
         # a UniqueViolation so this operation can be retried.
         return get_one(query, exception_class=UniqueViolation)
 
+    def refresh_neighbours(self, interface, neighbours: list) -> list:
+        """Records that the given neighbours were seen again on `interface`.
+
+        Every neighbour that already exists is updated in a single statement,
+        rather than with several queries each. A neighbour may carry a
+        `count` of the times it was seen since it was last reported.
+
+        :return: The neighbours that do not exist, which the caller must
+            create with `Interface.update_neighbour`.
+        """
+        if len(neighbours) == 0:
+            return []
+        values, params = [], [now()]
+        for neighbour in neighbours:
+            values.append("(%s::inet, %s::macaddr, %s::integer, %s, %s)")
+            params.extend((
+                neighbour['ip'], neighbour['mac'], neighbour.get('vid', None),
+                neighbour['time'], neighbour.get('count', 1)))
+        params.append(interface.id)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self._sql_refresh_neighbours % ", ".join(values), params)
+            refreshed = {
+                (IPAddress(ip), EUI(mac), vid)
+                for ip, mac, vid in cursor.fetchall()
+            }
+        return [
+            neighbour for neighbour in neighbours
+            if (IPAddress(neighbour['ip']), EUI(neighbour['mac']),
+                neighbour.get('vid', None)) not in refreshed
+        ]
+
+    _sql_refresh_neighbours = """\
+    UPDATE maasserver_neighbour AS neighbour
+    SET time = GREATEST(neighbour.time, seen.time),
+        count = neighbour.count + seen.count,
+        updated = %%s
+    FROM (VALUES %s) AS seen (ip, mac_address, vid, time, count)
+    WHERE neighbour.interface_id = %%s
+      AND neighbour.ip = seen.ip
+      AND neighbour.mac_address = seen.mac_address
+      AND neighbour.vid IS NOT DISTINCT FROM seen.vid
+    RETURNING host(neighbour.ip), neighbour.mac_address::text, neighbour.vid
+    """
+
     def get_by_updated_with_related_nodes(self):
         """Returns a `QuerySet` of neighbours, while also selecting related
         interfaces and nodes.
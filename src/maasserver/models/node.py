@@ -3975,8 +3975,9 @@ class Node(CleanSave, TimestampedModel):
             # this is not an error state.
             return None
 
-        # Request that the node be powered on post-commit.
-        d = post_commit()
+        # Request that the node be powered on post-commit. Powering different
+        # nodes is independent, so bulk operations can do so concurrently.
+        d = post_commit(concurrent=True)
         if self.power_state == POWER_STATE.ON and allow_power_cycle:
             d = self._power_control_node(d, power_cycle, power_info)
         else:
@@ -4043,8 +4044,9 @@ class Node(CleanSave, TimestampedModel):
         # Smuggle in a hint about how to power-off the self.
         power_info.power_parameters['power_off_mode'] = stop_mode
 
-        # Request that the node be powered off post-commit.
-        d = post_commit()
+        # Request that the node be powered off post-commit. Powering different
+        # nodes is independent, so bulk operations can do so concurrently.
+        d = post_commit(concurrent=True)
         return self._power_control_node(d, power_off_node, power_info)
 
     @asynchronous
@@ -5047,17 +5049,35 @@ class Controller(Node):
             Neighbour data is gathered directly from the ARP monitoring process
             running on each rack interface.
         """
+        # Circular imports.
+        from maasserver.models.neighbour import Neighbour
         # Determine which interfaces' neighbours need updating.
         interface_set = {neighbour['interface'] for neighbour in neighbours}
         interfaces = Interface.objects.get_interface_dict_for_node(
             self, names=interface_set, fetch_fabric_vlan=True)
+        # Bindings that were merely seen again are the bulk of what's
+        # reported, so they're refreshed together, per interface.
+        refreshed = defaultdict(list)
+        vids = OrderedDict()
         for neighbour in neighbours:
             interface = interfaces.get(neighbour['interface'], None)
             if interface is not None:
-                interface.update_neighbour(neighbour)
+                if neighbour.get('event', None) == "REFRESHED":
+                    refreshed[interface.name].append(neighbour)
+                else:
+                    interface.update_neighbour(neighbour)
                 vid = neighbour.get("vid", None)
                 if vid is not None:
-                    interface.report_vid(vid)
+                    vids[interface.name, vid] = interface
+        for ifname, refreshes in refreshed.items():
+            interface = interfaces[ifname]
+            if interface.neighbour_discovery_state is not False:
+                missing = Neighbour.objects.refresh_neighbours(
+                    interface, refreshes)
+                for neighbour in missing:
+                    interface.update_neighbour(neighbour)
+        for (_, vid), interface in vids.items():
+            interface.report_vid(vid)
 
     def report_mdns_entries(self, entries):
         """Update the mDNS entries on this controller.
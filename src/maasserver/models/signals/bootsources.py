@@ -13,7 +13,7 @@ from django.db.models.signals import (
 )
 from maasserver.bootsources import cache_boot_sources
 from maasserver.models.bootsource import BootSource
-from maasserver.utils.orm import post_commit_do
+from maasserver.utils.orm import post_commit_do_once
 from maasserver.utils.signals import SignalsManager
 from twisted.internet import reactor
 
@@ -37,7 +37,8 @@ def update_boot_source_cache(sender, instance, *args, **kwargs):
     This only begins after a successful commit to the database, and is then
     run in a thread. Nothing waits for its completion.
     """
-    post_commit_do(reactor.callLater, 0, cache_boot_sources)
+    post_commit_do_once(
+        "cache-boot-sources", reactor.callLater, 0, cache_boot_sources)
 
 
 signals.watch(post_save, save_boot_source_cache, BootSource)
@@ -13,7 +13,7 @@ from maasserver.exceptions import PowerProblem
 from maasserver.models.node import Node
 from maasserver.node_status import QUERY_TRANSITIONS
 from maasserver.utils.orm import (
-    post_commit,
+    post_commit_do_once,
     transactional,
 )
 from maasserver.utils.signals import SignalsManager
@@ -22,7 +22,6 @@ from provisioningserver.logger import LegacyLogger
 from provisioningserver.rpc.exceptions import UnknownPowerType
 from provisioningserver.utils.twisted import (
     asynchronous,
-    callOut,
     FOREVER,
     synchronous,
 )
@@ -84,8 +83,9 @@ def signal_update_power_state_of_node(instance, old_values, **kwargs):
     # Only check the power state if it's an interesting transition.
     if old_status in QUERY_TRANSITIONS:
         if node.status in QUERY_TRANSITIONS[old_status]:
-            post_commit().addCallback(
-                callOut, update_power_state_of_node_soon, node.system_id)
+            post_commit_do_once(
+                ("update-power-state", node.system_id),
+                update_power_state_of_node_soon, node.system_id)
 
 signals.watch_fields(
     signal_update_power_state_of_node, Node, ['status'])
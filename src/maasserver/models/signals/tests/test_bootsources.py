@@ -35,58 +35,58 @@ class TestBootSourceSignals(MAASServerTestCase):
             cursor.execute(
                 "ALTER SEQUENCE %s_id_seq RESTART WITH 1" %
                 BootSource._meta.db_table)
-        post_commit_do = self.patch(signals.bootsources, "post_commit_do")
+        post_commit_do = self.patch(signals.bootsources, "post_commit_do_once")
         factory.make_BootSource(keyring_data=factory.make_bytes())
         self.assertThat(post_commit_do, MockNotCalled())
 
     def test_arranges_for_update_on_BootSource_create(self):
-        post_commit_do = self.patch(signals.bootsources, "post_commit_do")
+        post_commit_do = self.patch(signals.bootsources, "post_commit_do_once")
         factory.make_BootSource(keyring_data=factory.make_bytes())
         factory.make_BootSource(keyring_data=factory.make_bytes())
         self.assertThat(post_commit_do, MockCalledWith(
-            reactor.callLater, 0, cache_boot_sources))
+            "cache-boot-sources", reactor.callLater, 0, cache_boot_sources))
 
     def test_arranges_for_update_always_when_empty(self):
-        self.patch(signals.bootsources, "post_commit_do")
+        self.patch(signals.bootsources, "post_commit_do_once")
         # Create then delete a boot source cache to get over initial ignore
         # on create.
         boot_source = factory.make_BootSource(
             keyring_data=factory.make_bytes())
         boot_source.delete()
-        post_commit_do = self.patch(signals.bootsources, "post_commit_do")
+        post_commit_do = self.patch(signals.bootsources, "post_commit_do_once")
         factory.make_BootSource(keyring_data=factory.make_bytes())
         self.assertThat(post_commit_do, MockCalledOnceWith(
-            reactor.callLater, 0, cache_boot_sources))
+            "cache-boot-sources", reactor.callLater, 0, cache_boot_sources))
 
     def test_arranges_for_update_on_BootSource_update(self):
-        self.patch(signals.bootsources, "post_commit_do")
+        self.patch(signals.bootsources, "post_commit_do_once")
         factory.make_BootSource(keyring_data=factory.make_bytes())
         boot_source = factory.make_BootSource(
             keyring_data=factory.make_bytes())
-        post_commit_do = self.patch(signals.bootsources, "post_commit_do")
+        post_commit_do = self.patch(signals.bootsources, "post_commit_do_once")
         boot_source.keyring_data = factory.make_bytes()
         boot_source.save()
         self.assertThat(post_commit_do, MockCalledOnceWith(
-            reactor.callLater, 0, cache_boot_sources))
+            "cache-boot-sources", reactor.callLater, 0, cache_boot_sources))
 
     def test_arranges_for_update_on_BootSource_delete(self):
-        self.patch(signals.bootsources, "post_commit_do")
+        self.patch(signals.bootsources, "post_commit_do_once")
         factory.make_BootSource(keyring_data=factory.make_bytes())
         boot_source = factory.make_BootSource(
             keyring_data=factory.make_bytes())
-        post_commit_do = self.patch(signals.bootsources, "post_commit_do")
+        post_commit_do = self.patch(signals.bootsources, "post_commit_do_once")
         boot_source.delete()
         self.assertThat(post_commit_do, MockCalledOnceWith(
-            reactor.callLater, 0, cache_boot_sources))
+            "cache-boot-sources", reactor.callLater, 0, cache_boot_sources))
 
     def test_arranges_for_update_on_Config_http_proxy(self):
-        post_commit_do = self.patch(signals.bootsources, "post_commit_do")
+        post_commit_do = self.patch(signals.bootsources, "post_commit_do_once")
         Config.objects.set_config("http_proxy", factory.make_url())
         self.assertThat(post_commit_do, MockCalledOnceWith(
-            reactor.callLater, 0, cache_boot_sources))
+            "cache-boot-sources", reactor.callLater, 0, cache_boot_sources))
 
     def test_arranges_for_update_on_Config_http_proxy_enable(self):
-        post_commit_do = self.patch(signals.bootsources, "post_commit_do")
+        post_commit_do = self.patch(signals.bootsources, "post_commit_do_once")
         Config.objects.set_config("enable_http_proxy", False)
         self.assertThat(post_commit_do, MockCalledOnceWith(
-            reactor.callLater, 0, cache_boot_sources))
+            "cache-boot-sources", reactor.callLater, 0, cache_boot_sources))
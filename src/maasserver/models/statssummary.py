@@ -0,0 +1,58 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""StatsSummary objects."""
+
+__all__ = [
+    "StatsSummary",
+    ]
+
+from django.db.models import (
+    CharField,
+    Manager,
+)
+from maasserver import DefaultMeta
+from maasserver.fields import JSONObjectField
+from maasserver.models.cleansave import CleanSave
+from maasserver.models.timestampedmodel import TimestampedModel
+
+
+class StatsSummaryManager(Manager):
+    """Manager for `StatsSummary` objects."""
+
+    def get_summary(self, name):
+        """Return the summary called `name`, or `None` if there isn't one."""
+        return self.filter(name=name).first()
+
+    def set_summary(self, name, data):
+        """Store `data` as the summary called `name`."""
+        summary, created = self.get_or_create(
+            name=name, defaults={'data': data})
+        if not created:
+            summary.data = data
+            summary.save()
+        return summary
+
+
+class StatsSummary(CleanSave, TimestampedModel):
+    """Pre-computed statistics about the objects MAAS manages.
+
+    Computing the statistics means aggregating over every node, pod and
+    subnet. They are stored here by a background job so that frequent
+    readers, like Prometheus scrapes, can fetch them with a single lookup.
+    The `updated` timestamp tells readers how stale they are.
+
+    :ivar name: The name of the set of statistics.
+    :ivar data: The statistics, as a JSON-compatible structure.
+    """
+
+    class Meta(DefaultMeta):
+        verbose_name = "Statistics summary"
+        verbose_name_plural = "Statistics summaries"
+
+    objects = StatsSummaryManager()
+
+    name = CharField(
+        max_length=255, unique=True, editable=False, null=False, blank=False)
+
+    data = JSONObjectField(editable=False, null=False, blank=False)
@@ -1,13 +1,15 @@
-# Copyright 2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2016-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for the Neighbour model."""
 
 __all__ = []
 
+from maasserver.models import Neighbour
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
 from maastesting.matchers import IsNonEmptyString
+from testtools.matchers import Equals
 
 
 class TestNeighbourModel(MAASServerTestCase):
@@ -15,3 +17,39 @@ class TestNeighbourModel(MAASServerTestCase):
     def test_mac_organization(self):
         neighbour = factory.make_Neighbour(mac_address="48:51:b7:00:00:00")
         self.assertThat(neighbour.mac_organization, IsNonEmptyString)
+
+
+class TestNeighbourManager(MAASServerTestCase):
+
+    def test_refresh_neighbours_updates_existing_neighbours(self):
+        interface = factory.make_Interface()
+        tagged = factory.make_Neighbour(
+            interface=interface, time=10, count=1, vid=100)
+        untagged = factory.make_Neighbour(
+            interface=interface, time=10, count=1, vid=None)
+        missing = Neighbour.objects.refresh_neighbours(interface, [
+            {"ip": tagged.ip, "mac": str(tagged.mac_address), "vid": 100,
+             "time": 20, "count": 3},
+            {"ip": untagged.ip, "mac": str(untagged.mac_address),
+             "time": 5},
+        ])
+        self.assertThat(missing, Equals([]))
+        tagged.refresh_from_db()
+        untagged.refresh_from_db()
+        self.expectThat((tagged.time, tagged.count), Equals((20, 4)))
+        self.expectThat((untagged.time, untagged.count), Equals((10, 2)))
+
+    def test_refresh_neighbours_returns_missing_neighbours(self):
+        interface = factory.make_Interface()
+        neighbour = factory.make_Neighbour(interface=interface, vid=None)
+        missing = [
+            {"ip": neighbour.ip, "mac": factory.make_mac_address(),
+             "time": 20},
+            {"ip": neighbour.ip, "mac": str(neighbour.mac_address),
+             "vid": 100, "time": 20},
+            {"ip": factory.make_ipv4_address(),
+             "mac": str(neighbour.mac_address), "time": 20},
+        ]
+        self.assertThat(
+            Neighbour.objects.refresh_neighbours(interface, missing),
+            Equals(missing))
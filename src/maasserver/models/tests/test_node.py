@@ -7470,6 +7470,42 @@ class TestReportNeighbours(MAASServerTestCase):
         rack.report_neighbours(neighbours)
         self.assertThat(report_vid, MockCallsMatch(call(3), call(7)))
 
+    def test__refreshes_refreshed_neighbours_together(self):
+        rack = factory.make_RackController()
+        eth0 = factory.make_Interface(name='eth0', node=rack)
+        eth0.neighbour_discovery_state = True
+        eth0.save()
+        update_neighbour = self.patch(
+            interface_module.Interface, 'update_neighbour')
+        existing = factory.make_Neighbour(interface=eth0, vid=None, count=1)
+        refreshed = {
+            'interface': 'eth0', 'ip': existing.ip,
+            'mac': str(existing.mac_address), 'time': existing.time + 1,
+            'event': 'REFRESHED', 'count': 2,
+        }
+        unknown = {
+            'interface': 'eth0', 'ip': factory.make_ipv4_address(),
+            'mac': factory.make_mac_address(), 'time': 1,
+            'event': 'REFRESHED',
+        }
+        rack.report_neighbours([refreshed, unknown])
+        existing.refresh_from_db()
+        self.expectThat(existing.count, Equals(3))
+        self.expectThat(update_neighbour, MockCalledOnceWith(unknown))
+
+    def test__calls_report_vid_once_for_each_vid(self):
+        rack = factory.make_RackController()
+        factory.make_Interface(name='eth0', node=rack)
+        self.patch(interface_module.Interface, 'update_neighbour')
+        report_vid = self.patch(
+            interface_module.Interface, 'report_vid')
+        neighbours = [
+            {'interface': 'eth0', 'mac': factory.make_mac_address(), 'vid': 3}
+            for _ in range(3)
+        ]
+        rack.report_neighbours(neighbours)
+        self.assertThat(report_vid, MockCalledOnceWith(3))
+
 
 class TestReportMDNSEntries(MAASServerTestCase):
     """Tests for `Controller.report_mdns_entries()."""
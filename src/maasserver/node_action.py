@@ -53,7 +53,7 @@ from maasserver.node_status import (
     NON_MONITORED_STATUSES,
 )
 from maasserver.preseed import get_curtin_config
-from maasserver.utils.orm import post_commit_do
+from maasserver.utils.orm import post_commit_do_once
 from maasserver.utils.osystems import (
     validate_hwe_kernel,
     validate_osystem_and_distro_series,
@@ -786,7 +786,8 @@ class ImportImages(NodeAction):
     def _execute(self):
         """See `NodeAction.execute`."""
         try:
-            post_commit_do(
+            post_commit_do_once(
+                ("import-boot-images", self.node.system_id),
                 RackControllersImporter.schedule, self.node.system_id)
         except RPC_EXCEPTIONS as exception:
             raise NodeActionError(exception)
@@ -53,9 +53,14 @@ class RegionWorkerServiceMaker:
         libc.prctl(1, signal.SIGKILL)
 
     def _configureThreads(self):
+        from maasserver.config import RegionConfiguration
         from maasserver.utils import threads
+        with RegionConfiguration.open() as config:
+            pooler = config.database_pooler
+            idle_timeout = config.database_pool_idle_timeout
         threads.install_default_pool()
-        threads.install_database_pool()
+        threads.install_database_pool(
+            pooler=pooler, idle_timeout=idle_timeout)
 
     def _configureLogging(self, verbosity: int):
         # Get something going with the logs.
@@ -84,6 +89,15 @@ class RegionWorkerServiceMaker:
         else:
             reactor.callFromThread(disable_all_database_connections)
 
+    def _configureProfiler(self):
+        # Start sampling the reactor and thread-pools if configured to.
+        from maasserver.config import RegionConfiguration
+        with RegionConfiguration.open() as config:
+            debug_profiler = config.debug_profiler
+        if debug_profiler:
+            from provisioningserver.utils.profiler import PROFILER
+            reactor.callWhenRunning(PROFILER.start)
+
     def _configureCrochet(self):
         # Prevent other libraries from starting the reactor via crochet.
         # In other words, this makes crochet.setup() a no-op.
@@ -117,6 +131,7 @@ class RegionWorkerServiceMaker:
         self._configureDjango()
         self._configurePservSettings()
         self._configureReactor()
+        self._configureProfiler()
         self._configureCrochet()
 
         # Reconfigure the logging if required.
@@ -175,6 +190,7 @@ class RegionMasterServiceMaker(RegionWorkerServiceMaker):
         self._configureDjango()
         self._configurePservSettings()
         self._configureReactor()
+        self._configureProfiler()
         self._configureCrochet()
         self._ensureConnection()
 
@@ -213,6 +229,7 @@ class RegionAllInOneServiceMaker(RegionMasterServiceMaker):
         self._configureDjango()
         self._configurePservSettings()
         self._configureReactor()
+        self._configureProfiler()
         self._configureCrochet()
         self._ensureConnection()
 
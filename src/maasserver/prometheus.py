@@ -6,25 +6,25 @@
 __all__ = [
     "PrometheusService",
     "PROMETHEUS_SERVICE_PERIOD",
+    "RegionRuntimeMetricsService",
 ]
 
 from datetime import timedelta
-import json
 
 from django.http import (
     HttpResponse,
     HttpResponseNotFound,
 )
 from maasserver.models import Config
-from maasserver.stats import (
-    get_kvm_pods_stats,
-    get_maas_stats,
-    get_machines_by_architecture,
-)
+from maasserver.models.timestampedmodel import now
+from maasserver.stats import get_inventory_stats
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.prometheus.collectors import RuntimeMetricsService
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from twisted.application.internet import TimerService
+from twisted.internet.defer import inlineCallbacks
 
 
 try:
@@ -45,16 +45,27 @@ def prometheus_handler(request):
     if not Config.objects.get_config('prometheus_enabled'):
         return HttpResponseNotFound()
 
-    return HttpResponse(
-        content=generate_latest(get_stats_for_prometheus()),
-        content_type="text/plain")
+    content = generate_latest(get_stats_for_prometheus())
+    # Append the runtime metrics of the process serving this request.
+    runtime_metrics = PROMETHEUS_METRICS.generate_latest()
+    if PROMETHEUS_METRICS.enabled and runtime_metrics is not None:
+        content += runtime_metrics
+    return HttpResponse(content=content, content_type="text/plain")
 
 
 def get_stats_for_prometheus():
     registry = CollectorRegistry()
-    stats = json.loads(get_maas_stats())
-    architectures = get_machines_by_architecture()
-    pods = get_kvm_pods_stats()
+    inventory, updated = get_inventory_stats()
+    stats = inventory['maas_stats']
+    architectures = inventory['machine_arches']
+    pods = inventory['kvm_pods']
+
+    # Let consumers know how stale the inventory statistics are.
+    counter = Gauge(
+        "stats_age_seconds",
+        "Seconds since the inventory statistics were computed.",
+        registry=registry)
+    counter.set((now() - updated).total_seconds())
 
     # Gather counter for machines per status
     counter = Gauge(
@@ -161,3 +172,41 @@ class PrometheusService(TimerService, object):
         self._loop.interval = self.step = interval_seconds
         if self._loop.running:
             self._loop.reset()
+
+
+class RegionRuntimeMetricsService(RuntimeMetricsService):
+    """Collect runtime metrics in a region process.
+
+    Collection is switched on and off to follow the `prometheus_enabled`
+    configuration setting, so that it costs nothing while disabled.
+    """
+
+    def __init__(self, postgresListener=None, clock=None):
+        super(RegionRuntimeMetricsService, self).__init__(clock=clock)
+        self.listener = postgresListener
+
+    def startService(self):
+        super(RegionRuntimeMetricsService, self).startService()
+        if self.listener is not None:
+            self.listener.register('config', self.refreshEnabled)
+        d = self.refreshEnabled()
+        d.addErrback(log.err, "Failed to configure runtime metrics.")
+
+    def stopService(self):
+        if self.listener is not None:
+            self.listener.unregister('config', self.refreshEnabled)
+        return super(RegionRuntimeMetricsService, self).stopService()
+
+    @inlineCallbacks
+    def refreshEnabled(self, action=None, obj_id=None):
+        """Enable or disable collection based on the global setting.
+
+        Called when the service starts and whenever the postgres listener
+        indicates that a configuration value has changed.
+        """
+        enabled = yield deferToDatabase(
+            transactional(Config.objects.get_config), 'prometheus_enabled')
+        if enabled and PROMETHEUS:
+            PROMETHEUS_METRICS.enable()
+        else:
+            PROMETHEUS_METRICS.disable()
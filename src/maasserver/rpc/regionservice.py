@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """RPC implementation for regions."""
@@ -8,7 +8,6 @@ __all__ = [
 ]
 
 from collections import defaultdict
-import copy
 from datetime import datetime
 from os import urandom
 import random
@@ -40,6 +39,7 @@ from maasserver.rpc.nodes import (
 )
 from maasserver.rpc.services import update_services
 from maasserver.security import get_shared_secret
+from maasserver.utils.immutable import freeze
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
 from netaddr import (
@@ -47,13 +47,17 @@ from netaddr import (
     IPAddress,
 )
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.rpc import (
     cluster,
     common,
     exceptions,
     region,
 )
-from provisioningserver.rpc.common import RPCProtocol
+from provisioningserver.rpc.common import (
+    RPCProtocol,
+    select_connection,
+)
 from provisioningserver.rpc.exceptions import NoSuchCluster
 from provisioningserver.rpc.interfaces import IConnection
 from provisioningserver.security import calculate_digest
@@ -77,6 +81,7 @@ from twisted.internet.address import (
 )
 from twisted.internet.defer import (
     CancelledError,
+    Deferred,
     inlineCallbacks,
     maybeDeferred,
     returnValue,
@@ -87,6 +92,7 @@ from twisted.internet.error import ConnectionClosed
 from twisted.internet.protocol import Factory
 from twisted.internet.threads import deferToThread
 from twisted.protocols import amp
+from twisted.python.failure import Failure
 from zope.interface import implementer
 
 
@@ -586,6 +592,9 @@ class RegionServer(Region):
         service that created it.
 
     :ivar ident: The identity (e.g. UUID) of the remote cluster.
+
+    :ivar chunkedArguments: Whether the rack understands values of `Chunked`
+        arguments that have been split. This is negotiated when registering.
     """
 
     factory = None
@@ -593,6 +602,7 @@ class RegionServer(Region):
     ident = None
     host = None
     hostIsRemote = False
+    chunkedArguments = False
 
     @asynchronous
     def initResponder(self, rack_controller):
@@ -644,11 +654,22 @@ class RegionServer(Region):
         digest_local = calculate_digest(secret, message, salt)
         returnValue(digest == digest_local)
 
+    @region.InvalidateCachedResults.responder
+    def invalidate_cached_results(self, commands):
+        """invalidate_cached_results(commands)
+
+        Implementation of
+        :py:class:`~provisioningserver.rpc.region.InvalidateCachedResults`.
+        """
+        if self.ident is not None:
+            self.factory.service.invalidateCachedResults(self.ident, commands)
+        return {}
+
     @region.RegisterRackController.responder
     @inlineCallbacks
     def register(
             self, system_id, hostname, interfaces, url, nodegroup_uuid=None,
-            beacon_support=False, version=None):
+            beacon_support=False, version=None, chunked_arguments=False):
         # Hold off on fabric creation if the remote controller
         # supports beacons; it will happen later when UpdateInterfaces is
         # called.
@@ -663,6 +684,10 @@ class RegionServer(Region):
         if version:
             # The remote supports version checking, so reply to that.
             result['version'] = get_maas_version()
+        if chunked_arguments:
+            # Both ends can now split long values of Chunked arguments.
+            self.chunkedArguments = True
+            result['chunked_arguments'] = True
         return result
 
     @inlineCallbacks
@@ -755,19 +780,54 @@ class RegionServer(Region):
 
 
 class RackClient(common.Client):
-    """A `common.Client` for communication from region to rack."""
+    """A `common.Client` for communication from region to rack.
 
-    # Currently the only calls that can be cached are the ones that take
-    # no arguments. More work needs to be done to this class to handle
-    # argument matching.
-    cache_calls = [
-        cluster.DescribePowerTypes,
+    :ivar alternatives: `None`, or a callable returning ``(connection,
+        cache)`` pairs for the connections to other rack controllers that
+        the calls in `hedge_calls` can also be made over, with the caches of
+        those rack controllers.
+    """
+
+    # Calls whose results are cached, with the number of seconds for which
+    # the results are kept, or `None` to keep them until the rack controller
+    # invalidates them or disconnects. Only calls made without arguments are
+    # cached.
+    cache_calls = {
+        cluster.DescribeNOSTypes: None,
+        cluster.DescribePowerTypes: None,
+        cluster.ListBootImages: 300,
+        cluster.ListBootImagesV2: 300,
+        cluster.ListOperatingSystems: 300,
+        cluster.ListSupportedArchitectures: None,
+    }
+
+    # Calls that only query the rack controller itself, so can safely be
+    # made again over a connection to another rack controller when the first
+    # is slow to answer. Calls that reach out to a BMC or pod, like
+    # PowerQuery and DiscoverPod, are not included: they are often slow, a
+    # second call would only load the same device again, and the first call
+    # can't be cancelled on the rack.
+    hedge_calls = [
         cluster.DescribeNOSTypes,
+        cluster.DescribePowerTypes,
     ]
 
-    def __init__(self, connection, cache):
+    # Seconds to wait for an answer to one of `hedge_calls` before making
+    # the call again over a connection to another rack controller.
+    hedge_delay = 2.0
+
+    timeouts = {
+        cluster.DescribeNOSTypes: 30,
+        cluster.DescribePowerTypes: 30,
+        cluster.ListBootImagesV2: 60,
+    }
+
+    clock = reactor
+
+    def __init__(self, connection, cache, alternatives=None):
         super(RackClient, self).__init__(connection)
         self.cache = cache
+        self.alternatives = alternatives
 
     def _getCallCache(self):
         """Return the call cache."""
@@ -782,28 +842,94 @@ class RackClient(common.Client):
     def __call__(self, cmd, *args, **kwargs):
         """Call a remote RPC method.
 
-        This caches calls to the rack controller that do not change value,
-        unless the rack controller disconnects and reconnects to the region.
+        This caches the results of calls in `cache_calls`, sharing them
+        between all connections to the rack controller, and hedges calls in
+        `hedge_calls`; see `_callHedged`. Results are frozen, see `freeze`,
+        so they can be returned without copying.
         """
-        call_cache = self._getCallCache()
-        if cmd not in self.cache_calls:
+        if cmd in self.hedge_calls and self.alternatives is not None:
+            return self._callHedged(cmd, *args, **kwargs)
+        else:
+            return self._callCached(cmd, *args, **kwargs)
+
+    def _callCached(self, cmd, *args, **kwargs):
+        """Call `cmd`, answering from or adding to the cache if possible."""
+        cacheable = (
+            cmd in self.cache_calls and len(args) == 0 and
+            all(name == "_timeout" for name in kwargs))
+        if not cacheable:
             return super(RackClient, self).__call__(cmd, *args, **kwargs)
+        call_cache = self._getCallCache()
+        now = self.clock.seconds()
         if cmd in call_cache:
-            # Call has already been made over this connection, just return
-            # the original result.
-            return succeed(copy.deepcopy(call_cache[cmd]))
-        else:
-            # First time this call has been made so cache the result so
-            # so the next call over this connection will just be returned
-            # from the cache.
+            expires, result = call_cache[cmd]
+            if expires is None or now < expires:
+                return succeed(result)
+
+        # Results that arrive after an invalidation may be stale.
+        generation = self.cache.get('generation', 0)
+
+        def cb_cache(result):
+            result = freeze(result)
+            if self.cache.get('generation', 0) == generation:
+                ttl = self.cache_calls[cmd]
+                expires = None if ttl is None else now + ttl
+                call_cache[cmd] = expires, result
+            return result
+
+        d = super(RackClient, self).__call__(cmd, *args, **kwargs)
+        d.addCallback(cb_cache)
+        return d
 
-            def cb_cache(result):
-                call_cache[cmd] = result
-                return result
+    def _callHedged(self, cmd, *args, **kwargs):
+        """Call `cmd`, repeating it over another rack controller if slow.
 
-            d = super(RackClient, self).__call__(cmd, *args, **kwargs)
-            d.addCallback(cb_cache)
-            return d
+        If there's no answer after `hedge_delay` seconds the call is made
+        again over the least busy of the `alternatives`. The first answer
+        wins and the other call is cancelled. A failure before then is
+        returned as-is; after then, only if both calls fail. An answer is
+        only cached for the rack controller that gave it.
+        """
+        calls = [self._callCached(cmd, *args, **kwargs)]
+        failures = {}
+
+        def cancel(_=None):
+            if hedge.active():
+                hedge.cancel()
+            for call in calls:
+                call.cancel()
+
+        def answered(outcome, index):
+            if result.called:
+                pass  # Already answered; this is the loser.
+            elif not isinstance(outcome, Failure):
+                cancel()
+                result.callback(outcome)
+            else:
+                failures[index] = outcome
+                if hedge.active() or len(failures) == len(calls):
+                    cancel()
+                    result.errback(failures[min(failures)])
+
+        def call_again():
+            others = {
+                connection: cache
+                for connection, cache in self.alternatives()
+                if connection is not self._conn
+            }
+            if len(others) > 0:
+                connection = select_connection(list(others))
+                client = RackClient(connection, others[connection])
+                PROMETHEUS_METRICS.update(
+                    "maas_rpc_hedged_calls", "inc",
+                    labels={"call": cmd.commandName.decode("ascii")})
+                calls.append(client._callCached(cmd, *args, **kwargs))
+                calls[-1].addBoth(answered, len(calls) - 1)
+
+        result = Deferred(cancel)
+        hedge = self.clock.callLater(self.hedge_delay, call_again)
+        calls[0].addBoth(answered, 0)
+        return result
 
 
 class RegionService(service.Service, object):
@@ -818,6 +944,8 @@ class RegionService(service.Service, object):
         specify, say, a range of ports, but only bind one of them.
     :ivar ports: The opened :py:class:`IListeningPort`s.
     :ivar connections: Maps :class:`Region` connections to clusters.
+    :ivar resultCaches: Maps cluster idents to the cached results of calls,
+        for :class:`RackClient`.
     :ivar waiters: Maps cluster idents to callers waiting for a connection.
     :ivar starting: Either `None`, or a :class:`Deferred` that fires when
         attempts have been made to open all endpoints. Some or all of them may
@@ -835,7 +963,7 @@ class RegionService(service.Service, object):
              for port in range(5250, 5260)],
         ]
         self.connections = defaultdict(set)
-        self.connectionsCache = defaultdict(dict)
+        self.resultCaches = defaultdict(dict)
         self.waiters = defaultdict(set)
         self.factory = Factory.forProtocol(RegionServer)
         self.factory.service = self
@@ -858,15 +986,16 @@ class RegionService(service.Service, object):
             waiters.add(d)
             return d
         else:
-            connection = random.choice(conns)
+            connection = select_connection(conns)
             return defer.succeed(connection)
 
     def _getConnectionFromIdentifiers(self, identifiers, timeout):
         """Wait up to `timeout` seconds for at least one connection from
         `identifiers`.
 
-        Returns a `Deferred` which will fire with a list of random connections
-        to each client. Only one connection per client will be returned.
+        Returns a `Deferred` which will fire with a list of the least busy
+        connections to each client. Only one connection per client will be
+        returned.
 
         The public interface to this method is `getClientFromIdentifiers`.
         """
@@ -874,7 +1003,7 @@ class RegionService(service.Service, object):
         for ident in identifiers:
             conns = list(self.connections[ident])
             if len(conns) > 0:
-                matched_connections.append(random.choice(conns))
+                matched_connections.append(select_connection(conns))
         if len(matched_connections) > 0:
             return defer.succeed(matched_connections)
         else:
@@ -911,9 +1040,26 @@ class RegionService(service.Service, object):
     def _removeConnectionFor(self, ident, connection):
         """Removes `connection` from the set of connections for `ident`."""
         self.connections[ident].discard(connection)
-        self.connectionsCache.pop(connection, None)
+        if len(self.connections[ident]) == 0:
+            # The rack may be restarting, perhaps with different drivers.
+            self.resultCaches.pop(ident, None)
         self.events.disconnected.fire(ident)
 
+    def invalidateCachedResults(self, ident, commands=None):
+        """Discard cached results of calls to the rack controller `ident`.
+
+        :param commands: The names of the commands whose results should be
+            discarded, or `None` to discard all.
+        """
+        cache = self.resultCaches.get(ident)
+        if cache is not None:
+            cache['generation'] = cache.get('generation', 0) + 1
+            call_cache = cache.get('call_cache', {})
+            for cmd in list(call_cache):
+                if commands is None or (
+                        cmd.commandName.decode("ascii") in commands):
+                    del call_cache[cmd]
+
     def _savePorts(self, results):
         """Save the opened ports to ``self.ports``.
 
@@ -1027,13 +1173,41 @@ class RegionService(service.Service, object):
         host, port = socket.getsockname()[:2]
         return port
 
+    def _getClient(self, connection, idents):
+        """Return a :class:`RackClient` for `connection`.
+
+        Cached results are shared with other clients for the same rack
+        controller. Calls that can be hedged are made again over the
+        connections to the other rack controllers in `idents` when
+        `connection` is slow to answer.
+        """
+        for ident in idents:
+            if connection in self.connections.get(ident, ()):
+                cache = self.resultCaches[ident]
+                others = [other for other in idents if other != ident]
+                break
+        else:
+            cache = {}  # Already disconnected.
+            others = []
+
+        def alternatives():
+            return [
+                (conn, self.resultCaches[ident]) for ident in others
+                for conn in self.connections.get(ident, ())
+            ]
+
+        if len(others) == 0:
+            return RackClient(connection, cache)
+        else:
+            return RackClient(connection, cache, alternatives)
+
     @asynchronous(timeout=FOREVER)
     def getClientFor(self, system_id, timeout=30):
         """Return a :class:`RackClient` for the specified rack controller.
 
         If more than one connection exists to that rack controller - implying
         that there are multiple rack controllers for the particular
-        cluster, for HA - one of them will be returned at random.
+        cluster, for HA - the least busy of them will be returned.
 
         :param system_id: The system_id - as a string - of the rack controller
             that a connection is wanted for.
@@ -1051,7 +1225,7 @@ class RegionService(service.Service, object):
                 "available." % system_id, uuid=system_id)
 
         def cb_client(connection):
-            return RackClient(connection, self.connectionsCache[connection])
+            return self._getClient(connection, [system_id])
 
         return d.addCallbacks(cb_client, cancelled)
 
@@ -1061,7 +1235,7 @@ class RegionService(service.Service, object):
         identifiers.
 
         If more than one connection exists to that given `identifiers`, then
-        one of them will be returned at random.
+        the least busy of them will be returned.
 
         :param identifiers: List of system_id's of the rack controller
             that a connection is wanted for.
@@ -1079,36 +1253,32 @@ class RegionService(service.Service, object):
                 "available." % ','.join(identifiers))
 
         def cb_client(conns):
-            connection = random.choice(conns)
-            return RackClient(connection, self.connectionsCache[connection])
+            connection = select_connection(conns)
+            return self._getClient(connection, identifiers)
 
         return d.addCallbacks(cb_client, cancelled)
 
     @asynchronous(timeout=FOREVER)
     def getAllClients(self):
         """Return a list with one connection per rack controller."""
-
-        def _client(connection):
-            return RackClient(connection, self.connectionsCache[connection])
-
         return [
-            _client(random.choice(list(connections)))
-            for connections in self.connections.values()
+            self._getClient(select_connection(connections), [ident])
+            for ident, connections in self.connections.items()
             if len(connections) > 0
         ]
 
     @asynchronous(timeout=FOREVER)
     def getRandomClient(self):
         """Return a random connected :class:`RackClient`."""
-        connections = list(self.connections.values())
+        connections = list(self.connections.items())
         if len(connections) == 0:
             raise exceptions.NoConnectionsAvailable(
                 "Unable to connect to any rack controller; no connections "
                 "available.")
         else:
-            connection = random.choice(connections)
+            ident, connection = random.choice(connections)
             # The connection object is a set of RegionServer objects.
             # Make sure a sane set was returned.
             assert len(connection) > 0, "Connection set empty."
-            connection = random.choice(list(connection))
-            return RackClient(connection, self.connectionsCache[connection])
+            connection = select_connection(connection)
+            return self._getClient(connection, [ident])
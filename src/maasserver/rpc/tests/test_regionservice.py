@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for the region's RPC implementation."""
@@ -32,11 +32,16 @@ from maasserver.rpc.regionservice import (
 from maasserver.rpc.testing.doubles import HandshakingRegionServer
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASTransactionServerTestCase
+from maasserver.utils.immutable import (
+    freeze,
+    ImmutableDict,
+)
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
 from maastesting.matchers import (
     MockCalledOnceWith,
     MockCallsMatch,
+    MockNotCalled,
     Provides,
 )
 from maastesting.testcase import MAASTestCase
@@ -55,7 +60,10 @@ from provisioningserver.rpc.exceptions import (
     NoConnectionsAvailable,
 )
 from provisioningserver.rpc.interfaces import IConnection
-from provisioningserver.rpc.region import RegisterRackController
+from provisioningserver.rpc.region import (
+    InvalidateCachedResults,
+    RegisterRackController,
+)
 from provisioningserver.rpc.testing import call_responder
 from provisioningserver.rpc.testing.doubles import DummyConnection
 from provisioningserver.utils import events
@@ -81,6 +89,7 @@ from twisted.internet import (
     tcp,
 )
 from twisted.internet.address import IPv4Address
+from twisted.internet.task import Clock
 from twisted.internet.defer import (
     CancelledError,
     Deferred,
@@ -287,6 +296,21 @@ class TestRegionServer(MAASTransactionServerTestCase):
         patched_region.factory.service = RegionService(ipcWorker)
         return patched_region
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_invalidate_cached_results_invalidates_for_rack(self):
+        protocol = self.make_Region()
+        protocol.ident = factory.make_name("ident")
+        service = protocol.factory.service
+        invalidateCachedResults = self.patch(
+            service, "invalidateCachedResults")
+        response = yield call_responder(
+            protocol, InvalidateCachedResults,
+            {"commands": ["ListBootImages"]})
+        self.assertEqual({}, response)
+        self.assertThat(invalidateCachedResults, MockCalledOnceWith(
+            protocol.ident, ["ListBootImages"]))
+
     def test_register_is_registered(self):
         protocol = RegionServer()
         responder = protocol.locateResponder(
@@ -334,6 +358,23 @@ class TestRegionServer(MAASTransactionServerTestCase):
         self.assertThat(
             response['beacon_support'], Is(True))
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_register_acks_chunked_arguments(self):
+        yield self.installFakeRegion()
+        rack_controller = yield deferToDatabase(factory.make_RackController)
+        protocol = self.make_Region()
+        protocol.transport = MagicMock()
+        response = yield call_responder(
+            protocol, RegisterRackController, {
+                "system_id": rack_controller.system_id,
+                "hostname": rack_controller.hostname,
+                "interfaces": {},
+                "chunked_arguments": True,
+            })
+        self.assertThat(response['chunked_arguments'], Is(True))
+        self.assertThat(protocol.chunkedArguments, Is(True))
+
     @wait_for_reactor
     @inlineCallbacks
     def test_register_acks_version(self):
@@ -517,9 +558,13 @@ class TestRegionServer(MAASTransactionServerTestCase):
 class TestRackClient(MAASTestCase):
 
     def test_defined_cache_calls(self):
-        self.assertEquals([
-            cluster.DescribePowerTypes,
+        self.assertItemsEqual([
             cluster.DescribeNOSTypes,
+            cluster.DescribePowerTypes,
+            cluster.ListBootImages,
+            cluster.ListBootImagesV2,
+            cluster.ListOperatingSystems,
+            cluster.ListSupportedArchitectures,
         ], RackClient.cache_calls)
 
     def test__getCallCache_adds_new_call_cache(self):
@@ -546,7 +591,7 @@ class TestRackClient(MAASTestCase):
         conn.ident = factory.make_name("ident")
         client = RackClient(conn, {})
         call_cache = client._getCallCache()
-        power_types = {
+        power_types = freeze({
             "power_types": [
                 {
                     'name': 'ipmi',
@@ -555,27 +600,71 @@ class TestRackClient(MAASTestCase):
                     'name': 'wedge',
                 },
             ]
-        }
-        call_cache[cluster.DescribePowerTypes] = power_types
+        })
+        call_cache[cluster.DescribePowerTypes] = None, power_types
         result = yield client(cluster.DescribePowerTypes)
-        # The result is a copy. It should equal the result but not be
-        # the same object.
-        self.assertEquals(power_types, result)
-        self.assertIsNot(power_types, result)
+        # The result is immutable so it is not copied.
+        self.assertIs(power_types, result)
 
     @wait_for_reactor
     @inlineCallbacks
     def test__call__adds_result_to_cache(self):
         conn = DummyConnection()
         conn.ident = factory.make_name('ident')
-        self.patch(conn, 'callRemote').return_value = (
-            succeed(sentinel.power_types))
+        power_types = {"power_types": [{"name": "ipmi"}]}
+        self.patch(conn, 'callRemote').return_value = succeed(power_types)
         client = RackClient(conn, {})
         call_cache = client._getCallCache()
         result = yield client(cluster.DescribePowerTypes)
-        self.assertIs(sentinel.power_types, result)
-        self.assertIs(
-            sentinel.power_types, call_cache[cluster.DescribePowerTypes])
+        self.assertEqual(power_types, result)
+        self.assertIsInstance(result, ImmutableDict)
+        self.assertEqual(
+            (None, result), call_cache[cluster.DescribePowerTypes])
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__call__expires_cached_results(self):
+        conn = DummyConnection()
+        conn.ident = factory.make_name('ident')
+        callRemote = self.patch(conn, 'callRemote')
+        callRemote.side_effect = lambda cmd: succeed({"images": []})
+        client = RackClient(conn, {})
+        client.clock = Clock()
+        yield client(cluster.ListBootImagesV2)
+        yield client(cluster.ListBootImagesV2)
+        self.assertThat(callRemote, MockCalledOnceWith(
+            cluster.ListBootImagesV2))
+        client.clock.advance(client.cache_calls[cluster.ListBootImagesV2])
+        yield client(cluster.ListBootImagesV2)
+        self.assertThat(callRemote, MockCallsMatch(
+            call(cluster.ListBootImagesV2), call(cluster.ListBootImagesV2)))
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__call__does_not_cache_result_invalidated_in_flight(self):
+        conn = DummyConnection()
+        conn.ident = factory.make_name('ident')
+        d = Deferred()
+        self.patch(conn, 'callRemote').return_value = d
+        service = RegionService(sentinel.ipcWorker)
+        service.connections[conn.ident].add(conn)
+        client = yield service.getClientFor(conn.ident)
+        call = client(cluster.ListBootImagesV2)
+        service.invalidateCachedResults(conn.ident, ["ListBootImagesV2"])
+        d.callback({"images": []})
+        yield call
+        self.assertNotIn(cluster.ListBootImagesV2, client._getCallCache())
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__call__does_not_cache_calls_with_arguments(self):
+        conn = DummyConnection()
+        conn.ident = factory.make_name('ident')
+        self.patch(conn, 'callRemote').return_value = succeed({})
+        self.patch(RackClient, 'cache_calls', {cluster.PowerQuery: None})
+        client = RackClient(conn, {})
+        yield client(cluster.PowerQuery, system_id=sentinel.system_id)
+        self.assertNotIn(cluster.PowerQuery, client._getCallCache())
 
     @wait_for_reactor
     @inlineCallbacks
@@ -590,6 +679,96 @@ class TestRackClient(MAASTestCase):
         self.assertIs(sentinel.boot_images, result)
         self.assertNotIn(cluster.ListBootImages, call_cache)
 
+    def make_connections(self, *results):
+        ident = factory.make_name("ident")
+        connections = []
+        for result in results:
+            conn = DummyConnection()
+            conn.ident = ident
+            self.patch(conn, "callRemote").return_value = result
+            connections.append(conn)
+        return connections
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__call__hedges_slow_call_over_another_connection(self):
+        slow, fast = self.make_connections(Deferred(), succeed(sentinel.types))
+        client = RackClient(slow, {}, lambda: [(slow, {}), (fast, {})])
+        client.clock = Clock()
+        d = client(cluster.DescribePowerTypes)
+        self.assertFalse(d.called)
+        client.clock.advance(client.hedge_delay)
+        result = yield d
+        self.assertIs(sentinel.types, result)
+        self.assertThat(
+            fast.callRemote, MockCalledOnceWith(cluster.DescribePowerTypes))
+        # The slow call has been cancelled.
+        self.assertTrue(slow.callRemote.return_value.called)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__call__returns_failure_before_hedging(self):
+        conn, other = self.make_connections(
+            fail(ZeroDivisionError()), succeed(sentinel.types))
+        client = RackClient(conn, {}, lambda: [(conn, {}), (other, {})])
+        client.clock = Clock()
+        with ExpectedException(ZeroDivisionError):
+            yield client(cluster.DescribePowerTypes)
+        self.assertEqual([], client.clock.getDelayedCalls())
+        self.assertThat(other.callRemote, MockNotCalled())
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__call__caches_hedged_answer_for_rack_that_gave_it(self):
+        types = {"power_types": []}
+        slow, fast = self.make_connections(Deferred(), succeed(types))
+        slow_cache, fast_cache = {}, {}
+        client = RackClient(slow, slow_cache, lambda: [(fast, fast_cache)])
+        client.clock = Clock()
+        d = client(cluster.DescribePowerTypes)
+        client.clock.advance(client.hedge_delay)
+        yield d
+        self.assertNotIn(
+            cluster.DescribePowerTypes, slow_cache.get('call_cache', {}))
+        self.assertIn(cluster.DescribePowerTypes, fast_cache['call_cache'])
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__call__answers_hedged_call_from_cache(self):
+        conn, other = self.make_connections(Deferred(), Deferred())
+        client = RackClient(conn, {}, lambda: [(other, {})])
+        client.clock = Clock()
+        client._getCallCache()[cluster.DescribePowerTypes] = (
+            None, sentinel.types)
+        result = yield client(cluster.DescribePowerTypes)
+        self.assertIs(sentinel.types, result)
+        self.assertEqual([], client.clock.getDelayedCalls())
+        self.assertThat(conn.callRemote, MockNotCalled())
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__call__does_not_hedge_calls_to_bmcs(self):
+        slow, fast = self.make_connections(Deferred(), succeed(sentinel.state))
+        client = RackClient(slow, {}, lambda: [(slow, {}), (fast, {})])
+        client.clock = Clock()
+        d = client(cluster.PowerQuery, system_id=sentinel.system_id)
+        self.assertEqual([], client.clock.getDelayedCalls())
+        d.cancel()
+        with ExpectedException(CancelledError):
+            yield d
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__call__does_not_hedge_other_calls(self):
+        slow, fast = self.make_connections(Deferred(), succeed(sentinel.state))
+        client = RackClient(slow, {}, lambda: [(slow, {}), (fast, {})])
+        client.clock = Clock()
+        d = client(cluster.ListBootImages)
+        self.assertEqual([], client.clock.getDelayedCalls())
+        d.cancel()
+        with ExpectedException(CancelledError):
+            yield d
+
 
 class TestRegionService(MAASTestCase):
 
@@ -884,7 +1063,7 @@ class TestRegionService(MAASTestCase):
             exceptions.NoConnectionsAvailable)
 
     @wait_for_reactor
-    def test_getClientFor_returns_random_connection(self):
+    def test_getClientFor_returns_least_busy_connection(self):
         c1 = DummyConnection()
         c2 = DummyConnection()
         chosen = DummyConnection()
@@ -897,15 +1076,46 @@ class TestRegionService(MAASTestCase):
         def check_choice(choices):
             self.assertItemsEqual(choices, conns_for_uuid)
             return chosen
-        self.patch(random, "choice", check_choice)
+        self.patch(regionservice, "select_connection", check_choice)
 
         def check(client):
             self.assertThat(client, Equals(RackClient(chosen, {})))
-            self.assertIs(
-                client.cache, service.connectionsCache[client._conn])
+            # Other connections to the same rack controller are no use for
+            # hedging calls.
+            self.assertIsNone(client.alternatives)
 
         return service.getClientFor(uuid).addCallback(check)
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_getClientFor_shares_cache_between_connections(self):
+        c1 = DummyConnection()
+        c2 = DummyConnection()
+        service = RegionService(sentinel.ipcWorker)
+        uuid = factory.make_UUID()
+        service.connections[uuid].update({c1, c2})
+        self.patch(regionservice, "select_connection").side_effect = [c1, c2]
+        client1 = yield service.getClientFor(uuid)
+        client2 = yield service.getClientFor(uuid)
+        self.assertThat(client1, Equals(RackClient(c1, {})))
+        self.assertThat(client2, Equals(RackClient(c2, {})))
+        self.assertIs(service.resultCaches[uuid], client1.cache)
+        self.assertIs(service.resultCaches[uuid], client2.cache)
+
+    def test_getClient_hedges_over_other_rack_controllers(self):
+        c1 = DummyConnection()
+        c2 = DummyConnection()
+        c3 = DummyConnection()
+        service = RegionService(sentinel.ipcWorker)
+        uuid1 = factory.make_UUID()
+        uuid2 = factory.make_UUID()
+        service.connections[uuid1].update({c1, c2})
+        service.connections[uuid2].add(c3)
+        client = service._getClient(c1, [uuid1, uuid2])
+        self.assertIs(service.resultCaches[uuid1], client.cache)
+        self.assertEqual(
+            [(c3, service.resultCaches[uuid2])], client.alternatives())
+
     @wait_for_reactor
     def test_getAllClients_empty(self):
         service = RegionService(sentinel.ipcWorker)
@@ -1007,6 +1217,47 @@ class TestRegionService(MAASTestCase):
 
         self.assertEqual({uuid: {c2}}, service.connections)
 
+    def test_removeConnectionFor_keeps_cache_until_last_connection(self):
+        service = RegionService(sentinel.ipcWorker)
+        uuid = factory.make_UUID()
+        c1 = DummyConnection()
+        c2 = DummyConnection()
+        service._addConnectionFor(uuid, c1)
+        service._addConnectionFor(uuid, c2)
+        cache = service.resultCaches[uuid]
+
+        service._removeConnectionFor(uuid, c1)
+        self.assertIs(cache, service.resultCaches.get(uuid))
+        service._removeConnectionFor(uuid, c2)
+        self.assertNotIn(uuid, service.resultCaches)
+
+    def test_invalidateCachedResults_discards_named_results(self):
+        service = RegionService(sentinel.ipcWorker)
+        uuid = factory.make_UUID()
+        call_cache = service.resultCaches[uuid]["call_cache"] = {
+            cluster.ListBootImagesV2: (None, sentinel.images),
+            cluster.DescribePowerTypes: (None, sentinel.power_types),
+        }
+        service.invalidateCachedResults(uuid, ["ListBootImagesV2"])
+        self.assertEqual(
+            {cluster.DescribePowerTypes: (None, sentinel.power_types)},
+            call_cache)
+
+    def test_invalidateCachedResults_discards_all_results(self):
+        service = RegionService(sentinel.ipcWorker)
+        uuid = factory.make_UUID()
+        call_cache = service.resultCaches[uuid]["call_cache"] = {
+            cluster.ListBootImagesV2: (None, sentinel.images),
+            cluster.DescribePowerTypes: (None, sentinel.power_types),
+        }
+        service.invalidateCachedResults(uuid)
+        self.assertEqual({}, call_cache)
+
+    def test_invalidateCachedResults_ignores_unknown_rack(self):
+        service = RegionService(sentinel.ipcWorker)
+        service.invalidateCachedResults(factory.make_UUID())
+        self.assertEqual({}, service.resultCaches)
+
     def test_removeConnectionFor_is_okay_if_connection_is_not_there(self):
         service = RegionService(sentinel.ipcWorker)
         uuid = factory.make_UUID()
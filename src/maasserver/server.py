@@ -31,6 +31,14 @@ def runWorkerServices():
     runService("maas-regiond-worker")
 
 
+def runPreloader():
+    """Preload the region and fork the workers requested by the master."""
+    # Install the reactor before anything imports it.
+    import provisioningserver.server  # noqa
+    from maasserver.workers import WorkerPreloader
+    WorkerPreloader(runWorkerServices).run()
+
+
 def parse():
     """Parse the command-line arguments."""
     parser = argparse.ArgumentParser(
@@ -42,6 +50,9 @@ def parse():
     parser.add_argument(
         '-w', '--workers', metavar='N', type=int, help=(
             "Number of worker process to spawn."))
+    parser.add_argument(
+        '-p', '--preload', action='store_true', help=(
+            "Load the region once and fork the workers from it."))
     return parser.parse_args()
 
 
@@ -64,8 +75,17 @@ def run():
         runWorkerServices()
         return
 
+    # The preloader forks the workers, which inherit its signal handling.
+    if os.environ.get('MAAS_REGIOND_PROCESS_MODE') == 'preloader':
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        runPreloader()
+        return
+
     # Circular imports.
-    from maasserver.workers import set_max_workers_count
+    from maasserver.workers import (
+        set_max_workers_count,
+        set_preload_workers,
+    )
 
     # Debug mode, run the all-in-one mode.
     if args.debug:
@@ -73,20 +93,23 @@ def run():
         runAllInOneServices()
         return
 
-    # Calculate the number of workers.
+    # Calculate the number of workers, and whether to preload them.
     worker_count = args.workers
-    if not worker_count:
+    preload = args.preload
+    if not worker_count or not preload:
         from maasserver.config import RegionConfiguration
         try:
             with RegionConfiguration.open() as config:
-                worker_count = config.num_workers
+                worker_count = worker_count or config.num_workers
+                preload = preload or config.preload_workers
         except:
-            worker_count = 4
+            worker_count = worker_count or 4
     if worker_count <= 0:
         raise ValueError('Number of workers must be greater than zero.')
 
     # Set the maximum number of workers.
     set_max_workers_count(worker_count)
+    set_preload_workers(preload)
 
     # Start the master services, which will spawn the required workers.
     runMasterServices()
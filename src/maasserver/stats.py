@@ -4,14 +4,21 @@
 """Boot Resources."""
 
 __all__ = [
+    "get_inventory_stats",
     "StatsService",
     "STATS_SERVICE_PERIOD",
+    "StatsSummaryService",
+    "update_inventory_stats",
 ]
 
 from datetime import timedelta
 
 from django.db.models import Sum
-from maasserver.models import Config
+from maasserver.models import (
+    Config,
+    StatsSummary,
+)
+from maasserver.models.timestampedmodel import now
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
 from provisioningserver.logger import LegacyLogger
@@ -175,6 +182,64 @@ def get_maas_stats():
     })
 
 
+def compute_inventory_stats():
+    """Compute the inventory statistics exported to Prometheus.
+
+    This aggregates over all nodes, pods and subnets, so it's expensive.
+    """
+    architectures = get_machines_by_architecture()
+    return {
+        "maas_stats": json.loads(get_maas_stats()),
+        # Keys must be strings to be stored as JSON.
+        "machine_arches": {
+            str(arch): count for arch, count in architectures.items()},
+        "kvm_pods": get_kvm_pods_stats(),
+    }
+
+
+# Name of the summary holding the inventory statistics.
+INVENTORY_STATS = "inventory"
+
+
+def update_inventory_stats(changed=True):
+    """Recompute the inventory statistics summary, if it needs it.
+
+    The summary is recomputed if it's missing or older than
+    `STATS_SUMMARY_MAX_AGE`. When `changed` is true, i.e. something the stats
+    cover may have changed, it's also recomputed once it's older than
+    `STATS_SUMMARY_INTERVAL`. The age check means that only one region
+    recomputes the summary per interval, however many are running.
+
+    :return: True if the summary was recomputed.
+    """
+    summary = StatsSummary.objects.get_summary(INVENTORY_STATS)
+    if summary is not None:
+        age = now() - summary.updated
+        if age < STATS_SUMMARY_INTERVAL:
+            return False
+        elif age < STATS_SUMMARY_MAX_AGE and not changed:
+            return False
+    StatsSummary.objects.set_summary(
+        INVENTORY_STATS, compute_inventory_stats())
+    return True
+
+
+def get_inventory_stats():
+    """Return the inventory statistics and when they were computed.
+
+    The statistics are read from the summary maintained by
+    `StatsSummaryService`. They're computed on the spot only if there's no
+    summary yet.
+
+    :return: A ``(stats, updated)`` tuple.
+    """
+    summary = StatsSummary.objects.get_summary(INVENTORY_STATS)
+    if summary is None:
+        summary = StatsSummary.objects.set_summary(
+            INVENTORY_STATS, compute_inventory_stats())
+    return summary.data, summary.updated
+
+
 def get_request_params():
     return {
         "data": base64.b64encode(
@@ -220,3 +285,65 @@ class StatsService(TimerService, object):
         d = deferToDatabase(transactional(determine_stats_request))
         d.addErrback(log.err, "Failure performing user agent request.")
         return d
+
+
+# How often the stats summary is checked for staleness.
+STATS_SUMMARY_INTERVAL = timedelta(seconds=60)
+
+# Maximum age of the stats summary, even when nothing appears to change.
+STATS_SUMMARY_MAX_AGE = timedelta(minutes=15)
+
+
+class StatsSummaryService(TimerService):
+    """Service to keep the inventory statistics summary up to date.
+
+    The postgres listener tells the service when nodes, pods or networks
+    change. The summary is recomputed at most once per interval after a
+    change, and periodically regardless, see `update_inventory_stats`.
+    """
+
+    # Notification channels for objects the inventory stats cover.
+    channels = (
+        "machine", "controller", "device", "pod",
+        "subnet", "vlan", "fabric", "space",
+    )
+
+    def __init__(self, postgresListener=None):
+        super(StatsSummaryService, self).__init__(
+            STATS_SUMMARY_INTERVAL.total_seconds(), self.maybe_update_summary)
+        self.listener = postgresListener
+        # Assume something changed while we weren't listening.
+        self.changed = True
+
+    def startService(self):
+        super(StatsSummaryService, self).startService()
+        if self.listener is not None:
+            for channel in self.channels:
+                self.listener.register(channel, self.mark_changed)
+
+    def stopService(self):
+        if self.listener is not None:
+            for channel in self.channels:
+                self.listener.unregister(channel, self.mark_changed)
+        return super(StatsSummaryService, self).stopService()
+
+    def mark_changed(self, action, obj_id):
+        """Called by the postgres listener when an object changes."""
+        self.changed = True
+
+    def maybe_update_summary(self):
+        changed, self.changed = self.changed, False
+
+        def updated(recomputed):
+            # A change seen too soon after the last update is picked up next
+            # time around.
+            if changed and not recomputed:
+                self.changed = True
+
+        def failed(failure):
+            self.changed = self.changed or changed
+            log.err(failure, "Failure updating the stats summary.")
+
+        d = deferToDatabase(transactional(update_inventory_stats), changed)
+        d.addCallbacks(updated, failed)
+        return d
@@ -507,6 +507,43 @@ class TestSimpleStreamsHandler(MAASServerTestCase):
         self.assertIsInstance(response, StreamingHttpResponse)
 
 
+class TestGetByteRange(MAASTestCase):
+    """Tests for `get_byte_range`."""
+
+    def test_returns_None_without_header(self):
+        self.assertIsNone(bootresources.get_byte_range(None, 100))
+
+    def test_returns_range(self):
+        self.assertEqual(
+            (10, 19), bootresources.get_byte_range("bytes=10-19", 100))
+
+    def test_returns_range_to_end(self):
+        self.assertEqual(
+            (10, 99), bootresources.get_byte_range("bytes=10-", 100))
+
+    def test_returns_range_limited_to_size(self):
+        self.assertEqual(
+            (10, 99), bootresources.get_byte_range("bytes=10-200", 100))
+
+    def test_returns_suffix_range(self):
+        self.assertEqual(
+            (90, 99), bootresources.get_byte_range("bytes=-10", 100))
+        self.assertEqual(
+            (0, 99), bootresources.get_byte_range("bytes=-200", 100))
+
+    def test_ignores_unsupported_ranges(self):
+        for header in (
+                "bytes=0-1,5-6", "items=0-1", "bytes=5-1", "bytes=-",
+                "bytes=a-b", "bytes"):
+            self.assertIsNone(
+                bootresources.get_byte_range(header, 100), header)
+
+    def test_raises_ValueError_for_unsatisfiable_range(self):
+        for header in ("bytes=100-", "bytes=200-300", "bytes=-0"):
+            self.assertRaises(
+                ValueError, bootresources.get_byte_range, header, 100)
+
+
 class TestConnectionWrapper(MAASTransactionServerTestCase):
     """Tests the use of StreamingHttpResponse(ConnectionWrapper(stream)).
 
@@ -569,6 +606,26 @@ class TestConnectionWrapper(MAASTransactionServerTestCase):
         self.read_response(response)
         self.assertThat(mock_get_new_connection, MockCalledOnceWith())
 
+    def test_download_returns_requested_range(self):
+        content, url = self.make_file_for_client()
+        client = MAASSensibleClient()
+        response = client.get(url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(http.client.PARTIAL_CONTENT, response.status_code)
+        self.assertEqual(content[100:], self.read_response(response))
+        self.assertEqual(
+            'bytes 100-%d/%d' % (len(content) - 1, len(content)),
+            response['Content-Range'])
+        self.assertEqual(str(len(content) - 100), response['Content-Length'])
+
+    def test_download_rejects_unsatisfiable_range(self):
+        content, url = self.make_file_for_client()
+        client = MAASSensibleClient()
+        response = client.get(url, HTTP_RANGE='bytes=%d-' % len(content))
+        self.assertEqual(
+            http.client.REQUESTED_RANGE_NOT_SATISFIABLE, response.status_code)
+        self.assertEqual(
+            'bytes */%d' % len(content), response['Content-Range'])
+
     def test_download_connection_is_not_same_as_django_connections(self):
         content, url = self.make_file_for_client()
 
@@ -1766,7 +1823,7 @@ class TestImportImages(MAASTransactionServerTestCase):
 
     def test__import_resources_has_env_http_and_https_proxy_set(self):
         proxy_address = factory.make_name('proxy')
-        self.patch(signals.bootsources, "post_commit_do")
+        self.patch(signals.bootsources, "post_commit_do_once")
         Config.objects.set_config('http_proxy', proxy_address)
 
         fake_image_descriptions = self.patch(
@@ -1794,7 +1851,7 @@ class TestImportImages(MAASTransactionServerTestCase):
 
     def test__restarts_import_if_source_changed(self):
         # Regression test for LP:1766370
-        self.patch(signals.bootsources, "post_commit_do")
+        self.patch(signals.bootsources, "post_commit_do_once")
         boot_source = factory.make_BootSource(
             keyring_data=factory.make_bytes())
         factory.make_BootSourceSelection(boot_source=boot_source)
@@ -1842,7 +1899,7 @@ class TestImportImages(MAASTransactionServerTestCase):
 
     def test__restarts_import_if_selection_changed(self):
         # Regression test for LP:1766370
-        self.patch(signals.bootsources, "post_commit_do")
+        self.patch(signals.bootsources, "post_commit_do_once")
         boot_source = factory.make_BootSource(
             keyring_data=factory.make_bytes())
         factory.make_BootSourceSelection(boot_source=boot_source)
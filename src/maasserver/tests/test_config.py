@@ -114,6 +114,17 @@ class TestRegionConfigurationWorkerOptions(MAASTestCase):
         # It's also stored in the configuration database.
         self.assertEqual({'num_workers': workers}, config.store)
 
+    def test__preload_default(self):
+        config = RegionConfiguration({})
+        self.assertFalse(config.preload_workers)
+
+    def test__preload_set_and_get(self):
+        config = RegionConfiguration({})
+        config.preload_workers = 'true'
+        self.assertTrue(config.preload_workers)
+        # It's also stored in the configuration database.
+        self.assertEqual({'preload_workers': True}, config.store)
+
 
 class TestRegionConfigurationDebugOptions(MAASTestCase):
     """Tests for the debug options in `RegionConfiguration`."""
@@ -121,6 +132,7 @@ class TestRegionConfigurationDebugOptions(MAASTestCase):
     options_and_defaults = {
         "debug": False,
         "debug_queries": False,
+        "debug_profiler": False,
     }
 
     scenarios = tuple(
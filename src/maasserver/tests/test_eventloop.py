@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for `maasserver.eventloop`."""
@@ -377,6 +377,22 @@ class TestFactories(MAASTestCase):
         self.assertTrue(
             eventloop.loop.factories["stats"]["only_on_master"])
 
+    def test_make_StatsSummaryService(self):
+        service = eventloop.make_StatsSummaryService(
+            FakePostgresListenerService())
+        self.assertThat(service, IsInstance(
+            stats.StatsSummaryService))
+        # It is registered as a factory in RegionEventLoop.
+        self.assertIs(
+            eventloop.make_StatsSummaryService,
+            eventloop.loop.factories["stats-summary"]["factory"])
+        # Has a dependency of postgres-listener.
+        self.assertEquals(
+            ["postgres-listener-master"],
+            eventloop.loop.factories["stats-summary"]["requires"])
+        self.assertTrue(
+            eventloop.loop.factories["stats-summary"]["only_on_master"])
+
     def test_make_PrometheusService(self):
         service = eventloop.make_PrometheusService()
         self.assertThat(service, IsInstance(
@@ -388,6 +404,22 @@ class TestFactories(MAASTestCase):
         self.assertTrue(
             eventloop.loop.factories["prometheus"]["only_on_master"])
 
+    def test_make_RuntimeMetricsService(self):
+        service = eventloop.make_RuntimeMetricsService(
+            FakePostgresListenerService())
+        self.assertThat(service, IsInstance(
+            prometheus.RegionRuntimeMetricsService))
+        # It is registered as a factory in RegionEventLoop.
+        self.assertIs(
+            eventloop.make_RuntimeMetricsService,
+            eventloop.loop.factories["runtime-metrics"]["factory"])
+        # Has a dependency of postgres-listener.
+        self.assertEquals(
+            ["postgres-listener-worker"],
+            eventloop.loop.factories["runtime-metrics"]["requires"])
+        self.assertFalse(
+            eventloop.loop.factories["runtime-metrics"]["only_on_master"])
+
     def test_make_ImportResourcesService(self):
         service = eventloop.make_ImportResourcesService()
         self.assertThat(service, IsInstance(
@@ -526,6 +558,12 @@ class TestFactories(MAASTestCase):
         self.assertTrue(
             eventloop.loop.factories["workers"]["not_all_in_one"])
 
+    def test_make_WorkersService_preloaded(self):
+        self.patch(workers, "PRELOAD_WORKERS", True)
+        service = eventloop.make_WorkersService()
+        self.assertThat(service, IsInstance(
+            workers.PreloadedWorkersService))
+
     def test_make_IPCMasterService(self):
         service = eventloop.make_IPCMasterService()
         self.assertThat(service, IsInstance(
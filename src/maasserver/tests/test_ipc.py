@@ -6,9 +6,14 @@
 __all__ = []
 
 from datetime import timedelta
+from functools import partial
 import os
 import random
-from unittest.mock import MagicMock
+from unittest.mock import (
+    ANY,
+    call,
+    MagicMock,
+)
 import uuid
 
 from crochet import wait_for
@@ -36,9 +41,14 @@ from maasserver.testing.testcase import MAASTransactionServerTestCase
 from maasserver.utils.orm import reload_object
 from maasserver.utils.threads import deferToDatabase
 from maastesting.fixtures import TempDirectory
-from maastesting.matchers import MockCalledOnceWith
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockCallsMatch,
+    MockNotCalled,
+)
 from maastesting.runtest import MAASCrochetRunTest
 from maastesting.testcase import MAASTestCase
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils.twisted import (
     callOut,
     DeferredValue,
@@ -46,6 +56,7 @@ from provisioningserver.utils.twisted import (
 from testtools.matchers import MatchesStructure
 from twisted.internet import reactor
 from twisted.internet.defer import (
+    DeferredList,
     inlineCallbacks,
     succeed,
 )
@@ -283,6 +294,192 @@ class TestIPCCommunication(MAASTransactionServerTestCase):
         yield disconnected.get(timeout=2)
         yield master.stopService()
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_worker_records_rpc_connection_registration_lag(self):
+        pid = random.randint(1, 512)
+        self.patch(os, 'getpid').return_value = pid
+        master, connected, disconnected = (
+            self.make_IPCMasterService_with_wrap())
+        rpc_started = self.wrap_async_method(master, 'registerWorkerRPC')
+        yield master.startService()
+
+        worker = IPCWorkerService(reactor, socket_path=self.ipc_path)
+        rpc = RegionService(worker)
+        yield worker.startService()
+        yield rpc.startService()
+
+        yield connected.get(timeout=2)
+        yield rpc_started.get(timeout=2)
+
+        self.patch(PROMETHEUS_METRICS, 'enabled', True)
+        mock_update = self.patch(PROMETHEUS_METRICS, 'update')
+        rackd = yield deferToDatabase(factory.make_RackController)
+        connid = str(uuid.uuid4())
+        yield worker.rpcRegisterConnection(
+            connid, rackd.system_id, factory.make_ipv4_address(),
+            random.randint(1000, 5000))
+        yield worker.rpcUnregisterConnection(connid)
+        self.assertThat(mock_update, MockCallsMatch(
+            call(
+                'maas_rpc_connection_registration_lag', 'observe',
+                value=ANY, labels={'action': 'register'}),
+            call(
+                'maas_rpc_connection_registration_lag', 'observe',
+                value=ANY, labels={'action': 'unregister'})))
+
+        yield rpc.stopService()
+        yield worker.stopService()
+        yield disconnected.get(timeout=2)
+        yield master.stopService()
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_rpc_connections_are_written_together(self):
+        master = self.make_IPCMasterService()
+        yield master.startService()
+
+        pid = random.randint(1, 512)
+        port = random.randint(1, 512)
+        yield master.registerWorker(pid, MagicMock())
+        yield master.registerWorkerRPC(pid, port)
+
+        record_connections = self.patch(master, '_recordConnections')
+        record_connections.side_effect = partial(
+            IPCMasterService._recordConnections, master)
+
+        racks = yield deferToDatabase(
+            lambda: [factory.make_RackController() for _ in range(3)])
+        address = factory.make_ipv4_address()
+        connections = {
+            str(uuid.uuid4()): (rack.system_id, address, port)
+            for rack in racks
+        }
+        yield DeferredList([
+            master.registerWorkerRPCConnection(pid, connid, *conn)
+            for connid, conn in connections.items()
+        ], fireOnOneErrback=True)
+
+        self.assertThat(record_connections, MockCalledOnceWith(
+            ANY, set(connections.values()), set()))
+        self.assertEquals(
+            connections, master.connections[pid]['rpc']['connections'])
+
+        def get_connections():
+            return {
+                (conn.rack_controller.system_id, conn.endpoint.address,
+                 conn.endpoint.port)
+                for conn in RegionRackRPCConnection.objects.filter(
+                    endpoint__process__pid=pid).select_related(
+                    "rack_controller", "endpoint")
+            }
+
+        recorded = yield deferToDatabase(get_connections)
+        self.assertEquals(set(connections.values()), recorded)
+
+        yield DeferredList([
+            master.unregisterWorkerRPCConnection(pid, connid)
+            for connid in connections
+        ], fireOnOneErrback=True)
+
+        self.assertThat(record_connections, MockCallsMatch(
+            call(ANY, set(connections.values()), set()),
+            call(ANY, set(), set(connections.values()))))
+        recorded = yield deferToDatabase(get_connections)
+        self.assertEquals(set(), recorded)
+
+        yield master.stopService()
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_rpc_connection_unregistered_before_written_is_not_written(self):
+        master = self.make_IPCMasterService()
+        yield master.startService()
+
+        pid = random.randint(1, 512)
+        port = random.randint(1, 512)
+        yield master.registerWorker(pid, MagicMock())
+        yield master.registerWorkerRPC(pid, port)
+
+        record_connections = self.patch(master, '_recordConnections')
+        rack = yield deferToDatabase(factory.make_RackController)
+        connid = str(uuid.uuid4())
+        registered = master.registerWorkerRPCConnection(
+            pid, connid, rack.system_id, factory.make_ipv4_address(), port)
+        unregistered = master.unregisterWorkerRPCConnection(pid, connid)
+        yield DeferredList(
+            [registered, unregistered], fireOnOneErrback=True)
+
+        self.assertThat(record_connections, MockNotCalled())
+        self.assertEquals({}, master.connections[pid]['rpc']['connections'])
+
+        yield master.stopService()
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_rpc_connection_reconnected_before_written_is_kept(self):
+        master = self.make_IPCMasterService()
+        yield master.startService()
+
+        pid = random.randint(1, 512)
+        port = random.randint(1, 512)
+        yield master.registerWorker(pid, MagicMock())
+        yield master.registerWorkerRPC(pid, port)
+
+        rack = yield deferToDatabase(factory.make_RackController)
+        conn = (rack.system_id, factory.make_ipv4_address(), port)
+        connid = str(uuid.uuid4())
+        yield master.registerWorkerRPCConnection(pid, connid, *conn)
+
+        # The rack controller reconnects before the lost connection has
+        # been written.
+        new_connid = str(uuid.uuid4())
+        unregistered = master.unregisterWorkerRPCConnection(pid, connid)
+        registered = master.registerWorkerRPCConnection(
+            pid, new_connid, *conn)
+        yield DeferredList(
+            [unregistered, registered], fireOnOneErrback=True)
+
+        def get_connections():
+            return {
+                (conn.rack_controller.system_id, conn.endpoint.address,
+                 conn.endpoint.port)
+                for conn in RegionRackRPCConnection.objects.filter(
+                    endpoint__process__pid=pid).select_related(
+                    "rack_controller", "endpoint")
+            }
+
+        recorded = yield deferToDatabase(get_connections)
+        self.assertEquals({conn}, recorded)
+        self.assertEquals(
+            {new_connid: conn}, master.connections[pid]['rpc']['connections'])
+
+        yield master.stopService()
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_registering_rpc_connection_updates_rackd_status(self):
+        master = self.make_IPCMasterService()
+        yield master.startService()
+
+        pid = random.randint(1, 512)
+        port = random.randint(1, 512)
+        yield master.registerWorker(pid, MagicMock())
+        yield master.registerWorkerRPC(pid, port)
+
+        rack = yield deferToDatabase(factory.make_RackController)
+        yield master.registerWorkerRPCConnection(
+            pid, str(uuid.uuid4()), rack.system_id,
+            factory.make_ipv4_address(), port)
+
+        def get_rackd_status():
+            return Service.objects.get(node=rack, name="rackd").status
+
+        status = yield deferToDatabase(get_rackd_status)
+        self.assertEquals(SERVICE_STATUS.RUNNING, status)
+
+        yield master.stopService()
+
     @wait_for_reactor
     @inlineCallbacks
     def test_update_creates_process_when_removed(self):
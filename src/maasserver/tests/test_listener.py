@@ -228,6 +228,18 @@ class TestPostgresListenerService(MAASServerTestCase):
         finally:
             yield listener.stopService()
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__tryConnection_increments_generation(self):
+        listener = PostgresListenerService()
+        self.assertEqual(0, listener.generation)
+
+        yield listener.tryConnection()
+        try:
+            self.assertEqual(1, listener.generation)
+        finally:
+            yield listener.stopService()
+
     @wait_for_reactor
     @inlineCallbacks
     def test__tryConnection_logs_error(self):
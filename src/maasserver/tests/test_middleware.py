@@ -9,7 +9,11 @@ import http.client
 import json
 import logging
 import random
-from unittest.mock import Mock
+from unittest.mock import (
+    ANY,
+    call,
+    Mock,
+)
 
 from crochet import TimeoutError
 from django.conf import settings
@@ -41,6 +45,7 @@ from maasserver.middleware import (
     ExternalAuthInfoMiddleware,
     ExternalComponentsMiddleware,
     is_public_path,
+    PrometheusRequestMetricsMiddleware,
     RPCErrorsMiddleware,
 )
 from maasserver.models.config import Config
@@ -52,7 +57,10 @@ from maasserver.utils.orm import (
     make_deadlock_failure,
     make_serialization_failure,
 )
-from maastesting.matchers import MockCalledOnceWith
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockNotCalled,
+)
 from maastesting.utils import sample_binary_data
 from provisioningserver.rpc.exceptions import (
     NoConnectionsAvailable,
@@ -62,6 +70,7 @@ from provisioningserver.utils.shell import ExternalProcessError
 from testtools.matchers import (
     Contains,
     Equals,
+    GreaterThan,
     Not,
 )
 
@@ -688,3 +697,39 @@ class TestExternalAuthInfoMiddleware(MAASServerTestCase):
         self.assertEqual(request.external_auth_info.type, 'candid')
         self.assertEqual(
             request.external_auth_info.url, 'https://example.com')
+
+
+class TestPrometheusRequestMetricsMiddleware(MAASServerTestCase):
+
+    def process_request(self, request):
+
+        def get_response(request):
+            # Make a couple of queries.
+            Config.objects.get_config('maas_name')
+            Config.objects.get_config('prometheus_enabled')
+            return HttpResponse()
+
+        middleware = PrometheusRequestMetricsMiddleware(get_response)
+        return middleware(request)
+
+    def test_does_nothing_when_metrics_disabled(self):
+        metrics = middleware_module.PROMETHEUS_METRICS
+        self.patch(metrics, 'enabled', False)
+        mock_update = self.patch(metrics, 'update')
+        self.process_request(factory.make_fake_request('/'))
+        self.assertThat(mock_update, MockNotCalled())
+
+    def test_records_query_count_and_latency(self):
+        metrics = middleware_module.PROMETHEUS_METRICS
+        self.patch(metrics, 'enabled', True)
+        mock_update = self.patch(metrics, 'update')
+        self.process_request(factory.make_fake_request('/'))
+        count_call, latency_call = mock_update.call_args_list
+        self.assertEqual(
+            ('maas_http_request_query_count', 'observe'), count_call[0])
+        self.assertThat(count_call[1]['value'], GreaterThan(0))
+        self.assertEqual(
+            call(
+                'maas_http_request_query_latency', 'observe', value=ANY,
+                labels={'method': 'GET'}),
+            latency_call)
@@ -16,14 +16,19 @@ from maasserver.plugin import (
     RegionMasterServiceMaker,
     RegionWorkerServiceMaker,
 )
+from maasserver.testing.config import RegionConfigurationFixture
 from maasserver.utils.orm import (
     disable_all_database_connections,
     DisabledDatabaseConnection,
     enable_all_database_connections,
 )
-from maastesting.matchers import MockCalledOnceWith
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase
 from provisioningserver import logger
+from provisioningserver.utils.profiler import PROFILER
 from provisioningserver.utils.twisted import (
     asynchronous,
     ThreadPool,
@@ -123,6 +128,7 @@ class TestRegionWorkerServiceMaker(TestServiceMaker):
             "status-worker",
             "web",
             "ipc-worker",
+            "runtime-metrics",
         ]
         self.assertItemsEqual(expected_services, service.namedServices.keys())
         self.assertEqual(
@@ -153,6 +159,7 @@ class TestRegionWorkerServiceMaker(TestServiceMaker):
             "status-worker",
             "web",
             "ipc-worker",
+            "runtime-metrics",
             "import-resources",
             "import-resources-progress",
         ]
@@ -190,6 +197,20 @@ class TestRegionWorkerServiceMaker(TestServiceMaker):
         service_maker.makeService(Options())
         self.assertConnectionsDisabled()
 
+    def test_configureProfiler_starts_profiler_when_enabled(self):
+        self.useFixture(RegionConfigurationFixture(debug_profiler=True))
+        callWhenRunning = self.patch(reactor, "callWhenRunning")
+        service_maker = RegionWorkerServiceMaker("Harry", "Hill")
+        service_maker._configureProfiler()
+        self.assertThat(callWhenRunning, MockCalledOnceWith(PROFILER.start))
+
+    def test_configureProfiler_does_nothing_by_default(self):
+        self.useFixture(RegionConfigurationFixture())
+        callWhenRunning = self.patch(reactor, "callWhenRunning")
+        service_maker = RegionWorkerServiceMaker("Harry", "Hill")
+        service_maker._configureProfiler()
+        self.assertThat(callWhenRunning, MockNotCalled())
+
 
 class TestRegionMasterServiceMaker(TestServiceMaker):
     """Tests for `maasserver.plugin.RegionMasterServiceMaker`."""
@@ -228,6 +249,7 @@ class TestRegionMasterServiceMaker(TestServiceMaker):
             "service-monitor",
             "status-monitor",
             "stats",
+            "stats-summary",
             "prometheus",
             "postgres-listener-master",
             "networks-monitor",
@@ -317,12 +339,14 @@ class TestRegionAllInOneServiceMaker(TestServiceMaker):
             "status-worker",
             "web",
             "ipc-worker",
+            "runtime-metrics",
             # Master services.
             "region-controller",
             "nonce-cleanup",
             "dns-publication-cleanup",
             "status-monitor",
             "stats",
+            "stats-summary",
             "prometheus",
             "import-resources",
             "import-resources-progress",
@@ -9,7 +9,10 @@ import http.client
 import json
 
 from django.db import transaction
-from maasserver import prometheus
+from maasserver import (
+    prometheus,
+    stats,
+)
 from maasserver.models import Config
 from maasserver.prometheus import (
     get_stats_for_prometheus,
@@ -62,6 +65,17 @@ class TestPrometheusHandler(MAASServerTestCase):
         response = self.client.get(reverse('metrics'))
         self.assertEqual(metrics, response.content.decode("unicode_escape"))
 
+    def test_prometheus_handler_includes_runtime_metrics(self):
+        Config.objects.set_config('prometheus_enabled', True)
+        self.patch(prometheus, "CollectorRegistry")
+        self.patch(prometheus, "Gauge")
+        self.patch(prometheus, "generate_latest").return_value = b"stats\n"
+        runtime_metrics = self.patch(prometheus, "PROMETHEUS_METRICS")
+        runtime_metrics.enabled = True
+        runtime_metrics.generate_latest.return_value = b"runtime\n"
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(b"stats\nruntime\n", response.content)
+
 
 class TestPrometheus(MAASServerTestCase):
 
@@ -86,21 +100,21 @@ class TestPrometheus(MAASServerTestCase):
                 "total_cpus": 0,
             },
         }
-        mock = self.patch(prometheus, "get_maas_stats")
+        mock = self.patch(stats, "get_maas_stats")
         mock.return_value = json.dumps(values)
         # architecture
         arches = {
             "amd64": 0,
             "i386": 0,
         }
-        mock_arches = self.patch(prometheus, "get_machines_by_architecture")
+        mock_arches = self.patch(stats, "get_machines_by_architecture")
         mock_arches.return_value = arches
         # pods
         pods = {
             "kvm_pods": 0,
             "kvm_machines": 0,
         }
-        mock_pods = self.patch(prometheus, "get_kvm_pods_stats")
+        mock_pods = self.patch(stats, "get_kvm_pods_stats")
         mock_pods.return_value = pods
         get_stats_for_prometheus()
         self.assertThat(
@@ -110,6 +124,25 @@ class TestPrometheus(MAASServerTestCase):
         self.assertThat(
             mock_pods, MockCalledOnce())
 
+    def test_get_stats_for_prometheus_uses_summary(self):
+        self.patch(prometheus, "CollectorRegistry")
+        self.patch(prometheus, "Gauge")
+        mock = self.patch(stats, "compute_inventory_stats")
+        mock.return_value = {
+            "maas_stats": {
+                "machine_status": {},
+                "controllers": {},
+                "nodes": {},
+                "network_stats": {},
+                "machine_stats": {},
+            },
+            "machine_arches": {},
+            "kvm_pods": {},
+        }
+        get_stats_for_prometheus()
+        get_stats_for_prometheus()
+        self.assertThat(mock, MockCalledOnce())
+
     def test_push_stats_to_prometheus(self):
         factory.make_RegionRackController()
         maas_name = 'random.maas'
@@ -183,3 +216,26 @@ class TestPrometheusServiceAsync(MAASTransactionServerTestCase):
         maybe_push_prometheus_stats().wait(5)
 
         self.assertThat(mock_call, MockNotCalled())
+
+
+class TestRegionRuntimeMetricsService(MAASTransactionServerTestCase):
+    """Tests for `RegionRuntimeMetricsService`."""
+
+    def setUp(self):
+        super(TestRegionRuntimeMetricsService, self).setUp()
+        self.patch(prometheus, "PROMETHEUS", True)
+        self.metrics = self.patch(prometheus, "PROMETHEUS_METRICS")
+
+    def test_refreshEnabled_enables_metrics(self):
+        with transaction.atomic():
+            Config.objects.set_config('prometheus_enabled', True)
+        service = prometheus.RegionRuntimeMetricsService()
+        asynchronous(service.refreshEnabled)().wait(5)
+        self.assertThat(self.metrics.enable, MockCalledOnceWith())
+
+    def test_refreshEnabled_disables_metrics(self):
+        with transaction.atomic():
+            Config.objects.set_config('prometheus_enabled', False)
+        service = prometheus.RegionRuntimeMetricsService()
+        asynchronous(service.refreshEnabled)().wait(5)
+        self.assertThat(self.metrics.disable, MockCalledOnceWith())
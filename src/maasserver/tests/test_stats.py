@@ -17,18 +17,22 @@ from maasserver.models import (
     Fabric,
     Node,
     Space,
+    StatsSummary,
     Subnet,
     VLAN,
 )
 from maasserver.stats import (
+    get_inventory_stats,
     get_kvm_pods_stats,
     get_maas_stats,
     get_machine_stats,
     get_machines_by_architecture,
     get_request_params,
     make_maas_user_agent_request,
+    update_inventory_stats,
 )
 from maasserver.testing.factory import factory
+from maasserver.testing.listener import FakePostgresListenerService
 from maasserver.testing.testcase import (
     MAASServerTestCase,
     MAASTransactionServerTestCase,
@@ -42,7 +46,10 @@ from maastesting.twisted import extract_result
 from provisioningserver.utils.twisted import asynchronous
 import requests as requests_module
 from twisted.application.internet import TimerService
-from twisted.internet.defer import fail
+from twisted.internet.defer import (
+    fail,
+    succeed,
+)
 
 
 class TestMAASStats(MAASServerTestCase):
@@ -250,3 +257,104 @@ class TestStatsServiceAsync(MAASTransactionServerTestCase):
         maybe_make_stats_request().wait(5)
 
         self.assertThat(mock_call, MockNotCalled())
+
+
+class TestInventoryStats(MAASServerTestCase):
+    """Tests for the inventory statistics summary."""
+
+    def test_get_inventory_stats_computes_missing_summary(self):
+        factory.make_Machine(architecture='amd64/generic')
+        inventory, updated = get_inventory_stats()
+        self.assertEqual(
+            json.loads(get_maas_stats()), inventory['maas_stats'])
+        self.assertEqual({'amd64': 1}, inventory['machine_arches'])
+        self.assertEqual(
+            StatsSummary.objects.get(name=stats.INVENTORY_STATS).updated,
+            updated)
+
+    def test_get_inventory_stats_uses_summary(self):
+        StatsSummary.objects.set_summary(
+            stats.INVENTORY_STATS, {'cached': True})
+        mock_compute = self.patch(stats, "compute_inventory_stats")
+        inventory, _ = get_inventory_stats()
+        self.assertEqual({'cached': True}, inventory)
+        self.assertThat(mock_compute, MockNotCalled())
+
+    def test_update_inventory_stats_creates_summary(self):
+        self.assertTrue(update_inventory_stats(changed=False))
+        self.assertIsNotNone(
+            StatsSummary.objects.get_summary(stats.INVENTORY_STATS))
+
+    def test_update_inventory_stats_skips_fresh_summary(self):
+        StatsSummary.objects.set_summary(stats.INVENTORY_STATS, {})
+        self.assertFalse(update_inventory_stats(changed=True))
+
+    def test_update_inventory_stats_on_change_after_interval(self):
+        summary = StatsSummary.objects.set_summary(stats.INVENTORY_STATS, {})
+        self.patch(stats, "now").return_value = (
+            summary.updated + stats.STATS_SUMMARY_INTERVAL)
+        self.assertFalse(update_inventory_stats(changed=False))
+        self.assertTrue(update_inventory_stats(changed=True))
+
+    def test_update_inventory_stats_after_max_age(self):
+        summary = StatsSummary.objects.set_summary(stats.INVENTORY_STATS, {})
+        self.patch(stats, "now").return_value = (
+            summary.updated + stats.STATS_SUMMARY_MAX_AGE)
+        self.assertTrue(update_inventory_stats(changed=False))
+
+
+class TestStatsSummaryService(MAASTestCase):
+    """Tests for `StatsSummaryService`."""
+
+    def test__is_a_TimerService(self):
+        service = stats.StatsSummaryService()
+        self.assertIsInstance(service, TimerService)
+
+    def test__runs_every_minute(self):
+        service = stats.StatsSummaryService()
+        self.assertEqual(60, service.step)
+
+    def test__registers_and_unregisters_channels(self):
+        listener = FakePostgresListenerService()
+        service = stats.StatsSummaryService(listener)
+        self.patch(service, "maybe_update_summary")
+        service.startService()
+        self.assertItemsEqual(
+            stats.StatsSummaryService.channels, listener.listeners.keys())
+        service.stopService()
+        self.assertItemsEqual(
+            [], [
+                channel for channel, handlers in listener.listeners.items()
+                if len(handlers) > 0
+            ])
+
+    def test_mark_changed(self):
+        service = stats.StatsSummaryService()
+        service.changed = False
+        service.mark_changed("update", "id")
+        self.assertTrue(service.changed)
+
+    def test_maybe_update_summary_keeps_unhandled_change(self):
+        service = stats.StatsSummaryService()
+        deferToDatabase = self.patch(stats, "deferToDatabase")
+        deferToDatabase.return_value = succeed(False)
+        service.changed = True
+        extract_result(service.maybe_update_summary())
+        self.assertTrue(service.changed)
+
+    def test_maybe_update_summary_clears_change(self):
+        service = stats.StatsSummaryService()
+        deferToDatabase = self.patch(stats, "deferToDatabase")
+        deferToDatabase.return_value = succeed(True)
+        service.changed = True
+        extract_result(service.maybe_update_summary())
+        self.assertFalse(service.changed)
+
+    def test_maybe_update_summary_does_not_error(self):
+        service = stats.StatsSummaryService()
+        deferToDatabase = self.patch(stats, "deferToDatabase")
+        exception_type = factory.make_exception_type()
+        deferToDatabase.return_value = fail(exception_type())
+        d = service.maybe_update_summary()
+        self.assertIsNone(extract_result(d))
+        self.assertTrue(service.changed)
@@ -14,6 +14,7 @@ from maasserver import (
     eventloop,
     webapp,
 )
+from maasserver.api.conditional import ChangeTracker
 from maasserver.testing.listener import FakePostgresListenerService
 from maasserver.webapp import OverlaySite
 from maasserver.websockets.protocol import WebSocketFactory
@@ -223,6 +224,15 @@ class TestWebApplicationService(MAASTestCase):
         self.assertFalse(service.running)
         self.assertFalse(service.starting)
 
+    def test__start_installs_and_stop_uninstalls_change_tracker(self):
+        tracker = self.patch(webapp, "change_tracker", ChangeTracker())
+        service = self.make_webapp()
+        service.privilegedStartService()
+        service.startService()
+        self.assertThat(tracker.listener, Is(service.websocket.listener))
+        service.stopService()
+        self.assertThat(tracker.listener, Is(None))
+
     def test__successful_start_installs_wsgi_resource(self):
         service = self.make_webapp()
         self.addCleanup(service.stopService)
@@ -5,24 +5,43 @@
 
 __all__ = []
 
+import asyncio
+import ctypes
 import os
 import random
+import signal
 import sys
-from unittest.mock import call
+import time
+from unittest.mock import (
+    call,
+    Mock,
+    sentinel,
+)
 
 from crochet import wait_for
+from maasserver import workers
 from maasserver.workers import (
+    PRELOADER_COMMAND_FD,
+    PRELOADER_EVENT_FD,
+    PreloadedWorker,
+    PreloadedWorkersService,
+    PreloaderProcess,
     set_max_workers_count,
+    set_preload_workers,
+    WorkerPreloader,
     WorkerProcess,
     WorkersService,
 )
 from maastesting.matchers import (
     MockCalledOnceWith,
     MockCallsMatch,
+    MockNotCalled,
 )
 from maastesting.testcase import MAASTestCase
 from provisioningserver.utils.twisted import DeferredValue
+from testtools.matchers import IsInstance
 from twisted.internet import reactor
+from twisted.internet.asyncioreactor import AsyncioSelectorReactor
 from twisted.internet.defer import inlineCallbacks
 
 
@@ -41,6 +60,14 @@ class TestWorkersCount(MAASTestCase):
         from maasserver.workers import MAX_WORKERS_COUNT
         self.assertEquals(worker_count, MAX_WORKERS_COUNT)
 
+    def test_PRELOAD_WORKERS_default_false(self):
+        self.assertFalse(workers.PRELOAD_WORKERS)
+
+    def test_set_preload_workers(self):
+        self.patch(workers, "PRELOAD_WORKERS")
+        set_preload_workers(True)
+        self.assertTrue(workers.PRELOAD_WORKERS)
+
 
 class TestWorkersService(MAASTestCase):
 
@@ -148,3 +175,223 @@ class TestWorkersService(MAASTestCase):
 
         yield dv.get(timeout=2)
         self.assertEqual({}, service.workers)
+
+
+class TestPreloadedWorker(MAASTestCase):
+
+    def test_signal_kills_by_pid(self):
+        kill = self.patch(workers.os, "kill")
+        worker = PreloadedWorker(random.randint(1, 500))
+        worker.signal("TERM")
+        self.assertThat(kill, MockCalledOnceWith(worker.pid, signal.SIGTERM))
+
+    def test_signal_ignores_missing_process(self):
+        kill = self.patch(workers.os, "kill")
+        kill.side_effect = ProcessLookupError()
+        PreloadedWorker(random.randint(1, 500)).signal("KILL")
+
+
+class TestPreloaderProcess(MAASTestCase):
+
+    def test_spawnWorker_writes_command(self):
+        preloader = PreloaderProcess(sentinel.service)
+        preloader.makeConnection(self.patch(preloader, "transport"))
+        preloader.spawnWorker(True)
+        preloader.spawnWorker()
+        self.assertThat(
+            preloader.transport.writeToChild, MockCallsMatch(
+                call(PRELOADER_COMMAND_FD, b"spawn 1\n"),
+                call(PRELOADER_COMMAND_FD, b"spawn 0\n")))
+
+    def test_childDataReceived_passes_on_events(self):
+        service = PreloadedWorkersService(reactor)
+        self.patch(service, "workerStarted")
+        self.patch(service, "workerEnded")
+        preloader = PreloaderProcess(service)
+        preloader.childDataReceived(PRELOADER_EVENT_FD, b"started 12 1\nen")
+        preloader.childDataReceived(PRELOADER_EVENT_FD, b"ded 34 9\n")
+        preloader.childDataReceived(2, b"started 56 0\n")
+        self.assertThat(service.workerStarted, MockCalledOnceWith(12, True))
+        self.assertThat(service.workerEnded, MockCalledOnceWith(34, 9))
+
+    def test_processEnded_tells_service(self):
+        service = PreloadedWorkersService(reactor)
+        self.patch(service, "preloaderEnded")
+        PreloaderProcess(service).processEnded(sentinel.status)
+        self.assertThat(
+            service.preloaderEnded, MockCalledOnceWith(sentinel.status))
+
+
+class TestPreloadedWorkersService(MAASTestCase):
+
+    def make_service(self, worker_count=4):
+        service = PreloadedWorkersService(reactor, worker_count=worker_count)
+        self.patch(service, "_spawnPreloader").side_effect = (
+            lambda: setattr(service, "preloader", PreloaderProcess(service)))
+        self.patch(PreloaderProcess, "spawnWorker")
+        return service
+
+    def test_spawnWorkers_spawns_preloader_once(self):
+        service = self.make_service()
+        service.spawnWorkers()
+        service.spawnWorkers()
+        self.assertThat(service._spawnPreloader, MockCalledOnceWith())
+
+    def test_spawnWorkers_counts_workers_being_spawned(self):
+        service = self.make_service(worker_count=3)
+        service.spawnWorkers()
+        service.spawnWorkers()
+        self.assertEqual([True, False, False], service.spawning)
+        self.assertThat(
+            service.preloader.spawnWorker, MockCallsMatch(
+                call(True), call(False), call(False)))
+
+    def test_workerStarted_registers_worker(self):
+        service = self.make_service(worker_count=2)
+        service.spawnWorkers()
+        pid = random.randint(1, 500)
+        service.workerStarted(pid, True)
+        self.assertEqual([False], service.spawning)
+        self.assertThat(service.workers[pid], IsInstance(PreloadedWorker))
+        self.assertTrue(service.workers[pid].runningImport)
+
+    def test_workerEnded_spawns_another(self):
+        service = self.make_service(worker_count=1)
+        service.spawnWorkers()
+        pid = random.randint(1, 500)
+        service.workerStarted(pid, True)
+        service.workerEnded(pid, 0)
+        self.assertEqual({}, service.workers)
+        self.assertEqual([True], service.spawning)
+
+    def test_workerEnded_ignores_unknown_worker(self):
+        service = self.make_service(worker_count=1)
+        self.patch(service, "unregisterWorker")
+        service.workerEnded(random.randint(1, 500), 0)
+        self.assertThat(service.unregisterWorker, MockNotCalled())
+
+    def test_preloaderEnded_respawns_preloader_and_workers(self):
+        service = self.make_service(worker_count=2)
+        service.spawnWorkers()
+        service.workerStarted(random.randint(1, 500), True)
+        service.preloaderEnded(sentinel.status)
+        self.assertEqual({}, service.workers)
+        self.assertEqual([True, False], service.spawning)
+        self.assertThat(
+            service._spawnPreloader, MockCallsMatch(call(), call()))
+
+    def test_stopService_kills_workers_and_preloader(self):
+        service = self.make_service(worker_count=1)
+        service.spawnWorkers()
+        pid = random.randint(1, 500)
+        service.workerStarted(pid, True)
+        self.patch(service.workers[pid], "signal")
+        self.patch(service.preloader, "signal")
+        service.preloader.pid = random.randint(501, 1000)
+        service.stopService()
+        self.assertThat(
+            service.workers[pid].signal, MockCalledOnceWith("KILL"))
+        self.assertThat(service.preloader.signal, MockCalledOnceWith("KILL"))
+        service.workerEnded(pid, 0)
+        self.assertEqual([], service.spawning)
+
+
+class TestWorkerPreloader(MAASTestCase):
+
+    def make_pipe(self):
+        read_fd, write_fd = os.pipe()
+        for fd in (read_fd, write_fd):
+            self.addCleanup(self.close, fd)
+        return read_fd, write_fd
+
+    def close(self, fd):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+    def make_preloader(self, run_worker):
+        command_fd, self.command_w = self.make_pipe()
+        self.event_r, event_fd = self.make_pipe()
+        preloader = WorkerPreloader(
+            run_worker, command_fd=command_fd, event_fd=event_fd)
+        preloader.wakeup = self.make_pipe()
+        self.patch(preloader, "preload")
+        self.patch(preloader, "_resetReactor")
+        return preloader
+
+    def reap(self, preloader):
+        for _ in range(500):
+            preloader.reapWorkers()
+            if not preloader.workers:
+                break
+            time.sleep(0.01)
+
+    def test_spawnWorker_forks_worker(self):
+        output_r, output_w = self.make_pipe()
+
+        def run_worker():
+            os.write(output_w, ("%s %s" % (
+                os.environ['MAAS_REGIOND_PROCESS_MODE'],
+                os.environ['MAAS_REGIOND_RUN_IMPORTER_SERVICE'],
+            )).encode("ascii"))
+
+        preloader = self.make_preloader(run_worker)
+        preloader.spawnWorker(True)
+        [pid] = preloader.workers
+        self.assertEqual(
+            b"started %d 1\n" % pid, os.read(self.event_r, 4096))
+        self.assertEqual(b"worker true", os.read(output_r, 4096))
+        self.reap(preloader)
+        self.assertEqual(b"ended %d 0\n" % pid, os.read(self.event_r, 4096))
+
+    def test_spawnWorker_makes_worker_die_with_preloader(self):
+        output_r, output_w = self.make_pipe()
+
+        def run_worker():
+            signum = ctypes.c_int()
+            libc = ctypes.CDLL("libc.so.6")
+            libc.prctl(2, ctypes.byref(signum))  # PR_GET_PDEATHSIG
+            os.write(output_w, b"%d" % signum.value)
+
+        preloader = self.make_preloader(run_worker)
+        preloader.spawnWorker()
+        self.assertEqual(b"%d" % signal.SIGKILL, os.read(output_r, 4096))
+        self.reap(preloader)
+
+    def test_prepareWorker_exits_if_preloader_has_gone(self):
+        preloader = self.make_preloader(sentinel.run_worker)
+        set_pdeathsig = self.patch(workers, "_set_pdeathsig")
+        self.patch(workers.os, "getppid").return_value = 1
+        error = self.assertRaises(
+            SystemExit, preloader._prepareWorker, False, os.getpid())
+        self.assertEqual(1, error.code)
+        self.assertThat(set_pdeathsig, MockCalledOnceWith(signal.SIGKILL))
+
+    def test_resetReactor_keeps_system_event_triggers(self):
+        old_loop = asyncio.new_event_loop()
+        self.addCleanup(old_loop.close)
+        self.addCleanup(asyncio.set_event_loop, None)
+        reactor = AsyncioSelectorReactor(old_loop)
+        self.addCleanup(reactor.waker.connectionLost, None)
+        trigger = Mock()
+        reactor.addSystemEventTrigger("before", "startup", trigger, 1, a=2)
+        startup = reactor._eventTriggers["startup"]
+        expected = startup.before + startup.during
+        preloader = WorkerPreloader(
+            sentinel.run_worker, command_fd=0, event_fd=1)
+        preloader._resetReactor(reactor)
+        self.addCleanup(reactor._asyncioEventloop.close)
+        self.addCleanup(reactor.waker.connectionLost, None)
+        self.assertIsNot(old_loop, reactor._asyncioEventloop)
+        startup = reactor._eventTriggers["startup"]
+        self.assertEqual(expected, startup.before + startup.during)
+
+    def test_run_stops_when_master_goes_away(self):
+        preloader = self.make_preloader(sentinel.run_worker)
+        self.patch(workers.signal, "set_wakeup_fd")
+        self.patch(workers.signal, "signal")
+        os.close(self.command_w)
+        preloader.run()
+        self.assertThat(preloader.preload, MockCalledOnceWith())
+        self.assertIsNone(preloader.command_fd)
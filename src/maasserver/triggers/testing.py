@@ -18,6 +18,7 @@ from maasserver.models.bmc import (
     BMC,
     Pod,
 )
+from maasserver.models.bootresource import BootResource
 from maasserver.models.cacheset import CacheSet
 from maasserver.models.config import Config
 from maasserver.models.dhcpsnippet import DHCPSnippet
@@ -37,6 +38,7 @@ from maasserver.models.node import (
     RegionController,
 )
 from maasserver.models.nodemetadata import NodeMetadata
+from maasserver.models.ownerdata import OwnerData
 from maasserver.models.packagerepository import PackageRepository
 from maasserver.models.partition import Partition
 from maasserver.models.partitiontable import PartitionTable
@@ -376,6 +378,10 @@ class TransactionalHelpersMixin:
     def delete_node_metadata(self, node, key):
         NodeMetadata.objects.filter(node=node, key=key).delete()
 
+    @transactional
+    def set_owner_data(self, node, key, value):
+        OwnerData.objects.set_owner_data(node, {key: value})
+
     @transactional
     def remove_node_from_tag(self, node, tag):
         node.tags.remove(tag)
@@ -799,6 +805,21 @@ class TransactionalHelpersMixin:
         script = Script.objects.get(id=id)
         script.delete()
 
+    @transactional
+    def create_bootresource(self, params=None):
+        if params is None:
+            params = {}
+        return factory.make_BootResource(**params)
+
+    @transactional
+    def update_bootresource(self, id, params, **kwargs):
+        return apply_update_to_model(BootResource, id, params, **kwargs)
+
+    @transactional
+    def delete_bootresource(self, id):
+        resource = BootResource.objects.get(id=id)
+        resource.delete()
+
     @transactional
     def reload_object(self, obj):
         return reload_object(obj)
@@ -123,6 +123,9 @@ class TestTriggersUsed(MAASServerTestCase):
         "bmc_pod_insert_notify",
         "bmc_pod_update_notify",
         "bmc_pod_delete_notify",
+        "bootresource_bootresource_create_notify",
+        "bootresource_bootresource_delete_notify",
+        "bootresource_bootresource_update_notify",
         "cacheset_nd_cacheset_link_notify",
         "cacheset_nd_cacheset_unlink_notify",
         "cacheset_nd_cacheset_update_notify",
@@ -220,6 +223,9 @@ class TestTriggersUsed(MAASServerTestCase):
         "notification_notification_delete_notify",
         "notification_notification_update_notify",
         "notificationdismissal_notificationdismissal_create_notify",
+        "ownerdata_ownerdata_link_notify",
+        "ownerdata_ownerdata_unlink_notify",
+        "ownerdata_ownerdata_update_notify",
         "packagerepository_packagerepository_create_notify",
         "packagerepository_packagerepository_delete_notify",
         "packagerepository_packagerepository_update_notify",
@@ -925,6 +925,65 @@ class TestNodeMetadataTriggers(
             yield listener.stopService()
 
 
+class TestOwnerDataTriggers(
+        MAASTransactionServerTestCase, TransactionalHelpersMixin):
+    """End-to-end test of both the listeners code and the triggers on
+    maasserver_ownerdata table."""
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__calls_handler_with_update_on_create(self):
+        yield deferToDatabase(register_websocket_triggers)
+        node = yield deferToDatabase(self.create_node)
+
+        listener = self.make_listener_without_delay()
+        dv = DeferredValue()
+        listener.register("machine", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            yield deferToDatabase(self.set_owner_data, node, "foo", "bar")
+            yield dv.get(timeout=2)
+            self.assertEqual(('update', '%s' % node.system_id), dv.value)
+        finally:
+            yield listener.stopService()
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__calls_handler_with_update_on_update(self):
+        yield deferToDatabase(register_websocket_triggers)
+        node = yield deferToDatabase(self.create_node)
+
+        listener = self.make_listener_without_delay()
+        dv = DeferredValue()
+        listener.register("machine", lambda *args: dv.set(args))
+        yield deferToDatabase(self.set_owner_data, node, "foo", "bar")
+        yield listener.startService()
+        try:
+            yield deferToDatabase(self.set_owner_data, node, "foo", "baz")
+            yield dv.get(timeout=2)
+            self.assertEqual(('update', '%s' % node.system_id), dv.value)
+        finally:
+            yield listener.stopService()
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__calls_handler_with_update_on_delete(self):
+        yield deferToDatabase(register_websocket_triggers)
+        node = yield deferToDatabase(self.create_node)
+
+        listener = self.make_listener_without_delay()
+        dv = DeferredValue()
+        listener.register("machine", lambda *args: dv.set(args))
+        yield deferToDatabase(self.set_owner_data, node, "foo", "bar")
+        yield listener.startService()
+        try:
+            yield deferToDatabase(self.set_owner_data, node, "foo", None)
+            yield dv.get(timeout=2)
+            self.assertEqual(('update', '%s' % node.system_id), dv.value)
+        finally:
+            yield listener.stopService()
+
+
 class TestDeviceWithParentTagListener(
         MAASTransactionServerTestCase, TransactionalHelpersMixin):
     """End-to-end test of both the listeners code and the triggers on
@@ -4489,3 +4548,59 @@ class TestScriptListener(
             self.assertEqual(('delete', '%s' % script.id), dv.value)
         finally:
             yield listener.stopService()
+
+
+class TestBootResourceListener(
+        MAASTransactionServerTestCase, TransactionalHelpersMixin):
+    """End-to-end test of both the listeners code and the boot resource
+    triggers code."""
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__calls_handler_on_create_notification(self):
+        yield deferToDatabase(register_websocket_triggers)
+        listener = self.make_listener_without_delay()
+        dv = DeferredValue()
+        listener.register("bootresource", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            resource = yield deferToDatabase(self.create_bootresource)
+            yield dv.get(timeout=2)
+            self.assertEqual(('create', '%s' % resource.id), dv.value)
+        finally:
+            yield listener.stopService()
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__calls_handler_on_update_notification(self):
+        yield deferToDatabase(register_websocket_triggers)
+        listener = self.make_listener_without_delay()
+        dv = DeferredValue()
+        listener.register("bootresource", lambda *args: dv.set(args))
+        resource = yield deferToDatabase(self.create_bootresource)
+
+        yield listener.startService()
+        try:
+            yield deferToDatabase(
+                self.update_bootresource, resource.id,
+                {'extra': {'title': factory.make_name('title')}})
+            yield dv.get(timeout=2)
+            self.assertEqual(('update', '%s' % resource.id), dv.value)
+        finally:
+            yield listener.stopService()
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__calls_handler_on_delete_notification(self):
+        yield deferToDatabase(register_websocket_triggers)
+        listener = self.make_listener_without_delay()
+        dv = DeferredValue()
+        listener.register("bootresource", lambda *args: dv.set(args))
+        resource = yield deferToDatabase(self.create_bootresource)
+        yield listener.startService()
+        try:
+            yield deferToDatabase(self.delete_bootresource, resource.id)
+            yield dv.get(timeout=2)
+            self.assertEqual(('delete', '%s' % resource.id), dv.value)
+        finally:
+            yield listener.stopService()
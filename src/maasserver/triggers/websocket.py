@@ -1342,6 +1342,22 @@ def register_websocket_triggers():
         events=EVENTS_LUU
     )
 
+    # OwnerData notifications
+    register_procedure(
+        render_node_related_notification_procedure(
+            'ownerdata_link_notify', 'NEW.node_id'))
+    register_procedure(
+        render_node_related_notification_procedure(
+            'ownerdata_update_notify', 'NEW.node_id'))
+    register_procedure(
+        render_node_related_notification_procedure(
+            'ownerdata_unlink_notify', 'OLD.node_id'))
+    register_triggers(
+        "maasserver_ownerdata",
+        "ownerdata",
+        events=EVENTS_LUU
+    )
+
     register_procedure(POOL_NODE_INSERT_NOTIFY.format(
         func_name='resourcepool_link_notify',
         pool_id='NEW.pool_id'))
@@ -2089,3 +2105,15 @@ def register_websocket_triggers():
         render_notification_procedure(
             'script_delete_notify', 'script_delete', 'OLD.id'))
     register_triggers('metadataserver_script', 'script')
+
+    # BootResource table
+    register_procedure(
+        render_notification_procedure(
+            'bootresource_create_notify', 'bootresource_create', 'NEW.id'))
+    register_procedure(
+        render_notification_procedure(
+            'bootresource_update_notify', 'bootresource_update', 'NEW.id'))
+    register_procedure(
+        render_notification_procedure(
+            'bootresource_delete_notify', 'bootresource_delete', 'OLD.id'))
+    register_triggers("maasserver_bootresource", "bootresource")
@@ -27,6 +27,7 @@ from twisted.internet import reactor
 from twisted.internet.defer import (
     CancelledError,
     Deferred,
+    DeferredList,
     maybeDeferred,
 )
 
@@ -168,16 +169,23 @@ class DeferredHooks(threading.local):
     to be run at some later time *in Twisted*. This is a common pattern in
     MAAS, where the web-application needs to arrange post-commit actions that
     mutate remote state, via RPC for example.
+
+    Hooks are normally fired one at a time, each waiting for the previous to
+    complete. Hooks added with ``concurrent=True`` are independent of one
+    another, so a run of consecutive concurrent hooks is fired together.
     """
 
     def __init__(self):
         super(DeferredHooks, self).__init__()
         self.hooks = deque()
+        self.concurrent = set()
 
     @synchronous
-    def add(self, d):
+    def add(self, d, concurrent=False):
         assert isinstance(d, Deferred)
         self.hooks.append(d)
+        if concurrent:
+            self.concurrent.add(d)
 
     @contextmanager
     def savepoint(self):
@@ -205,13 +213,22 @@ class DeferredHooks(threading.local):
     def fire(self):
         """Fire all hooks in sequence, in the reactor.
 
+        Consecutive concurrent hooks are fired together, and all of them are
+        waited for before moving on to the next hook.
+
         If a hook fails, the subsequent hooks will be cancelled (by calling
         ``.cancel()``), and the exception will propagate out of this method.
         """
         try:
             while len(self.hooks) > 0:
-                hook = self.hooks.popleft()
-                self._fire_in_reactor(hook).wait(LONGTIME)
+                if self.hooks[0] in self.concurrent:
+                    hooks = []
+                    while len(self.hooks) > 0 and self.hooks[0] in (
+                            self.concurrent):
+                        hooks.append(self._pop())
+                    self._fire_all_in_reactor(hooks).wait(LONGTIME)
+                else:
+                    self._fire_in_reactor(self._pop()).wait(LONGTIME)
         finally:
             # Ensure that any remaining hooks are cancelled.
             self.reset()
@@ -226,18 +243,38 @@ class DeferredHooks(threading.local):
         """
         try:
             while len(self.hooks) > 0:
-                hook = self.hooks.popleft()
+                hook = self._pop()
                 self._cancel_in_reactor(hook).wait(LONGTIME)
         finally:
             # Belt-n-braces.
+            self.concurrent.difference_update(self.hooks)
             self.hooks.clear()
 
+    def _pop(self):
+        hook = self.hooks.popleft()
+        self.concurrent.discard(hook)
+        return hook
+
     @staticmethod
     @asynchronous
     def _fire_in_reactor(hook):
         hook.callback(None)
         return hook
 
+    @staticmethod
+    @asynchronous
+    def _fire_all_in_reactor(hooks):
+        for hook in hooks:
+            hook.callback(None)
+
+        def check(results):
+            # Propagate the first failure, if any, once all hooks are done.
+            for success, result in results:
+                if not success:
+                    return result
+
+        return DeferredList(hooks, consumeErrors=True).addCallback(check)
+
     @staticmethod
     @asynchronous
     def _cancel_in_reactor(hook):
@@ -0,0 +1,79 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Immutable containers, for sharing structures without copying them."""
+
+__all__ = [
+    "freeze",
+    "ImmutableDict",
+    "ImmutableList",
+]
+
+
+def _immutable(self, *args, **kwargs):
+    raise TypeError("%s is immutable" % type(self).__name__)
+
+
+class ImmutableDict(dict):
+    """A `dict` that cannot be changed.
+
+    It is still a `dict`, so it can be serialised to JSON, validated against
+    a JSON schema, and copied with `dict`.
+    """
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+class ImmutableList(list):
+    """A `list` that cannot be changed.
+
+    It is still a `list`, so it can be serialised to JSON, validated against
+    a JSON schema, and copied with `list`.
+    """
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = clear = extend = insert = pop = remove = _immutable
+    reverse = sort = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+
+def freeze(thing):
+    """Return an immutable equivalent of `thing`.
+
+    Dicts, lists, tuples and sets are converted, recursively, to
+    `ImmutableDict`, `ImmutableList`, tuples and frozensets. Anything else is
+    returned as-is.
+    """
+    if isinstance(thing, ImmutableDict):
+        return thing
+    elif isinstance(thing, dict):
+        return ImmutableDict(
+            (key, freeze(value)) for key, value in thing.items())
+    elif isinstance(thing, ImmutableList):
+        return thing
+    elif isinstance(thing, list):
+        return ImmutableList(freeze(item) for item in thing)
+    elif isinstance(thing, tuple):
+        return tuple(freeze(item) for item in thing)
+    elif isinstance(thing, (set, frozenset)):
+        return frozenset(freeze(item) for item in thing)
+    else:
+        return thing
@@ -22,6 +22,7 @@ __all__ = [
     'make_unique_violation',
     'post_commit',
     'post_commit_do',
+    'post_commit_do_once',
     'psql_array',
     'request_transaction_retry',
     'retry_context',
@@ -75,13 +76,17 @@ from maasserver.exceptions import (
     MAASAPIForbidden,
 )
 from maasserver.utils.async import DeferredHooks
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils import flatten
 from provisioningserver.utils.backoff import (
     exponential_growth,
     full_jitter,
 )
 from provisioningserver.utils.network import parse_integer
-from provisioningserver.utils.twisted import callOut
+from provisioningserver.utils.twisted import (
+    callOut,
+    synchronous,
+)
 import psycopg2
 from psycopg2.errorcodes import (
     DEADLOCK_DETECTED,
@@ -602,8 +607,15 @@ class PostCommitHooks(DeferredHooks):
 
     Can be used as a context manager, to check for orphaned post-commit hooks
     on the way in, and to run newly added hooks on the way out.
+
+    Hooks can be registered under a key, in which case only the first hook
+    registered with that key in a transaction is kept; see `post_commit`.
     """
 
+    def __init__(self):
+        super(PostCommitHooks, self).__init__()
+        self.keys = {}
+
     def __enter__(self):
         if len(self.hooks) > 0:
             # Capture a textual description of the hooks to help us understand
@@ -623,11 +635,64 @@ class PostCommitHooks(DeferredHooks):
         else:
             self.reset()
 
+    @synchronous
+    def add(self, d, concurrent=False, key=None):
+        """Add `d` as a hook, optionally under `key`.
+
+        :return: The hook that will be fired: `d`, or the hook previously
+            registered under `key`, in which case `d` is *not* added.
+        """
+        if key is None:
+            super(PostCommitHooks, self).add(d, concurrent)
+            return d
+        kind = key[0] if isinstance(key, tuple) else key
+        PROMETHEUS_METRICS.update(
+            'maas_post_commit_hooks_keyed', 'inc', labels={'kind': kind})
+        existing = self.keys.get(key)
+        if existing is None:
+            super(PostCommitHooks, self).add(d, concurrent)
+            self.keys[key] = d
+            return d
+        else:
+            PROMETHEUS_METRICS.update(
+                'maas_post_commit_hooks_collapsed', 'inc',
+                labels={'kind': kind})
+            return existing
+
+    @contextmanager
+    def savepoint(self):
+        """See `DeferredHooks.savepoint`.
+
+        Keys registered within a savepoint that is rolled back are forgotten
+        along with their hooks.
+        """
+        saved = self.keys.copy()
+        try:
+            with super(PostCommitHooks, self).savepoint():
+                yield
+        except:
+            self.keys = saved
+            raise
+
+    @synchronous
+    def fire(self):
+        try:
+            super(PostCommitHooks, self).fire()
+        finally:
+            self.keys.clear()
+
+    @synchronous
+    def reset(self):
+        try:
+            super(PostCommitHooks, self).reset()
+        finally:
+            self.keys.clear()
+
 
 post_commit_hooks = PostCommitHooks()
 
 
-def post_commit(hook=None):
+def post_commit(hook=None, *, concurrent=False, key=None):
     """Add a post-commit hook, specific to this thread.
 
     :param hook: Optional, but if provided it must be either a `Deferred`
@@ -635,6 +700,14 @@ def post_commit(hook=None):
         behaviour. In the latter case, the callable will be passed exactly one
         argument when fired, a `Failure`, or `None`. If the `hook` argument is
         not provided (or is None), a new `Deferred` will be created.
+    :param concurrent: If true, this hook does not depend on, and is not
+        depended upon by, neighbouring concurrent hooks, so it can be fired
+        at the same time as them.
+    :param key: Optional, a hashable identifying the work this hook does. If
+        a hook has already been registered with the same key in this
+        transaction, that hook is returned and `hook` is discarded. A tuple
+        key's first element (or the key itself otherwise) names the kind of
+        work in metrics, so keep that part low-cardinality.
     :return: The `Deferred` that has been registered as a hook.
     """
     if hook is None:
@@ -647,8 +720,7 @@ def post_commit(hook=None):
         raise AssertionError(
             "Not a Deferred or callable: %r" % (hook,))
 
-    post_commit_hooks.add(hook)
-    return hook
+    return post_commit_hooks.add(hook, concurrent, key)
 
 
 def post_commit_do(func, *args, **kwargs):
@@ -669,6 +741,24 @@ def post_commit_do(func, *args, **kwargs):
         raise AssertionError("Not callable: %r" % (func,))
 
 
+def post_commit_do_once(key, func, *args, **kwargs):
+    """Call a function after a successful commit, once per `key`.
+
+    As `post_commit_do`, but if work has already been registered under `key`
+    in this transaction then this call is collapsed into it: `func` is not
+    called again, and the arguments from the first registration win.
+
+    :return: The `Deferred` that has been registered as a hook.
+    """
+    if not callable(func):
+        raise AssertionError("Not callable: %r" % (func,))
+    hook = Deferred()
+    added = post_commit(hook, key=key)
+    if added is hook:
+        hook.addCallback(callOut, func, *args, **kwargs)
+    return added
+
+
 @contextmanager
 def connected():
     """Context manager that ensures we're connected to the database.
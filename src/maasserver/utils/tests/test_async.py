@@ -205,6 +205,48 @@ class TestDeferredHooks(MAASTestCase, PostCommitHooksTestMixin):
         self.assertThat(d1, IsFiredDeferred())
         self.assertThat(d2, IsFiredDeferred())
 
+    def test__fire_fires_consecutive_concurrent_hooks_together(self):
+        dhooks = DeferredHooks()
+        d1, d2, d3 = Deferred(), Deferred(), Deferred()
+        waiting = []
+
+        def wait_for_other(_, other):
+            # Neither hook completes until the other has been fired.
+            waiting.append(other)
+            return deferLater(reactor, 0, lambda: other.called)
+
+        d1.addCallback(wait_for_other, d2)
+        d2.addCallback(wait_for_other, d1)
+        dhooks.add(d1, concurrent=True)
+        dhooks.add(d2, concurrent=True)
+        dhooks.add(d3)
+        dhooks.fire()
+        self.assertEqual([d2, d1], waiting)
+        self.assertTrue(extract_result(d1))
+        self.assertTrue(extract_result(d2))
+        self.assertIsNone(extract_result(d3))
+        self.assertEqual(set(), dhooks.concurrent)
+
+    def test__fire_propagates_error_from_concurrent_hook(self):
+        dhooks = DeferredHooks()
+        d1, d2, d3 = Deferred(), Deferred(), Deferred()
+        d1.addCallback(lambda _: 0 / 0)  # d1 will fail.
+        dhooks.add(d1, concurrent=True)
+        dhooks.add(d2, concurrent=True)
+        dhooks.add(d3)
+        self.assertRaises(ZeroDivisionError, dhooks.fire)
+        # d2 was fired alongside d1; d3 was cancelled.
+        self.assertIsNone(extract_result(d2))
+        self.assertIsNone(extract_result(d3))
+        self.assertThat(dhooks.hooks, HasLength(0))
+        self.assertEqual(set(), dhooks.concurrent)
+
+    def test__reset_forgets_concurrent_hooks(self):
+        dhooks = DeferredHooks()
+        dhooks.add(Deferred(), concurrent=True)
+        dhooks.reset()
+        self.assertEqual(set(), dhooks.concurrent)
+
     def test__reset_cancels_all_hooks(self):
         canceller = Mock()
         dhooks = DeferredHooks()
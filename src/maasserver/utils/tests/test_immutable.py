@@ -0,0 +1,108 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.utils.immutable`."""
+
+__all__ = []
+
+import copy
+import json
+import pickle
+
+from maasserver.utils.immutable import (
+    freeze,
+    ImmutableDict,
+    ImmutableList,
+)
+from maastesting.testcase import MAASTestCase
+from testtools.matchers import (
+    Equals,
+    Is,
+    IsInstance,
+)
+
+
+class TestFreeze(MAASTestCase):
+
+    def test_freezes_nested_structures(self):
+        thing = {"a": [{"b": 1}, (2, [3])], "c": {4}}
+        frozen = freeze(thing)
+        self.assertThat(frozen, Equals(thing))
+        self.assertThat(frozen, IsInstance(ImmutableDict))
+        self.assertThat(frozen["a"], IsInstance(ImmutableList))
+        self.assertThat(frozen["a"][0], IsInstance(ImmutableDict))
+        self.assertThat(frozen["a"][1][1], IsInstance(ImmutableList))
+        self.assertThat(frozen["c"], IsInstance(frozenset))
+
+    def test_returns_frozen_structures_as_is(self):
+        frozen = freeze({"a": [1]})
+        self.assertThat(freeze(frozen), Is(frozen))
+
+    def test_leaves_original_alone(self):
+        thing = {"a": [1]}
+        frozen = freeze(thing)
+        thing["a"].append(2)
+        self.assertThat(frozen, Equals({"a": [1]}))
+
+
+class TestImmutableDict(MAASTestCase):
+
+    def test_cannot_be_changed(self):
+        frozen = ImmutableDict(a=1)
+        self.assertRaises(TypeError, frozen.__setitem__, "b", 2)
+        self.assertRaises(TypeError, frozen.__delitem__, "a")
+        self.assertRaises(TypeError, frozen.update, b=2)
+        self.assertRaises(TypeError, frozen.setdefault, "b", 2)
+        self.assertRaises(TypeError, frozen.pop, "a")
+        self.assertRaises(TypeError, frozen.clear)
+        self.assertThat(frozen, Equals({"a": 1}))
+
+    def test_copies_are_itself(self):
+        frozen = ImmutableDict(a=1)
+        self.assertThat(copy.copy(frozen), Is(frozen))
+        self.assertThat(copy.deepcopy(frozen), Is(frozen))
+
+    def test_can_be_copied_into_a_dict(self):
+        thawed = dict(ImmutableDict(a=1))
+        thawed["b"] = 2
+        self.assertThat(thawed, Equals({"a": 1, "b": 2}))
+
+    def test_can_be_serialised(self):
+        frozen = freeze({"a": [1, {"b": 2}]})
+        self.assertThat(
+            json.loads(json.dumps(frozen)), Equals({"a": [1, {"b": 2}]}))
+        self.assertThat(pickle.loads(pickle.dumps(frozen)), Equals(frozen))
+
+
+class TestImmutableList(MAASTestCase):
+
+    def test_cannot_be_changed(self):
+        frozen = ImmutableList([1, 2])
+        self.assertRaises(TypeError, frozen.__setitem__, 0, 2)
+        self.assertRaises(TypeError, frozen.__delitem__, 0)
+        self.assertRaises(TypeError, frozen.append, 3)
+        self.assertRaises(TypeError, frozen.extend, [3])
+        self.assertRaises(TypeError, frozen.insert, 0, 3)
+        self.assertRaises(TypeError, frozen.pop)
+        self.assertRaises(TypeError, frozen.remove, 1)
+        self.assertRaises(TypeError, frozen.sort)
+        self.assertThat(frozen, Equals([1, 2]))
+
+    def test_in_place_operators_are_refused(self):
+        frozen = ImmutableList([1])
+
+        def add():
+            nonlocal frozen
+            frozen += [2]
+
+        self.assertRaises(TypeError, add)
+        self.assertThat(frozen, Equals([1]))
+
+    def test_copies_are_itself(self):
+        frozen = ImmutableList([1])
+        self.assertThat(copy.copy(frozen), Is(frozen))
+        self.assertThat(copy.deepcopy(frozen), Is(frozen))
+
+    def test_can_be_serialised(self):
+        frozen = ImmutableList([1, 2])
+        self.assertThat(pickle.loads(pickle.dumps(frozen)), Equals(frozen))
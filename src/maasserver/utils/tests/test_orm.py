@@ -63,6 +63,7 @@ from maasserver.utils.orm import (
     log_sql_calls,
     post_commit,
     post_commit_do,
+    post_commit_do_once,
     post_commit_hooks,
     psql_array,
     request_transaction_retry,
@@ -1034,6 +1035,60 @@ class TestPostCommit(MAASTestCase):
     def test__rejects_other_hook_types(self):
         self.assertRaises(AssertionError, post_commit, sentinel.hook)
 
+    def test__adds_concurrent_hook(self):
+        hook_added = post_commit(concurrent=True)
+        self.assertEqual({hook_added}, post_commit_hooks.concurrent)
+
+    def test__collapses_hooks_with_the_same_key(self):
+        key = ("key", factory.make_name("key"))
+        hook_added = post_commit(key=key)
+        self.assertThat(post_commit(Deferred(), key=key), Is(hook_added))
+        self.assertEqual([hook_added], list(post_commit_hooks.hooks))
+
+    def test__does_not_collapse_hooks_with_different_keys(self):
+        hook1 = post_commit(key=("key", 1))
+        hook2 = post_commit(key=("key", 2))
+        self.assertEqual([hook1, hook2], list(post_commit_hooks.hooks))
+
+    def test__records_collapsed_hooks(self):
+        update = self.patch(orm.PROMETHEUS_METRICS, "update")
+        post_commit(key=("key", 1))
+        post_commit(key=("key", 1))
+        self.assertThat(update, MockCallsMatch(
+            call("maas_post_commit_hooks_keyed", "inc",
+                 labels={"kind": "key"}),
+            call("maas_post_commit_hooks_keyed", "inc",
+                 labels={"kind": "key"}),
+            call("maas_post_commit_hooks_collapsed", "inc",
+                 labels={"kind": "key"})))
+
+    def test__fire_forgets_keys(self):
+        post_commit(key="key")
+        post_commit_hooks.fire()
+        self.assertEqual({}, post_commit_hooks.keys)
+        hook_added = post_commit(key="key")
+        self.assertEqual([hook_added], list(post_commit_hooks.hooks))
+
+    def test__reset_forgets_keys(self):
+        post_commit(key="key")
+        post_commit_hooks.reset()
+        self.assertEqual({}, post_commit_hooks.keys)
+
+    def test__savepoint_keeps_keys_on_clean_exit(self):
+        with post_commit_hooks.savepoint():
+            hook_added = post_commit(key="key")
+        self.assertEqual({"key": hook_added}, post_commit_hooks.keys)
+
+    def test__savepoint_forgets_new_keys_on_dirty_exit(self):
+        hook_before = post_commit(key="before")
+        exception_type = factory.make_exception_type()
+        with ExpectedException(exception_type):
+            with post_commit_hooks.savepoint():
+                post_commit(key="after")
+                raise exception_type()
+        self.assertEqual({"before": hook_before}, post_commit_hooks.keys)
+        self.assertEqual([hook_before], list(post_commit_hooks.hooks))
+
 
 class TestPostCommitDo(MAASTestCase):
     """Tests for the `post_commit_do` function."""
@@ -1075,6 +1130,36 @@ class TestPostCommitDo(MAASTestCase):
         self.assertRaises(AssertionError, post_commit_do, sentinel.hook)
 
 
+class TestPostCommitDoOnce(MAASTestCase):
+    """Tests for the `post_commit_do_once` function."""
+
+    def setUp(self):
+        super(TestPostCommitDoOnce, self).setUp()
+        self.addCleanup(post_commit_hooks.reset)
+
+    def test__calls_hook_once_per_key(self):
+        hook = Mock()
+        hook_added = post_commit_do_once("key", hook, sentinel.first)
+        self.assertThat(
+            post_commit_do_once("key", hook, sentinel.second),
+            Is(hook_added))
+        post_commit_do_once("other", hook, sentinel.other)
+        post_commit_hooks.fire()
+        self.assertThat(hook, MockCallsMatch(
+            call(sentinel.first), call(sentinel.other)))
+
+    def test__collapses_into_hook_registered_with_post_commit(self):
+        hook = Mock()
+        hook_added = post_commit(key="key")
+        self.assertThat(post_commit_do_once("key", hook), Is(hook_added))
+        post_commit_hooks.fire()
+        self.assertThat(hook, MockNotCalled())
+
+    def test__rejects_other_hook_types(self):
+        self.assertRaises(
+            AssertionError, post_commit_do_once, "key", sentinel.hook)
+
+
 class TestConnected(MAASTransactionServerTestCase):
     """Tests for the `orm.connected` context manager."""
 
@@ -17,6 +17,7 @@ from maasserver.utils import (
 )
 from maastesting.testcase import MAASTestCase
 from provisioningserver.utils.twisted import (
+    AdaptiveThreadPool,
     ThreadPool,
     ThreadUnpool,
 )
@@ -24,6 +25,7 @@ from testtools.matchers import (
     Equals,
     Is,
     IsInstance,
+    MatchesStructure,
 )
 from twisted.internet import reactor
 from twisted.internet.defer import (
@@ -56,18 +58,32 @@ class TestMakeFunctions(MAASTestCase):
 
     def test__make_database_pool_creates_connected_pool(self):
         pool = threads.make_database_pool()
-        self.assertThat(pool, IsInstance(ThreadPool))
+        self.assertThat(pool, IsInstance(threads.DatabaseThreadPool))
         self.assertThat(pool.context.contextFactory, Is(orm.FullyConnected))
-        self.assertThat(pool.max, Equals(
+        self.assertThat(pool.ceiling, Equals(
             threads.max_threads_for_database_pool))
+        self.assertThat(pool.idleTimeout, Equals(
+            threads.idle_timeout_for_database_pool))
         self.assertThat(pool.min, Equals(0))
+        self.assertFalse(pool.pooler)
 
     def test__make_database_pool_accepts_max_threads_setting(self):
         maxthreads = random.randint(1, 1000)
         pool = threads.make_database_pool(maxthreads)
-        self.assertThat(pool.max, Equals(maxthreads))
+        self.assertThat(pool.ceiling, Equals(maxthreads))
         self.assertThat(pool.min, Equals(0))
 
+    def test__make_database_pool_accepts_idle_timeout_setting(self):
+        idle_timeout = random.randint(1, 1000)
+        pool = threads.make_database_pool(idle_timeout=idle_timeout)
+        self.assertThat(pool.idleTimeout, Equals(idle_timeout))
+
+    def test__make_database_pool_in_pooler_mode(self):
+        pool = threads.make_database_pool(pooler=True)
+        self.assertThat(
+            pool.context.contextFactory, Is(orm.ExclusivelyConnected))
+        self.assertTrue(pool.pooler)
+
     def test__make_database_unpool_creates_unpool(self):
         pool = threads.make_database_unpool()
         self.assertThat(pool, IsInstance(ThreadUnpool))
@@ -109,6 +125,33 @@ class TestInstallFunctions(MAASTestCase):
         self.assertThat(pool.contextFactory, Is(orm.ExclusivelyConnected))
 
 
+class TestDatabaseThreadPool(MAASTestCase):
+    """Tests for `DatabaseThreadPool`."""
+
+    def test__sizes_between_floor_and_maxthreads(self):
+        pool = threads.DatabaseThreadPool(maxthreads=7)
+        self.assertThat(pool, MatchesStructure.byEquality(
+            max=threads.min_threads_for_database_pool,
+            floor=threads.min_threads_for_database_pool, ceiling=7))
+
+    def test__connects_for_each_task_in_pooler_mode(self):
+        pool = threads.DatabaseThreadPool(pooler=True)
+        callInThreadWithCallback = self.patch(
+            AdaptiveThreadPool, "callInThreadWithCallback")
+        pool.callInThreadWithCallback(None, sentinel.func, sentinel.arg)
+        [_, func, arg], _ = callInThreadWithCallback.call_args
+        self.assertThat(func.func, Is(sentinel.func))
+        self.assertThat(arg, Is(sentinel.arg))
+
+    def test__does_not_wrap_tasks_normally(self):
+        pool = threads.DatabaseThreadPool()
+        callInThreadWithCallback = self.patch(
+            AdaptiveThreadPool, "callInThreadWithCallback")
+        pool.callInThreadWithCallback(None, sentinel.func)
+        [_, func], _ = callInThreadWithCallback.call_args
+        self.assertThat(func, Is(sentinel.func))
+
+
 class TestDeferToDatabase(MAASServerTestCase):
 
     @wait_for_reactor
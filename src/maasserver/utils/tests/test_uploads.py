@@ -0,0 +1,113 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.utils.uploads`."""
+
+__all__ = []
+
+import hashlib
+from io import BytesIO
+
+from apiclient.multipart import encode_multipart_data
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from django.db import connection
+from django.http.multipartparser import MultiPartParser
+from maasserver.models.largefile import LargeFile
+from maasserver.testing.factory import factory
+from maasserver.testing.testcase import MAASServerTestCase
+from maasserver.utils.uploads import (
+    LargeObjectUploadedFile,
+    LargeObjectUploadHandler,
+)
+
+
+def large_object_exists(oid):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM pg_largeobject_metadata WHERE oid = %s",
+            [oid])
+        [count] = cursor.fetchone()
+    return count == 1
+
+
+class TestLargeObjectUploadHandler(MAASServerTestCase):
+
+    def upload(self, handler, **files):
+        files = {
+            name: BytesIO(content)
+            for name, content in files.items()
+        }
+        body, headers = encode_multipart_data(files=files)
+        meta = {
+            "CONTENT_TYPE": headers["Content-Type"],
+            "CONTENT_LENGTH": headers["Content-Length"],
+        }
+        parser = MultiPartParser(
+            META=meta, input_data=BytesIO(body.encode("ascii")),
+            upload_handlers=[handler, MemoryFileUploadHandler()])
+        _, files = parser.parse()
+        return files
+
+    def test_streams_named_fields_into_large_objects(self):
+        content = factory.make_bytes(1024)
+        handler = LargeObjectUploadHandler()
+        files = self.upload(handler, content=content)
+        upload = files["content"]
+        self.assertIsInstance(upload, LargeObjectUploadedFile)
+        self.assertEqual(len(content), upload.size)
+        self.assertEqual(hashlib.sha256(content).hexdigest(), upload.sha256)
+        with upload.content.open("rb") as stream:
+            self.assertEqual(content, stream.read())
+        self.assertEqual([upload], handler.uploads)
+
+    def test_leaves_other_fields_to_other_handlers(self):
+        content = factory.make_bytes()
+        files = self.upload(LargeObjectUploadHandler(), other=content)
+        self.assertNotIsInstance(files["other"], LargeObjectUploadedFile)
+        self.assertEqual(content, files["other"].read())
+
+    def test_discard_unused_removes_unused_large_objects(self):
+        handler = LargeObjectUploadHandler()
+        upload = self.upload(handler, content=factory.make_bytes())["content"]
+        oid = upload.content.oid
+        handler.discard_unused()
+        self.assertFalse(large_object_exists(oid))
+        self.assertIsNone(upload.content)
+        self.assertEqual([], handler.uploads)
+
+    def test_discard_unused_leaves_used_large_objects(self):
+        handler = LargeObjectUploadHandler()
+        upload = self.upload(handler, content=factory.make_bytes())["content"]
+        largefile = LargeFile.objects.get_or_create_file_from_content(upload)
+        handler.discard_unused()
+        self.assertTrue(large_object_exists(largefile.content.oid))
+
+
+class TestGetOrCreateFileFromUpload(MAASServerTestCase):
+
+    def make_upload(self, content):
+        handler = LargeObjectUploadHandler()
+        handler.new_file("content", "content", "text/plain", len(content))
+        handler.receive_data_chunk(content, 0)
+        return handler.file_complete(len(content))
+
+    def test_creates_file_from_large_object(self):
+        content = factory.make_bytes(1024)
+        upload = self.make_upload(content)
+        oid = upload.content.oid
+        largefile = LargeFile.objects.get_or_create_file_from_content(upload)
+        self.assertEqual(hashlib.sha256(content).hexdigest(), largefile.sha256)
+        self.assertEqual(len(content), largefile.size)
+        self.assertEqual(len(content), largefile.total_size)
+        self.assertEqual(oid, largefile.content.oid)
+        self.assertIsNone(upload.content)
+
+    def test_returns_existing_file_and_discards_upload(self):
+        content = factory.make_bytes(1024)
+        existing = factory.make_LargeFile(content=content, size=len(content))
+        upload = self.make_upload(content)
+        oid = upload.content.oid
+        self.assertEqual(
+            existing,
+            LargeFile.objects.get_or_create_file_from_content(upload))
+        self.assertFalse(large_object_exists(oid))
@@ -11,6 +11,7 @@ pools to limit the number of connections each `regiond` process will consume.
 
 __all__ = [
     "callOutToDatabase",
+    "DatabaseThreadPool",
     "deferToDatabase",
     "install_database_pool",
     "install_database_unpool",
@@ -25,9 +26,12 @@ from maasserver.utils.orm import (
     ExclusivelyConnected,
     FullyConnected,
     TotallyDisconnected,
+    with_connection,
 )
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils.twisted import (
+    AdaptiveThreadPool,
     asynchronous,
     FOREVER,
     ThreadPool,
@@ -53,6 +57,10 @@ max_threads_for_default_pool = 50
 # PostgreSQL connection (default is 100 connections).
 max_threads_for_database_pool = 9
 
+# Number of threads the database pool allows at once when there's no demand.
+# It's raised as soon as work arrives that no thread is free for.
+min_threads_for_database_pool = 1
+
 
 def make_default_pool(maxthreads=max_threads_for_default_pool):
     """Create a general thread-pool for non-database activity.
@@ -63,14 +71,57 @@ def make_default_pool(maxthreads=max_threads_for_default_pool):
     return ThreadPool(0, maxthreads, "default", TotallyDisconnected)
 
 
-def make_database_pool(maxthreads=max_threads_for_database_pool):
+# Threads in the database pool that haven't been needed for this many seconds
+# are stopped, closing their database connections.
+idle_timeout_for_database_pool = 60
+
+
+class DatabaseThreadPool(AdaptiveThreadPool):
+    """Adaptive thread-pool for database activity.
+
+    The number of threads allowed at once floats between
+    `min_threads_for_database_pool` and `maxthreads` with demand, and with
+    how long work waits for a thread; threads idle for `idle_timeout`
+    seconds are stopped.
+
+    Normally each thread connects to the database when it first runs a task
+    and keeps that connection until the thread is reaped for being idle.
+
+    In `pooler` mode, for when the region reaches the database through a
+    transaction-level connection pooler like pgbouncer, each task connects
+    and disconnects instead. Connecting is cheap with a pooler in between,
+    and no server connection is pinned by an idle thread.
+    """
+
+    def __init__(
+            self, maxthreads=max_threads_for_database_pool, pooler=False,
+            idle_timeout=idle_timeout_for_database_pool):
+        super(DatabaseThreadPool, self).__init__(
+            0, maxthreads, "database",
+            ExclusivelyConnected if pooler else FullyConnected,
+            floor=min(min_threads_for_database_pool, maxthreads),
+            idleTimeout=idle_timeout)
+        self.pooler = pooler
+
+    def callInThreadWithCallback(self, onResult, func, *args, **kwargs):
+        if self.pooler:
+            func = with_connection(func)
+        return super(DatabaseThreadPool, self).callInThreadWithCallback(
+            onResult, func, *args, **kwargs)
+
+
+def make_database_pool(
+        maxthreads=max_threads_for_database_pool, pooler=False,
+        idle_timeout=idle_timeout_for_database_pool):
     """Create a general thread-pool for database activity.
 
     Its consumer are the old-school web application, i.e. the plain HTTP and
     HTTP API services, and the WebSocket service, for the responsive web UI.
-    All threads are fully connected to the database.
+    The pool grows and shrinks with demand, up to `maxthreads`, and threads
+    are stopped once they have been idle for `idle_timeout` seconds; see
+    `DatabaseThreadPool` for how threads are connected to the database.
     """
-    return ThreadPool(0, maxthreads, "database", FullyConnected)
+    return DatabaseThreadPool(maxthreads, pooler, idle_timeout)
 
 
 def make_database_unpool(maxthreads=max_threads_for_database_pool):
@@ -112,14 +163,18 @@ def install_default_pool(maxthreads=max_threads_for_default_pool):
 
 
 @asynchronous(timeout=FOREVER)
-def install_database_pool(maxthreads=max_threads_for_database_pool):
+def install_database_pool(
+        maxthreads=max_threads_for_database_pool, pooler=False,
+        idle_timeout=idle_timeout_for_database_pool):
     """Install a pool for database activity."""
     if getattr(reactor, "threadpoolForDatabase", None) is None:
         # Start with ZERO threads to avoid pulling in all of Django's
         # configuration straight away; it may not be ready yet.
-        reactor.threadpoolForDatabase = make_database_pool(maxthreads)
+        reactor.threadpoolForDatabase = make_database_pool(
+            maxthreads, pooler, idle_timeout)
         reactor.callInDatabase = reactor.threadpoolForDatabase.callInThread
         reactor.callWhenRunning(reactor.threadpoolForDatabase.start)
+        reactor.callWhenRunning(reactor.threadpoolForDatabase.install)
         reactor.addSystemEventTrigger(
             "during", "shutdown", reactor.threadpoolForDatabase.stop)
     else:
@@ -148,6 +203,17 @@ def install_database_unpool(maxthreads=max_threads_for_database_pool):
             "been configured and installed.")
 
 
+def _get_call_labels(func, *args, **kwargs):
+    try:
+        # A function or method; see PEP 3155.
+        return {"call": func.__qualname__}
+    except AttributeError:
+        # An instance with a __call__ method, or a partial.
+        return {"call": type(func).__qualname__}
+
+
+@PROMETHEUS_METRICS.record_call_latency(
+    "maas_db_thread_call_latency", get_labels=_get_call_labels)
 def deferToDatabase(func, *args, **kwargs):
     """Call `func` in a thread where database activity is permitted."""
     if settings.DEBUG and getattr(settings, 'DEBUG_QUERIES', False):
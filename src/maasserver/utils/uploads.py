@@ -0,0 +1,109 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Stream uploaded files into large objects."""
+
+__all__ = [
+    "LargeObjectUploadedFile",
+    "LargeObjectUploadHandler",
+]
+
+import hashlib
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    StopFutureHandlers,
+)
+from maasserver.fields import LargeObjectFile
+
+
+class LargeObjectUploadedFile(UploadedFile):
+    """A file that was streamed into a large object as it was uploaded.
+
+    Its content is not held in memory nor on disk. Its SHA256 was calculated
+    as it was uploaded. The large object must be used, e.g. by
+    `LargeFile.objects.get_or_create_file_from_content`, or discarded.
+
+    :ivar content: The `LargeObjectFile` holding the upload.
+    :ivar sha256: The hex digest of the upload's SHA256.
+    """
+
+    def __init__(self, content, sha256, name, content_type, size, charset):
+        super(LargeObjectUploadedFile, self).__init__(
+            file=None, name=name, content_type=content_type, size=size,
+            charset=charset)
+        self.content = content
+        self.sha256 = sha256
+
+    def open(self, mode=None):
+        return self.content.open("rb")
+
+    def chunks(self, chunk_size=None):
+        with self.content.open("rb") as stream:
+            yield from stream
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """Remove the large object, if it has not been used."""
+        if self.content is not None:
+            self.content.unlink()
+            self.content = None
+
+
+class LargeObjectUploadHandler(FileUploadHandler):
+    """Stream the named file fields of an upload into large objects.
+
+    Each chunk is written to the large object and added to its SHA256 as it
+    is received, so neither the file nor its hash need another pass. Other
+    fields are left to the handlers that follow.
+
+    This must be used within a transaction. Large objects that are not used
+    while handling the request must be removed with `discard_unused`.
+    """
+
+    def __init__(self, request=None, field_names=("content",)):
+        super(LargeObjectUploadHandler, self).__init__(request)
+        self.field_names = frozenset(field_names)
+        self.stream = None
+        self.uploads = []
+
+    def new_file(self, field_name, *args, **kwargs):
+        super(LargeObjectUploadHandler, self).new_file(
+            field_name, *args, **kwargs)
+        if field_name in self.field_names:
+            self.stream = LargeObjectFile().open("wb")
+            self.sha256 = hashlib.sha256()
+            raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.stream is None:
+            return raw_data
+        else:
+            self.stream.write(raw_data)
+            self.sha256.update(raw_data)
+            return None
+
+    def file_complete(self, file_size):
+        if self.stream is None:
+            return None
+        stream, self.stream = self.stream, None
+        stream.close()
+        upload = LargeObjectUploadedFile(
+            LargeObjectFile(stream.oid), self.sha256.hexdigest(),
+            self.file_name, self.content_type, file_size, self.charset)
+        self.uploads.append(upload)
+        return upload
+
+    def upload_interrupted(self):
+        if self.stream is not None:
+            stream, self.stream = self.stream, None
+            stream.unlink()
+
+    def discard_unused(self):
+        """Remove the large objects of uploads that have not been used."""
+        uploads, self.uploads = self.uploads, []
+        for upload in uploads:
+            upload.discard()
@@ -14,6 +14,7 @@ import socket
 
 from django.conf import settings
 from maasserver import concurrency
+from maasserver.api.conditional import change_tracker
 from maasserver.utils.threads import deferToDatabase
 from maasserver.utils.views import WebApplicationHandler
 from maasserver.websockets.protocol import WebSocketFactory
@@ -231,6 +232,7 @@ class WebApplicationService(StreamServerEndpointService):
         """Start the Django application, and install it."""
         application = yield deferToDatabase(self.prepareApplication)
         self.startWebsocket()
+        change_tracker.install(self.websocket.listener)
         self.installApplication(application)
 
     def _makeEndpoint(self):
@@ -285,5 +287,6 @@ class WebApplicationService(StreamServerEndpointService):
 
         d = super(WebApplicationService, self).stopService()
         d.addCallback(lambda _: self.websocket.stopFactory())
+        d.addCallback(lambda _: change_tracker.uninstall())
         d.addCallback(_cleanup)
         return d
@@ -21,6 +21,7 @@ from maasserver.enum import NODE_PERMISSION
 from maasserver.utils.forms import get_QueryDict
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils.twisted import (
     asynchronous,
     IAsynchronous,
@@ -314,6 +315,10 @@ class Handler(metaclass=HandlerMetaclass):
         return get_QueryDict(params)
 
     @asynchronous
+    @PROMETHEUS_METRICS.record_call_latency(
+        'maas_websocket_call_latency',
+        get_labels=lambda handler, method_name, params: {
+            'call': '%s.%s' % (handler._meta.handler_name, method_name)})
     def execute(self, method_name, params):
         """Execute the given method on the handler.
 
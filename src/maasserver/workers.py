@@ -3,8 +3,15 @@
 
 """Workers executor."""
 
+import ctypes
+import gc
+import importlib
 import os
+import random
+import select
+import signal
 import sys
+import traceback
 
 from provisioningserver.logger import LegacyLogger
 from twisted.application import service
@@ -17,6 +24,29 @@ log = LegacyLogger()
 MAX_WORKERS_COUNT = int(
     os.environ.get('MAAS_REGIOND_WORKER_COUNT', os.cpu_count()))
 
+PRELOAD_WORKERS = False
+
+# Modules loaded by the `WorkerPreloader` before it forks any worker. These
+# are the import-heavy parts of the region that every worker needs anyway.
+# None of them may start threads or open connections when imported.
+PRELOAD_MODULES = (
+    "maasserver.api.doc",
+    "maasserver.eventloop",
+    "maasserver.rpc.regionservice",
+    "maasserver.start_up",
+    "maasserver.urls",
+    "maasserver.webapp",
+    "maasserver.websockets.handlers",
+)
+
+# File descriptors, as seen by the preloader, that carry the commands from
+# the master and the events back to it.
+PRELOADER_COMMAND_FD = 3
+PRELOADER_EVENT_FD = 4
+
+# From <linux/prctl.h>.
+PR_SET_PDEATHSIG = 1
+
 
 def set_max_workers_count(worker_count):
     """Set the global `MAX_WORKERS_COUNT`."""
@@ -24,6 +54,20 @@ def set_max_workers_count(worker_count):
     MAX_WORKERS_COUNT = worker_count
 
 
+def set_preload_workers(preload):
+    """Set the global `PRELOAD_WORKERS`."""
+    global PRELOAD_WORKERS
+    PRELOAD_WORKERS = preload
+
+
+def _set_pdeathsig(signum):
+    """Have the kernel send `signum` to this process when its parent dies."""
+    libc = ctypes.CDLL("libc.so.6", use_errno=True)
+    if libc.prctl(PR_SET_PDEATHSIG, signum) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
 class WorkerProcess(protocol.ProcessProtocol):
 
     def __init__(self, service, runningImport=False):
@@ -130,3 +174,301 @@ class WorkersService(service.Service, object):
         self.reactor.spawnProcess(
             worker, self.worker_cmd, [self.worker_cmd],
             env=env, childFDs={0: 0, 1: 1, 2: 2})
+
+
+class PreloadedWorker:
+    """A worker forked by the `WorkerPreloader`.
+
+    It is not a child of the master so it is signalled directly by PID.
+    """
+
+    def __init__(self, pid, runningImport=False):
+        super(PreloadedWorker, self).__init__()
+        self.pid = pid
+        self.runningImport = runningImport
+
+    def signal(self, signame):
+        try:
+            os.kill(self.pid, signal.Signals["SIG" + signame])
+        except ProcessLookupError:
+            pass
+
+
+class PreloaderProcess(protocol.ProcessProtocol):
+    """Master side of the `WorkerPreloader` process.
+
+    Asks the preloader to fork workers and passes the workers that it
+    reports as started or ended to the `PreloadedWorkersService`.
+    """
+
+    def __init__(self, service):
+        super(PreloaderProcess, self).__init__()
+        self.service = service
+        self.buffer = b""
+
+    def connectionMade(self):
+        self.pid = self.transport.pid
+
+    def spawnWorker(self, runningImport=False):
+        self.transport.writeToChild(
+            PRELOADER_COMMAND_FD, b"spawn %d\n" % runningImport)
+
+    def childDataReceived(self, childFD, data):
+        if childFD != PRELOADER_EVENT_FD:
+            return
+        *lines, self.buffer = (self.buffer + data).split(b"\n")
+        for line in lines:
+            event, pid, value = line.decode("ascii").split()
+            if event == "started":
+                self.service.workerStarted(int(pid), value == "1")
+            elif event == "ended":
+                self.service.workerEnded(int(pid), int(value))
+
+    def processEnded(self, status):
+        self.service.preloaderEnded(status)
+
+    def signal(self, signal):
+        if self.transport:
+            try:
+                self.transport.signalProcess(signal)
+            except ProcessExitedAlready:
+                pass
+            self.transport.reapProcess()
+
+
+class PreloadedWorkersService(WorkersService):
+    """
+    Workers service that forks the workers from a preloaded process.
+
+    A single `WorkerPreloader` process loads Django and the import-heavy
+    parts of `maasserver` once; every worker is then forked from it and
+    shares those pages copy-on-write, instead of loading them from scratch.
+    """
+
+    def __init__(self, reactor, *, worker_count=None, worker_cmd=None):
+        super(PreloadedWorkersService, self).__init__(
+            reactor, worker_count=worker_count, worker_cmd=worker_cmd)
+        self.preloader = None
+        # The `runningImport` flag of each worker requested from the
+        # preloader that has not been reported as started yet.
+        self.spawning = []
+
+    def stopService(self):
+        """Stop the workers and the preloader."""
+        super(PreloadedWorkersService, self).stopService()
+        if self.preloader is not None:
+            log.msg("Killing worker preloader pid:%d." % self.preloader.pid)
+            self.preloader.signal("KILL")
+
+    def spawnWorkers(self):
+        """Spawn the missing workers."""
+        if self.stopping:
+            # Don't spwan new workers if the service is stopping.
+            return
+        if self.preloader is None:
+            self._spawnPreloader()
+        missing = self.worker_count - len(self.workers) - len(self.spawning)
+        runningImport = any(self.spawning) or any(
+            worker.runningImport for worker in self.workers.values())
+        for _ in range(missing):
+            if not runningImport:
+                self._spawnWorker(runningImport=True)
+                runningImport = True
+            else:
+                self._spawnWorker()
+
+    def workerStarted(self, pid, runningImport):
+        """The preloader forked a worker."""
+        self.spawning.remove(runningImport)
+        self.registerWorker(PreloadedWorker(pid, runningImport))
+
+    def workerEnded(self, pid, status):
+        """The preloader reaped a worker."""
+        worker = self.workers.get(pid, None)
+        if worker is not None:
+            self.unregisterWorker(worker, status)
+
+    def preloaderEnded(self, status):
+        """The preloader has died, and all its workers with it."""
+        self.preloader = None
+        self.spawning.clear()
+        self.workers.clear()
+        self.spawnWorkers()
+
+    def _spawnPreloader(self):
+        """Spawn the process that preloads and forks the workers."""
+        self.preloader = PreloaderProcess(self)
+        env = os.environ.copy()
+        env['MAAS_REGIOND_PROCESS_MODE'] = 'preloader'
+        env['MAAS_REGIOND_WORKER_COUNT'] = str(MAX_WORKERS_COUNT)
+        self.reactor.spawnProcess(
+            self.preloader, self.worker_cmd, [self.worker_cmd],
+            env=env, childFDs={
+                0: 0, 1: 1, 2: 2,
+                PRELOADER_COMMAND_FD: 'w',
+                PRELOADER_EVENT_FD: 'r',
+            })
+
+    def _spawnWorker(self, runningImport=False):
+        """Ask the preloader to fork a new worker."""
+        self.spawning.append(runningImport)
+        self.preloader.spawnWorker(runningImport)
+
+
+class WorkerPreloader:
+    """Preload the region and fork workers on request of the master.
+
+    This runs in the process spawned by `PreloadedWorkersService`. It reads
+    ``spawn <import>`` commands from the master and answers with ``started
+    <pid> <import>`` and ``ended <pid> <status>`` events.
+
+    :param run_worker: Called without arguments in each forked worker to run
+        the worker services.
+    """
+
+    def __init__(
+            self, run_worker, *, command_fd=PRELOADER_COMMAND_FD,
+            event_fd=PRELOADER_EVENT_FD):
+        super(WorkerPreloader, self).__init__()
+        self.run_worker = run_worker
+        self.command_fd = command_fd
+        self.event_fd = event_fd
+        self.workers = set()
+        self.buffer = b""
+        self.wakeup = None
+
+    def preload(self):
+        """Load everything the workers share."""
+        import django
+        django.setup()
+        for name in PRELOAD_MODULES:
+            importlib.import_module(name)
+        # Every API response carries this hash; compute it only once.
+        from maasserver.api.doc import get_api_description_hash
+        get_api_description_hash()
+        # Move what is loaded out of the collector's reach so that a
+        # collection in a worker doesn't touch, and so copy, those pages.
+        # `gc.freeze` is only available in Python 3.7 and later.
+        freeze = getattr(gc, "freeze", None)
+        if freeze is not None:
+            gc.collect()
+            freeze()
+
+    def run(self):
+        """Preload, then fork workers until the master goes away."""
+        self.preload()
+        # Wake up `select` when a worker ends.
+        self.wakeup = os.pipe()
+        os.set_blocking(self.wakeup[1], False)
+        signal.set_wakeup_fd(self.wakeup[1])
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        try:
+            while self.command_fd is not None:
+                readable, _, _ = select.select(
+                    [self.command_fd, self.wakeup[0]], [], [])
+                if self.wakeup[0] in readable:
+                    os.read(self.wakeup[0], 4096)
+                self.reapWorkers()
+                if self.command_fd in readable:
+                    self.readCommands()
+        finally:
+            for pid in self.workers:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def readCommands(self):
+        data = os.read(self.command_fd, 4096)
+        if not data:
+            # The master has gone away.
+            self.command_fd = None
+            return
+        *lines, self.buffer = (self.buffer + data).split(b"\n")
+        for line in lines:
+            command, runningImport = line.decode("ascii").split()
+            if command == "spawn":
+                self.spawnWorker(runningImport == "1")
+
+    def reapWorkers(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self.workers.discard(pid)
+            self.sendEvent("ended", pid, status)
+
+    def sendEvent(self, event, pid, value):
+        os.write(self.event_fd, b"%s %d %d\n" % (
+            event.encode("ascii"), pid, value))
+
+    def spawnWorker(self, runningImport=False):
+        preloader = os.getpid()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                self._prepareWorker(runningImport, preloader)
+                self.run_worker()
+            except Exception:
+                traceback.print_exc()
+            else:
+                status = 0
+            finally:
+                os._exit(status)
+        self.workers.add(pid)
+        self.sendEvent("started", pid, runningImport)
+
+    def _prepareWorker(self, runningImport, preloader):
+        """Turn this freshly forked process into a worker.
+
+        :param preloader: The PID of the preloader that forked this worker.
+        """
+        # Die with the preloader, even when it is killed before it can kill
+        # this worker; the master then starts a new preloader and workers,
+        # and an orphaned worker would keep serving alongside them.
+        _set_pdeathsig(signal.SIGKILL)
+        if os.getppid() != preloader:
+            # The preloader died before the above took effect.
+            raise SystemExit(1)
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for fd in (self.command_fd, self.event_fd) + self.wakeup:
+            os.close(fd)
+        os.environ['MAAS_REGIOND_PROCESS_MODE'] = 'worker'
+        if runningImport:
+            os.environ['MAAS_REGIOND_RUN_IMPORTER_SERVICE'] = 'true'
+        else:
+            os.environ.pop('MAAS_REGIOND_RUN_IMPORTER_SERVICE', None)
+        # Don't let the workers share a sequence of random numbers.
+        random.seed()
+        self._resetReactor()
+
+    def _resetReactor(self, reactor=None):
+        # The reactor was installed, though never run, in the preloader and
+        # all the workers would share its event loop. Give this worker its
+        # own loop; the reactor object itself must be kept as the preloaded
+        # modules hold references to it.
+        import asyncio
+        if reactor is None:
+            from twisted.internet import reactor
+        # Re-initialising the reactor discards the system event triggers
+        # that modules added when they were imported, so add them again.
+        triggers = [
+            (phase, event, trigger)
+            for event, triggers in reactor._eventTriggers.items()
+            for phase in ("before", "during", "after")
+            for trigger in getattr(triggers, phase)
+        ]
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        reactor.__init__(loop)
+        for phase, event, trigger in triggers:
+            existing = getattr(reactor._eventTriggers.get(event), phase, ())
+            if trigger not in existing:
+                function, args, kwargs = trigger
+                reactor.addSystemEventTrigger(
+                    phase, event, function, *args, **kwargs)
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-# Copyright 2012-2017 Canonical Ltd.  This software is licensed under the
+# Copyright 2012-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Command-line interface for the MAAS provisioning component."""
@@ -18,7 +18,9 @@ import provisioningserver.upgrade_cluster
 import provisioningserver.utils.arp
 import provisioningserver.utils.avahi
 import provisioningserver.utils.beaconing
+import provisioningserver.utils.capture
 import provisioningserver.utils.dhcp
+import provisioningserver.utils.profiler
 import provisioningserver.utils.scan_network
 from provisioningserver.utils.script import MainScript
 import provisioningserver.utils.send_beacons
@@ -28,6 +30,7 @@ COMMON_COMMANDS = {
     'observe-arp': provisioningserver.utils.arp,
     'observe-beacons': provisioningserver.utils.beaconing,
     'observe-mdns': provisioningserver.utils.avahi,
+    'observe-network': provisioningserver.utils.capture,
     'observe-dhcp': provisioningserver.utils.dhcp,
     'send-beacons': provisioningserver.utils.send_beacons,
     'scan-network': provisioningserver.utils.scan_network,
@@ -41,6 +44,7 @@ RACK_ONLY_COMMANDS = {
     'config': provisioningserver.cluster_config_command,
     'install-shared-secret': security.InstallSharedSecretScript,
     'install-uefi-config': provisioningserver.boot.install_grub,
+    'profiler': provisioningserver.utils.profiler,
     'register': provisioningserver.register_command,
     'support-dump': provisioningserver.support_dump,
     'upgrade-cluster': provisioningserver.upgrade_cluster,
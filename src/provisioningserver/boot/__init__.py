@@ -33,7 +33,7 @@ from provisioningserver.utils import (
     typed,
 )
 from provisioningserver.utils.fs import (
-    atomic_copy,
+    atomic_link,
     atomic_symlink,
 )
 from provisioningserver.utils.network import (
@@ -217,7 +217,7 @@ class BootMethod(metaclass=ABCMeta):
                 maaslog.error(err_msg)
 
     def _find_and_copy_bootloaders(self, destination, log_missing=True):
-        """Attempt to copy bootloaders from the previous snapshot
+        """Attempt to link bootloaders from the previous snapshot
 
         :param destination: The path to link the bootloaders to
         :param log_missing: Log missing files, default True
@@ -233,11 +233,12 @@ class BootMethod(metaclass=ABCMeta):
             bootloader_src = os.path.realpath(bootloader_src)
             bootloader_dst = os.path.join(destination, bootloader_file)
             if os.path.exists(bootloader_src):
-                # Copy files if their realpath is inside the previous snapshot
-                # as once we're done the previous snapshot is deleted. Symlinks
-                # to other areas of the filesystem are maintained.
+                # Link files if their realpath is inside the previous snapshot
+                # as once we're done the previous snapshot is deleted; the
+                # link keeps them, without a copy. Symlinks to other areas of
+                # the filesystem are maintained.
                 if boot_sources_base in bootloader_src:
-                    atomic_copy(bootloader_src, bootloader_dst)
+                    atomic_link(bootloader_src, bootloader_dst)
                 else:
                     atomic_symlink(bootloader_src, bootloader_dst)
             else:
@@ -23,7 +23,7 @@ from provisioningserver.events import (
 )
 from provisioningserver.logger import get_maas_logger
 from provisioningserver.utils.fs import (
-    atomic_copy,
+    atomic_link,
     atomic_symlink,
 )
 import tempita
@@ -185,12 +185,12 @@ class PXEBootMethod(BootMethod):
                 if (
                         os.path.exists(bootloader_src) and
                         not os.path.exists(bootloader_dst)):
-                    # If the file was found in a previous snapshot copy it as
+                    # If the file was found in a previous snapshot link it as
                     # once we're done the previous snapshot will be deleted. If
                     # the file was found elsewhere on the filesystem create a
                     # symlink so we stay current with that source.
                     if boot_sources_base in bootloader_src:
-                        atomic_copy(bootloader_src, bootloader_dst)
+                        atomic_link(bootloader_src, bootloader_dst)
                     else:
                         atomic_symlink(bootloader_src, bootloader_dst)
                     files_found.append(bootloader_file)
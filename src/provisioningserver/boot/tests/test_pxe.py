@@ -201,13 +201,13 @@ class TestPXEBootMethod(MAASTestCase):
                 return False
 
         self.patch(pxe_module.os.path, 'exists').side_effect = fake_exists
-        mock_atomic_copy = self.patch(pxe_module, 'atomic_copy')
+        mock_atomic_link = self.patch(pxe_module, 'atomic_link')
         mock_atomic_symlink = self.patch(pxe_module, 'atomic_symlink')
         mock_shutil_copy = self.patch(pxe_module.shutil, 'copy')
 
         method.link_bootloader(bootloader_dir)
 
-        self.assertThat(mock_atomic_copy, MockNotCalled())
+        self.assertThat(mock_atomic_link, MockNotCalled())
         self.assertThat(mock_shutil_copy, MockNotCalled())
         for bootloader_file in method.bootloader_files:
             bootloader_src = os.path.join(
@@ -780,6 +780,13 @@ class ClusterConfiguration(Configuration, metaclass=ClusterConfigurationMeta):
             accept_python=True, if_missing=get_tentative_data_path(
                 "/var/lib/maas/boot-resources/current")))
 
+    # Boot image options.
+    image_download_streams = ConfigurationOption(
+        "image_download_streams",
+        "The number of boot resource files to download from the region at "
+        "once.",
+        Number(min=1, max=64, if_missing=4))
+
     # GRUB options.
 
     @property
@@ -796,6 +803,17 @@ class ClusterConfiguration(Configuration, metaclass=ClusterConfigurationMeta):
     debug = ConfigurationOption(
         "debug", "Enable debug mode for detailed error and log reporting.",
         StringBool(if_missing=False))
+    debug_profiler = ConfigurationOption(
+        "debug_profiler",
+        "Sample the reactor and thread-pools to find what blocks rackd. See "
+        "`maas-rack profiler`.",
+        StringBool(if_missing=False))
+
+    # Metrics options.
+    prometheus_enabled = ConfigurationOption(
+        "prometheus_enabled",
+        "Collect runtime metrics and expose them for Prometheus.",
+        StringBool(if_missing=False))
 
 
 def is_dev_environment():
@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Drivers."""
@@ -6,11 +6,22 @@
 __all__ = [
     "Architecture",
     "ArchitectureRegistry",
+    "build_driver_manifest",
+    "get_driver_schemas",
     ]
 
+from copy import deepcopy
+from functools import lru_cache
+from itertools import chain
+import json
+import os
+
 from jsonschema import validate
 from provisioningserver.utils import typed
-from provisioningserver.utils.registry import Registry
+from provisioningserver.utils.registry import (
+    LazyItem,
+    Registry,
+)
 
 
 class IP_EXTRACTOR_PATTERNS:
@@ -168,6 +179,56 @@ def make_setting_field(
     }
 
 
+# The schemas of the builtin power, pod and NOS drivers, by the path each is
+# registered with, so that they can be described without importing them.
+# Regenerate it with `utilities/update-driver-manifest`.
+DRIVER_MANIFEST = os.path.join(os.path.dirname(__file__), "manifest.json")
+
+
+@lru_cache(1)
+def get_driver_manifest():
+    """Return the precomputed schemas of the builtin drivers."""
+    with open(DRIVER_MANIFEST, "r", encoding="utf-8") as fd:
+        return json.load(fd)
+
+
+def build_driver_manifest():
+    """Return the manifest for the builtin drivers, importing every one."""
+    from provisioningserver.drivers.nos.registry import nos_drivers
+    from provisioningserver.drivers.pod.registry import pod_drivers
+    from provisioningserver.drivers.power.registry import power_drivers
+    manifest = {
+        path: LazyItem(path).load().get_schema(detect_missing_packages=False)
+        for path in chain(power_drivers.values(), pod_drivers.values())
+    }
+    manifest.update(
+        (path, LazyItem(path).load().get_schema())
+        for path in nos_drivers.values())
+    # Round-trip through JSON, as the manifest is when it's loaded.
+    return json.loads(json.dumps(manifest))
+
+
+def get_driver_schemas(registry, **kwargs):
+    """Return the schema of each driver in `registry`.
+
+    Drivers that have not been imported yet are described from the manifest,
+    unless their missing packages must be detected.
+
+    :param kwargs: Passed to `get_schema` on the drivers that are imported.
+    """
+    manifest = get_driver_manifest()
+    use_manifest = not kwargs.get("detect_missing_packages", False)
+    schemas = []
+    for name, driver in registry.peek_items():
+        if (use_manifest and isinstance(driver, LazyItem) and
+                driver.path in manifest):
+            # Callers can mutate this, so deep copy.
+            schemas.append(deepcopy(manifest[driver.path]))
+        else:
+            schemas.append(registry[name].get_schema(**kwargs))
+    return schemas
+
+
 class Architecture:
 
     def __init__(self, name, description, pxealiases=None,
@@ -1,4 +1,4 @@
-# Copyright 2017 Canonical Ltd.  This software is licensed under the
+# Copyright 2017-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Load all NOS drivers."""
@@ -8,8 +8,8 @@ __all__ = [
     ]
 
 from jsonschema import validate
+from provisioningserver.drivers import get_driver_schemas
 from provisioningserver.drivers.nos import JSON_NOS_DRIVERS_SCHEMA
-from provisioningserver.drivers.nos.flexswitch import FlexswitchNOSDriver
 from provisioningserver.utils.registry import Registry
 
 
@@ -19,17 +19,15 @@ class NOSDriverRegistry(Registry):
     @classmethod
     def get_schema(cls):
         """Returns the full schema for the registry."""
-        schemas = [
-            driver.get_schema()
-            for _, driver in cls
-        ]
+        schemas = get_driver_schemas(cls)
         validate(schemas, JSON_NOS_DRIVERS_SCHEMA)
         return schemas
 
 
-# Register all the NOS drivers.
-nos_drivers = [
-    FlexswitchNOSDriver(),
-]
-for driver in nos_drivers:
-    NOSDriverRegistry.register_item(driver.name, driver)
+# Register all the NOS drivers. Each is imported when first looked up.
+nos_drivers = {
+    "flexswitch": (
+        "provisioningserver.drivers.nos.flexswitch:FlexswitchNOSDriver"),
+}
+for driver_name, driver_path in nos_drivers.items():
+    NOSDriverRegistry.register_lazy_item(driver_name, driver_path)
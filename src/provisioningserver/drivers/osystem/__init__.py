@@ -247,28 +247,19 @@ class OperatingSystemRegistry(Registry):
     """Registry for operating system classes."""
 
 
-from provisioningserver.drivers.osystem.ubuntu import UbuntuOS
-from provisioningserver.drivers.osystem.ubuntucore import UbuntuCoreOS
-from provisioningserver.drivers.osystem.bootloader import BootLoaderOS
-from provisioningserver.drivers.osystem.centos import CentOS
-from provisioningserver.drivers.osystem.rhel import RHELOS
-from provisioningserver.drivers.osystem.custom import CustomOS
-from provisioningserver.drivers.osystem.windows import WindowsOS
-from provisioningserver.drivers.osystem.suse import SUSEOS
-from provisioningserver.drivers.osystem.caringo import CaringoOS
-from provisioningserver.drivers.osystem.esxi import ESXi
-
-builtin_osystems = [
-    UbuntuOS(),
-    UbuntuCoreOS(),
-    BootLoaderOS(),
-    CentOS(),
-    RHELOS(),
-    CustomOS(),
-    WindowsOS(),
-    SUSEOS(),
-    CaringoOS(),
-    ESXi(),
-    ]
-for osystem in builtin_osystems:
-    OperatingSystemRegistry.register_item(osystem.name, osystem)
+# Register all the operating systems. Each is imported when first looked up.
+builtin_osystems = {
+    "ubuntu": "provisioningserver.drivers.osystem.ubuntu:UbuntuOS",
+    "ubuntu-core": (
+        "provisioningserver.drivers.osystem.ubuntucore:UbuntuCoreOS"),
+    "bootloader": "provisioningserver.drivers.osystem.bootloader:BootLoaderOS",
+    "centos": "provisioningserver.drivers.osystem.centos:CentOS",
+    "rhel": "provisioningserver.drivers.osystem.rhel:RHELOS",
+    "custom": "provisioningserver.drivers.osystem.custom:CustomOS",
+    "windows": "provisioningserver.drivers.osystem.windows:WindowsOS",
+    "suse": "provisioningserver.drivers.osystem.suse:SUSEOS",
+    "caringo": "provisioningserver.drivers.osystem.caringo:CaringoOS",
+    "esxi": "provisioningserver.drivers.osystem.esxi:ESXi",
+}
+for osystem_name, osystem_path in builtin_osystems.items():
+    OperatingSystemRegistry.register_lazy_item(osystem_name, osystem_path)
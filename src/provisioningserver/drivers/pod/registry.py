@@ -1,4 +1,4 @@
-# Copyright 2017 Canonical Ltd.  This software is licensed under the
+# Copyright 2017-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Load all pod drivers."""
@@ -8,9 +8,8 @@ __all__ = [
     ]
 
 from jsonschema import validate
+from provisioningserver.drivers import get_driver_schemas
 from provisioningserver.drivers.pod import JSON_POD_DRIVERS_SCHEMA
-from provisioningserver.drivers.pod.rsd import RSDPodDriver
-from provisioningserver.drivers.pod.virsh import VirshPodDriver
 from provisioningserver.utils.registry import Registry
 
 
@@ -20,17 +19,16 @@ class PodDriverRegistry(Registry):
     @classmethod
     def get_schema(cls, detect_missing_packages=True):
         """Returns the full schema for the registry."""
-        schemas = [
-            driver.get_schema(detect_missing_packages=detect_missing_packages)
-            for _, driver in cls
-        ]
+        schemas = get_driver_schemas(
+            cls, detect_missing_packages=detect_missing_packages)
         validate(schemas, JSON_POD_DRIVERS_SCHEMA)
         return schemas
 
 
-pod_drivers = [
-    RSDPodDriver(),
-    VirshPodDriver(),
-]
-for driver in pod_drivers:
-    PodDriverRegistry.register_item(driver.name, driver)
+# Register all the pod drivers. Each is imported when first looked up.
+pod_drivers = {
+    "rsd": "provisioningserver.drivers.pod.rsd:RSDPodDriver",
+    "virsh": "provisioningserver.drivers.pod.virsh:VirshPodDriver",
+}
+for driver_name, driver_path in pod_drivers.items():
+    PodDriverRegistry.register_lazy_item(driver_name, driver_path)
@@ -21,6 +21,7 @@ from maastesting.factory import factory
 from maastesting.matchers import (
     MockCalledOnceWith,
     MockCallsMatch,
+    MockNotCalled,
 )
 from maastesting.testcase import (
     MAASTestCase,
@@ -64,7 +65,11 @@ from testtools.matchers import (
     Equals,
 )
 from testtools.testcase import ExpectedException
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import (
+    inlineCallbacks,
+    maybeDeferred,
+)
+from twisted.internet.task import Clock
 from twisted.internet.threads import deferToThread
 
 
@@ -253,6 +258,39 @@ SAMPLE_DUMPXML_4 = dedent("""
     </domain>
     """)
 
+SAMPLE_DOMAIN_DUMPXML = dedent("""\
+    <domain type='kvm'>
+      <name>{name}</name>
+      <memory unit='{memory_unit}'>{memory}</memory>
+      <vcpu placement='static' current='{cores}'>16</vcpu>
+      <os>
+        <type arch='x86_64'>hvm</type>
+      </os>
+      <devices>
+        <disk type='file' device='disk'>
+          <source file='{pool_path}/{name}-vda'/>
+          <target dev='vda' bus='virtio'/>
+        </disk>
+        <disk type='file' device='cdrom'>
+          <target dev='hdc' bus='ide'/>
+        </disk>
+        <disk type='volume' device='disk'>
+          <source pool='{pool_name}' volume='{pool_path}/{name}-vdb'/>
+          <target dev='vdb' bus='virtio'/>
+        </disk>
+        <interface type='network'>
+          <mac address='{mac_addresses[0]}'/>
+          <source network='default'/>
+          <model type='virtio'/>
+        </interface>
+        <interface type='bridge'>
+          <mac address='{mac_addresses[1]}'/>
+          <source bridge='br0'/>
+        </interface>
+      </devices>
+    </domain>
+    """)
+
 SAMPLE_CAPABILITY_KVM = dedent("""\
     <domainCapabilities>
       <path>/usr/bin/qemu-system-x86_64</path>
@@ -456,6 +494,21 @@ class VirshRunFake:
         return POOLINFO_TEMPLATE.format(**pool)
 
 
+def fake_virsh_line(line, outputs):
+    """Return what virsh prints for `line` of semicolon-separated commands.
+
+    `echo` commands print their arguments; anything else prints what it
+    maps to in `outputs`.
+    """
+    printed = [line]
+    for command in line.split('; '):
+        if command.startswith('echo '):
+            printed.append(command[5:])
+        else:
+            printed.append(outputs[command])
+    return '\r\n'.join(printed).encode('utf-8')
+
+
 def make_requested_machine():
     block_devices = [
         RequestedMachineBlockDevice(
@@ -653,6 +706,41 @@ class TestVirshSSH(MAASTestCase):
         expected = conn.get_machine_state('')
         self.assertEqual(None, expected)
 
+    def test_get_machine_states(self):
+        output = dedent("""\
+             Id    Name                           State
+            ----------------------------------------------------
+             1     foo                            running
+             -     bar                            shut off
+            """)
+        conn = self.configure_virshssh(output)
+        self.assertEqual(
+            {'foo': 'running', 'bar': 'shut off'}, conn.get_machine_states())
+        self.assertThat(
+            virsh.VirshSSH.run, MockCalledOnceWith(['list', '--all']))
+
+    def test_get_machine_states_error(self):
+        conn = self.configure_virshssh('error:')
+        self.assertIsNone(conn.get_machine_states())
+
+    def test_is_healthy_checks_for_prompt(self):
+        conn = virsh.VirshSSH()
+        self.patch(conn, 'isalive').return_value = True
+        mock_sendline = self.patch(conn, 'sendline')
+        mock_prompt = self.patch(conn, 'prompt')
+        mock_prompt.return_value = True
+        self.assertTrue(conn.is_healthy())
+        self.assertThat(mock_sendline, MockCalledOnceWith(''))
+        mock_prompt.return_value = False
+        self.assertFalse(conn.is_healthy())
+
+    def test_is_healthy_false_when_dead(self):
+        conn = virsh.VirshSSH()
+        self.patch(conn, 'isalive').return_value = False
+        mock_sendline = self.patch(conn, 'sendline')
+        self.assertFalse(conn.is_healthy())
+        self.assertThat(mock_sendline, MockNotCalled())
+
     def test_machine_mac_addresses_returns_list(self):
         macs = [factory.make_mac_address() for _ in range(2)]
         output = SAMPLE_IFLIST % (macs[0], macs[1])
@@ -961,6 +1049,150 @@ class TestVirshSSH(MAASTestCase):
         self.assertFalse(discovered_machine.interfaces[1].boot)
         self.assertFalse(discovered_machine.interfaces[2].boot)
 
+    def patch_sendline(self, conn, outputs):
+        def sendline(line):
+            conn.before = fake_virsh_line(line, outputs)
+        return self.patch(conn, 'sendline', MagicMock(side_effect=sendline))
+
+    def test_run_batch(self):
+        conn = self.configure_virshssh_pexpect()
+        outputs = {
+            'domstate foo': 'running\n',
+            'dumpxml foo': '<domain>\n  <name>foo</name>\n</domain>',
+            'domstate bar': "error: failed to get domain 'bar'",
+        }
+        self.patch_sendline(conn, outputs)
+        self.patch(conn, 'prompt')
+        self.assertEqual(
+            ['running', '<domain>\n  <name>foo</name>\n</domain>',
+             "error: failed to get domain 'bar'"],
+            conn.run_batch(
+                [['domstate', 'foo'], ['dumpxml', 'foo'],
+                 ['domstate', 'bar']]))
+
+    def test_run_batch_splits_long_lines(self):
+        conn = self.configure_virshssh_pexpect()
+        machines = [factory.make_name('machine') for _ in range(10)]
+        outputs = {
+            'domstate ' + machine: factory.make_name('state')
+            for machine in machines
+        }
+        sendline = self.patch_sendline(conn, outputs)
+        self.patch(conn, 'prompt')
+        self.assertEqual(
+            [outputs['domstate ' + machine] for machine in machines],
+            conn.run_batch(
+                [['domstate', machine] for machine in machines],
+                max_length=200))
+        lines = [args[0] for args, _ in sendline.call_args_list]
+        self.assertGreater(len(lines), 1)
+        self.assertTrue(all(len(line) <= 200 for line in lines))
+
+    def test_run_batch_without_commands_sends_nothing(self):
+        conn = self.configure_virshssh_pexpect()
+        mock_sendline = self.patch(conn, 'sendline')
+        self.assertEqual([], conn.run_batch([]))
+        self.assertThat(mock_sendline, MockNotCalled())
+
+    def make_domain_xml(self, name, pool, memory=4096, memory_unit='MiB'):
+        mac_addresses = [factory.make_mac_address() for _ in range(2)]
+        xml = SAMPLE_DOMAIN_DUMPXML.format(
+            name=name, memory=memory, memory_unit=memory_unit, cores=2,
+            pool_name=pool.name, pool_path=pool.path.rstrip('/'),
+            mac_addresses=mac_addresses)
+        return xml, mac_addresses
+
+    def make_storage_pool(self):
+        name = factory.make_name('storage')
+        return DiscoveredPodStoragePool(
+            id=factory.make_name('uuid'), type='dir', name=name,
+            storage=random.randint(4096, 8192),
+            path='/var/lib/libvirt/%s/' % name)
+
+    def test_get_domain_info(self):
+        pool = self.make_storage_pool()
+        xml, mac_addresses = self.make_domain_xml(
+            'foo', pool, memory=4194304, memory_unit='KiB')
+        path = pool.path.rstrip('/')
+        self.assertEqual(
+            virsh.DomainInfo(
+                architecture='amd64/generic', cores=2, memory=4096,
+                block_devices=[
+                    ('vda', path + '/foo-vda'),
+                    ('vdb', path + '/foo-vdb'),
+                ],
+                interfaces=[
+                    InterfaceInfo(
+                        'network', 'default', 'virtio', mac_addresses[0]),
+                    InterfaceInfo('bridge', 'br0', '-', mac_addresses[1]),
+                ]),
+            virsh.get_domain_info(xml))
+
+    def test_get_domain_info_converts_memory_to_MiB(self):
+        pool = self.make_storage_pool()
+        for memory, unit in ((4, 'GiB'), (4294967296, 'b'), (4096, 'M')):
+            xml, _ = self.make_domain_xml(
+                'foo', pool, memory=memory, memory_unit=unit)
+            self.assertEqual(4096, virsh.get_domain_info(xml).memory)
+
+    def test_get_discovered_machines(self):
+        pool = self.make_storage_pool()
+        conn = self.configure_virshssh_pexpect()
+        xml, mac_addresses = self.make_domain_xml('foo', pool)
+        outputs = {
+            'domstate foo': 'shut off',
+            'dumpxml foo': xml,
+            'domstate bar': "error: failed to get domain 'bar'",
+            'dumpxml bar': "error: failed to get domain 'bar'",
+            'domblkinfo foo vda': 'Capacity:       1000\nAllocation: 0',
+            'domblkinfo foo vdb': 'Capacity:       2000\nAllocation: 0',
+        }
+        self.patch_sendline(conn, outputs)
+        self.patch(conn, 'prompt')
+        [discovered_machine] = conn.get_discovered_machines(
+            ['foo', 'bar'], storage_pools=[pool])
+        self.assertEqual('foo', discovered_machine.hostname)
+        self.assertEqual('amd64/generic', discovered_machine.architecture)
+        self.assertEqual(2, discovered_machine.cores)
+        self.assertEqual(4096, discovered_machine.memory)
+        self.assertEqual('off', discovered_machine.power_state)
+        self.assertEqual(
+            {'power_id': 'foo'}, discovered_machine.power_parameters)
+        self.assertEqual(
+            [(1000, '/dev/vda', pool.id), (2000, '/dev/vdb', pool.id)],
+            [(bd.size, bd.id_path, bd.storage_pool)
+             for bd in discovered_machine.block_devices])
+        self.assertEqual(
+            [(mac_addresses[0], True, 'network', 'default'),
+             (mac_addresses[1], False, 'bridge', 'br0')],
+            [(iface.mac_address, iface.boot, iface.attach_type,
+              iface.attach_name)
+             for iface in discovered_machine.interfaces])
+        self.assertEqual({'foo': xml.strip()}, conn.xml)
+
+    def test_get_discovered_machines_handles_bad_storage_device(self):
+        pool = self.make_storage_pool()
+        conn = self.configure_virshssh_pexpect()
+        foo_xml, _ = self.make_domain_xml('foo', pool)
+        bar_xml, _ = self.make_domain_xml('bar', pool)
+        outputs = {
+            'domstate foo': 'shut off',
+            'dumpxml foo': foo_xml,
+            'domstate bar': 'running',
+            'dumpxml bar': bar_xml,
+            'domblkinfo foo vda': 'Capacity:       1000',
+            'domblkinfo foo vdb': "error: cannot stat file 'foo-vdb'",
+            'domblkinfo bar vda': 'Capacity:       1000',
+            'domblkinfo bar vdb': 'Capacity:       2000',
+        }
+        self.patch_sendline(conn, outputs)
+        self.patch(conn, 'prompt')
+        discovered_machines = conn.get_discovered_machines(
+            ['foo', 'bar'], storage_pools=[pool])
+        self.assertEqual(
+            ['bar'], [machine.hostname for machine in discovered_machines])
+        self.assertEqual('on', discovered_machines[0].power_state)
+
     def test__get_discovered_machine_handles_bad_storage_device(self):
         conn = self.configure_virshssh('')
         hostname = factory.make_name('hostname')
@@ -1931,6 +2163,14 @@ class TestVirshSSH(MAASTestCase):
             mock_discovered, MockCalledOnceWith(ANY, request=request))
         self.assertEquals(sentinel.discovered, observed)
 
+    def test_delete_domain_forgets_domain_xml(self):
+        conn = self.configure_virshssh('')
+        self.patch(virsh.VirshSSH, "run")
+        domain = factory.make_name('vm')
+        conn.xml[domain] = '<domain/>'
+        conn.delete_domain(domain)
+        self.assertNotIn(domain, conn.xml)
+
     def test_delete_domain_calls_correct_methods(self):
         conn = self.configure_virshssh('')
         mock_run = self.patch(virsh.VirshSSH, "run")
@@ -2104,10 +2344,164 @@ class TestVirsh(MAASTestCase):
                 domain=factory.make_string())
 
 
+class TestVirshSessionPool(MAASTestCase):
+    """Tests for `VirshSessionPool`."""
+
+    def setUp(self):
+        super(TestVirshSessionPool, self).setUp()
+        self.now = 1000.0
+        self.patch(virsh, 'monotonic', lambda: self.now)
+        self.mock_login = self.patch(virsh.VirshSSH, 'login')
+        self.mock_login.return_value = True
+        self.mock_is_healthy = self.patch(virsh.VirshSSH, 'is_healthy')
+        self.mock_is_healthy.return_value = True
+        self.mock_logout = self.patch(virsh.VirshSSH, 'logout')
+
+    def test_acquire_logs_in(self):
+        pool = virsh.VirshSessionPool()
+        power_address = factory.make_name('power_address')
+        conn = pool.acquire(power_address, 'pass')
+        self.assertIsInstance(conn, virsh.VirshSSH)
+        self.assertThat(
+            self.mock_login, MockCalledOnceWith(power_address, 'pass'))
+
+    def test_acquire_raises_error_on_failed_login(self):
+        self.mock_login.return_value = False
+        pool = virsh.VirshSessionPool()
+        self.assertRaises(
+            virsh.VirshError, pool.acquire,
+            factory.make_name('power_address'))
+
+    def test_acquire_reuses_released_session(self):
+        pool = virsh.VirshSessionPool()
+        power_address = factory.make_name('power_address')
+        conn = pool.acquire(power_address)
+        pool.release(conn)
+        self.assertIs(conn, pool.acquire(power_address))
+        self.assertThat(
+            self.mock_login, MockCalledOnceWith(power_address, None))
+
+    def test_acquire_does_not_share_sessions_between_hosts(self):
+        pool = virsh.VirshSessionPool()
+        conn = pool.acquire(factory.make_name('power_address'))
+        pool.release(conn)
+        self.assertIsNot(
+            conn, pool.acquire(factory.make_name('power_address')))
+
+    def test_acquire_discards_unhealthy_session(self):
+        pool = virsh.VirshSessionPool()
+        power_address = factory.make_name('power_address')
+        conn = pool.acquire(power_address)
+        pool.release(conn)
+        self.mock_is_healthy.return_value = False
+        self.assertIsNot(conn, pool.acquire(power_address))
+        self.assertThat(self.mock_logout, MockCalledOnceWith())
+
+    def test_acquire_closes_idle_sessions(self):
+        pool = virsh.VirshSessionPool(idle_timeout=60)
+        power_address = factory.make_name('power_address')
+        conn = pool.acquire(power_address)
+        pool.release(conn)
+        self.now += 60
+        self.assertIsNot(conn, pool.acquire(power_address))
+        self.assertThat(self.mock_logout, MockCalledOnceWith())
+        self.assertThat(self.mock_is_healthy, MockNotCalled())
+
+    def test_release_closes_sessions_beyond_max_idle(self):
+        pool = virsh.VirshSessionPool(max_idle=1)
+        power_address = factory.make_name('power_address')
+        conns = [pool.acquire(power_address) for _ in range(2)]
+        for conn in conns:
+            pool.release(conn)
+        self.assertThat(self.mock_logout, MockCalledOnceWith())
+
+    def test_release_forgets_domain_xml(self):
+        pool = virsh.VirshSessionPool()
+        conn = pool.acquire(factory.make_name('power_address'))
+        conn.xml['foo'] = '<domain/>'
+        pool.release(conn)
+        self.assertEqual({}, conn.xml)
+
+    def test_close_idle_returns_delay_until_next_expiry(self):
+        pool = virsh.VirshSessionPool(idle_timeout=60)
+        pool.release(pool.acquire(factory.make_name('power_address')))
+        self.now += 20
+        pool.release(pool.acquire(factory.make_name('power_address')))
+        self.now += 40
+        self.assertEqual(20, pool.close_idle())
+        self.assertThat(self.mock_logout, MockCalledOnceWith())
+        self.now += 20
+        self.assertIsNone(pool.close_idle())
+
+    def test_release_schedules_closing_idle_sessions(self):
+        clock = Clock()
+        self.patch(
+            virsh.reactor, 'callFromThread',
+            lambda func, *args: func(*args))
+        self.patch(virsh, 'deferToThread', maybeDeferred)
+        pool = virsh.VirshSessionPool(idle_timeout=60, clock=clock)
+        pool.release(pool.acquire(factory.make_name('power_address')))
+        self.now += 30
+        pool.release(pool.acquire(factory.make_name('power_address')))
+        self.assertEqual(1, len(clock.getDelayedCalls()))
+        self.now += 30
+        clock.advance(60)
+        self.assertThat(self.mock_logout, MockCalledOnceWith())
+        self.now += 30
+        clock.advance(30)
+        self.assertThat(self.mock_logout, MockCallsMatch(call(), call()))
+        self.assertEqual({}, dict(pool.idle))
+        self.assertEqual([], clock.getDelayedCalls())
+
+    def test_call_closes_session_on_error(self):
+        pool = virsh.VirshSessionPool()
+        power_address = factory.make_name('power_address')
+        func = MagicMock(side_effect=factory.make_exception_type())
+        self.assertRaises(
+            func.side_effect, pool.call, power_address, None, func)
+        self.assertThat(self.mock_logout, MockCalledOnceWith())
+        self.assertEqual({}, dict(pool.idle))
+
+    def test_get_machine_state_expires_states(self):
+        pool = virsh.VirshSessionPool(states_ttl=5)
+        power_address = factory.make_name('power_address')
+        mock_states = self.patch(virsh.VirshSSH, 'get_machine_states')
+        mock_states.side_effect = [{'foo': 'running'}, {'foo': 'shut off'}]
+        self.assertEqual(
+            'running', pool.get_machine_state(power_address, 'foo'))
+        self.now += 5
+        self.assertEqual(
+            'running', pool.get_machine_state(power_address, 'foo'))
+        self.now += 1
+        self.assertEqual(
+            'shut off', pool.get_machine_state(power_address, 'foo'))
+
+    def test_get_machine_state_refreshes_states_for_unknown_machine(self):
+        pool = virsh.VirshSessionPool()
+        power_address = factory.make_name('power_address')
+        mock_states = self.patch(virsh.VirshSSH, 'get_machine_states')
+        mock_states.side_effect = [{'foo': 'running'}, {'bar': 'shut off'}]
+        self.assertEqual(
+            'running', pool.get_machine_state(power_address, 'foo'))
+        self.assertEqual(
+            'shut off', pool.get_machine_state(power_address, 'bar'))
+
+    def test_get_machine_state_returns_None_on_error(self):
+        pool = virsh.VirshSessionPool()
+        self.patch(virsh.VirshSSH, 'get_machine_states').return_value = None
+        self.assertIsNone(
+            pool.get_machine_state(factory.make_name('power_address'), 'foo'))
+
+
 class TestVirshPodDriver(MAASTestCase):
 
     run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
 
+    def setUp(self):
+        super(TestVirshPodDriver, self).setUp()
+        # Don't leave idle sessions to be closed after the test.
+        self.patch(virsh.VirshSessionPool, '_scheduleReaping')
+
     def test_missing_packages(self):
         mock = self.patch(has_command_available)
         mock.return_value = False
@@ -2263,11 +2657,10 @@ class TestVirshPodDriver(MAASTestCase):
         driver = VirshPodDriver()
         mock_login = self.patch(virsh.VirshSSH, 'login')
         mock_login.return_value = True
-        mock_state = self.patch(virsh.VirshSSH, 'get_machine_state')
-        mock_state.return_value = virsh.VirshVMState.ON
-
         power_address = factory.make_name('power_address')
         power_id = factory.make_name('power_id')
+        mock_states = self.patch(virsh.VirshSSH, 'get_machine_states')
+        mock_states.return_value = {power_id: virsh.VirshVMState.ON}
         state = yield driver.power_state_virsh(power_address, power_id)
         self.assertEqual('on', state)
 
@@ -2276,11 +2669,10 @@ class TestVirshPodDriver(MAASTestCase):
         driver = VirshPodDriver()
         mock_login = self.patch(virsh.VirshSSH, 'login')
         mock_login.return_value = True
-        mock_state = self.patch(virsh.VirshSSH, 'get_machine_state')
-        mock_state.return_value = virsh.VirshVMState.OFF
-
         power_address = factory.make_name('power_address')
         power_id = factory.make_name('power_id')
+        mock_states = self.patch(virsh.VirshSSH, 'get_machine_states')
+        mock_states.return_value = {power_id: virsh.VirshVMState.OFF}
         state = yield driver.power_state_virsh(power_address, power_id)
         self.assertEqual('off', state)
 
@@ -2289,11 +2681,10 @@ class TestVirshPodDriver(MAASTestCase):
         driver = VirshPodDriver()
         mock_login = self.patch(virsh.VirshSSH, 'login')
         mock_login.return_value = True
-        mock_state = self.patch(virsh.VirshSSH, 'get_machine_state')
-        mock_state.return_value = None
-
         power_address = factory.make_name('power_address')
         power_id = factory.make_name('power_id')
+        mock_states = self.patch(virsh.VirshSSH, 'get_machine_states')
+        mock_states.return_value = {}
         with ExpectedException(virsh.VirshError):
             yield driver.power_state_virsh(
                 power_address, power_id)
@@ -2303,15 +2694,53 @@ class TestVirshPodDriver(MAASTestCase):
         driver = VirshPodDriver()
         mock_login = self.patch(virsh.VirshSSH, 'login')
         mock_login.return_value = True
-        mock_state = self.patch(virsh.VirshSSH, 'get_machine_state')
-        mock_state.return_value = 'unknown'
-
         power_address = factory.make_name('power_address')
         power_id = factory.make_name('power_id')
+        mock_states = self.patch(virsh.VirshSSH, 'get_machine_states')
+        mock_states.return_value = {power_id: 'unknown'}
         with ExpectedException(virsh.VirshError):
             yield driver.power_state_virsh(
                 power_address, power_id)
 
+    @inlineCallbacks
+    def test_power_state_queries_all_machines_on_host_once(self):
+        driver = VirshPodDriver()
+        mock_login = self.patch(virsh.VirshSSH, 'login')
+        mock_login.return_value = True
+        power_address = factory.make_name('power_address')
+        power_ids = [factory.make_name('power_id') for _ in range(3)]
+        mock_states = self.patch(virsh.VirshSSH, 'get_machine_states')
+        mock_states.return_value = {
+            power_id: virsh.VirshVMState.ON for power_id in power_ids}
+        for power_id in power_ids:
+            state = yield driver.power_state_virsh(power_address, power_id)
+            self.assertEqual('on', state)
+        self.assertThat(mock_login, MockCalledOnceWith(power_address, None))
+        self.assertThat(mock_states, MockCalledOnceWith())
+
+    @inlineCallbacks
+    def test_power_control_forgets_machine_states(self):
+        driver = VirshPodDriver()
+        mock_login = self.patch(virsh.VirshSSH, 'login')
+        mock_login.return_value = True
+        power_address = factory.make_name('power_address')
+        power_id = factory.make_name('power_id')
+        mock_states = self.patch(virsh.VirshSSH, 'get_machine_states')
+        mock_states.side_effect = [
+            {power_id: virsh.VirshVMState.OFF},
+            {power_id: virsh.VirshVMState.ON},
+        ]
+        mock_state = self.patch(virsh.VirshSSH, 'get_machine_state')
+        mock_state.return_value = virsh.VirshVMState.OFF
+        self.patch(virsh.VirshSSH, 'poweron')
+        self.patch(virsh.VirshSSH, 'is_healthy').return_value = True
+        state = yield driver.power_state_virsh(power_address, power_id)
+        self.assertEqual('off', state)
+        yield driver.power_control_virsh(power_address, power_id, 'on')
+        state = yield driver.power_state_virsh(power_address, power_id)
+        self.assertEqual('on', state)
+        self.assertThat(mock_login, MockCalledOnceWith(power_address, None))
+
     @inlineCallbacks
     def test_discover_errors_on_failed_login(self):
         driver = VirshPodDriver()
@@ -2351,9 +2780,11 @@ class TestVirshPodDriver(MAASTestCase):
         mock_get_pod_hints = self.patch(
             virsh.VirshSSH, 'get_pod_hints')
         mock_list_machines = self.patch(virsh.VirshSSH, 'list_machines')
-        mock_get_discovered_machine = self.patch(
-            virsh.VirshSSH, 'get_discovered_machine')
+        mock_get_discovered_machines = self.patch(
+            virsh.VirshSSH, 'get_discovered_machines')
         mock_list_machines.return_value = machines
+        mock_get_discovered_machines.return_value = [
+            MagicMock(cpu_speed=0) for _ in machines]
 
         discovered_pod = yield driver.discover(system_id, context)
         self.expectThat(mock_create_storage_pool, MockCalledOnceWith())
@@ -2364,10 +2795,14 @@ class TestVirshPodDriver(MAASTestCase):
         self.expectThat(
             mock_list_machines, MockCalledOnceWith())
         self.expectThat(
-            mock_get_discovered_machine, MockCallsMatch(
-                call(machines[0], storage_pools=sentinel.storage_pools),
-                call(machines[1], storage_pools=sentinel.storage_pools),
-                call(machines[2], storage_pools=sentinel.storage_pools)))
+            mock_get_discovered_machines, MockCalledOnceWith(
+                machines, storage_pools=sentinel.storage_pools))
+        self.expectThat(
+            discovered_pod.machines,
+            Equals(mock_get_discovered_machines.return_value))
+        self.expectThat(
+            [machine.cpu_speed for machine in discovered_pod.machines],
+            Equals([mock_pod.cpu_speed] * 3))
         self.expectThat(['virtual'], Equals(discovered_pod.tags))
 
     @inlineCallbacks
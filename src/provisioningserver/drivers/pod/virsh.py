@@ -8,11 +8,17 @@ __all__ = [
     'VirshPodDriver',
     ]
 
-from collections import namedtuple
+from collections import (
+    defaultdict,
+    namedtuple,
+)
+from operator import methodcaller
 import os
 import string
 from tempfile import NamedTemporaryFile
 from textwrap import dedent
+import threading
+from time import monotonic
 from uuid import uuid4
 
 from lxml import etree
@@ -51,6 +57,7 @@ from provisioningserver.utils.twisted import (
     asynchronous,
     synchronous,
 )
+from twisted.internet import reactor
 from twisted.internet.defer import inlineCallbacks
 from twisted.internet.threads import deferToThread
 
@@ -67,6 +74,20 @@ XPATH_ARCH = "/domain/os/type/@arch"
 XPATH_BOOT = "/domain/os/boot"
 XPATH_OS = "/domain/os"
 
+XPATH_MEMORY = "/domain/memory"
+XPATH_VCPU = "/domain/vcpu"
+XPATH_DISKS = "/domain/devices/disk[not(@device) or @device='disk']"
+XPATH_DISK_TARGET = "string(target/@dev)"
+XPATH_DISK_SOURCE = (
+    "string(source/@file|source/@dev|source/@dir|"
+    "source/@name|source/@volume)")
+XPATH_INTERFACES = "/domain/devices/interface"
+XPATH_INTERFACE_SOURCE = (
+    "string(source/@bridge|source/@dev|source/@network|"
+    "source/@name|source/@path)")
+XPATH_INTERFACE_MODEL = "string(model/@type)"
+XPATH_INTERFACE_MAC = "string(mac/@address)"
+
 XPATH_POOL_TYPE = "/pool/@type"
 XPATH_POOL_AVAILABLE = "/pool/available"
 XPATH_POOL_CAPACITY = "/pool/capacity"
@@ -257,6 +278,58 @@ InterfaceInfo = namedtuple("InterfaceInfo", (
     "mac",
 ))
 
+DomainInfo = namedtuple("DomainInfo", (
+    "architecture",
+    "cores",
+    "memory",
+    "block_devices",
+    "interfaces",
+))
+
+# Multipliers for the units libvirt accepts for memory, to get bytes.
+MEMORY_UNITS = {
+    'b': 1, 'bytes': 1,
+    'KB': 1000, 'k': 1024, 'KiB': 1024,
+    'MB': 1000 ** 2, 'M': 1024 ** 2, 'MiB': 1024 ** 2,
+    'GB': 1000 ** 3, 'G': 1024 ** 3, 'GiB': 1024 ** 3,
+    'TB': 1000 ** 4, 'T': 1024 ** 4, 'TiB': 1024 ** 4,
+}
+
+
+def get_domain_info(xml):
+    """Parse a domain's XML into a `DomainInfo`.
+
+    This gets from the XML alone what `dominfo`, `domblklist --details`, and
+    `domiflist` report, so a single `dumpxml` can replace all three. Memory
+    is in MiB; block devices are (target, source) tuples for disks only.
+    """
+    doc = etree.XML(xml)
+    evaluator = etree.XPathEvaluator(doc)
+
+    arch = evaluator(XPATH_ARCH)[0]
+    vcpu = evaluator(XPATH_VCPU)[0]
+    cores = int(vcpu.get('current', vcpu.text))
+    memory = evaluator(XPATH_MEMORY)[0]
+    memory = (
+        int(memory.text) * MEMORY_UNITS[memory.get('unit', 'KiB')] //
+        MEMORY_UNITS['MiB'])
+
+    block_devices = [
+        (disk.xpath(XPATH_DISK_TARGET),
+         disk.xpath(XPATH_DISK_SOURCE) or '-')
+        for disk in evaluator(XPATH_DISKS)
+    ]
+    interfaces = [
+        InterfaceInfo(
+            interface.get('type'),
+            interface.xpath(XPATH_INTERFACE_SOURCE) or '-',
+            interface.xpath(XPATH_INTERFACE_MODEL) or '-',
+            interface.xpath(XPATH_INTERFACE_MAC))
+        for interface in evaluator(XPATH_INTERFACES)
+    ]
+    return DomainInfo(
+        ARCH_FIX.get(arch, arch), cores, memory, block_devices, interfaces)
+
 
 REQUIRED_PACKAGES = [["virsh", "libvirt-clients"],
                      ["virt-login-shell", "libvirt-clients"]]
@@ -337,8 +410,9 @@ class VirshSSH(pexpect.spawn):
 
     def get_machine_xml(self, machine):
         # Check if we have a cached version of the XML.
-        # This is a short-lived object, so we don't need to worry about
-        # expiring objects in the cache.
+        # The cache is cleared when the session is returned to its pool, so
+        # it only lasts for one operation and we don't need to worry about
+        # expiring objects in it.
         if machine in self.xml:
             return self.xml[machine]
 
@@ -380,6 +454,13 @@ class VirshSSH(pexpect.spawn):
         self.sendline("quit")
         self.close()
 
+    def is_healthy(self, timeout=5):
+        """Check that the session is still answering at the virsh prompt."""
+        if not self.isalive():
+            return False
+        self.sendline("")
+        return self.prompt(timeout=timeout)
+
     def prompt(self, timeout=None):
         """Waits for virsh prompt."""
         if timeout is None:
@@ -396,6 +477,42 @@ class VirshSSH(pexpect.spawn):
         result = self.before.decode("utf-8").splitlines()
         return '\n'.join(result[1:])
 
+    def run_batch(self, commands, max_length=1000):
+        """Run several commands, returning a list of their outputs.
+
+        The commands are sent to virsh on as few lines as possible, separated
+        by semicolons, rather than waiting for the prompt after each one.
+        Each command is preceded by an `echo` of a unique marker so that the
+        output can be split up again. Lines are kept shorter than
+        `max_length` so that they fit in the terminal's line buffer.
+        """
+        marker = 'maas-%s' % uuid4().hex
+        lines, line = [], []
+        for index, args in enumerate(commands):
+            part = 'echo %s-%d; %s' % (marker, index, ' '.join(args))
+            if line and len('; '.join(line + [part])) > max_length:
+                lines.append('; '.join(line))
+                line = []
+            line.append(part)
+        if line:
+            lines.append('; '.join(line))
+
+        outputs = [[] for _ in commands]
+        for line in lines:
+            self.sendline(line)
+            self.prompt()
+            output = None
+            for text in self.before.decode("utf-8").splitlines():
+                prefix, _, index = text.strip().rpartition('-')
+                if prefix == marker and index.isdigit():
+                    # The command line may have been echoed back with a
+                    # marker on a line of its own; the real one comes last.
+                    output = outputs[int(index)]
+                    output.clear()
+                elif output is not None:
+                    output.append(text)
+        return ['\n'.join(output).strip() for output in outputs]
+
     def get_column_values(self, data, keys):
         """Return tuple of column value tuples based off keys."""
         data = data.strip().splitlines()
@@ -475,6 +592,29 @@ class VirshSSH(pexpect.spawn):
             return None
         return state
 
+    def get_machine_states(self):
+        """Gets the state of every VM, as a dict of {name: state}."""
+        output = self.run(['list', '--all']).strip()
+        if output.startswith('error:'):
+            maaslog.error("Failed to list machine states")
+            return None
+        # Parse the `virsh list --all` output, which will look something
+        # like the following:
+        #
+        #  Id    Name                           State
+        # ----------------------------------------------------
+        #  1     foo                            running
+        #  -     bar                            shut off
+        #
+        # That is, skip the two lines of header, and then extract the name
+        # and the state, which may contain spaces.
+        states = {}
+        for line in output.splitlines()[2:]:
+            values = line.split(None, 2)
+            if len(values) == 3:
+                states[values[1]] = values[2].strip()
+        return states
+
     def get_machine_interface_info(self, machine):
         """Gets list of mac addressess assigned to the VM."""
         output = self.run(['domiflist', machine]).strip()
@@ -736,6 +876,88 @@ class VirshSSH(pexpect.spawn):
         discovered_machine.interfaces = interfaces
         return discovered_machine
 
+    def get_discovered_machines(self, machines, storage_pools=None):
+        """Gets the discovered machines.
+
+        This gets the same information as calling `get_discovered_machine`
+        for each of `machines`, but with two batches of virsh commands in
+        total instead of seven or more commands per machine.
+        """
+        if storage_pools is None:
+            storage_pools = self.get_pod_storage_pools()
+
+        # Get the state and XML of every machine.
+        outputs = self.run_batch([
+            command
+            for machine in machines
+            for command in (['domstate', machine], ['dumpxml', machine])
+        ])
+        domains = []
+        for index, machine in enumerate(machines):
+            state, xml = outputs[index * 2:index * 2 + 2]
+            if state.startswith('error:') or xml.startswith('error:'):
+                maaslog.error("%s: Failed to get XML for machine", machine)
+                continue
+            # Cache the XML, since we'll need it later to reconfigure the VM.
+            self.xml[machine] = xml
+            domains.append((machine, state, get_domain_info(xml)))
+
+        # Get the size of every disk.
+        outputs = iter(self.run_batch([
+            ['domblkinfo', machine, device]
+            for machine, _, info in domains
+            for device, _ in info.block_devices
+        ]))
+
+        discovered_machines = []
+        for machine, state, info in domains:
+            sizes = [
+                self.get_key_value_unitless(next(outputs), "Capacity")
+                for _ in info.block_devices
+            ]
+            missing = [
+                device
+                for (device, _), size in zip(info.block_devices, sizes)
+                if size is None
+            ]
+            if len(missing) > 0:
+                # Bug lp:1690144 - see `get_discovered_machine`.
+                maaslog.error(
+                    "Unable to discover machine '%s' in virsh pod: storage "
+                    "device '%s' is missing its storage backing." % (
+                        machine, missing[0]))
+                continue
+
+            block_devices = []
+            for (device, source), size in zip(info.block_devices, sizes):
+                # Find the storage pool for this block device. Virsh doesn't
+                # tell you this information.
+                storage_pool = self.find_storage_pool(source, storage_pools)
+                block_devices.append(
+                    DiscoveredMachineBlockDevice(
+                        model=None, serial=None, size=int(size),
+                        id_path="/dev/%s" % device, tags=[],
+                        storage_pool=storage_pool.id))
+
+            interfaces = [
+                DiscoveredMachineInterface(
+                    mac_address=interface_info.mac, boot=(idx == 0),
+                    attach_type=interface_info.type,
+                    attach_name=interface_info.source)
+                for idx, interface_info in enumerate(info.interfaces)
+            ]
+            discovered_machine = DiscoveredMachine(
+                architecture=info.architecture, cores=info.cores,
+                cpu_speed=0, memory=info.memory, interfaces=interfaces,
+                block_devices=block_devices, tags=[])
+            discovered_machine.hostname = machine
+            discovered_machine.power_state = VM_STATE_TO_POWER_STATE[state]
+            discovered_machine.power_parameters = {
+                'power_id': machine,
+            }
+            discovered_machines.append(discovered_machine)
+        return discovered_machines
+
     def check_machine_can_startup(self, machine):
         """Check the machine for any startup errors
         after the domain is created in virsh.
@@ -1172,6 +1394,7 @@ class VirshSSH(pexpect.spawn):
 
     def delete_domain(self, domain):
         """Delete `domain` and its volumes."""
+        self.xml.pop(domain, None)
         # Ensure that its destroyed first.
         self.run(['destroy', domain])
         # Undefine the domains and remove all storage and snapshots.
@@ -1183,6 +1406,173 @@ class VirshSSH(pexpect.spawn):
             '--managed-save', '--nvram'])
 
 
+class VirshSessionPool:
+    """Logged-in virsh sessions, kept for reuse.
+
+    Sessions are keyed by address and password. A session is only used by
+    one thread at a time; while it's not in use it's kept for up to
+    `idle_timeout` seconds, and checked before it's used again, so that
+    repeated operations on the same host don't log in each time. All
+    methods block, so call them from a thread.
+
+    The states of all the VMs on a host are fetched together and kept for
+    `states_ttl` seconds, so that the power monitor can query every VM on
+    a host with a single `list --all`.
+
+    When given a `clock`, idle sessions are also closed in the background,
+    even when no more sessions are acquired.
+    """
+
+    def __init__(
+            self, idle_timeout=60.0, max_idle=4, states_ttl=5.0, clock=None):
+        super(VirshSessionPool, self).__init__()
+        self.clock = clock
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.states_ttl = states_ttl
+        # Store a mapping of { key: [(last_used, session), ...] }.
+        self.idle = defaultdict(list)
+        # Store a mapping of { key: (expires, { machine_name: state }) }.
+        self.states = {}
+        self.states_locks = defaultdict(threading.Lock)
+        self.lock = threading.Lock()
+        self._reaping = None
+
+    def _close(self, conn):
+        try:
+            conn.logout()
+        except Exception:
+            # The session is being thrown away; it may already be broken,
+            # in which case the process goes when `conn` is collected.
+            pass
+
+    def close_idle(self, everything=False):
+        """Close sessions that have been idle for too long, or all of them.
+
+        :return: The number of seconds until the next idle session is due to
+            be closed, or `None` if no sessions are left idle.
+        """
+        now = monotonic()
+        expired = []
+        oldest = None
+        with self.lock:
+            for key, sessions in list(self.idle.items()):
+                keep = []
+                for last_used, conn in sessions:
+                    if everything or now - last_used >= self.idle_timeout:
+                        expired.append(conn)
+                    else:
+                        keep.append((last_used, conn))
+                        if oldest is None or last_used < oldest:
+                            oldest = last_used
+                if len(keep) > 0:
+                    self.idle[key] = keep
+                else:
+                    del self.idle[key]
+        for conn in expired:
+            self._close(conn)
+        if oldest is None:
+            return None
+        else:
+            return oldest + self.idle_timeout - now
+
+    def _scheduleReaping(self, delay=None):
+        """Arrange to close idle sessions once they've been idle too long.
+
+        This must be called from the reactor.
+        """
+        if self._reaping is None or not self._reaping.active():
+            if delay is None:
+                delay = self.idle_timeout
+            self._reaping = self.clock.callLater(delay, self._reap)
+
+    def _reap(self):
+        """Close idle sessions in a thread; see `_scheduleReaping`."""
+
+        def reschedule(delay):
+            if delay is not None:
+                self._scheduleReaping(delay)
+
+        def failed(failure):
+            maaslog.error(
+                "Failed to close idle virsh sessions: %s",
+                failure.getErrorMessage())
+
+        d = deferToThread(self.close_idle)
+        d.addCallbacks(reschedule, failed)
+        return d
+
+    def acquire(self, power_address, power_pass=None):
+        """Return a logged-in session, reusing an idle one if possible.
+
+        :raise VirshError: If a new session cannot log in.
+        """
+        self.close_idle()
+        key = power_address, power_pass
+        while True:
+            with self.lock:
+                sessions = self.idle.get(key)
+                if not sessions:
+                    break
+                _, conn = sessions.pop()
+            if conn.is_healthy():
+                return conn
+            self._close(conn)
+        conn = VirshSSH()
+        if not conn.login(power_address, power_pass):
+            raise VirshError('Failed to login to virsh console.')
+        conn.session_key = key
+        return conn
+
+    def release(self, conn, reuse=True):
+        """Return a session from `acquire` to the pool.
+
+        :param reuse: If false, the session is closed instead; do this when
+            it may have been left in a bad state.
+        """
+        key = getattr(conn, 'session_key', None)
+        if reuse and key is not None:
+            # Domains may change before the session is used again.
+            conn.xml.clear()
+            with self.lock:
+                if len(self.idle[key]) < self.max_idle:
+                    self.idle[key].append((monotonic(), conn))
+                    if self.clock is not None:
+                        reactor.callFromThread(self._scheduleReaping)
+                    return
+        self._close(conn)
+
+    def call(self, power_address, power_pass, func, *args, **kwargs):
+        """Call `func` with a session as its first argument."""
+        conn = self.acquire(power_address, power_pass)
+        try:
+            result = func(conn, *args, **kwargs)
+        except:
+            self.release(conn, reuse=False)
+            raise
+        else:
+            self.release(conn)
+            return result
+
+    def get_machine_state(self, power_address, power_id, power_pass=None):
+        """Gets the VM state, from the states of all VMs on the host."""
+        key = power_address, power_pass
+        with self.states_locks[key]:
+            expires, states = self.states.get(key, (0, {}))
+            if expires < monotonic() or power_id not in states:
+                states = self.call(
+                    power_address, power_pass,
+                    methodcaller('get_machine_states'))
+                if states is None:
+                    return None
+                self.states[key] = monotonic() + self.states_ttl, states
+        return states.get(power_id)
+
+    def forget_machine_states(self, power_address, power_pass=None):
+        """Forget VM states for the host, e.g. after changing one."""
+        self.states.pop((power_address, power_pass), None)
+
+
 class VirshPodDriver(PodDriver):
 
     name = 'virsh'
@@ -1207,6 +1597,10 @@ class VirshPodDriver(PodDriver):
                 missing_packages.add(package)
         return list(missing_packages)
 
+    def __init__(self, clock=reactor):
+        super(VirshPodDriver, self).__init__(clock)
+        self.sessions = VirshSessionPool(clock=clock)
+
     @inlineCallbacks
     def power_control_virsh(
             self, power_address, power_id, power_change,
@@ -1218,25 +1612,27 @@ class VirshPodDriver(PodDriver):
         if power_pass == '':
             power_pass = None
 
-        conn = VirshSSH()
-        logged_in = yield deferToThread(conn.login, power_address, power_pass)
-        if not logged_in:
-            raise VirshError('Failed to login to virsh console.')
+        def control(conn):
+            state = conn.get_machine_state(power_id)
+            if state is None:
+                raise VirshError('%s: Failed to get power state' % power_id)
+
+            if state == VirshVMState.OFF:
+                if power_change == 'on':
+                    if conn.poweron(power_id) is False:
+                        raise VirshError(
+                            '%s: Failed to power on VM' % power_id)
+            elif state == VirshVMState.ON:
+                if power_change == 'off':
+                    if conn.poweroff(power_id) is False:
+                        raise VirshError(
+                            '%s: Failed to power off VM' % power_id)
 
-        state = yield deferToThread(conn.get_machine_state, power_id)
-        if state is None:
-            raise VirshError('%s: Failed to get power state' % power_id)
-
-        if state == VirshVMState.OFF:
-            if power_change == 'on':
-                powered_on = yield deferToThread(conn.poweron, power_id)
-                if powered_on is False:
-                    raise VirshError('%s: Failed to power on VM' % power_id)
-        elif state == VirshVMState.ON:
-            if power_change == 'off':
-                powered_off = yield deferToThread(conn.poweroff, power_id)
-                if powered_off is False:
-                    raise VirshError('%s: Failed to power off VM' % power_id)
+        try:
+            yield deferToThread(
+                self.sessions.call, power_address, power_pass, control)
+        finally:
+            self.sessions.forget_machine_states(power_address, power_pass)
 
     @inlineCallbacks
     def power_state_virsh(
@@ -1248,12 +1644,9 @@ class VirshPodDriver(PodDriver):
         if power_pass == '':
             power_pass = None
 
-        conn = VirshSSH()
-        logged_in = yield deferToThread(conn.login, power_address, power_pass)
-        if not logged_in:
-            raise VirshError('Failed to login to virsh console.')
-
-        state = yield deferToThread(conn.get_machine_state, power_id)
+        state = yield deferToThread(
+            self.sessions.get_machine_state, power_address, power_id,
+            power_pass)
         if state is None:
             raise VirshError('Failed to get domain: %s' % power_id)
 
@@ -1277,47 +1670,40 @@ class VirshPodDriver(PodDriver):
         """Power query Virsh node."""
         return self.power_state_virsh(**context)
 
-    @inlineCallbacks
-    def get_virsh_connection(self, context):
-        """Connect and return the virsh connection."""
-        power_address = context.get('power_address')
-        power_pass = context.get('power_pass')
-        # Login to Virsh console.
-        conn = VirshSSH()
-        logged_in = yield deferToThread(conn.login, power_address, power_pass)
-        if not logged_in:
-            raise VirshError('Failed to login to virsh console.')
-        return conn
+    def call_with_connection(self, context, func, *args, **kwargs):
+        """Call `func` in a thread with a virsh connection to the pod.
+
+        The connection is taken from, and returned to, the pool of sessions
+        to the pod's address.
+        """
+        return deferToThread(
+            self.sessions.call, context.get('power_address'),
+            context.get('power_pass'), func, *args, **kwargs)
 
-    @inlineCallbacks
     def discover(self, system_id, context):
         """Discover all resources.
 
         Returns a defer to a DiscoveredPod object.
         """
-        conn = yield self.get_virsh_connection(context)
+        return self.call_with_connection(context, self._discover)
 
+    def _discover(self, conn):
         # Check that we have at least one storage pool.  If not, create it.
-        pools = yield deferToThread(conn.list_pools)
+        pools = conn.list_pools()
         if not len(pools):
-            yield deferToThread(conn.create_storage_pool)
+            conn.create_storage_pool()
 
         # Discover pod resources.
-        discovered_pod = yield deferToThread(conn.get_pod_resources)
+        discovered_pod = conn.get_pod_resources()
 
         # Discovered pod hints.
-        discovered_pod.hints = yield deferToThread(conn.get_pod_hints)
+        discovered_pod.hints = conn.get_pod_hints()
 
         # Discover VMs.
-        machines = []
-        virtual_machines = yield deferToThread(conn.list_machines)
-        for vm in virtual_machines:
-            discovered_machine = yield deferToThread(
-                conn.get_discovered_machine, vm,
-                storage_pools=discovered_pod.storage_pools)
-            if discovered_machine is not None:
-                discovered_machine.cpu_speed = discovered_pod.cpu_speed
-                machines.append(discovered_machine)
+        machines = conn.get_discovered_machines(
+            conn.list_machines(), storage_pools=discovered_pod.storage_pools)
+        for discovered_machine in machines:
+            discovered_machine.cpu_speed = discovered_pod.cpu_speed
         discovered_pod.machines = machines
 
         # Set KVM Pod tags to 'virtual'.
@@ -1326,24 +1712,26 @@ class VirshPodDriver(PodDriver):
         # Return the DiscoveredPod
         return discovered_pod
 
-    @inlineCallbacks
     def compose(self, system_id, context, request):
         """Compose machine."""
-        conn = yield self.get_virsh_connection(context)
         default_pool = context.get(
             'default_storage_pool_id', context.get('default_storage_pool'))
-        created_machine = yield deferToThread(
-            conn.create_domain, request, default_pool)
-        hints = yield deferToThread(conn.get_pod_hints)
+        return self.call_with_connection(
+            context, self._compose, request, default_pool)
+
+    def _compose(self, conn, request, default_pool):
+        created_machine = conn.create_domain(request, default_pool)
+        hints = conn.get_pod_hints()
         return created_machine, hints
 
-    @inlineCallbacks
     def decompose(self, system_id, context):
         """Decompose machine."""
-        conn = yield self.get_virsh_connection(context)
-        yield deferToThread(conn.delete_domain, context['power_id'])
-        hints = yield deferToThread(conn.get_pod_hints)
-        return hints
+        return self.call_with_connection(
+            context, self._decompose, context['power_id'])
+
+    def _decompose(self, conn, power_id):
+        conn.delete_domain(power_id)
+        return conn.get_pod_hints()
 
 
 @synchronous
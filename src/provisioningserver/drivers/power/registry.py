@@ -1,4 +1,4 @@
-# Copyright 2017 Canonical Ltd.  This software is licensed under the
+# Copyright 2017-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Load all power drivers."""
@@ -8,25 +8,9 @@ __all__ = [
     ]
 
 from jsonschema import validate
+from provisioningserver.drivers import get_driver_schemas
 from provisioningserver.drivers.pod.registry import PodDriverRegistry
 from provisioningserver.drivers.power import JSON_POWER_DRIVERS_SCHEMA
-from provisioningserver.drivers.power.amt import AMTPowerDriver
-from provisioningserver.drivers.power.apc import APCPowerDriver
-from provisioningserver.drivers.power.dli import DLIPowerDriver
-from provisioningserver.drivers.power.fence_cdu import FenceCDUPowerDriver
-from provisioningserver.drivers.power.hmc import HMCPowerDriver
-from provisioningserver.drivers.power.ipmi import IPMIPowerDriver
-from provisioningserver.drivers.power.manual import ManualPowerDriver
-from provisioningserver.drivers.power.moonshot import MoonshotIPMIPowerDriver
-from provisioningserver.drivers.power.mscm import MSCMPowerDriver
-from provisioningserver.drivers.power.msftocs import MicrosoftOCSPowerDriver
-from provisioningserver.drivers.power.nova import NovaPowerDriver
-from provisioningserver.drivers.power.recs import RECSPowerDriver
-from provisioningserver.drivers.power.seamicro import SeaMicroPowerDriver
-from provisioningserver.drivers.power.ucsm import UCSMPowerDriver
-from provisioningserver.drivers.power.virsh import VirshPowerDriver
-from provisioningserver.drivers.power.vmware import VMwarePowerDriver
-from provisioningserver.drivers.power.wedge import WedgePowerDriver
 from provisioningserver.utils.registry import Registry
 
 
@@ -39,38 +23,40 @@ class PowerDriverRegistry(Registry):
         # Pod drivers are not included in the schema because they should
         # be used through `PodDriverRegistry`, except when a power action
         # is to be performed.
-        schemas = [
-            driver.get_schema(detect_missing_packages=detect_missing_packages)
-            for _, driver in cls
-        ]
+        schemas = get_driver_schemas(
+            cls, detect_missing_packages=detect_missing_packages)
         validate(schemas, JSON_POWER_DRIVERS_SCHEMA)
         return schemas
 
 
-# Register all the power drivers.
-power_drivers = [
-    AMTPowerDriver(),
-    APCPowerDriver(),
-    DLIPowerDriver(),
-    FenceCDUPowerDriver(),
-    HMCPowerDriver(),
-    IPMIPowerDriver(),
-    ManualPowerDriver(),
-    MoonshotIPMIPowerDriver(),
-    MSCMPowerDriver(),
-    MicrosoftOCSPowerDriver(),
-    NovaPowerDriver(),
-    RECSPowerDriver(),
-    SeaMicroPowerDriver(),
-    UCSMPowerDriver(),
-    VirshPowerDriver(),
-    VMwarePowerDriver(),
-    WedgePowerDriver(),
-]
-for driver in power_drivers:
-    PowerDriverRegistry.register_item(driver.name, driver)
-
-
-# Pod drivers are also power drivers.
-for driver_name, driver in PodDriverRegistry:
+# Register all the power drivers. Each is imported when first looked up.
+power_drivers = {
+    "amt": "provisioningserver.drivers.power.amt:AMTPowerDriver",
+    "apc": "provisioningserver.drivers.power.apc:APCPowerDriver",
+    "dli": "provisioningserver.drivers.power.dli:DLIPowerDriver",
+    "fence_cdu": (
+        "provisioningserver.drivers.power.fence_cdu:FenceCDUPowerDriver"),
+    "hmc": "provisioningserver.drivers.power.hmc:HMCPowerDriver",
+    "ipmi": "provisioningserver.drivers.power.ipmi:IPMIPowerDriver",
+    "manual": "provisioningserver.drivers.power.manual:ManualPowerDriver",
+    "moonshot": (
+        "provisioningserver.drivers.power.moonshot:MoonshotIPMIPowerDriver"),
+    "mscm": "provisioningserver.drivers.power.mscm:MSCMPowerDriver",
+    "msftocs": (
+        "provisioningserver.drivers.power.msftocs:MicrosoftOCSPowerDriver"),
+    "nova": "provisioningserver.drivers.power.nova:NovaPowerDriver",
+    "recs_box": "provisioningserver.drivers.power.recs:RECSPowerDriver",
+    "sm15k": "provisioningserver.drivers.power.seamicro:SeaMicroPowerDriver",
+    "ucsm": "provisioningserver.drivers.power.ucsm:UCSMPowerDriver",
+    "virsh": "provisioningserver.drivers.power.virsh:VirshPowerDriver",
+    "vmware": "provisioningserver.drivers.power.vmware:VMwarePowerDriver",
+    "wedge": "provisioningserver.drivers.power.wedge:WedgePowerDriver",
+}
+for driver_name, driver_path in power_drivers.items():
+    PowerDriverRegistry.register_lazy_item(driver_name, driver_path)
+
+
+# Pod drivers are also power drivers. They are registered as they are, so
+# that both registries share the same, possibly not yet imported, driver.
+for driver_name, driver in PodDriverRegistry.peek_items():
     PowerDriverRegistry.register_item(driver_name, driver)
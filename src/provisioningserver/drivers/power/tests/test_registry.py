@@ -1,4 +1,4 @@
-# Copyright 2017 Canonical Ltd.  This software is licensed under the
+# Copyright 2017-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for `provisioningserver.drivers.power.registry`."""
@@ -8,10 +8,17 @@ __all__ = []
 from unittest.mock import sentinel
 
 from maastesting.testcase import MAASTestCase
+from provisioningserver.drivers.pod.registry import (
+    pod_drivers,
+    PodDriverRegistry,
+)
 from provisioningserver.drivers.pod.tests.test_base import (
     make_pod_driver_base,
 )
-from provisioningserver.drivers.power.registry import PowerDriverRegistry
+from provisioningserver.drivers.power.registry import (
+    power_drivers,
+    PowerDriverRegistry,
+)
 from provisioningserver.drivers.power.tests.test_base import (
     make_power_driver_base,
 )
@@ -68,3 +75,15 @@ class TestPowerDriverRegistry(MAASTestCase):
                 'missing_packages': fake_pod_driver.detect_missing_packages(),
             }],
             PowerDriverRegistry.get_schema())
+
+
+class TestPowerDriverRegistryBuiltins(MAASTestCase):
+
+    def test_registers_power_and_pod_drivers(self):
+        self.assertItemsEqual(
+            set(power_drivers) | set(pod_drivers),
+            [name for name, _ in PowerDriverRegistry.peek_items()])
+
+    def test_shares_pod_drivers_with_pod_registry(self):
+        for name in pod_drivers:
+            self.assertIs(PodDriverRegistry[name], PowerDriverRegistry[name])
@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for `provisioningserver.drivers`."""
@@ -15,15 +15,27 @@ from jsonschema import (
     ValidationError,
 )
 from maastesting.factory import factory
+from maastesting.matchers import MockNotCalled
 from maastesting.testcase import MAASTestCase
+from provisioningserver import drivers
 from provisioningserver.drivers import (
     Architecture,
     ArchitectureRegistry,
+    build_driver_manifest,
+    get_driver_manifest,
+    get_driver_schemas,
     IP_EXTRACTOR_PATTERNS,
     make_setting_field,
     SETTING_PARAMETER_FIELD_SCHEMA,
     SETTING_SCOPE,
 )
+from provisioningserver.drivers.power.tests.test_base import (
+    make_power_driver_base,
+)
+from provisioningserver.utils.registry import (
+    LazyItem,
+    Registry,
+)
 from provisioningserver.utils.testing import RegistryFixture
 from testtools.matchers import (
     AfterPreprocessing,
@@ -267,3 +279,50 @@ class TestRegistries(MAASTestCase):
         ArchitectureRegistry.register_item("arch2", arch2)
         self.assertEqual(
             None, ArchitectureRegistry.get_by_pxealias("stinkywinky"))
+
+
+class TestDriverManifest(MAASTestCase):
+
+    def test_manifest_is_up_to_date(self):
+        self.assertEqual(
+            build_driver_manifest(), get_driver_manifest(),
+            "Run utilities/update-driver-manifest.")
+
+
+class TestGetDriverSchemas(MAASTestCase):
+
+    def setUp(self):
+        super(TestGetDriverSchemas, self).setUp()
+        # Ensure the global registry is empty for each test run.
+        self.useFixture(RegistryFixture())
+        self.path = factory.make_name("module") + ":Driver"
+        self.schema = {"name": factory.make_name("name")}
+        self.patch(drivers, "get_driver_manifest").return_value = {
+            self.path: self.schema,
+        }
+        self.load = self.patch(LazyItem, "load")
+
+    def test_describes_lazy_drivers_from_manifest(self):
+        Registry.register_lazy_item("driver", self.path)
+        self.assertEqual([self.schema], get_driver_schemas(Registry))
+        self.assertThat(self.load, MockNotCalled())
+
+    def test_returns_copy_of_manifest(self):
+        Registry.register_lazy_item("driver", self.path)
+        get_driver_schemas(Registry)[0]["name"] = "mutated"
+        self.assertEqual([self.schema], get_driver_schemas(Registry))
+
+    def test_loads_lazy_drivers_to_detect_missing_packages(self):
+        driver = make_power_driver_base()
+        self.load.return_value = driver
+        Registry.register_lazy_item("driver", self.path)
+        self.assertEqual(
+            [driver.get_schema(detect_missing_packages=True)],
+            get_driver_schemas(Registry, detect_missing_packages=True))
+
+    def test_describes_loaded_drivers_themselves(self):
+        driver = make_power_driver_base()
+        Registry.register_item("driver", driver)
+        self.assertEqual(
+            [driver.get_schema(detect_missing_packages=False)],
+            get_driver_schemas(Registry, detect_missing_packages=False))
@@ -153,6 +153,7 @@ def import_images(sources):
 
     with ClusterConfiguration.open() as config:
         storage = FilePath(config.tftp_root).parent().path
+        streams = config.image_download_streams
 
     with tempdir('keyrings') as keyrings_path:
         # XXX: Band-aid to ensure that the keyring_data is bytes. Future task:
@@ -194,7 +195,7 @@ def import_images(sources):
 
         try:
             snapshot_path = download_all_boot_resources(
-                sources, storage, product_mapping)
+                sources, storage, product_mapping, streams=streams)
         except Exception as e:
             try_send_rack_event(
                 EVENT_TYPES.RACK_IMPORT_ERROR,
@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Clean up old snapshot directories."""
@@ -7,8 +7,10 @@ __all__ = [
     'cleanup_snapshots_and_cache',
     ]
 
+from collections import defaultdict
 import os
 import shutil
+from stat import S_ISREG
 
 
 def list_old_snapshots(storage):
@@ -33,28 +35,41 @@ def cleanup_snapshots(storage):
 
 
 def list_unused_cache_files(storage):
-    """List of cache files that are no longer being referenced by snapshots."""
+    """List of cache files that are no longer being referenced by snapshots.
+
+    Files in the cache are linked into snapshots, so the link count of each
+    file is its reference count. A file may also be linked more than once
+    within the cache, e.g. under its SHA256 and under the name of the archive
+    it was extracted from, so these links are not counted as references.
+    """
     cache_dir = os.path.join(storage, 'cache')
-    if os.path.exists(cache_dir):
-        cache_files = [
-            os.path.join(cache_dir, filename)
-            for filename in os.listdir(cache_dir)
-            if os.path.isfile(os.path.join(cache_dir, filename))
-            ]
-    else:
-        cache_files = []
+    inodes = defaultdict(list)
+    for root, _, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            cache_file = os.path.join(root, filename)
+            stat = os.lstat(cache_file)
+            if S_ISREG(stat.st_mode):
+                inodes[stat.st_dev, stat.st_ino].append((cache_file, stat))
     return [
         cache_file
-        for cache_file in cache_files
-        if os.stat(cache_file).st_nlink == 1
+        for cache_files in inodes.values()
+        if cache_files[0][1].st_nlink <= len(cache_files)
+        for cache_file, _ in cache_files
         ]
 
 
 def cleanup_cache(storage):
-    """Remove files that are no longer being referenced by snapshots."""
+    """Remove files that are no longer being referenced by snapshots.
+
+    Directories in the cache that are left empty are removed too.
+    """
     cache_files = list_unused_cache_files(storage)
     for cache_file in cache_files:
         os.remove(cache_file)
+    cache_dir = os.path.join(storage, 'cache')
+    for root, dirnames, filenames in os.walk(cache_dir, topdown=False):
+        if root != cache_dir and len(os.listdir(root)) == 0:
+            os.rmdir(root)
 
 
 def cleanup_snapshots_and_cache(storage):
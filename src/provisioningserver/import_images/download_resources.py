@@ -8,15 +8,18 @@ __all__ = [
     ]
 
 from datetime import datetime
+import hashlib
 import os.path
 import tarfile
 
+from provisioningserver.import_images.downloader import ParallelDownloader
 from provisioningserver.import_images.helpers import (
     get_os_from_product,
     get_signing_policy,
     maaslog,
 )
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.utils.fs import atomic_link
 from simplestreams.mirrors import (
     BasicMirrorWriter,
     UrlMirrorReader,
@@ -34,6 +37,9 @@ log = LegacyLogger()
 
 DEFAULT_KEYRING_PATH = "/usr/share/keyrings"
 
+# The number of files to download from a source at once.
+DEFAULT_DOWNLOAD_STREAMS = 4
+
 
 def insert_file(store, name, tag, checksums, size, content_source):
     """Insert a file into `store`.
@@ -63,6 +69,57 @@ def insert_file(store, name, tag, checksums, size, content_source):
     return [(store._fullpath(tag), name)]
 
 
+def find_extracted_files(store, tag):
+    """Return the files extracted into `store` from the archive `tag`.
+
+    This is done by scanning the cache directory for files whose names end
+    with "-" and the given tag. Since the tag is the SHA256 this will always
+    be unique and if files are added/removed from the archive we'll get a new
+    tag. The archive itself, stored under the bare tag while it's extracted,
+    is not one of them.
+
+    :return: A list of files described as tuples of (path, logical name).
+    """
+    extracted_files = []
+    cache_dir = store._fullpath('')
+    suffix = '-' + tag
+    for root, dirs, files in os.walk(cache_dir):
+        for f in files:
+            if f.endswith(suffix):
+                # Strip out the tag
+                filename = f[:-len(suffix)]
+                if root != cache_dir:
+                    filename = os.path.join(root[len(cache_dir):], filename)
+                # Give full path to cached file
+                filepath = os.path.join(root, f)
+                extracted_files.append((filepath, filename))
+    return extracted_files
+
+
+def intern_file(store, path):
+    """Share the contents of the file at `path` with identical files.
+
+    Every file in `store` is also linked under its SHA256, as downloaded
+    files already are. If a file with the same SHA256 is already there,
+    `path` is replaced with a link to it, so that identical files extracted
+    from different archives, or downloaded separately, are stored once.
+
+    :param store: A simplestreams `ObjectStore`.
+    :param path: The path to a file in `store`.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for data in iter(lambda: stream.read(2 ** 20), b''):
+            sha256.update(data)
+    # XXX jtv 2014-04-24 bug=1313580: Isn't _fullpath meant to be private?
+    object_path = store._fullpath(sha256.hexdigest())
+    if (os.path.isfile(object_path) and
+            os.path.getsize(object_path) == os.path.getsize(path)):
+        atomic_link(object_path, path)
+    else:
+        atomic_link(path, object_path)
+
+
 def extract_archive_tar(store, name, tag, checksums, size, content_source):
     """Extract an archive.tar.xz into `store`.
 
@@ -78,7 +135,7 @@ def extract_archive_tar(store, name, tag, checksums, size, content_source):
     :param size: Optional size for the file, so Simplestreams knows what size
         to expect.
     :param content_source: A Simplestreams `ContentSource` for reading the
-        file.
+        file, or `None` if the archive is already in `store` under `tag`.
     :return: A list of inserted files (file and archive.tar.xz) described
         as tuples of (path, logical name).  The path lies in the directory
         managed by `store` and has a filename based on `tag`, not logical name.
@@ -86,22 +143,7 @@ def extract_archive_tar(store, name, tag, checksums, size, content_source):
     log.debug(
         "Inserting archive {name} (tag={tag}, size={size}).",
         name=name, tag=tag, size=size)
-    extracted_files = []
-    cache_dir = store._fullpath('')
-    # Check if the archive has already been extracted. This is done by scanning
-    # the cache directory for files containing the given tag. Since the tag is
-    # the SHA256 this will always be unique and if files are added/removed from
-    # the archive we'll get a new tag.
-    for root, dirs, files in os.walk(cache_dir):
-        for f in files:
-            if f.endswith(tag):
-                # Strip out the tag
-                filename = f[:-(len(tag) + 1)]
-                if root != cache_dir:
-                    filename = os.path.join(root[len(cache_dir):], filename)
-                # Give full path to cached file
-                filepath = os.path.join(root, f)
-                extracted_files.append((filepath, filename))
+    extracted_files = find_extracted_files(store, tag)
 
     # If no files with the given tag were found we need to extract them.
     if extracted_files == []:
@@ -109,7 +151,9 @@ def extract_archive_tar(store, name, tag, checksums, size, content_source):
             "Extracting archive {name} (tag={tag}, size={size}).",
             name=name, tag=tag, size=size)
         archive_path = store._fullpath(tag)
-        store.insert(tag, content_source, checksums, mutable=False, size=size)
+        if content_source is not None:
+            store.insert(
+                tag, content_source, checksums, mutable=False, size=size)
         with tarfile.open(archive_path, 'r|*') as tar:
             for member in tar:
                 if member.isfile():
@@ -117,6 +161,7 @@ def extract_archive_tar(store, name, tag, checksums, size, content_source):
                     filepath = store._fullpath('%s-%s' % (filename, tag))
                     fo = tar.extractfile(member)
                     store.insert(filepath, fo, mutable=False)
+                    intern_file(store, filepath)
                     extracted_files.append((filepath, filename))
         store.remove(tag)
 
@@ -168,12 +213,10 @@ def link_resources(
             os.makedirs(directory)
         for cached_file, logical_name in links:
             link_path = os.path.join(directory, logical_name)
-            if os.path.isfile(link_path):
-                os.remove(link_path)
             base_dir = os.path.dirname(link_path)
             if not os.path.exists(base_dir):
                 os.makedirs(base_dir)
-            os.link(cached_file, link_path)
+            atomic_link(cached_file, link_path)
 
 
 class RepoWriter(BasicMirrorWriter):
@@ -184,12 +227,17 @@ class RepoWriter(BasicMirrorWriter):
         should be stored.
     :ivar product_mapping: A `ProductMapping` describing the desired boot
         resources.
+    :ivar downloader: An optional `ParallelDownloader`. When given, items
+        are downloaded concurrently into `store`, and are extracted and
+        linked into the snapshot by `finish`.
     """
 
-    def __init__(self, root_path, store, product_mapping):
+    def __init__(self, root_path, store, product_mapping, downloader=None):
         self.root_path = root_path
         self.store = store
         self.product_mapping = product_mapping
+        self.downloader = downloader
+        self.pending = []
         super(RepoWriter, self).__init__(config={
             # Only download the latest version. Without this all versions
             # will be downloaded from simplestreams.
@@ -215,13 +263,46 @@ class RepoWriter(BasicMirrorWriter):
         size = data['size']
         ftype = item['ftype']
         filename = os.path.basename(item['path'])
+        if self.downloader is not None:
+            if (ftype == 'archive.tar.xz' and
+                    len(find_extracted_files(self.store, tag)) > 0):
+                download = None
+                contentsource.close()
+            else:
+                download = self.downloader.download(
+                    checksums, size, contentsource)
+            self.pending.append(
+                (download, item, filename, tag, checksums, size))
+            return
         if ftype == 'archive.tar.xz':
             links = extract_archive_tar(
                 self.store, filename, tag, checksums, size, contentsource)
         else:
             links = insert_file(
                 self.store, filename, tag, checksums, size, contentsource)
+        self.link_item(item, links)
+
+    def finish(self):
+        """Extract and link the items downloaded by `downloader`.
+
+        Items are handled in the order in which they were inserted, waiting
+        for each download to complete.
+        """
+        pending, self.pending = self.pending, []
+        for download, item, filename, tag, checksums, size in pending:
+            if download is not None:
+                download.result()
+            if item['ftype'] == 'archive.tar.xz':
+                links = extract_archive_tar(
+                    self.store, filename, tag, checksums, size, None)
+            else:
+                # XXX jtv 2014-04-24 bug=1313580: Isn't _fullpath meant to be
+                # private?
+                links = [(self.store._fullpath(tag), filename)]
+            self.link_item(item, links)
 
+    def link_item(self, item, links):
+        """Link `links` into the snapshot for the product `item`."""
         osystem = get_os_from_product(item)
 
         # link_resources creates a hardlink for every subarch. Every Ubuntu
@@ -262,7 +343,8 @@ class RepoWriter(BasicMirrorWriter):
 
 
 def download_boot_resources(path, store, snapshot_path, product_mapping,
-                            keyring_file=None):
+                            keyring_file=None,
+                            streams=DEFAULT_DOWNLOAD_STREAMS):
     """Download boot resources for one simplestreams source.
 
     :param path: The Simplestreams URL for this source.
@@ -274,13 +356,17 @@ def download_boot_resources(path, store, snapshot_path, product_mapping,
         downloaded.
     :param keyring_file: Optional path to a keyring file for verifying
         signatures.
+    :param streams: The number of files to download at once.
     """
     maaslog.info("Downloading boot resources from %s", path)
-    writer = RepoWriter(snapshot_path, store, product_mapping)
-    (mirror, rpath) = path_from_mirror_url(path, None)
-    policy = get_signing_policy(rpath, keyring_file)
-    reader = UrlMirrorReader(mirror, policy=policy)
-    writer.sync(reader, rpath)
+    with ParallelDownloader(store._fullpath(''), streams) as downloader:
+        writer = RepoWriter(
+            snapshot_path, store, product_mapping, downloader)
+        (mirror, rpath) = path_from_mirror_url(path, None)
+        policy = get_signing_policy(rpath, keyring_file)
+        reader = UrlMirrorReader(mirror, policy=policy)
+        writer.sync(reader, rpath)
+        writer.finish()
 
 
 def compose_snapshot_path(storage_path):
@@ -299,7 +385,8 @@ def compose_snapshot_path(storage_path):
 
 
 def download_all_boot_resources(
-        sources, storage_path, product_mapping, store=None):
+        sources, storage_path, product_mapping, store=None,
+        streams=DEFAULT_DOWNLOAD_STREAMS):
     """Download the actual boot resources.
 
     Local copies of boot resources are downloaded into a "cache" directory.
@@ -319,6 +406,8 @@ def download_all_boot_resources(
     :param product_mapping: A `ProductMapping` describing the resources to be
         downloaded.
     :param store: A `FileStore` instance. Used only for testing.
+    :param streams: The number of files to download at once from each
+        source.
     :return: Path to the snapshot directory.
     """
     storage_path = os.path.abspath(storage_path)
@@ -334,6 +423,6 @@ def download_all_boot_resources(
     for source in sources:
         download_boot_resources(
             source['url'], store, snapshot_path, product_mapping,
-            keyring_file=source.get('keyring')),
+            keyring_file=source.get('keyring'), streams=streams)
 
     return snapshot_path
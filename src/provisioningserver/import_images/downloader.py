@@ -0,0 +1,237 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Download boot resources concurrently, resuming interrupted transfers."""
+
+__all__ = [
+    'InvalidChecksum',
+    'ParallelDownloader',
+    ]
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import http.client
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from provisioningserver.import_images.helpers import maaslog
+from provisioningserver.logger import LegacyLogger
+
+
+log = LegacyLogger()
+
+
+class InvalidChecksum(Exception):
+    """A downloaded file does not match its size or checksums."""
+
+
+def make_hashers(checksums):
+    """Return hash objects for those of `checksums` that can be computed."""
+    return {
+        algorithm: hashlib.new(algorithm)
+        for algorithm in checksums
+        if algorithm in hashlib.algorithms_available
+    }
+
+
+class ParallelDownloader:
+    """Download files into a directory using several streams at once.
+
+    Each file is named after its SHA256, so a file that's already in the
+    directory, or that's already being downloaded, is not downloaded again.
+    Files are written to a ``.part`` file first. When downloading via HTTP a
+    ``.part`` file left by an interrupted download is resumed with a Range
+    request, and a download that fails part-way is retried from where it
+    stopped. Checksums are computed as each file is written and are checked
+    before it's given its final name.
+    """
+
+    def __init__(
+            self, directory, streams=4, retries=3, backoff=1.0,
+            chunk_size=(1 << 20), timeout=60.0):
+        """Initialise the downloader.
+
+        :param directory: The directory in which to store files.
+        :param streams: The number of files to download at once.
+        :param retries: The number of times to try each download.
+        :param backoff: Seconds to wait before the first retry; this doubles
+            for each subsequent retry.
+        :param chunk_size: The most to read or write at once.
+        :param timeout: Socket timeout, in seconds.
+        """
+        super(ParallelDownloader, self).__init__()
+        self.directory = directory
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(streams)
+        self.downloads = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close(cancel=(exc_type is not None))
+
+    def close(self, cancel=False):
+        """Wait for downloads to finish, or cancel those not yet started."""
+        if cancel:
+            for future in self.downloads.values():
+                future.cancel()
+        self.executor.shutdown(wait=True)
+
+    def get_path(self, sha256):
+        return os.path.join(self.directory, sha256)
+
+    def download(self, checksums, size, content_source):
+        """Download a file unless it is already present.
+
+        :param checksums: A Simplestreams checksums dict; it must include
+            ``sha256``.
+        :param size: The expected size of the file, or `None`.
+        :param content_source: A Simplestreams `ContentSource` for reading
+            the file. If it has an HTTP or HTTPS ``url`` the file is
+            downloaded directly from there, otherwise it's read from the
+            content source.
+        :return: A `Future` that will be the path to the file.
+        """
+        sha256 = checksums['sha256']
+        with self.lock:
+            try:
+                future = self.downloads[sha256]
+            except KeyError:
+                future = self.downloads[sha256] = self.executor.submit(
+                    self._fetch, checksums, size, content_source)
+            else:
+                self._close_source(content_source)
+        return future
+
+    def _close_source(self, content_source):
+        close = getattr(content_source, "close", None)
+        if close is not None:
+            close()
+
+    def _fetch(self, checksums, size, content_source):
+        path = self.get_path(checksums['sha256'])
+        try:
+            if os.path.isfile(path):
+                if self._verify_existing(path, checksums, size):
+                    log.debug("Reusing {path}.", path=path)
+                    return path
+                os.remove(path)
+            os.makedirs(self.directory, exist_ok=True)
+            partial = path + ".part"
+            url = getattr(content_source, "url", None)
+            if isinstance(url, str) and url.startswith(("http:", "https:")):
+                hashers = self._fetch_url(url, partial, checksums)
+            else:
+                hashers = self._fetch_source(
+                    content_source, partial, checksums)
+            self._verify(partial, hashers, checksums, size)
+            os.rename(partial, path)
+            maaslog.info("Downloaded %s.", path)
+            return path
+        finally:
+            self._close_source(content_source)
+
+    def _verify_existing(self, path, checksums, size):
+        if size is not None and os.path.getsize(path) != size:
+            return False
+        hashers = make_hashers(checksums)
+        with open(path, "rb") as stream:
+            for data in iter(lambda: stream.read(self.chunk_size), b""):
+                for hasher in hashers.values():
+                    hasher.update(data)
+        return all(
+            hasher.hexdigest() == checksums[algorithm]
+            for algorithm, hasher in hashers.items())
+
+    def _verify(self, partial, hashers, checksums, size):
+        actual_size = os.path.getsize(partial)
+        if size is not None and actual_size != size:
+            os.remove(partial)
+            raise InvalidChecksum(
+                "Expected %d bytes but got %d for %s." % (
+                    size, actual_size, partial))
+        for algorithm, hasher in hashers.items():
+            if hasher.hexdigest() != checksums[algorithm]:
+                os.remove(partial)
+                raise InvalidChecksum(
+                    "Invalid %s checksum for %s." % (algorithm, partial))
+
+    def _fetch_source(self, content_source, partial, checksums):
+        """Read all of `content_source` into `partial`."""
+        hashers = make_hashers(checksums)
+        with open(partial, "wb") as stream:
+            for data in iter(
+                    lambda: content_source.read(self.chunk_size), b""):
+                stream.write(data)
+                for hasher in hashers.values():
+                    hasher.update(data)
+        return hashers
+
+    def _resume(self, partial, hashers):
+        """Add what's already in `partial` to `hashers`; return its size."""
+        offset = 0
+        if os.path.isfile(partial):
+            with open(partial, "rb") as stream:
+                for data in iter(lambda: stream.read(self.chunk_size), b""):
+                    offset += len(data)
+                    for hasher in hashers.values():
+                        hasher.update(data)
+        return offset
+
+    def _fetch_url(self, url, partial, checksums):
+        """Download `url` into `partial`, resuming where possible."""
+        hashers = make_hashers(checksums)
+        offset = self._resume(partial, hashers)
+        for attempt in range(self.retries):
+            request = urllib.request.Request(url)
+            if offset > 0:
+                request.add_header("Range", "bytes=%d-" % offset)
+            try:
+                with urllib.request.urlopen(
+                        request, timeout=self.timeout) as response:
+                    if offset > 0 and response.status != 206:
+                        # The server ignored the Range; start again.
+                        log.debug("Cannot resume {url}.", url=url)
+                        hashers = make_hashers(checksums)
+                        offset = 0
+                        mode = "wb"
+                    else:
+                        mode = "ab"
+                    length = response.getheader("Content-Length")
+                    received = 0
+                    with open(partial, mode) as stream:
+                        for data in iter(
+                                lambda: response.read(self.chunk_size), b""):
+                            stream.write(data)
+                            offset += len(data)
+                            received += len(data)
+                            for hasher in hashers.values():
+                                hasher.update(data)
+                    if length is not None and received < int(length):
+                        # The connection was closed early.
+                        raise http.client.IncompleteRead(
+                            b"", int(length) - received)
+            except urllib.error.HTTPError as error:
+                if error.code == 416:
+                    # Range not satisfiable: the part is complete, or bogus.
+                    # Verification will tell.
+                    return hashers
+                elif error.code < 500 or attempt == self.retries - 1:
+                    raise
+            except (OSError, http.client.HTTPException):
+                if attempt == self.retries - 1:
+                    raise
+            else:
+                return hashers
+            log.debug(
+                "Download of {url} interrupted at {offset} bytes; "
+                "resuming.", url=url, offset=offset)
+            time.sleep(self.backoff * (2 ** attempt))
@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for the `cleanup` module."""
@@ -98,6 +98,40 @@ class TestCleanup(MAASTestCase):
         self.assertItemsEqual(
             cache_nlink_greater_than_1, remaining_cache)
 
+    def test_list_unused_cache_files_ignores_links_within_cache(self):
+        storage = self.make_dir()
+        unused = self.make_cache_file(storage)
+        unused_object = os.path.join(
+            storage, 'cache', factory.make_name('sha256'))
+        os.link(unused, unused_object)
+        used = self.make_cache_file(storage, link_count=1)
+        os.link(used, os.path.join(
+            storage, 'cache', factory.make_name('sha256')))
+        self.assertItemsEqual(
+            [unused, unused_object], cleanup.list_unused_cache_files(storage))
+
+    def test_list_unused_cache_files_includes_subdirectories(self):
+        storage = self.make_dir()
+        subdir = os.path.join(storage, 'cache', factory.make_name('subdir'))
+        os.makedirs(subdir)
+        unused = factory.make_file(subdir)
+        self.assertItemsEqual(
+            [unused], cleanup.list_unused_cache_files(storage))
+
+    def test_cleanup_cache_removes_empty_subdirectories(self):
+        storage = self.make_dir()
+        cache_dir = os.path.join(storage, 'cache')
+        empty = os.path.join(cache_dir, factory.make_name('subdir'))
+        os.makedirs(empty)
+        factory.make_file(empty)
+        used = os.path.join(cache_dir, factory.make_name('subdir'))
+        os.makedirs(used)
+        used_file = factory.make_file(used)
+        os.link(used_file, os.path.join(storage, factory.make_name('link')))
+        cleanup.cleanup_cache(storage)
+        self.assertItemsEqual(
+            [os.path.basename(used)], os.listdir(cache_dir))
+
     def test_cleanup_snapshots_and_cache_calls(self):
         storage = self.make_dir()
         mock_snapshots = self.patch_autospec(cleanup, 'cleanup_snapshots')
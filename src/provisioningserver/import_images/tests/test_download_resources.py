@@ -9,6 +9,7 @@ from datetime import datetime
 import hashlib
 import os
 import random
+import shutil
 import tarfile
 from unittest import mock
 
@@ -72,7 +73,8 @@ class TestDownloadAllBootResources(MAASTestCase):
             fake,
             MockCalledWith(
                 source['url'], file_store, snapshot_path, product_mapping,
-                keyring_file=source['keyring']))
+                keyring_file=source['keyring'],
+                streams=download_resources.DEFAULT_DOWNLOAD_STREAMS))
 
 
 class TestDownloadBootResources(MAASTestCase):
@@ -156,6 +158,25 @@ class TestExtractArchiveTar(MAASTestCase):
                     self.assertTrue(os.path.exists(cached_file))
                     self.assertEqual(info, self.get_file_info(cached_file))
 
+    def test_extracts_archive_already_in_store(self):
+        # The parallel downloader stores the archive under its SHA256, which
+        # is also its tag, before it's extracted.
+        with tempdir() as cache_dir:
+            store = FileStore(cache_dir)
+            tar_xz, files = self.make_tar_xz(cache_dir)
+            sha256, size = self.get_file_info(tar_xz)
+            os.rename(tar_xz, os.path.join(cache_dir, sha256))
+            cached_files = download_resources.extract_archive_tar(
+                store, os.path.basename(tar_xz), sha256, {'sha256': sha256},
+                size, None)
+            self.assertEqual(sorted(
+                (os.path.join(cache_dir, '%s-%s' % (f, sha256)), f)
+                for f in files), sorted(cached_files))
+            for f, info in files.items():
+                cached_file = os.path.join(cache_dir, '%s-%s' % (f, sha256))
+                self.assertEqual(info, self.get_file_info(cached_file))
+            self.assertFalse(os.path.exists(os.path.join(cache_dir, sha256)))
+
     def test_returns_files_from_cache(self):
         with tempdir() as cache_dir:
             store = FileStore(cache_dir)
@@ -178,6 +199,79 @@ class TestExtractArchiveTar(MAASTestCase):
                     expected_cached_file = (cached_file, f)
                     self.assertIn(expected_cached_file, cached_files)
 
+    def test_shares_files_between_archives(self):
+        with tempdir() as cache_dir:
+            store = FileStore(cache_dir)
+            archives = []
+            with tempdir() as tmp:
+                member = factory.make_file(tmp)
+                for _ in range(2):
+                    tar_xz = os.path.join(
+                        cache_dir, factory.make_name('archive') + '.tar.xz')
+                    with tarfile.open(tar_xz, 'w:xz') as tar:
+                        tar.add(member, os.path.basename(member))
+                        tar.add(factory.make_file(tmp), factory.make_name())
+                    archives.append(tar_xz)
+            extracted = {}
+            for tar_xz in archives:
+                sha256, size = self.get_file_info(tar_xz)
+                checksums = {'sha256': sha256}
+                with open(tar_xz, 'rb') as f:
+                    content_source = ChecksummingContentSource(
+                        f, checksums, size)
+                    for path, name in download_resources.extract_archive_tar(
+                            store, os.path.basename(tar_xz), sha256,
+                            checksums, size, content_source):
+                        extracted.setdefault(name, []).append(path)
+            first, second = extracted[os.path.basename(member)]
+            self.assertTrue(os.path.samefile(first, second))
+
+
+class TestFindExtractedFiles(MAASTestCase):
+    """Tests for `find_extracted_files`()."""
+
+    def test_finds_files_extracted_from_archive(self):
+        cache_dir = self.make_dir()
+        store = FileStore(cache_dir)
+        tag = factory.make_name('tag')
+        path = factory.make_file(cache_dir, 'file-%s' % tag)
+        self.assertEqual(
+            [(path, 'file')],
+            download_resources.find_extracted_files(store, tag))
+
+    def test_ignores_archive(self):
+        cache_dir = self.make_dir()
+        store = FileStore(cache_dir)
+        tag = factory.make_name('tag')
+        factory.make_file(cache_dir, tag)
+        self.assertEqual(
+            [], download_resources.find_extracted_files(store, tag))
+
+
+class TestInternFile(MAASTestCase):
+    """Tests for `intern_file`()."""
+
+    def test_links_file_under_its_sha256(self):
+        cache_dir = self.make_dir()
+        store = FileStore(cache_dir)
+        content = factory.make_bytes()
+        path = factory.make_file(cache_dir, contents=content)
+        download_resources.intern_file(store, path)
+        object_path = os.path.join(
+            cache_dir, hashlib.sha256(content).hexdigest())
+        self.assertTrue(os.path.samefile(path, object_path))
+
+    def test_links_file_to_identical_file(self):
+        cache_dir = self.make_dir()
+        store = FileStore(cache_dir)
+        content = factory.make_bytes()
+        object_path = factory.make_file(
+            cache_dir, hashlib.sha256(content).hexdigest(), content)
+        path = factory.make_file(cache_dir, contents=content)
+        download_resources.intern_file(store, path)
+        self.assertTrue(os.path.samefile(path, object_path))
+        self.assertEqual(2, os.stat(object_path).st_nlink)
+
 
 class TestRepoWriter(MAASTestCase):
     """Tests for `RepoWriter`."""
@@ -261,6 +355,106 @@ class TestRepoWriter(MAASTestCase):
                 label=product['label'], subarches={subarch},
                 bootloader_type=None))
 
+    def test_queues_download_and_links_on_finish(self):
+        product_mapping = ProductMapping()
+        subarch = factory.make_name('subarch')
+        product = self.make_product(subarch=subarch)
+        product_mapping.add(product, subarch)
+        store = mock.Mock()
+        store._fullpath.side_effect = lambda tag: os.path.join('/cache', tag)
+        downloader = mock.Mock()
+        content_source = mock.Mock()
+        repo_writer = download_resources.RepoWriter(
+            None, store, product_mapping, downloader)
+        self.patch(
+            download_resources, 'products_exdata').return_value = product
+        mock_insert_file = self.patch(download_resources, 'insert_file')
+        mock_link_resources = self.patch(download_resources, 'link_resources')
+        repo_writer.insert_item(product, None, None, None, content_source)
+        self.assertThat(
+            downloader.download,
+            MockCalledOnceWith(
+                {'sha256': product['sha256']}, product['size'],
+                content_source))
+        self.assertThat(mock_link_resources, MockNotCalled())
+        repo_writer.finish()
+        self.assertThat(
+            downloader.download.return_value.result, MockCalledOnceWith())
+        self.assertThat(mock_insert_file, MockNotCalled())
+        self.assertThat(
+            mock_link_resources,
+            MockCalledOnceWith(
+                snapshot_path=None,
+                links=[(
+                    os.path.join('/cache', product['sha256']),
+                    os.path.basename(product['path']))],
+                osystem=product['os'], arch=product['arch'],
+                release=product['release'], label=product['label'],
+                subarches={subarch}, bootloader_type=None))
+
+    def test_does_not_download_extracted_archive(self):
+        product_mapping = ProductMapping()
+        subarch = factory.make_name('subarch')
+        product = self.make_product(ftype='archive.tar.xz', subarch=subarch)
+        product_mapping.add(product, subarch)
+        downloader = mock.Mock()
+        content_source = mock.Mock()
+        repo_writer = download_resources.RepoWriter(
+            None, None, product_mapping, downloader)
+        self.patch(
+            download_resources, 'products_exdata').return_value = product
+        self.patch(download_resources, 'find_extracted_files').return_value = [
+            (factory.make_name('path'), factory.make_name('file'))]
+        mock_extract_archive_tar = self.patch(
+            download_resources, 'extract_archive_tar')
+        self.patch(download_resources, 'link_resources')
+        repo_writer.insert_item(product, None, None, None, content_source)
+        repo_writer.finish()
+        self.assertThat(downloader.download, MockNotCalled())
+        self.assertThat(content_source.close, MockCalledOnceWith())
+        self.assertThat(
+            mock_extract_archive_tar,
+            MockCalledOnceWith(
+                None, os.path.basename(product['path']), product['sha256'],
+                {'sha256': product['sha256']}, product['size'], None))
+
+    def test_extracts_downloaded_archive_on_finish(self):
+        root_path = self.make_dir()
+        cache_dir = self.make_dir()
+        store = FileStore(cache_dir)
+        content = factory.make_bytes()
+        tar_xz = os.path.join(self.make_dir(), 'archive.tar.xz')
+        with tarfile.open(tar_xz, 'w:xz') as tar:
+            tar.add(factory.make_file(self.make_dir(), contents=content),
+                    'bootx64.efi')
+        with open(tar_xz, 'rb') as f:
+            sha256 = hashlib.sha256(f.read()).hexdigest()
+        product_mapping = ProductMapping()
+        subarch = factory.make_name('subarch')
+        product = self.make_product(
+            ftype='archive.tar.xz', sha256=sha256,
+            size=os.path.getsize(tar_xz), subarch=subarch)
+        product_mapping.add(product, subarch)
+
+        def download(checksums, size, content_source):
+            # The parallel downloader stores files under their SHA256.
+            shutil.copy(tar_xz, store._fullpath(checksums['sha256']))
+            return mock.Mock()
+
+        downloader = mock.Mock()
+        downloader.download.side_effect = download
+        repo_writer = download_resources.RepoWriter(
+            root_path, store, product_mapping, downloader)
+        self.patch(
+            download_resources, 'products_exdata').return_value = product
+        repo_writer.insert_item(product, None, None, None, mock.Mock())
+        repo_writer.finish()
+        link_path = os.path.join(
+            root_path, product['os'], product['arch'], subarch,
+            product['release'], product['label'], 'bootx64.efi')
+        with open(link_path, 'rb') as f:
+            self.assertEqual(content, f.read())
+
     def test_inserts_rolling_links(self):
         product_mapping = ProductMapping()
         product = self.make_product(subarch='hwe-16.04', rolling=True)
@@ -0,0 +1,202 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.import_images.downloader`."""
+
+__all__ = []
+
+import hashlib
+from http.server import (
+    BaseHTTPRequestHandler,
+    HTTPServer,
+)
+from io import BytesIO
+import os
+from socketserver import ThreadingMixIn
+import threading
+from unittest.mock import Mock
+
+from fixtures import Fixture
+from maastesting.factory import factory
+from maastesting.matchers import (
+    FileContains,
+    MockNotCalled,
+)
+from maastesting.testcase import MAASTestCase
+from provisioningserver.import_images.downloader import (
+    InvalidChecksum,
+    ParallelDownloader,
+)
+from testtools.matchers import (
+    FileExists,
+    Not,
+)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class RangeHTTPServerFixture(Fixture):
+    """Serve `content` at every path, honouring Range requests.
+
+    :ivar ranges: The Range header of each request, or `None`.
+    :ivar truncate: The number of responses to cut short.
+    """
+
+    def __init__(self, content, ranges=True):
+        super(RangeHTTPServerFixture, self).__init__()
+        self.content = content
+        self.requests = []
+        self.truncate = 0
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                range_header = self.headers.get("Range")
+                fixture.requests.append(range_header)
+                content = fixture.content
+                if range_header is not None and ranges:
+                    start = int(range_header[6:-1])
+                    if start >= len(content):
+                        self.send_response(416)
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range", "bytes %d-%d/%d" % (
+                            start, len(content) - 1, len(content)))
+                    content = content[start:]
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                if fixture.truncate > 0:
+                    fixture.truncate -= 1
+                    content = content[:len(content) // 2]
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("localhost", 0), Handler)
+
+    @property
+    def url(self):
+        return "http://%s:%d/file" % self.server.server_address
+
+    def setUp(self):
+        super(RangeHTTPServerFixture, self).setUp()
+        threading.Thread(target=self.server.serve_forever).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+
+def make_checksums(content):
+    return {
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "md5": hashlib.md5(content).hexdigest(),
+    }
+
+
+class TestParallelDownloader(MAASTestCase):
+
+    def setUp(self):
+        super(TestParallelDownloader, self).setUp()
+        self.directory = self.make_dir()
+        self.downloader = ParallelDownloader(
+            self.directory, streams=2, backoff=0, chunk_size=100)
+        self.addCleanup(self.downloader.close)
+
+    def download(self, content, content_source):
+        future = self.downloader.download(
+            make_checksums(content), len(content), content_source)
+        return future.result()
+
+    def test_downloads_url_into_directory(self):
+        content = factory.make_bytes(1000)
+        httpd = self.useFixture(RangeHTTPServerFixture(content))
+        path = self.download(content, Mock(url=httpd.url))
+        self.assertEqual(
+            os.path.join(self.directory, make_checksums(content)["sha256"]),
+            path)
+        self.assertThat(path, FileContains(content))
+        self.assertEqual([None], httpd.requests)
+
+    def test_resumes_partial_download(self):
+        content = factory.make_bytes(1000)
+        httpd = self.useFixture(RangeHTTPServerFixture(content))
+        partial = os.path.join(
+            self.directory, make_checksums(content)["sha256"] + ".part")
+        factory.make_file(
+            self.directory, os.path.basename(partial), content[:300])
+        path = self.download(content, Mock(url=httpd.url))
+        self.assertThat(path, FileContains(content))
+        self.assertThat(partial, Not(FileExists()))
+        self.assertEqual(["bytes=300-"], httpd.requests)
+
+    def test_resumes_interrupted_download(self):
+        content = factory.make_bytes(1000)
+        httpd = self.useFixture(RangeHTTPServerFixture(content))
+        httpd.truncate = 1
+        path = self.download(content, Mock(url=httpd.url))
+        self.assertThat(path, FileContains(content))
+        self.assertEqual([None, "bytes=500-"], httpd.requests)
+
+    def test_starts_again_when_range_is_ignored(self):
+        content = factory.make_bytes(1000)
+        httpd = self.useFixture(RangeHTTPServerFixture(content, ranges=False))
+        partial = os.path.join(
+            self.directory, make_checksums(content)["sha256"] + ".part")
+        factory.make_file(
+            self.directory, os.path.basename(partial), content[:300])
+        path = self.download(content, Mock(url=httpd.url))
+        self.assertThat(path, FileContains(content))
+
+    def test_rejects_invalid_checksum(self):
+        content = factory.make_bytes(1000)
+        httpd = self.useFixture(RangeHTTPServerFixture(content))
+        checksums = make_checksums(content)
+        checksums["md5"] = hashlib.md5(b"other").hexdigest()
+        future = self.downloader.download(
+            checksums, len(content), Mock(url=httpd.url))
+        self.assertRaises(InvalidChecksum, future.result)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_reads_content_source_without_url(self):
+        content = factory.make_bytes(1000)
+        content_source = BytesIO(content)
+        path = self.download(content, content_source)
+        self.assertThat(path, FileContains(content))
+        self.assertTrue(content_source.closed)
+
+    def test_reuses_existing_file(self):
+        content = factory.make_bytes(1000)
+        factory.make_file(
+            self.directory, make_checksums(content)["sha256"], content)
+        content_source = Mock(url="http://example.com/file")
+        self.download(content, content_source)
+        self.assertThat(content_source.read, MockNotCalled())
+
+    def test_replaces_corrupt_existing_file(self):
+        content = factory.make_bytes(1000)
+        factory.make_file(
+            self.directory, make_checksums(content)["sha256"],
+            factory.make_bytes(1000))
+        path = self.download(content, BytesIO(content))
+        self.assertThat(path, FileContains(content))
+
+    def test_downloads_each_file_once(self):
+        content = factory.make_bytes(1000)
+        httpd = self.useFixture(RangeHTTPServerFixture(content))
+        checksums = make_checksums(content)
+        first = self.downloader.download(
+            checksums, len(content), Mock(url=httpd.url))
+        second_source = Mock(url=httpd.url)
+        second = self.downloader.download(
+            checksums, len(content), second_source)
+        self.assertIs(first, second)
+        first.result()
+        self.assertEqual([None], httpd.requests)
+        self.assertEqual(1, second_source.close.call_count)
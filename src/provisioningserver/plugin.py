@@ -48,10 +48,19 @@ class ProvisioningServiceMaker:
         self.description = description
 
     def _makeHTTPLogService(self):
-        """Create the HTTP log service."""
+        """Create the HTTP log service.
+
+        This also serves the runtime metrics of rackd, at ``/metrics``, and
+        its profiler, at ``/profiler``.
+        """
+        from provisioningserver.prometheus.collectors import (
+            PrometheusMetricsResource,
+        )
         from provisioningserver.rackdservices.http import HTTPLogResource
+        from provisioningserver.utils.profiler import ProfilerResource
         from twisted.application.internet import StreamServerEndpointService
         from twisted.internet.endpoints import AdoptedStreamServerEndpoint
+        from twisted.web.resource import Resource
         from provisioningserver.utils.twisted import SiteNoLog
 
         port = 5249
@@ -71,8 +80,12 @@ class ProvisioningServiceMaker:
         site_endpoint.port = port  # Make it easy to get the port number.
         site_endpoint.socket = s  # Prevent garbage collection.
 
+        root = Resource()
+        root.putChild(b"log", HTTPLogResource())
+        root.putChild(b"metrics", PrometheusMetricsResource())
+        root.putChild(b"profiler", ProfilerResource())
         http_log = StreamServerEndpointService(
-            site_endpoint, SiteNoLog(HTTPLogResource()))
+            site_endpoint, SiteNoLog(root))
         http_log.setName("http_log")
         return http_log
 
@@ -177,6 +190,14 @@ class ProvisioningServiceMaker:
         external_service.setName("external")
         return external_service
 
+    def _makeRuntimeMetricsService(self):
+        from provisioningserver.prometheus.collectors import (
+            RuntimeMetricsService,
+        )
+        runtime_metrics = RuntimeMetricsService()
+        runtime_metrics.setName("runtime_metrics")
+        return runtime_metrics
+
     def _makeServices(self, tftp_root, tftp_port, clock=reactor):
         # Several services need to make use of the RPC service.
         rpc_service = self._makeRPCService()
@@ -191,6 +212,7 @@ class ProvisioningServiceMaker:
         yield self._makeImageDownloadService(rpc_service, tftp_root)
         yield self._makeHTTPService(tftp_root, rpc_service)
         yield self._makeExternalService(rpc_service)
+        yield self._makeRuntimeMetricsService()
         # The following are network-accessible services.
         yield self._makeHTTPLogService()
         yield self._makeTFTPService(tftp_root, tftp_port, rpc_service)
@@ -230,6 +252,18 @@ class ProvisioningServiceMaker:
         with ClusterConfiguration.open() as config:
             tftp_root = config.tftp_root
             tftp_port = config.tftp_port
+            prometheus_enabled = config.prometheus_enabled
+            debug_profiler = config.debug_profiler
+
+        if prometheus_enabled:
+            from provisioningserver.prometheus.metrics import (
+                PROMETHEUS_METRICS,
+            )
+            PROMETHEUS_METRICS.enable()
+
+        if debug_profiler:
+            from provisioningserver.utils.profiler import PROFILER
+            reactor.callWhenRunning(PROFILER.start)
 
         from provisioningserver import services
         for service in self._makeServices(tftp_root, tftp_port, clock=clock):
@@ -0,0 +1,95 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Periodic collection of process-wide runtime metrics."""
+
+__all__ = [
+    "PrometheusMetricsResource",
+    "RuntimeMetricsService",
+]
+
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
+from twisted.application.internet import TimerService
+from twisted.web import resource
+
+
+def update_threadpool_metrics(metrics, name, pool):
+    """Record the occupancy of `pool` under the label `name`.
+
+    Pools that don't look like a Twisted `ThreadPool`, like `ThreadUnpool`,
+    are ignored.
+    """
+    if not hasattr(pool, "working"):
+        return
+    labels = {"pool": name}
+    metrics.update(
+        "maas_threadpool_threads", "set", value=pool.workers, labels=labels)
+    metrics.update(
+        "maas_threadpool_working", "set", value=len(pool.working),
+        labels=labels)
+    metrics.update(
+        "maas_threadpool_queued", "set", value=pool._queue.qsize(),
+        labels=labels)
+    metrics.update(
+        "maas_threadpool_max_threads", "set", value=pool.max, labels=labels)
+    metrics.update(
+        "maas_threadpool_saturation", "set",
+        value=(len(pool.working) / pool.max) if pool.max > 0 else 0,
+        labels=labels)
+    if hasattr(pool, "queueWait"):
+        # Only adaptive pools measure how long work waits.
+        metrics.update(
+            "maas_threadpool_queue_wait", "set", value=pool.queueWait,
+            labels=labels)
+
+
+class RuntimeMetricsService(TimerService):
+    """Periodically sample reactor lag and thread-pool occupancy.
+
+    Lag is measured by scheduling a call for "now" and observing how much
+    later it actually runs; a busy or blocked reactor delays it.
+    """
+
+    interval = 5
+
+    def __init__(self, clock=None, metrics=PROMETHEUS_METRICS):
+        super(RuntimeMetricsService, self).__init__(
+            self.interval, self.collect)
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        self.metrics = metrics
+
+    def collect(self):
+        if not self.metrics.enabled:
+            return
+        scheduled = self.clock.seconds()
+        self.clock.callLater(0, self._recordLag, scheduled)
+        pools = [
+            ("default", getattr(self.clock, "threadpool", None)),
+            ("database", getattr(self.clock, "threadpoolForDatabase", None)),
+        ]
+        for name, pool in pools:
+            if pool is not None:
+                update_threadpool_metrics(self.metrics, name, pool)
+
+    def _recordLag(self, scheduled):
+        self.metrics.update(
+            "maas_reactor_lag", "set", value=self.clock.seconds() - scheduled)
+
+
+class PrometheusMetricsResource(resource.Resource):
+    """Serve the runtime metrics of this process."""
+
+    isLeaf = True
+
+    def __init__(self, metrics=PROMETHEUS_METRICS):
+        super(PrometheusMetricsResource, self).__init__()
+        self.metrics = metrics
+
+    def render_GET(self, request):
+        if not self.metrics.enabled:
+            request.setResponseCode(404)
+            return b''
+        request.setHeader(b"Content-Type", b"text/plain")
+        return self.metrics.generate_latest()
@@ -0,0 +1,101 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Runtime Prometheus metrics shared by regiond and rackd."""
+
+__all__ = [
+    "METRICS_DEFINITIONS",
+    "PROMETHEUS_METRICS",
+]
+
+from os import getpid
+from socket import gethostname
+
+from provisioningserver.prometheus.utils import (
+    create_metrics,
+    MetricDefinition,
+)
+
+
+METRICS_DEFINITIONS = [
+    MetricDefinition(
+        'Histogram', 'maas_rpc_call_latency',
+        'Time taken to respond to RPC commands', ['call']),
+    MetricDefinition(
+        'Histogram', 'maas_rpc_answer_latency',
+        'Time taken for the far end to answer RPC calls', ['call', 'peer']),
+    MetricDefinition(
+        'Gauge', 'maas_rpc_outstanding_calls',
+        'Number of RPC calls awaiting an answer', ['peer']),
+    MetricDefinition(
+        'Counter', 'maas_rpc_hedged_calls',
+        'Number of RPC calls repeated on another connection because the '
+        'first was slow to answer', ['call']),
+    MetricDefinition(
+        'Histogram', 'maas_rpc_connection_registration_lag',
+        'Time taken for the master regiond process to record rack '
+        'controller RPC connections in the database', ['action']),
+    MetricDefinition(
+        'Histogram', 'maas_websocket_call_latency',
+        'Time taken to respond to websocket handler calls', ['call']),
+    MetricDefinition(
+        'Histogram', 'maas_api_call_latency',
+        'Time taken to respond to API operations',
+        ['handler', 'method', 'op']),
+    MetricDefinition(
+        'Counter', 'maas_api_not_modified',
+        'Number of API reads answered with 304 Not Modified', ['handler']),
+    MetricDefinition(
+        'Histogram', 'maas_db_thread_call_latency',
+        'Time taken by calls deferred to the database thread-pool, '
+        'including time spent queued', ['call']),
+    MetricDefinition(
+        'Histogram', 'maas_http_request_query_count',
+        'Number of database queries executed per HTTP request', ['method']),
+    MetricDefinition(
+        'Histogram', 'maas_http_request_query_latency',
+        'Time spent in database queries per HTTP request', ['method']),
+    MetricDefinition(
+        'Histogram', 'maas_tftp_file_transfer_latency',
+        'Time taken to prepare a TFTP file for transfer', ['boot_method']),
+    MetricDefinition(
+        'Counter', 'maas_http_boot_requests',
+        'Number of boot files requested over HTTP', []),
+    MetricDefinition(
+        'Gauge', 'maas_reactor_lag',
+        'Delay before a call scheduled in the reactor is run', []),
+    MetricDefinition(
+        'Gauge', 'maas_threadpool_threads',
+        'Number of threads in the thread-pool', ['pool']),
+    MetricDefinition(
+        'Gauge', 'maas_threadpool_working',
+        'Number of threads in the thread-pool doing work', ['pool']),
+    MetricDefinition(
+        'Gauge', 'maas_threadpool_queued',
+        'Number of tasks waiting for a thread in the thread-pool', ['pool']),
+    MetricDefinition(
+        'Gauge', 'maas_threadpool_max_threads',
+        'Current limit on the number of threads in the thread-pool',
+        ['pool']),
+    MetricDefinition(
+        'Gauge', 'maas_threadpool_saturation',
+        'Fraction of the thread-pool limit that is doing work', ['pool']),
+    MetricDefinition(
+        'Gauge', 'maas_threadpool_queue_wait',
+        'Mean time recent tasks waited for a thread in the thread-pool',
+        ['pool']),
+    MetricDefinition(
+        'Counter', 'maas_post_commit_hooks_keyed',
+        'Number of keyed post-commit hooks registered', ['kind']),
+    MetricDefinition(
+        'Counter', 'maas_post_commit_hooks_collapsed',
+        'Number of keyed post-commit hooks collapsed into an earlier hook '
+        'with the same key', ['kind']),
+]
+
+
+# The global set of runtime metrics for this process. Collection is disabled
+# until the daemon enables it, see `PrometheusMetrics.enable`.
+PROMETHEUS_METRICS = create_metrics(
+    METRICS_DEFINITIONS,
+    extra_labels={'host': gethostname(), 'pid': getpid})
@@ -0,0 +1,94 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.prometheus.collectors`."""
+
+__all__ = []
+
+from unittest.mock import Mock
+
+from maastesting.testcase import MAASTestCase
+from provisioningserver.prometheus.collectors import (
+    PrometheusMetricsResource,
+    RuntimeMetricsService,
+    update_threadpool_metrics,
+)
+from provisioningserver.prometheus.metrics import METRICS_DEFINITIONS
+from provisioningserver.prometheus.utils import (
+    create_metrics,
+    PROMETHEUS_SUPPORTED,
+)
+from provisioningserver.utils.twisted import (
+    AdaptiveThreadPool,
+    ThreadPool,
+)
+from twisted.internet.task import Clock
+from twisted.web.test.requesthelper import DummyRequest
+
+
+class TestRuntimeMetrics(MAASTestCase):
+
+    def setUp(self):
+        super(TestRuntimeMetrics, self).setUp()
+        if not PROMETHEUS_SUPPORTED:
+            self.skipTest('cannot test metrics without prometheus_client')
+        self.metrics = create_metrics(METRICS_DEFINITIONS)
+        self.metrics.enable()
+
+    def test_update_threadpool_metrics(self):
+        pool = ThreadPool(0, 5, "test")
+        update_threadpool_metrics(self.metrics, "test", pool)
+        output = self.metrics.generate_latest().decode("ascii")
+        self.assertIn('maas_threadpool_threads{pool="test"} 0.0', output)
+        self.assertIn('maas_threadpool_working{pool="test"} 0.0', output)
+        self.assertIn('maas_threadpool_queued{pool="test"} 0.0', output)
+        self.assertIn('maas_threadpool_max_threads{pool="test"} 5.0', output)
+        self.assertIn('maas_threadpool_saturation{pool="test"} 0.0', output)
+        self.assertNotIn('maas_threadpool_queue_wait{pool="test"}', output)
+
+    def test_update_threadpool_metrics_for_adaptive_pool(self):
+        pool = AdaptiveThreadPool(0, 5, "test", clock=Clock())
+        pool.queueWait = 0.25
+        update_threadpool_metrics(self.metrics, "test", pool)
+        output = self.metrics.generate_latest().decode("ascii")
+        self.assertIn('maas_threadpool_max_threads{pool="test"} 1.0', output)
+        self.assertIn('maas_threadpool_queue_wait{pool="test"} 0.25', output)
+
+    def test_update_threadpool_metrics_ignores_other_pools(self):
+        update_threadpool_metrics(self.metrics, "test", object())
+        output = self.metrics.generate_latest().decode("ascii")
+        self.assertNotIn('pool="test"', output)
+
+    def test_collect_records_reactor_lag(self):
+        clock = Clock()
+        service = RuntimeMetricsService(clock=clock, metrics=self.metrics)
+        service.collect()
+        clock.advance(2)
+        output = self.metrics.generate_latest().decode("ascii")
+        self.assertIn('maas_reactor_lag 2.0', output)
+
+    def test_collect_does_nothing_when_disabled(self):
+        clock = Clock()
+        self.metrics.disable()
+        service = RuntimeMetricsService(clock=clock, metrics=self.metrics)
+        service.collect()
+        self.assertEqual([], clock.getDelayedCalls())
+
+
+class TestPrometheusMetricsResource(MAASTestCase):
+
+    def test_render_GET(self):
+        metrics = Mock(enabled=True)
+        metrics.generate_latest.return_value = b"metrics"
+        resource = PrometheusMetricsResource(metrics)
+        request = DummyRequest([b"metrics"])
+        self.assertEqual(b"metrics", resource.render_GET(request))
+        self.assertEqual(
+            [b"text/plain"],
+            request.responseHeaders.getRawHeaders(b"Content-Type"))
+
+    def test_render_GET_not_found_when_disabled(self):
+        resource = PrometheusMetricsResource(Mock(enabled=False))
+        request = DummyRequest([b"metrics"])
+        self.assertEqual(b"", resource.render_GET(request))
+        self.assertEqual(404, request.responseCode)
@@ -0,0 +1,147 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.prometheus.utils`."""
+
+__all__ = []
+
+from maastesting.testcase import MAASTestCase
+from provisioningserver.prometheus.utils import (
+    create_metrics,
+    MetricDefinition,
+    PrometheusMetrics,
+    PROMETHEUS_SUPPORTED,
+)
+from twisted.internet.defer import (
+    Deferred,
+    succeed,
+)
+
+
+class TestPrometheusMetrics(MAASTestCase):
+
+    def setUp(self):
+        super(TestPrometheusMetrics, self).setUp()
+        if not PROMETHEUS_SUPPORTED:
+            self.skipTest('cannot test metrics without prometheus_client')
+
+    def make_metrics(self, **kwargs):
+        definitions = [
+            MetricDefinition('Gauge', 'sample_gauge', 'Gauge', ['label']),
+            MetricDefinition('Histogram', 'sample_latency', 'Latency', []),
+        ]
+        metrics = create_metrics(definitions, **kwargs)
+        metrics.enable()
+        return metrics
+
+    def test_create_metrics(self):
+        metrics = self.make_metrics()
+        self.assertEqual(
+            ['sample_gauge', 'sample_latency'], metrics.available_metrics)
+
+    def test_starts_disabled(self):
+        metrics = create_metrics([])
+        self.assertFalse(metrics.enabled)
+
+    def test_cannot_enable_without_registry(self):
+        metrics = PrometheusMetrics()
+        metrics.enable()
+        self.assertFalse(metrics.enabled)
+        self.assertIsNone(metrics.generate_latest())
+
+    def test_update(self):
+        metrics = self.make_metrics()
+        metrics.update(
+            'sample_gauge', 'set', value=12, labels={'label': 'foo'})
+        self.assertIn(
+            'sample_gauge{label="foo"} 12.0',
+            metrics.generate_latest().decode('ascii'))
+
+    def test_update_does_nothing_when_disabled(self):
+        metrics = self.make_metrics()
+        metrics.disable()
+        metrics.update(
+            'sample_gauge', 'set', value=12, labels={'label': 'foo'})
+        self.assertNotIn(
+            'sample_gauge{label="foo"}',
+            metrics.generate_latest().decode('ascii'))
+
+    def test_update_with_extra_labels(self):
+        metrics = self.make_metrics(
+            extra_labels={'host': 'example', 'pid': lambda: 1234})
+        metrics.update(
+            'sample_gauge', 'set', value=3, labels={'label': 'foo'})
+        self.assertIn(
+            'sample_gauge{host="example",label="foo",pid="1234"} 3.0',
+            metrics.generate_latest().decode('ascii'))
+
+    def test_record_call_latency_sync(self):
+        metrics = self.make_metrics()
+
+        @metrics.record_call_latency('sample_latency')
+        def func(param):
+            return param
+
+        self.assertEqual('result', func('result'))
+        self.assertIn(
+            'sample_latency_count 1.0',
+            metrics.generate_latest().decode('ascii'))
+
+    def test_record_call_latency_sync_error(self):
+        metrics = self.make_metrics()
+
+        @metrics.record_call_latency('sample_latency')
+        def func():
+            raise ZeroDivisionError()
+
+        self.assertRaises(ZeroDivisionError, func)
+        self.assertIn(
+            'sample_latency_count 1.0',
+            metrics.generate_latest().decode('ascii'))
+
+    def test_record_call_latency_async(self):
+        metrics = self.make_metrics()
+        d = Deferred()
+
+        @metrics.record_call_latency('sample_latency')
+        def func():
+            return d
+
+        result = func()
+        self.assertIn(
+            'sample_latency_count 0.0',
+            metrics.generate_latest().decode('ascii'))
+        d.callback('result')
+        self.assertEqual('result', self.successResultOf(result))
+        self.assertIn(
+            'sample_latency_count 1.0',
+            metrics.generate_latest().decode('ascii'))
+
+    def test_record_call_latency_with_labels(self):
+        metrics = create_metrics([
+            MetricDefinition(
+                'Histogram', 'labelled_latency', 'Latency', ['label'])])
+        metrics.enable()
+
+        @metrics.record_call_latency(
+            'labelled_latency', get_labels=lambda param: {'label': param})
+        def func(param):
+            return succeed(param)
+
+        func('foo')
+        self.assertIn(
+            'labelled_latency_count{label="foo"} 1.0',
+            metrics.generate_latest().decode('ascii'))
+
+    def test_record_call_latency_passes_through_when_disabled(self):
+        metrics = self.make_metrics()
+        metrics.disable()
+        calls = []
+
+        @metrics.record_call_latency(
+            'sample_latency', get_labels=lambda: calls.append('labels'))
+        def func():
+            return 'result'
+
+        self.assertEqual('result', func())
+        self.assertEqual([], calls)
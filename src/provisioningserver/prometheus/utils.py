@@ -0,0 +1,171 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Helpers for collecting Prometheus metrics in MAAS daemons.
+
+The `prometheus_client` library is optional. When it's not installed the
+helpers here degrade to no-ops, so instrumented code doesn't need to care.
+"""
+
+__all__ = [
+    "create_metrics",
+    "MetricDefinition",
+    "PrometheusMetrics",
+    "PROMETHEUS_SUPPORTED",
+]
+
+from collections import namedtuple
+from functools import wraps
+import time
+
+from twisted.internet.defer import Deferred
+
+
+try:
+    import prometheus_client
+    PROMETHEUS_SUPPORTED = True
+except ImportError:
+    PROMETHEUS_SUPPORTED = False
+
+
+MetricDefinition = namedtuple(
+    "MetricDefinition", ["type", "name", "description", "labels"])
+
+
+def _no_labels(*args, **kwargs):
+    return {}
+
+
+class PrometheusMetrics:
+    """Wrapper for accessing and interacting with Prometheus metrics.
+
+    Collection starts disabled: until `enable` is called, every update is a
+    single attribute check and decorated functions are called straight
+    through, so instrumentation costs next to nothing when nobody scrapes.
+
+    :ivar registry: The `CollectorRegistry` holding the metrics, or `None`
+        if `prometheus_client` isn't available.
+    """
+
+    def __init__(self, registry=None, metrics=None, extra_labels=None):
+        super(PrometheusMetrics, self).__init__()
+        self.registry = registry
+        self.enabled = False
+        self._metrics = {} if metrics is None else metrics
+        self._extra_labels = {} if extra_labels is None else extra_labels
+
+    @property
+    def available_metrics(self):
+        """Return a list of the names of the available metrics."""
+        return sorted(self._metrics)
+
+    def enable(self):
+        """Start collecting metrics, if Prometheus is supported."""
+        self.enabled = self.registry is not None
+
+    def disable(self):
+        """Stop collecting metrics."""
+        self.enabled = False
+
+    def update(self, metric_name, action, value=None, labels=None):
+        """Update the specified metric.
+
+        :param metric_name: The name of the metric to update.
+        :param action: The method to call on the metric, e.g. "observe",
+            "set" or "inc".
+        :param value: The value to pass to `action`, if any.
+        :param labels: A dict of label values for the metric.
+        """
+        if not self.enabled:
+            return
+        metric = self._metrics[metric_name]
+        all_labels = self._get_extra_labels()
+        if labels:
+            all_labels.update(labels)
+        if all_labels:
+            metric = metric.labels(**all_labels)
+        if value is None:
+            getattr(metric, action)()
+        else:
+            getattr(metric, action)(value)
+
+    def _get_extra_labels(self):
+        # Values can be callables so that labels like the PID are correct
+        # even if the process forks after the metrics have been created.
+        return {
+            name: value() if callable(value) else value
+            for name, value in self._extra_labels.items()
+        }
+
+    def record_call_latency(self, metric_name, get_labels=_no_labels):
+        """Decorator recording the latency of calls to a function.
+
+        The duration is observed on the named histogram. If the decorated
+        function returns a `Deferred`, the time is taken when it fires.
+
+        :param get_labels: A function called with the same arguments as the
+            decorated function, returning a dict of label values.
+        """
+        def wrap_func(func):
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                labels = get_labels(*args, **kwargs)
+                start = time.time()
+
+                def record(result):
+                    self.update(
+                        metric_name, "observe", value=time.time() - start,
+                        labels=labels)
+                    return result
+
+                try:
+                    result = func(*args, **kwargs)
+                except Exception:
+                    record(None)
+                    raise
+                if isinstance(result, Deferred):
+                    return result.addBoth(record)
+                else:
+                    return record(result)
+
+            return wrapper
+
+        return wrap_func
+
+    def generate_latest(self):
+        """Generate the exposition text for all metrics.
+
+        :return: The text as a byte string, or `None` if Prometheus isn't
+            supported.
+        """
+        if self.registry is None:
+            return None
+        return prometheus_client.generate_latest(self.registry)
+
+
+def create_metrics(metric_definitions, extra_labels=None, registry=None):
+    """Return a `PrometheusMetrics` from the specified definitions.
+
+    :param metric_definitions: An iterable of `MetricDefinition`s.
+    :param extra_labels: A dict of labels added to every metric. Values may
+        be callables, in which case they're called on every update.
+    :param registry: The `CollectorRegistry` to register metrics in. A new
+        one is created if not specified.
+    """
+    if not PROMETHEUS_SUPPORTED:
+        return PrometheusMetrics()
+
+    extra_labels = {} if extra_labels is None else extra_labels
+    if registry is None:
+        registry = prometheus_client.CollectorRegistry()
+    metrics = {}
+    for metric in metric_definitions:
+        metric_class = getattr(prometheus_client, metric.type)
+        metrics[metric.name] = metric_class(
+            metric.name, metric.description,
+            list(metric.labels) + sorted(extra_labels), registry=registry)
+    return PrometheusMetrics(
+        registry=registry, metrics=metrics, extra_labels=extra_labels)
@@ -21,6 +21,7 @@ from provisioningserver.events import (
 )
 from provisioningserver.logger import LegacyLogger
 from provisioningserver.path import get_tentative_data_path
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.service_monitor import service_monitor
 from provisioningserver.utils import (
     load_template,
@@ -214,6 +215,7 @@ class HTTPLogResource(resource.Resource):
         log.info(
             "{path} requested by {remote_host}",
             path=path, remote_host=remote_host)
+        PROMETHEUS_METRICS.update("maas_http_boot_requests", "inc")
         d = deferLater(
             reactor, 0, send_node_event_ip_address,
             event_type=EVENT_TYPES.NODE_HTTP_REQUEST,
@@ -8,6 +8,7 @@ __all__ = [
 ]
 
 from provisioningserver.logger import get_maas_logger
+from provisioningserver.rpc.arguments import prepare_chunked
 from provisioningserver.rpc.exceptions import NoConnectionsAvailable
 from provisioningserver.rpc.region import (
     GetDiscoveryState,
@@ -58,9 +59,12 @@ class RackNetworksMonitoringService(NetworksMonitoringService):
                 continue
             if self._recorded is None:
                 yield client(RequestRackRefresh, system_id=client.localIdent)
+            # Serialise in a thread: interfaces can be many and verbose.
+            arguments = yield prepare_chunked(
+                UpdateInterfaces.arguments, {
+                    "interfaces": interfaces, "topology_hints": hints})
             yield client(
-                UpdateInterfaces, system_id=client.localIdent,
-                interfaces=interfaces, topology_hints=hints)
+                UpdateInterfaces, system_id=client.localIdent, **arguments)
             break
 
     def reportNeighbours(self, neighbours):
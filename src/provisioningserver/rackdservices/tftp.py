@@ -27,6 +27,7 @@ from provisioningserver.logger import (
     get_maas_logger,
     LegacyLogger,
 )
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.rpc.boot_images import list_boot_images
 from provisioningserver.rpc.exceptions import BootConfigNoResponse
 from provisioningserver.rpc.region import (
@@ -321,6 +322,11 @@ class TFTPBackend(FilesystemSynchronousBackend):
         # Convert to a TFTP file not found.
         raise FileNotFound(file_name)
 
+    @PROMETHEUS_METRICS.record_call_latency(
+        'maas_tftp_file_transfer_latency',
+        get_labels=lambda backend, file_name, result: {
+            'boot_method': (
+                'filesystem' if result[0] is None else result[0].name)})
     @deferred
     @typed
     def handle_boot_method(self, file_name: TFTPPath, result):
@@ -1,9 +1,10 @@
-# Copyright 2013-2015 Canonical Ltd.  This software is licensed under the
+# Copyright 2013-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Cluster Controller RPC."""
 
 __all__ = [
+    "getAllRegionClients",
     "getRegionClient",
 ]
 
@@ -28,3 +29,18 @@ def getRegionClient():
             "Cluster services are unavailable.")
     else:
         return rpc_service.getClient()
+
+
+def getAllRegionClients():
+    """getAllRegionClients()
+
+    Get a client for each region event-loop that's connected.
+
+    :return: A list of clients, possibly empty.
+    """
+    try:
+        rpc_service = provisioningserver.services.getServiceNamed('rpc')
+    except KeyError:
+        return []
+    else:
+        return rpc_service.getAllClients()
@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Additional AMP argument classes."""
@@ -6,19 +6,23 @@
 __all__ = [
     "Bytes",
     "Choice",
+    "Chunked",
     "IPAddress",
     "IPNetwork",
     "ParsedURL",
+    "prepare_chunked",
     "StructureAsJSON",
 ]
 
 import collections
+from itertools import count
 import json
 import urllib.parse
 import zlib
 
 from apiclient.utils import ascii_url
 import netaddr
+from twisted.internet.threads import deferToThread
 from twisted.protocols import amp
 
 
@@ -167,6 +171,113 @@ class CompressedAmpList(AmpList):
         return fromStringProto(zlib.decompress(inString), proto)
 
 
+class PreparedValue:
+    """A value that has already been serialised by a `Chunked` argument."""
+
+    def __init__(self, data):
+        super(PreparedValue, self).__init__()
+        self.data = data
+
+
+class Chunked(amp.Argument):
+    """Split a value across several AMP values when it's too long for one.
+
+    The value is serialised by another argument, e.g. `CompressedAmpList`
+    or `StructureAsJSON`. If that's longer than
+    :py:data:`~twisted.protocols.amp.MAX_VALUE_LENGTH`, and the peer said
+    during the handshake that it understands chunked arguments, it is split
+    across the keys ``name``, ``name.2``, ``name.3`` and so on of the same
+    box. Otherwise it's sent exactly as the other argument would send it, so
+    peers that don't understand chunked arguments can decode values that
+    fit, and values that don't fit fail with `TooLong` as before.
+
+    Serialising a large value can take a while, so it can be done in a
+    thread beforehand with `prepare_chunked`.
+    """
+
+    def __init__(self, argument, optional=False):
+        """Create a chunked argument.
+
+        :param argument: The `amp.Argument` that serialises values.
+        :param optional: Whether this argument can be omitted in the protocol.
+        """
+        super(Chunked, self).__init__(optional=optional)
+        self.argument = argument
+
+    def prepare(self, inObject):
+        """Serialise `inObject` now; the result can be sent later."""
+        if inObject is None or isinstance(inObject, PreparedValue):
+            return inObject
+        else:
+            return PreparedValue(self.argument.toStringProto(inObject, None))
+
+    def toStringProto(self, inObject, proto):
+        if isinstance(inObject, PreparedValue):
+            return inObject.data
+        else:
+            return self.argument.toStringProto(inObject, proto)
+
+    def fromStringProto(self, inString, proto):
+        return self.argument.fromStringProto(inString, proto)
+
+    def toBox(self, name, strings, objects, proto):
+        value = {}
+        super(Chunked, self).toBox(name, value, objects, proto)
+        data = value.get(name)
+        if data is None:
+            pass  # An optional argument has been omitted.
+        elif len(data) <= amp.MAX_VALUE_LENGTH:
+            strings[name] = data
+        elif getattr(proto, "chunkedArguments", False):
+            chunks = (
+                data[start:start + amp.MAX_VALUE_LENGTH]
+                for start in range(0, len(data), amp.MAX_VALUE_LENGTH))
+            strings[name] = next(chunks)
+            for index, chunk in enumerate(chunks, 2):
+                strings[b"%s.%d" % (name, index)] = chunk
+        else:
+            # This peer won't understand chunks; AMP will raise TooLong.
+            strings[name] = data
+
+    def fromBox(self, name, strings, objects, proto):
+        chunks = []
+        for index in count(2):
+            chunk = strings.pop(b"%s.%d" % (name, index), None)
+            if chunk is None:
+                break
+            else:
+                chunks.append(chunk)
+        if len(chunks) != 0:
+            strings[name] = b"".join([strings[name]] + chunks)
+        super(Chunked, self).fromBox(name, strings, objects, proto)
+
+
+def prepare_chunked(arglist, objects):
+    """Serialise values for the `Chunked` arguments in `arglist` in a thread.
+
+    :param arglist: The arguments or response of an `amp.Command`.
+    :param objects: A dict of Python values for `arglist`.
+    :return: A `Deferred` that fires with a copy of `objects` in which the
+        values for `Chunked` arguments have been serialised. It can be
+        passed to ``callRemote`` or returned from a responder.
+    """
+    chunked = {
+        name.decode("ascii"): argument
+        for name, argument in arglist
+        if isinstance(argument, Chunked)
+    }
+
+    def prepare():
+        return {
+            name: (
+                chunked[name].prepare(value)
+                if name in chunked else value)
+            for name, value in objects.items()
+        }
+
+    return deferToThread(prepare)
+
+
 class IPAddress(amp.Argument):
     """Encode a `netaddr.IPAddress` object on the wire."""
 
@@ -1,10 +1,11 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """RPC relating to boot images."""
 
 __all__ = [
     "import_boot_images",
+    "invalidate_cached_boot_images",
     "list_boot_images",
     "is_import_boot_images_running",
     ]
@@ -17,14 +18,26 @@ from provisioningserver.boot import tftppath
 from provisioningserver.config import ClusterConfiguration
 from provisioningserver.import_images import boot_resources
 from provisioningserver.logger import LegacyLogger
-from provisioningserver.rpc import getRegionClient
-from provisioningserver.rpc.region import UpdateLastImageSync
+from provisioningserver.rpc import (
+    getAllRegionClients,
+    getRegionClient,
+)
+from provisioningserver.rpc.cluster import (
+    ListBootImages,
+    ListBootImagesV2,
+    ListOperatingSystems,
+)
+from provisioningserver.rpc.region import (
+    InvalidateCachedResults,
+    UpdateLastImageSync,
+)
 from provisioningserver.utils.env import (
     environment_variables,
     get_maas_id,
 )
 from provisioningserver.utils.twisted import synchronous
 from twisted.internet.defer import (
+    DeferredList,
     fail,
     inlineCallbacks,
 )
@@ -155,9 +168,11 @@ def _import_boot_images(sources, maas_url, http_proxy=None, https_proxy=None):
     Helper for `import_boot_images`.
     """
     proxies = dict(http_proxy=http_proxy, https_proxy=https_proxy)
-    yield deferToThread(_run_import, sources, maas_url, **proxies)
+    imported = yield deferToThread(_run_import, sources, maas_url, **proxies)
     yield touch_last_image_sync_timestamp().addErrback(
         log.err, "Failure touching last image sync timestamp.")
+    if imported:
+        yield invalidate_cached_boot_images()
 
 
 def is_import_boot_images_running():
@@ -177,3 +192,22 @@ def touch_last_image_sync_timestamp():
         return fail()
     else:
         return client(UpdateLastImageSync, system_id=get_maas_id())
+
+
+def invalidate_cached_boot_images():
+    """Inform every region event-loop that the boot images have changed.
+
+    The region caches the results of calls that list them. Failures, e.g.
+    from a region that's too old to understand, are ignored; the region's
+    cached results expire anyway, just not as promptly.
+
+    :return: :class:`Deferred` that fires when all event-loops have answered.
+    """
+    commands = [
+        command.commandName.decode("ascii")
+        for command in (ListBootImages, ListBootImagesV2, ListOperatingSystems)
+    ]
+    return DeferredList([
+        client(InvalidateCachedResults, commands=commands)
+        for client in getAllRegionClients()
+    ], consumeErrors=True)
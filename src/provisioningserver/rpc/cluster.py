@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """RPC declarations for clusters.
@@ -17,6 +17,7 @@ __all__ = [
     "DescribePowerTypes",
     "DescribeNOSTypes",
     "GetPreseedData",
+    "GetScanNetworksProgress",
     "Identify",
     "ListBootImages",
     "ListOperatingSystems",
@@ -42,6 +43,7 @@ from provisioningserver.rpc.arguments import (
     AmpList,
     AmpRequestedMachine,
     Bytes,
+    Chunked,
     CompressedAmpList,
     IPAddress,
     IPNetwork,
@@ -80,14 +82,15 @@ class ListBootImagesV2(amp.Command):
     """List the boot images available on this rack controller.
 
     This command compresses the images list to allow more images in the
-    response and to remove the amp.TooLong error.
+    response and to remove the amp.TooLong error. If the region supports
+    chunked arguments the compressed list is also split when it's too long.
 
     :since: 1.7.6
     """
 
     arguments = []
     response = [
-        (b"images", CompressedAmpList(
+        (b"images", Chunked(CompressedAmpList(
             [(b"osystem", amp.Unicode()),
              (b"architecture", amp.Unicode()),
              (b"subarchitecture", amp.Unicode()),
@@ -95,7 +98,7 @@ class ListBootImagesV2(amp.Command):
              (b"label", amp.Unicode()),
              (b"purpose", amp.Unicode()),
              (b"xinstall_type", amp.Unicode()),
-             (b"xinstall_path", amp.Unicode())]))
+             (b"xinstall_path", amp.Unicode())])))
     ]
     errors = []
 
@@ -648,7 +651,7 @@ class DiscoverPod(amp.Command):
         (b"context", StructureAsJSON()),
     ]
     response = [
-        (b"pod", AmpDiscoveredPod()),
+        (b"pod", Chunked(AmpDiscoveredPod())),
     ]
     errors = {
         exceptions.UnknownPodType: (
@@ -758,6 +761,27 @@ class ScanNetworks(amp.Command):
     }
 
 
+class GetScanNetworksProgress(amp.Command):
+    """Reports the progress of the network scan on the rack controller.
+
+    `scanning` is True while a scan is running. `subnets` has an entry for
+    each subnet the current (or most recent) scan has swept, or is sweeping,
+    with its `interface`, `cidr`, the number of `hosts` on it, how many have
+    been `probed` so far, how many are `up`, and whether it is `done`.
+
+    Only sweeps with ARP report their progress; `subnets` is empty for scans
+    with `nmap` or `ping`.
+
+    :since: 2.5
+    """
+    arguments = []
+    response = [
+        (b"scanning", amp.Boolean()),
+        (b"subnets", StructureAsJSON()),
+    ]
+    errors = {}
+
+
 class DisableAndShutoffRackd(amp.Command):
     """Disable and shutdown the rackd service.
 
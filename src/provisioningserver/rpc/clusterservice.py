@@ -12,7 +12,6 @@ import json
 from operator import itemgetter
 import os
 from os import urandom
-import random
 from socket import (
     AF_INET,
     AF_INET6,
@@ -58,6 +57,7 @@ from provisioningserver.rpc import (
     pods,
     region,
 )
+from provisioningserver.rpc.arguments import prepare_chunked
 from provisioningserver.rpc.boot_images import (
     import_boot_images,
     is_import_boot_images_running,
@@ -66,6 +66,7 @@ from provisioningserver.rpc.boot_images import (
 from provisioningserver.rpc.common import (
     Ping,
     RPCProtocol,
+    select_connection,
 )
 from provisioningserver.rpc.exceptions import CannotConfigureDHCP
 from provisioningserver.rpc.interfaces import IConnectionToRegion
@@ -99,6 +100,8 @@ from provisioningserver.utils.network import (
     get_all_interfaces_definition,
     resolve_host_to_addrinfo,
 )
+from provisioningserver.utils.scan_network import ScanProgress
+from provisioningserver.utils.services import JSONPerLineProtocol
 from provisioningserver.utils.shell import (
     call_and_check,
     ExternalProcessError,
@@ -114,7 +117,6 @@ from provisioningserver.utils.twisted import (
     deferred,
     DeferredValue,
     deferWithTimeout,
-    makeDeferredWithProcessProtocol,
     suppress,
 )
 from provisioningserver.utils.url import get_domain
@@ -203,25 +205,23 @@ def get_scan_all_networks_args(
     return binary_args
 
 
-def spawnProcessAndNullifyStdout(protocol, args):
-    """"Utility function to spawn a process and redirect stdout to /dev/null.
+# Progress of the network scan run by `executeScanNetworksSubprocess`.
+scan_progress = ScanProgress()
 
-    Spawns the process with the specified `protocol` in the reactor, with the
-    specified list of binary `args`.
+
+class ProtocolForScanNetworks(JSONPerLineProtocol):
+    """Protocol used when spawning `maas-common scan-network`.
+
+    Events written to stdout update `scan_progress`; lines written to stderr
+    are logged.
     """
-    # Using childFDs we arrange for the child's stdout to go to /dev/null
-    # and for stderr to be read asynchronously by the reactor.
-    with open(os.devnull, "r+b") as devnull:
-        # This file descriptor to /dev/null will be closed before the
-        # spawned process finishes, but will remain open in the spawned
-        # process; that's the Magic Of UNIX™.
-        reactor.spawnProcess(
-            protocol, args[0], args, childFDs={
-                0: devnull.fileno(),
-                1: devnull.fileno(),
-                2: 'r'
-            },
-            env=get_env_with_bytes_locale())
+
+    def __init__(self):
+        super().__init__(callback=scan_progress.update)
+
+    def errLineReceived(self, line):
+        line = line.decode("utf-8").rstrip()
+        log.msg("Scan all networks: " + line)
 
 
 def executeScanNetworksSubprocess(
@@ -229,26 +229,32 @@ def executeScanNetworksSubprocess(
         interface=None):
     """Runs the network scanning subprocess.
 
-    Redirects stdout and stderr in the subprocess to /dev/null. Leaves
-    stderr intact, so that we might pass useful logging through.
+    Reads the events it writes to stdout to track its progress in
+    `scan_progress`, and logs what it writes to stderr, so that we might
+    pass useful logging through.
 
     Returns the `reason` (see `ProcessProtocol.processEnded`) from the
     scan process after waiting for it to complete.
 
     :param cidrs: A list of CIDR strings to run neighbour scans on.
     """
-    done, protocol = makeDeferredWithProcessProtocol()
-    # Technically this is not guaranteed to be a string containing just
-    # one line of text. But reality in this case is both atomic and
-    # concise. (And if it isn't, we can fix it, since we're calling our
-    # own command.)
-    protocol.errReceived = lambda data: (
-        log.msg("Scan all networks: " + data.decode("utf-8")))
+    protocol = ProtocolForScanNetworks()
     args = get_scan_all_networks_args(
         scan_all=scan_all, force_ping=force_ping, slow=slow, threads=threads,
         cidrs=cidrs, interface=interface)
-    spawnProcessAndNullifyStdout(protocol, args)
-    return done
+    with open(os.devnull, "r+b") as devnull:
+        # This file descriptor to /dev/null will be closed before the
+        # spawned process finishes, but will remain open in the spawned
+        # process; that's the Magic Of UNIX™.
+        reactor.spawnProcess(
+            protocol, args[0], args, childFDs={
+                0: devnull.fileno(),
+                1: 'r',
+                2: 'r'
+            },
+            env=get_env_with_bytes_locale())
+    scan_progress.start()
+    return protocol.done.addBoth(callOut, scan_progress.finish)
 
 
 class Cluster(RPCProtocol):
@@ -293,7 +299,9 @@ class Cluster(RPCProtocol):
         Implementation of
         :py:class:`~provisioningserver.rpc.cluster.ListBootImagesV2`.
         """
-        return {"images": list_boot_images()}
+        return prepare_chunked(
+            cluster.ListBootImagesV2.response,
+            {"images": list_boot_images()})
 
     @cluster.ImportBootImages.responder
     def import_boot_images(self, sources, http_proxy=None, https_proxy=None):
@@ -688,8 +696,10 @@ class Cluster(RPCProtocol):
         Implementation of
         :py:class:`~provisioningserver.rpc.cluster.DiscoverPod`.
         """
-        return pods.discover_pod(
+        d = pods.discover_pod(
             type, context, pod_id=pod_id, name=name)
+        d.addCallback(partial(prepare_chunked, cluster.DiscoverPod.response))
+        return d
 
     @cluster.ComposeMachine.responder
     def compose_machine(
@@ -742,6 +752,15 @@ class Cluster(RPCProtocol):
             d.addBoth(callOut, lock.release)
         return {}
 
+    @cluster.GetScanNetworksProgress.responder
+    def get_scan_networks_progress(self):
+        """GetScanNetworksProgress()
+
+        Implementation of
+        :py:class:`~provisioningserver.rpc.cluster.GetScanNetworksProgress`.
+        """
+        return scan_progress.getProgress()
+
     @cluster.DisableAndShutoffRackd.responder
     def disable_and_shutoff_rackd(self):
         """DisableAndShutoffRackd()
@@ -803,11 +822,16 @@ class ClusterClient(Cluster):
         if the client service is not running; `KeyError` if there's already a
         live connection for this event-loop; or `AuthenticationFailed` if,
         guess, the authentication failed.
+
+    :ivar chunkedArguments: Whether the region understands values of
+        `Chunked` arguments that have been split. This is negotiated when
+        registering.
     """
 
     address = None
     eventloop = None
     service = None
+    chunkedArguments = False
 
     def __init__(self, address, eventloop, service):
         super(ClusterClient, self).__init__()
@@ -862,8 +886,9 @@ class ClusterClient(Cluster):
                 region.RegisterRackController, system_id=system_id,
                 hostname=hostname, interfaces=interfaces, url=parsed_url,
                 nodegroup_uuid=cluster_uuid, beacon_support=True,
-                version=version)
+                version=version, chunked_arguments=True)
             self.localIdent = data["system_id"]
+            self.chunkedArguments = bool(data.get("chunked_arguments"))
             set_maas_id(self.localIdent)
             version = data.get("version", None)
             if version is None:
@@ -1034,7 +1059,7 @@ class ClusterClientService(TimerService, object):
     def getClient(self):
         """Returns a :class:`common.Client` connected to a region.
 
-        The client is chosen at random.
+        The least busy connection is chosen.
 
         :raises: :py:class:`~.exceptions.NoConnectionsAvailable` when
             there are no open connections to a region controller.
@@ -1043,7 +1068,7 @@ class ClusterClientService(TimerService, object):
         if len(conns) == 0:
             raise exceptions.NoConnectionsAvailable()
         else:
-            return common.Client(random.choice(conns))
+            return common.Client(select_connection(conns))
 
     @deferred
     def getClientNow(self):
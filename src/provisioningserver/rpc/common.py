@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Common RPC classes and utilties."""
@@ -8,12 +8,16 @@ __all__ = [
     "Client",
     "Identify",
     "RPCProtocol",
+    "select_connection",
 ]
 
 from os import getpid
+import random
 from socket import gethostname
+import time
 
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.rpc.interfaces import (
     IConnection,
     IConnectionToRegion,
@@ -96,8 +100,13 @@ class Client:
     Limits the API to a subset of the behaviour of :class:`amp.AMP`'s,
     with alterations to make it suitable for use from a thread outside
     of the reactor.
+
+    :cvar timeouts: Maps commands to the number of seconds to wait for them
+        by default; others are given 2 minutes.
     """
 
+    timeouts = {}
+
     def __init__(self, conn):
         super(Client, self).__init__()
         assert IConnection.providedBy(conn), (
@@ -168,7 +177,7 @@ class Client:
 
         timeout = kwargs.pop('_timeout', undefined)
         if timeout is undefined:
-            timeout = 120  # 2 minutes
+            timeout = self.timeouts.get(cmd, 120)  # 2 minutes
         if timeout is None or timeout <= 0:
             return self._conn.callRemote(cmd, **kwargs)
         else:
@@ -194,6 +203,30 @@ class Client:
         return hash(self._conn)
 
 
+def get_load(connection):
+    """Return how busy `connection` is, for comparison with others.
+
+    Connections that are not `RPCProtocol`s, e.g. in tests, are never busy.
+    """
+    if isinstance(connection, RPCProtocol):
+        return connection.outstandingCalls, connection.latency
+    else:
+        return 0, 0.0
+
+
+def select_connection(connections):
+    """Return the least busy of `connections`.
+
+    This is the connection with the fewest calls awaiting an answer, then
+    the one answering the most quickly. Ties are broken at random.
+
+    :param connections: A non-empty iterable of connections.
+    """
+    connections = list(connections)
+    random.shuffle(connections)
+    return min(connections, key=get_load)
+
+
 def make_command_ref(box):
     """Make a textual description of an AMP command box.
 
@@ -230,16 +263,31 @@ class RPCProtocol(amp.AMP, object):
     and override `connectionMade` and `connectionLost` and signal from there,
     which is what this class does.
 
+    It also keeps track of how busy the connection is, for `select_connection`:
+    the calls made that are still awaiting an answer, and a moving average of
+    the time taken to answer them.
+
     :ivar onConnectionMade: A `Deferred` that fires when `connectionMade` has
         been called, i.e. this protocol is now connected.
     :ivar onConnectionLost: A `Deferred` that fires when `connectionLost` has
         been called, i.e. this protocol is no longer connected.
+    :ivar latency: The moving average of the seconds taken to answer calls.
     """
 
+    # The weight given to each new answer in the moving average latency.
+    latency_weight = 0.2
+
     def __init__(self):
         super(RPCProtocol, self).__init__()
         self.onConnectionMade = Deferred()
         self.onConnectionLost = Deferred()
+        self.latency = 0.0
+        self._outstanding = {}
+
+    @property
+    def outstandingCalls(self):
+        """The number of calls made that are still awaiting an answer."""
+        return len(self._outstanding)
 
     def connectionMade(self):
         super(RPCProtocol, self).connectionMade()
@@ -247,15 +295,48 @@ class RPCProtocol(amp.AMP, object):
 
     def connectionLost(self, reason):
         super(RPCProtocol, self).connectionLost(reason)
+        for tag in list(self._outstanding):
+            self._callAnswered(tag, observe=False)
         self.onConnectionLost.callback(None)
 
     def _sendBoxCommand(self, command, box, requiresAnswer=True):
         """Override `_sendBoxCommand` to log the sent RPC message."""
         box[amp.COMMAND] = command
         log.debug("[RPC -> sent] {box}", box=box)
-        return super(RPCProtocol, self)._sendBoxCommand(
+        d = super(RPCProtocol, self)._sendBoxCommand(
             command, box, requiresAnswer=requiresAnswer)
-
+        if requiresAnswer:
+            # Count the call until the answer arrives, even if the caller
+            # stops waiting for it, because the far end is still busy.
+            labels = {
+                "call": command.decode("ascii"),
+                "peer": str(getattr(self, "ident", None))}
+            self._outstanding[box[amp.ASK]] = (labels, time.monotonic())
+            PROMETHEUS_METRICS.update(
+                "maas_rpc_outstanding_calls", "inc",
+                labels={"peer": labels["peer"]})
+        return d
+
+    def _callAnswered(self, tag, observe=True):
+        """Stop counting the call with the given tag as outstanding."""
+        try:
+            labels, started = self._outstanding.pop(tag)
+        except KeyError:
+            return  # Not sent by _sendBoxCommand.
+        PROMETHEUS_METRICS.update(
+            "maas_rpc_outstanding_calls", "dec",
+            labels={"peer": labels["peer"]})
+        if observe:
+            latency = time.monotonic() - started
+            self.latency += (latency - self.latency) * self.latency_weight
+            PROMETHEUS_METRICS.update(
+                "maas_rpc_answer_latency", "observe", value=latency,
+                labels=labels)
+
+    @PROMETHEUS_METRICS.record_call_latency(
+        'maas_rpc_call_latency',
+        get_labels=lambda protocol, box: {
+            'call': box[amp.COMMAND].decode("ascii")})
     def dispatchCommand(self, box):
         """Call up, but coerce errors into non-fatal failures.
 
@@ -301,6 +382,7 @@ class RPCProtocol(amp.AMP, object):
         Override `_answerRecieved` to log recieving RPC response.
         """
         log.debug("[RPC <- recieved] {box}", box=box)
+        self._callAnswered(box[amp.ANSWER])
         return super(RPCProtocol, self)._answerReceived(box)
 
     def _errorReceived(self, box):
@@ -308,6 +390,7 @@ class RPCProtocol(amp.AMP, object):
         Override `_errorReceived` to log recieving RPC response.
         """
         log.debug("[RPC <- error] {box}", box=box)
+        self._callAnswered(box[amp.ERROR])
         return super(RPCProtocol, self)._errorReceived(box)
 
     def unhandledError(self, failure):
@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """RPC declarations for the region.
@@ -20,6 +20,7 @@ __all__ = [
     "GetProxies",
     "GetTimeConfiguration",
     "Identify",
+    "InvalidateCachedResults",
     "ListNodePowerParameters",
     "MarkNodeFailed",
     "RegisterEventType",
@@ -39,6 +40,7 @@ __all__ = [
 from provisioningserver.rpc.arguments import (
     AmpList,
     Bytes,
+    Chunked,
     ParsedURL,
     StructureAsJSON,
 )
@@ -78,11 +80,15 @@ class RegisterRackController(amp.Command):
         (b"nodegroup_uuid", amp.Unicode(optional=True)),
         (b"beacon_support", amp.Boolean(optional=True)),
         (b"version", amp.Unicode(optional=True)),
+        # Whether `Chunked` arguments can be split when sent to the rack.
+        (b"chunked_arguments", amp.Boolean(optional=True)),
     ]
     response = [
         (b"system_id", amp.Unicode()),
         (b"beacon_support", amp.Boolean(optional=True)),
         (b"version", amp.Unicode(optional=True)),
+        # Whether `Chunked` arguments can be split when sent to the region.
+        (b"chunked_arguments", amp.Boolean(optional=True)),
     ]
     errors = {
         CannotRegisterRackController: b"CannotRegisterRackController",
@@ -484,8 +490,8 @@ class UpdateInterfaces(amp.Command):
 
     arguments = [
         (b'system_id', amp.Unicode()),
-        (b'interfaces', StructureAsJSON()),
-        (b'topology_hints', StructureAsJSON(optional=True)),
+        (b'interfaces', Chunked(StructureAsJSON())),
+        (b'topology_hints', Chunked(StructureAsJSON(), optional=True)),
     ]
     response = []
     errors = []
@@ -674,3 +680,20 @@ class GetSyslogConfiguration(amp.Command):
     errors = {
         NoSuchNode: b"NoSuchNode",
     }
+
+
+class InvalidateCachedResults(amp.Command):
+    """Discard the region's cached results of calls to a rack controller.
+
+    The rack controller calls this when, for example, it has imported new
+    boot images.
+
+    :since: 2.5
+    """
+
+    arguments = [
+        # Names of the commands whose results have changed.
+        (b"commands", amp.ListOf(amp.Unicode())),
+    ]
+    response = []
+    errors = []
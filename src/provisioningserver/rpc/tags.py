@@ -9,12 +9,16 @@ __all__ = [
 
 from apiclient.maas_client import (
     MAASClient,
-    MAASDispatcher,
     MAASOAuth,
+    MAASPooledDispatcher,
 )
 from provisioningserver.tags import process_node_tags
 from provisioningserver.utils.twisted import synchronous
 
+# Tags are evaluated in batches of nodes, each batch making requests to the
+# region; they share this dispatcher so that connections are reused.
+dispatcher = MAASPooledDispatcher()
+
 
 @synchronous
 def evaluate_tag(
@@ -31,7 +35,7 @@ def evaluate_tag(
     :param maas_url: URL of the MAAS API.
     """
     client = MAASClient(
-        auth=MAASOAuth(*credentials), dispatcher=MAASDispatcher(),
+        auth=MAASOAuth(*credentials), dispatcher=dispatcher,
         base_url=maas_url)
     process_node_tags(
         rack_id=system_id, nodes=nodes,
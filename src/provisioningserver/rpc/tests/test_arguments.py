@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Test AMP argument classes."""
@@ -9,7 +9,10 @@ import random
 import zlib
 
 from maastesting.factory import factory
-from maastesting.testcase import MAASTestCase
+from maastesting.testcase import (
+    MAASTestCase,
+    MAASTwistedRunTest,
+)
 import netaddr
 from provisioningserver.drivers.pod import (
     DiscoveredMachine,
@@ -24,11 +27,13 @@ from provisioningserver.drivers.pod import (
 from provisioningserver.rpc import arguments
 from testtools import ExpectedException
 from testtools.matchers import (
+    AllMatch,
     Equals,
     HasLength,
     IsInstance,
     LessThan,
 )
+from twisted.internet.defer import inlineCallbacks
 from twisted.protocols import amp
 
 
@@ -160,6 +165,78 @@ class TestCompressedAmpList(MAASTestCase):
             LessThan(2 ** 16))
 
 
+class ChunkedCommand(amp.Command):
+    arguments = [
+        (b"data", arguments.Chunked(arguments.Bytes())),
+        (b"other", arguments.Chunked(arguments.Bytes(), optional=True)),
+    ]
+
+
+class TestChunked(MAASTestCase):
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def make_proto(self, chunkedArguments):
+        proto = amp.AMP()
+        proto.chunkedArguments = chunkedArguments
+        return proto
+
+    def round_trip(self, box, proto):
+        # Serialise and parse the box as AMP would send it.
+        [box] = amp.parseString(box.serialize())
+        return ChunkedCommand.parseArguments(box, proto)
+
+    def test_sends_short_values_as_is(self):
+        proto = self.make_proto(True)
+        data = factory.make_bytes()
+        box = ChunkedCommand.makeArguments({"data": data}, proto)
+        self.assertEqual({b"data": data}, dict(box))
+        self.assertEqual(
+            {"data": data, "other": None}, self.round_trip(box, proto))
+
+    def test_splits_long_values(self):
+        proto = self.make_proto(True)
+        data = factory.make_bytes(amp.MAX_VALUE_LENGTH * 3)
+        other = factory.make_bytes()
+        box = ChunkedCommand.makeArguments(
+            {"data": data, "other": other}, proto)
+        self.assertItemsEqual(
+            [b"data", b"data.2", b"data.3", b"other"], box.keys())
+        self.assertThat(
+            [len(value) for value in box.values()],
+            AllMatch(LessThan(amp.MAX_VALUE_LENGTH + 1)))
+        self.assertEqual(
+            {"data": data, "other": other}, self.round_trip(box, proto))
+
+    def test_does_not_split_values_for_peers_that_cannot_join_them(self):
+        proto = self.make_proto(False)
+        data = factory.make_bytes(amp.MAX_VALUE_LENGTH + 1)
+        box = ChunkedCommand.makeArguments({"data": data}, proto)
+        self.assertEqual({b"data": data}, dict(box))
+        self.assertRaises(amp.TooLong, box.serialize)
+
+    @inlineCallbacks
+    def test_prepare_chunked_serialises_in_advance(self):
+        proto = self.make_proto(True)
+        data = factory.make_bytes(amp.MAX_VALUE_LENGTH * 2)
+        prepared = yield arguments.prepare_chunked(
+            ChunkedCommand.arguments, {"data": data, "other": None})
+        self.assertThat(prepared["data"], IsInstance(arguments.PreparedValue))
+        self.assertIsNone(prepared["other"])
+        box = ChunkedCommand.makeArguments(prepared, proto)
+        self.assertEqual(
+            {"data": data, "other": None}, self.round_trip(box, proto))
+
+    def test_wraps_other_arguments(self):
+        proto = self.make_proto(True)
+        argument = arguments.Chunked(arguments.StructureAsJSON())
+        example = {"thing": factory.make_name("thing")}
+        encoded = argument.toStringProto(example, proto)
+        self.assertEqual(
+            arguments.StructureAsJSON().toString(example), encoded)
+        self.assertEqual(example, argument.fromStringProto(encoded, proto))
+
+
 class TestIPAddress(MAASTestCase):
 
     argument = arguments.IPAddress()
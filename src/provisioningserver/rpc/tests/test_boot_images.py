@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for provisioningserver.rpc.boot_images"""
@@ -9,6 +9,7 @@ import os
 from random import randint
 from unittest.mock import (
     ANY,
+    Mock,
     sentinel,
 )
 from urllib.parse import urlparse
@@ -38,7 +39,10 @@ from provisioningserver.rpc.boot_images import (
     list_boot_images,
     reload_boot_images,
 )
-from provisioningserver.rpc.region import UpdateLastImageSync
+from provisioningserver.rpc.region import (
+    InvalidateCachedResults,
+    UpdateLastImageSync,
+)
 from provisioningserver.rpc.testing import MockLiveClusterToRegionRPCFixture
 from provisioningserver.testing.config import (
     BootSourcesFixture,
@@ -51,6 +55,7 @@ from testtools.matchers import (
 )
 from twisted.internet import defer
 from twisted.internet.defer import (
+    fail,
     inlineCallbacks,
     succeed,
 )
@@ -369,6 +374,30 @@ class TestImportBootImages(MAASTestCase):
             client, MockCalledOnceWith(
                 UpdateLastImageSync, system_id=get_maas_id()))
 
+    @inlineCallbacks
+    def test_invalidates_cached_boot_images_when_imported(self):
+        self.patch(boot_images, "getRegionClient")
+        client = Mock(return_value=succeed({}))
+        self.patch(boot_images, "getAllRegionClients").return_value = [client]
+        self.patch_autospec(boot_images, '_run_import').return_value = True
+        yield boot_images._import_boot_images(
+            sentinel.sources, factory.make_simple_http_url())
+        self.assertThat(
+            client, MockCalledOnceWith(
+                InvalidateCachedResults, commands=[
+                    "ListBootImages", "ListBootImagesV2",
+                    "ListOperatingSystems"]))
+
+    @inlineCallbacks
+    def test_does_not_invalidate_cached_boot_images_when_not_imported(self):
+        self.patch(boot_images, "getRegionClient")
+        client = Mock(return_value=succeed({}))
+        self.patch(boot_images, "getAllRegionClients").return_value = [client]
+        self.patch_autospec(boot_images, '_run_import').return_value = False
+        yield boot_images._import_boot_images(
+            sentinel.sources, factory.make_simple_http_url())
+        self.assertThat(client, MockNotCalled())
+
     @inlineCallbacks
     def test_update_last_image_sync_end_to_end(self):
         get_maas_id = self.patch(boot_images, "get_maas_id")
@@ -410,6 +439,23 @@ class TestImportBootImages(MAASTestCase):
             MockNotCalled())
 
 
+class TestInvalidateCachedBootImages(MAASTestCase):
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    @inlineCallbacks
+    def test_ignores_failures(self):
+        clients = [
+            Mock(return_value=fail(ZeroDivisionError())),
+            Mock(return_value=succeed({})),
+        ]
+        self.patch(boot_images, "getAllRegionClients").return_value = clients
+        yield boot_images.invalidate_cached_boot_images()
+        for client in clients:
+            self.assertThat(client, MockCalledOnceWith(
+                InvalidateCachedResults, commands=ANY))
+
+
 class TestIsImportBootImagesRunning(MAASTestCase):
 
     run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
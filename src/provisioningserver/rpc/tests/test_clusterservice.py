@@ -94,7 +94,6 @@ from provisioningserver.rpc.clusterservice import (
     ClusterClientService,
     executeScanNetworksSubprocess,
     get_scan_all_networks_args,
-    spawnProcessAndNullifyStdout,
 )
 from provisioningserver.rpc.interfaces import IConnection
 from provisioningserver.rpc.osystems import gen_operating_systems
@@ -116,11 +115,9 @@ from provisioningserver.utils.fs import (
     NamedLock,
 )
 from provisioningserver.utils.network import get_all_interfaces_definition
+from provisioningserver.utils.scan_network import ScanProgress
 from provisioningserver.utils.shell import ExternalProcessError
-from provisioningserver.utils.twisted import (
-    makeDeferredWithProcessProtocol,
-    pause,
-)
+from provisioningserver.utils.twisted import pause
 from provisioningserver.utils.version import get_maas_version
 from testtools import ExpectedException
 from testtools.matchers import (
@@ -146,7 +143,10 @@ from twisted.internet.defer import (
     succeed,
 )
 from twisted.internet.endpoints import TCP6ClientEndpoint
-from twisted.internet.error import ConnectionClosed
+from twisted.internet.error import (
+    ConnectionClosed,
+    ProcessTerminated,
+)
 from twisted.internet.task import Clock
 from twisted.protocols import amp
 from twisted.python.failure import Failure
@@ -1749,6 +1749,23 @@ class TestClusterClient(MAASTestCase):
         self.assertTrue(result)
         self.assertEqual(system_id, client.localIdent)
 
+    @inlineCallbacks
+    def test_registerRackWithRegion_sets_chunkedArguments(self):
+        client = self.make_running_client()
+        callRemote = self.patch_autospec(client, "callRemote")
+        callRemote.side_effect = always_succeed_with({
+            "system_id": "...", "chunked_arguments": True})
+        yield client.registerRackWithRegion()
+        self.assertTrue(client.chunkedArguments)
+
+    @inlineCallbacks
+    def test_registerRackWithRegion_leaves_chunkedArguments_unset(self):
+        client = self.make_running_client()
+        callRemote = self.patch_autospec(client, "callRemote")
+        callRemote.side_effect = always_succeed_with({"system_id": "..."})
+        yield client.registerRackWithRegion()
+        self.assertFalse(client.chunkedArguments)
+
     @inlineCallbacks
     def test_registerRackWithRegion_calls_set_maas_id(self):
         client = self.make_running_client()
@@ -1779,7 +1796,7 @@ class TestClusterClient(MAASTestCase):
                 protocol, system_id='', hostname=hostname,
                 interfaces=interfaces, url=urlparse(maas_url),
                 nodegroup_uuid=None, beacon_support=True,
-                version=get_maas_version()))
+                version=get_maas_version(), chunked_arguments=True))
         # Clear cache for the next test
         set_maas_id(None)
 
@@ -1833,7 +1850,7 @@ class TestClusterClient(MAASTestCase):
                 protocol, system_id='', hostname=hostname,
                 interfaces=interfaces, url=urlparse(maas_url),
                 nodegroup_uuid=None, beacon_support=True,
-                version=get_maas_version()))
+                version=get_maas_version(), chunked_arguments=True))
 
 
 class TestClusterClientCheckerService(MAASTestCase):
@@ -2953,26 +2970,6 @@ class TestClusterProtocol_ScanNetworks(
         ]
         ))
 
-    @inlineCallbacks
-    def test_spawnProcessAndNullifyStdout_nullifies_stdout(self):
-        done, protocol = makeDeferredWithProcessProtocol()
-        args = [b"/bin/bash", b'-c', b"echo foo"]
-        outReceived = Mock()
-        protocol.outReceived = outReceived
-        spawnProcessAndNullifyStdout(protocol, args)
-        yield done
-        self.assertThat(outReceived, MockNotCalled())
-
-    @inlineCallbacks
-    def test_spawnProcessAndNullifyStdout_captures_stderr(self):
-        done, protocol = makeDeferredWithProcessProtocol()
-        args = [b"/bin/bash", b'-c', b"echo foo >&2"]
-        errReceived = Mock()
-        protocol.errReceived = errReceived
-        spawnProcessAndNullifyStdout(protocol, args)
-        yield done
-        self.assertThat(errReceived, MockCalledOnceWith(b'foo\n'))
-
     @inlineCallbacks
     def test_executeScanNetworksSubprocess(self):
         mock_scan_args = self.patch(
@@ -2984,6 +2981,69 @@ class TestClusterProtocol_ScanNetworks(
         self.assertThat(
             mock_log_msg, MockCalledOnceWith('Scan all networks: foo'))
 
+    @inlineCallbacks
+    def test_executeScanNetworksSubprocess_tracks_progress(self):
+        self.patch(clusterservice, 'scan_progress', ScanProgress())
+        event = {
+            "scan_type": "arp", "interface": "eth0",
+            "cidr": "192.168.0.0/24", "hosts": 254, "probed": 254, "up": 1,
+            "seconds": 3, "done": True,
+        }
+        mock_scan_args = self.patch(
+            clusterservice, 'get_scan_all_networks_args')
+        mock_scan_args.return_value = [
+            b"/bin/bash", b'-c', b"echo '%s'" % json.dumps(event).encode(
+                "ascii")]
+        d = executeScanNetworksSubprocess()
+        self.assertTrue(clusterservice.scan_progress.scanning)
+        yield d
+        self.assertThat(
+            clusterservice.scan_progress.getProgress(), Equals({
+                "scanning": False, "subnets": [{
+                    "interface": "eth0", "cidr": "192.168.0.0/24",
+                    "hosts": 254, "probed": 254, "up": 1, "done": True,
+                }],
+            }))
+
+    @inlineCallbacks
+    def test_executeScanNetworksSubprocess_finishes_on_failure(self):
+        self.patch(clusterservice, 'scan_progress', ScanProgress())
+        mock_scan_args = self.patch(
+            clusterservice, 'get_scan_all_networks_args')
+        mock_scan_args.return_value = [b"/bin/bash", b'-c', b"exit 1"]
+        with ExpectedException(ProcessTerminated):
+            yield executeScanNetworksSubprocess()
+        self.assertFalse(clusterservice.scan_progress.scanning)
+
+
+class TestClusterProtocol_GetScanNetworksProgress(MAASTestCase):
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def test__is_registered(self):
+        protocol = Cluster()
+        responder = protocol.locateResponder(
+            cluster.GetScanNetworksProgress.commandName)
+        self.assertIsNotNone(responder)
+
+    @inlineCallbacks
+    def test__returns_scan_progress(self):
+        progress = self.patch(clusterservice, 'scan_progress', ScanProgress())
+        progress.start()
+        progress.update([{
+            "scan_type": "arp", "interface": "eth0",
+            "cidr": "192.168.0.0/24", "hosts": 254, "probed": 32, "up": 0,
+            "seconds": 0, "done": False,
+        }])
+        response = yield call_responder(
+            Cluster(), cluster.GetScanNetworksProgress, {})
+        self.assertThat(response, Equals({
+            "scanning": True, "subnets": [{
+                "interface": "eth0", "cidr": "192.168.0.0/24", "hosts": 254,
+                "probed": 32, "up": 0, "done": False,
+            }],
+        }))
+
 
 class TestClusterProtocol_AddChassis(MAASTestCase):
 
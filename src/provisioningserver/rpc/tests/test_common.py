@@ -1,4 +1,4 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for common RPC code."""
@@ -129,6 +129,17 @@ class TestClient(MAASTestCase):
                 timeout, conn.callRemote, sentinel.command,
                 foo=sentinel.foo, bar=sentinel.bar))
 
+    def test_call_default_timeout_for_command(self):
+        conn, client = self.make_connection_and_client()
+        timeout = random.randint(10, 20)
+        self.patch(client, "timeouts", {sentinel.command: timeout})
+        self.patch_autospec(common, "deferWithTimeout")
+        client(sentinel.command, foo=sentinel.foo)
+        self.assertThat(
+            common.deferWithTimeout, MockCalledOnceWith(
+                timeout, conn.callRemote, sentinel.command,
+                foo=sentinel.foo))
+
     def test_call_with_keyword_arguments_raises_useful_error(self):
         conn = DummyConnection()
         client = common.Client(conn)
@@ -196,6 +207,62 @@ class TestRPCProtocol(MAASTestCase):
         protocol.connectionLost(connectionDone)
         self.assertThat(protocol.onConnectionLost, IsFiredDeferred())
 
+    def test_counts_outstanding_calls_until_answered(self):
+        self.patch(common.time, "monotonic").side_effect = [10.0, 12.0]
+        protocol = common.RPCProtocol()
+        protocol.makeConnection(StringTransport())
+        d = protocol.callRemote(common.Identify)
+        self.assertThat(protocol.outstandingCalls, Equals(1))
+        protocol.ampBoxReceived(amp.AmpBox(_answer=b"1", ident=b"foo"))
+        self.assertThat(extract_result(d), Equals({"ident": "foo"}))
+        self.assertThat(protocol.outstandingCalls, Equals(0))
+        self.assertThat(protocol.latency, Equals(2.0 * 0.2))
+
+    def test_counts_outstanding_calls_until_error(self):
+        protocol = common.RPCProtocol()
+        protocol.makeConnection(StringTransport())
+        d = protocol.callRemote(common.Identify)
+        d.addErrback(lambda failure: failure.check(amp.UnknownRemoteError))
+        protocol.ampBoxReceived(amp.AmpBox(
+            _error=b"1", _error_code=b"BOOM", _error_description=b"boom"))
+        self.assertThat(protocol.outstandingCalls, Equals(0))
+        self.assertThat(extract_result(d), Is(amp.UnknownRemoteError))
+
+    def test_forgets_outstanding_calls_when_connection_is_lost(self):
+        protocol = common.RPCProtocol()
+        protocol.makeConnection(StringTransport())
+        d = protocol.callRemote(common.Identify)
+        d.addErrback(lambda failure: None)
+        protocol.connectionLost(connectionDone)
+        self.assertThat(protocol.outstandingCalls, Equals(0))
+        self.assertThat(protocol.latency, Equals(0.0))
+
+
+class TestSelectConnection(MAASTestCase):
+
+    def make_protocol(self, outstanding, latency):
+        protocol = common.RPCProtocol()
+        protocol._outstanding = {
+            b"%d" % tag: None for tag in range(outstanding)}
+        protocol.latency = latency
+        return protocol
+
+    def test_selects_fewest_outstanding_calls(self):
+        busy = self.make_protocol(2, 0.1)
+        idle = self.make_protocol(1, 5.0)
+        self.assertThat(
+            common.select_connection([busy, idle, busy]), Is(idle))
+
+    def test_selects_lowest_latency_when_equally_busy(self):
+        slow = self.make_protocol(1, 5.0)
+        fast = self.make_protocol(1, 0.1)
+        self.assertThat(common.select_connection([slow, fast]), Is(fast))
+
+    def test_treats_other_connections_as_idle(self):
+        busy = self.make_protocol(1, 0.1)
+        other = DummyConnection()
+        self.assertThat(common.select_connection([busy, other]), Is(other))
+
 
 class TestRPCProtocol_UnhandledErrorsWhenHandlingResponses(MAASTestCase):
 
@@ -28,3 +28,14 @@ class TestUtilities(MAASTestCase):
         self.assertRaises(
             NoConnectionsAvailable,
             provisioningserver.rpc.getRegionClient)
+
+    def test_getAllRegionClients_returns_clients(self):
+        services = self.patch(provisioningserver, "services")
+        self.assertEqual(
+            services.getServiceNamed('rpc').getAllClients(),
+            provisioningserver.rpc.getAllRegionClients())
+
+    def test_getAllRegionClients_when_cluster_services_are_down(self):
+        services = self.patch(provisioningserver, "services")
+        services.getServiceNamed.side_effect = KeyError
+        self.assertEqual([], provisioningserver.rpc.getAllRegionClients())
@@ -22,6 +22,7 @@ from provisioningserver.plugin import (
     Options,
     ProvisioningServiceMaker,
 )
+from provisioningserver.prometheus.collectors import RuntimeMetricsService
 from provisioningserver.rackdservices.dhcp_probe_service import (
     DHCPProbeService,
 )
@@ -48,6 +49,7 @@ from provisioningserver.rackdservices.tftp import (
 from provisioningserver.rackdservices.tftp_offload import TFTPOffloadService
 from provisioningserver.rpc.clusterservice import ClusterClientCheckerService
 from provisioningserver.testing.config import ClusterConfigurationFixture
+from provisioningserver.utils.profiler import ProfilerResource
 from testtools.matchers import (
     AfterPreprocessing,
     Contains,
@@ -107,6 +109,7 @@ class TestProvisioningServiceMaker(MAASTestCase):
             "dhcp_probe", "networks_monitor", "image_download",
             "lease_socket_service", "node_monitor", "external",
             "rpc", "rpc-ping", "http", "http_log", "tftp", "service_monitor",
+            "runtime_metrics",
             ]
         self.assertThat(service.namedServices, KeysEqual(*expected_services))
         self.assertEqual(
@@ -132,6 +135,7 @@ class TestProvisioningServiceMaker(MAASTestCase):
             "dhcp_probe", "networks_monitor", "image_download",
             "lease_socket_service", "node_monitor", "external",
             "rpc", "rpc-ping", "http", "http_log", "tftp", "service_monitor",
+            "runtime_metrics",
             ]
         self.assertThat(service.namedServices, KeysEqual(*expected_services))
         self.assertEqual(
@@ -216,6 +220,13 @@ class TestProvisioningServiceMaker(MAASTestCase):
         external_service = service.getServiceNamed("external")
         self.assertIsInstance(external_service, RackExternalService)
 
+    def test_runtime_metrics_service(self):
+        options = Options()
+        service_maker = ProvisioningServiceMaker("Harry", "Hill")
+        service = service_maker.makeService(options, clock=None)
+        runtime_metrics = service.getServiceNamed("runtime_metrics")
+        self.assertIsInstance(runtime_metrics, RuntimeMetricsService)
+
     def test_http_service(self):
         options = Options()
         service_maker = ProvisioningServiceMaker("Harry", "Hill")
@@ -223,6 +234,14 @@ class TestProvisioningServiceMaker(MAASTestCase):
         http_log = service.getServiceNamed("http_log")
         self.assertIsInstance(http_log, StreamServerEndpointService)
 
+    def test_http_service_serves_profiler(self):
+        options = Options()
+        service_maker = ProvisioningServiceMaker("Harry", "Hill")
+        service = service_maker.makeService(options, clock=None)
+        http_log = service.getServiceNamed("http_log")
+        self.assertIsInstance(
+            http_log.factory.resource.children[b"profiler"], ProfilerResource)
+
     def test_tftp_service(self):
         # A TFTP service is configured and added to the top-level service.
         options = Options()
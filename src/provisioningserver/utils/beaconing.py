@@ -1,4 +1,4 @@
-# Copyright 2016-2017 Canonical Ltd.  This software is licensed under the
+# Copyright 2016-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Utilities for working with beaconing packets."""
@@ -10,6 +10,7 @@ __all__ = [
     "InvalidBeaconingPacket",
     "TopologyHint",
     "create_beacon_payload",
+    "make_beacon_observation",
     "read_beacon_payload",
     "add_arguments",
     "run"
@@ -272,6 +273,28 @@ class BeaconingPacket:
             return None
 
 
+def make_beacon_observation(packet, beacon):
+    """Describe a beacon received in `packet`, in a format suitable for JSON.
+
+    :param packet: A `Packet` from `decode_ethernet_udp_packet`.
+    :param beacon: The `BeaconingPacket` in `packet`.
+    """
+    observation = {
+        "source_mac": format_eui(packet.l2.src_eui),
+        "destination_mac": format_eui(packet.l2.dst_eui),
+        "source_ip": str(packet.l3.src_ip),
+        "destination_ip": str(packet.l3.dst_ip),
+        "source_port": packet.l4.packet.src_port,
+        "destination_port": packet.l4.packet.dst_port,
+        "time": packet.timestamp,
+    }
+    if packet.l2.vid is not None:
+        observation["vid"] = packet.l2.vid
+    if beacon.data is not None:
+        observation.update(beacon_to_json(beacon.data))
+    return observation
+
+
 def observe_beaconing_packets(input=sys.stdin.buffer, out=sys.stdout):
     """Read stdin and look for tcpdump binary beaconing output.
 
@@ -293,19 +316,7 @@ def observe_beaconing_packets(input=sys.stdin.buffer, out=sys.stdout):
                 beacon = BeaconingPacket(packet.payload)
                 if not beacon.valid:
                     continue
-                output_json = {
-                    "source_mac": format_eui(packet.l2.src_eui),
-                    "destination_mac": format_eui(packet.l2.dst_eui),
-                    "source_ip": str(packet.l3.src_ip),
-                    "destination_ip": str(packet.l3.dst_ip),
-                    "source_port": packet.l4.packet.src_port,
-                    "destination_port": packet.l4.packet.dst_port,
-                    "time": pcap_header.timestamp_seconds
-                }
-                if packet.l2.vid is not None:
-                    output_json["vid"] = packet.l2.vid
-                if beacon.data is not None:
-                    output_json.update(beacon_to_json(beacon.data))
+                output_json = make_beacon_observation(packet, beacon)
                 out.write(json.dumps(output_json))
                 out.write('\n')
                 out.flush()
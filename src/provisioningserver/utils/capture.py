@@ -0,0 +1,354 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Observe neighbours and beacons on many interfaces with one socket.
+
+`maas-rack observe-arp` and `maas-rack observe-beacons` each capture from a
+single interface via `tcpdump`. `maas-common observe-network` instead opens
+one packet socket for all interfaces, filtered in the kernel to ARP and
+beacon traffic, and works out which interface and VLAN each packet arrived
+on itself. Only new, moved, or refreshed neighbours, and beacons, are
+written out.
+"""
+
+__all__ = [
+    "add_arguments",
+    "make_capture_filter",
+    "NetworkObserver",
+    "open_capture_socket",
+    "run",
+]
+
+from collections import defaultdict
+import ctypes
+import json
+import os
+import select
+import socket
+import struct
+import sys
+from textwrap import dedent
+import time
+
+from provisioningserver.utils.arp import (
+    ARP,
+    SIZEOF_ARP_PACKET,
+    update_bindings_and_get_event,
+)
+from provisioningserver.utils.beaconing import (
+    BEACON_PORT,
+    BeaconingPacket,
+    make_beacon_observation,
+)
+from provisioningserver.utils.ethernet import (
+    Ethernet,
+    ETHERTYPE,
+)
+from provisioningserver.utils.tcpip import (
+    decode_ethernet_udp_packet,
+    PacketProcessingError,
+)
+
+# See packet(7), socket(7), and linux/filter.h.
+ETH_P_ALL = 0x0003
+ETH_P_ARP = 0x0806
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86dd
+ETH_P_8021Q = 0x8100
+IPPROTO_UDP = 17
+
+SOL_PACKET = 263
+PACKET_AUXDATA = 8
+TP_STATUS_VLAN_VALID = 0x10
+SO_ATTACH_FILTER = 26
+SO_LOCK_FILTER = 44
+
+BPF_LD_H_ABS = 0x28
+BPF_LD_B_ABS = 0x30
+BPF_LD_H_IND = 0x48
+BPF_LDX_B_MSH = 0xb1
+BPF_JEQ_K = 0x15
+BPF_JSET_K = 0x45
+BPF_RET_K = 0x06
+
+SOCK_FILTER = struct.Struct("=HBBI")
+TPACKET_AUXDATA = struct.Struct("=IIIHHHH")
+
+# Beacons are captured up to this size, as by `beacon-monitor`.
+SNAPSHOT_LENGTH = 16384
+
+# Read at most this many packets before writing out what was observed.
+BATCH_SIZE = 1000
+
+
+def _assemble(program):
+    """Assemble a classic BPF `program`.
+
+    Each element of `program` is either a label, or a tuple of an opcode, its
+    constant, and the labels to jump to if a comparison is true and false. A
+    jump label of `None` means the next instruction.
+
+    :return: A list of (code, jt, jf, k) tuples.
+    """
+    labels, instructions = {}, []
+    for item in program:
+        if isinstance(item, str):
+            labels[item] = len(instructions)
+        else:
+            instructions.append(item)
+
+    def offset(index, label):
+        return 0 if label is None else labels[label] - index - 1
+
+    return [
+        (code, offset(index, jt), offset(index, jf), k)
+        for index, (code, k, jt, jf) in enumerate(instructions)
+    ]
+
+
+def _match_ethertype(base, port, prefix):
+    """BPF to accept ARP, or UDP to `port`, after `base` bytes of VLAN tag."""
+    ipv4, ipv6 = prefix + "-ipv4", prefix + "-ipv6"
+    return [
+        (BPF_LD_H_ABS, base + 12, None, None),
+        (BPF_JEQ_K, ETH_P_ARP, "accept", None),
+        (BPF_JEQ_K, ETH_P_IP, ipv4, None),
+        (BPF_JEQ_K, ETH_P_IPV6, ipv6, "reject"),
+        ipv4,
+        (BPF_LD_B_ABS, base + 23, None, None),
+        (BPF_JEQ_K, IPPROTO_UDP, None, "reject"),
+        # Only the first fragment has a UDP header.
+        (BPF_LD_H_ABS, base + 20, None, None),
+        (BPF_JSET_K, 0x1fff, "reject", None),
+        (BPF_LDX_B_MSH, base + 14, None, None),
+        (BPF_LD_H_IND, base + 16, None, None),
+        (BPF_JEQ_K, port, "accept", "reject"),
+        ipv6,
+        (BPF_LD_B_ABS, base + 20, None, None),
+        (BPF_JEQ_K, IPPROTO_UDP, None, "reject"),
+        (BPF_LD_H_ABS, base + 56, None, None),
+        (BPF_JEQ_K, port, "accept", "reject"),
+    ]
+
+
+def make_capture_filter(port=BEACON_PORT, snaplen=SNAPSHOT_LENGTH):
+    """Return a BPF program that accepts only ARP and beacons.
+
+    This is equivalent to the `tcpdump` filters used by `network-monitor`
+    and `beacon-monitor` combined: ARP, or UDP to `port` over IPv4 or IPv6,
+    with or without an 802.1q VLAN tag.
+    """
+    return _assemble([
+        (BPF_LD_H_ABS, 12, None, None),
+        (BPF_JEQ_K, ETH_P_8021Q, "tagged", None),
+        *_match_ethertype(0, port, "untagged"),
+        "tagged",
+        *_match_ethertype(4, port, "tagged"),
+        "accept",
+        (BPF_RET_K, snaplen, None, None),
+        "reject",
+        (BPF_RET_K, 0, None, None),
+    ])
+
+
+def attach_filter(sock, program):
+    """Attach the BPF `program` to `sock`."""
+    code = b"".join(
+        SOCK_FILTER.pack(*instruction) for instruction in program)
+    buffer = ctypes.create_string_buffer(code, len(code))
+    fprog = struct.pack("HL", len(program), ctypes.addressof(buffer))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def open_capture_socket():
+    """Open a packet socket that captures ARP and beacons on all interfaces.
+
+    The filter is locked, so whoever holds the socket can't use it to
+    capture other traffic. This requires root, or `CAP_NET_RAW`.
+    """
+    sock = socket.socket(
+        socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+    try:
+        attach_filter(sock, make_capture_filter())
+        sock.setsockopt(socket.SOL_SOCKET, SO_LOCK_FILTER, 1)
+        sock.setsockopt(SOL_PACKET, PACKET_AUXDATA, 1)
+        sock.setblocking(False)
+        # Discard anything received before the filter was attached.
+        while True:
+            try:
+                sock.recv(SNAPSHOT_LENGTH)
+            except BlockingIOError:
+                break
+    except:
+        sock.close()
+        raise
+    return sock
+
+
+def get_vid(ancdata):
+    """Return the VLAN a packet was tagged with, if it was stripped.
+
+    Most network drivers remove 802.1q tags before packets are captured. The
+    kernel reports them in `PACKET_AUXDATA` control messages instead.
+    """
+    for level, msg_type, data in ancdata:
+        if level == SOL_PACKET and msg_type == PACKET_AUXDATA:
+            status, _, _, _, _, tci, _ = TPACKET_AUXDATA.unpack_from(data)
+            if tci != 0 or status & TP_STATUS_VLAN_VALID:
+                return tci & 0xfff
+    return None
+
+
+def receive_packets(sock, count=BATCH_SIZE):
+    """Yield up to `count` packets waiting on the nonblocking `sock`.
+
+    :return: An iterator of (interface, packet, vid, outgoing) tuples.
+    """
+    auxsize = socket.CMSG_SPACE(TPACKET_AUXDATA.size)
+    for _ in range(count):
+        try:
+            packet, ancdata, _, address = sock.recvmsg(
+                SNAPSHOT_LENGTH, auxsize)
+        except BlockingIOError:
+            break
+        ifname, _, pkttype = address[:3]
+        outgoing = pkttype == socket.PACKET_OUTGOING
+        yield ifname, packet, get_vid(ancdata), outgoing
+
+
+class NetworkObserver:
+    """Observe neighbours and beacons in packets from many interfaces.
+
+    Neighbours are tracked separately for each interface, exactly as
+    `maas-rack observe-arp` would for that interface.
+    """
+
+    def __init__(self, neighbours=(), beacons=()):
+        super().__init__()
+        self.bindings = defaultdict(dict)
+        self.select(neighbours, beacons)
+
+    def select(self, neighbours=(), beacons=()):
+        """Select the interfaces to observe neighbours and beacons on."""
+        self.neighbours = frozenset(neighbours)
+        self.beacons = frozenset(beacons)
+        for ifname in set(self.bindings) - self.neighbours:
+            del self.bindings[ifname]
+
+    def observe(self, ifname, packet, vid=None, outgoing=False, time=None):
+        """Observe a captured Ethernet `packet`.
+
+        :param vid: The VLAN the packet was tagged with, if its tag has been
+            stripped; see `get_vid`.
+        :param outgoing: Whether this host sent the packet.
+        :param time: When the packet was captured, in seconds since the epoch.
+        :return: A list of observations. Each is a dict with either a
+            "neighbour" key, holding an event like those from `maas-rack
+            observe-arp`, or a "beacon" key, holding a beacon like those from
+            `maas-rack observe-beacons`. Both include an "interface" key.
+        """
+        ethernet = Ethernet(packet, time=time)
+        if not ethernet.is_valid():
+            return []
+        if ethernet.vid is None:
+            ethernet.vid = vid
+        if ethernet.ethertype == ETHERTYPE.ARP:
+            if ifname in self.neighbours:
+                return self._observeARP(ifname, ethernet)
+        elif ifname in self.beacons and not outgoing:
+            return self._observeBeacon(ifname, ethernet, packet, time)
+        return []
+
+    def _observeARP(self, ifname, ethernet):
+        if len(ethernet.payload) < SIZEOF_ARP_PACKET:
+            return []
+        arp = ARP(
+            ethernet.payload, src_mac=ethernet.src_mac,
+            dst_mac=ethernet.dst_mac, vid=ethernet.vid, time=ethernet.time)
+        observations = []
+        bindings = self.bindings[ifname]
+        for ip, mac in arp.bindings():
+            event = update_bindings_and_get_event(
+                bindings, arp.vid, ip, mac, arp.time)
+            if event is not None:
+                event["interface"] = ifname
+                observations.append({"neighbour": event})
+        return observations
+
+    def _observeBeacon(self, ifname, ethernet, packet, time):
+        try:
+            packet = decode_ethernet_udp_packet(packet)
+        except PacketProcessingError:
+            return []
+        beacon = BeaconingPacket(packet.payload)
+        if not beacon.valid:
+            return []
+        packet.l2.vid = ethernet.vid
+        if time is not None:
+            packet = packet._replace(timestamp=time)
+        observation = make_beacon_observation(packet, beacon)
+        observation["interface"] = ifname
+        return [{"beacon": observation}]
+
+
+def observe_network(sock, control, output=sys.stdout):
+    """Observe neighbours and beacons until `control` reaches end-of-file.
+
+    :param sock: A nonblocking socket from `open_capture_socket`.
+    :param control: File descriptor to read interface selections from. Each
+        is a JSON object, on its own line, with "neighbours" and "beacons"
+        lists of interface names.
+    :param output: Stream to write observations to; see
+        `NetworkObserver.observe`. Each is a JSON object on its own line.
+    """
+    observer = NetworkObserver()
+    pending = b""
+    while True:
+        readable, _, _ = select.select([control, sock], [], [])
+        if control in readable:
+            data = os.read(control, 4096)
+            if len(data) == 0:
+                return
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                if line.strip() != b"":
+                    observer.select(**json.loads(line.decode("utf-8")))
+        if sock in readable:
+            now = int(time.time())
+            for ifname, packet, vid, outgoing in receive_packets(sock):
+                for observation in observer.observe(
+                        ifname, packet, vid, outgoing, now):
+                    output.write(json.dumps(observation))
+                    output.write("\n")
+            output.flush()
+
+
+def add_arguments(parser):
+    """Add this command's options to the `ArgumentParser`.
+
+    Specified by the `ActionScript` interface.
+    """
+    parser.description = dedent("""\
+        Observes ARP and beaconing traffic on many interfaces at once.
+
+        Reads the interfaces to observe from stdin, as JSON objects (one per
+        line) with "neighbours" and "beacons" lists of interface names.
+        Outputs JSON objects (one per line) for each NEW, REFRESHED, or MOVED
+        neighbour, and for each beacon received. Exits when stdin is closed.
+
+        This needs to run as root.
+        """)
+
+
+def run(args, output=sys.stdout, stdin=sys.stdin):
+    """Observe neighbours and beacons on the interfaces given on stdin."""
+
+    # First, become a progress group leader, so that signals can be directed
+    # to this process and its children; see p.u.twisted.terminateProcess.
+    os.setpgrp()
+
+    sock = open_capture_socket()
+    try:
+        observe_network(sock, stdin.fileno(), output)
+    finally:
+        sock.close()
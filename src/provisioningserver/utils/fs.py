@@ -6,6 +6,7 @@
 __all__ = [
     'atomic_copy',
     'atomic_delete',
+    'atomic_link',
     'atomic_symlink',
     'atomic_write',
     'FileLock',
@@ -24,6 +25,7 @@ __all__ = [
 import codecs
 from contextlib import contextmanager
 import errno
+import fcntl
 import filecmp
 from itertools import count
 import os
@@ -35,6 +37,7 @@ from os import (
 from random import randint
 from shutil import (
     copyfile,
+    copyfileobj,
     rmtree,
 )
 import string
@@ -205,6 +208,51 @@ def atomic_copy(source, destination):
     os.rename(temp_file, destination)
 
 
+# The FICLONE ioctl, from linux/fs.h.
+FICLONE = 0x40049409
+
+
+def clone_file(source, destination):
+    """Copy the file at `source` to `destination`.
+
+    On filesystems that support it, e.g. btrfs and XFS, the copy is a
+    reflink that shares the blocks of `source` until either is modified.
+    Elsewhere the contents are copied.
+    """
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            copyfileobj(src, dst)
+
+
+def atomic_link(source, destination):
+    """Hardlink the file at `source` as `destination` in an atomic fashion.
+
+    If `destination` is already a link to `source` it is left untouched,
+    otherwise it is replaced. When a hardlink cannot be made, e.g. because
+    `destination` is on another filesystem, the file is cloned instead; see
+    `clone_file`.
+
+    :param source: Source path of the file.
+    :param destination: Destination path of the link.
+    """
+    if os.path.isfile(destination) and os.path.samefile(source, destination):
+        return
+
+    # Link next to the destination, then rename over it.
+    temp_file = '%s.new' % destination
+    if os.path.lexists(temp_file):
+        os.remove(temp_file)
+    try:
+        os.link(source, temp_file)
+    except OSError as error:
+        if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        clone_file(source, temp_file)
+    os.rename(temp_file, destination)
+
+
 def atomic_delete(filename):
     """Delete the file `filename` in an atomic fashion.
 
@@ -0,0 +1,248 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Utilities for watching network interfaces change with rtnetlink."""
+
+__all__ = [
+    "InterfaceModel",
+    "NetlinkMonitorService",
+    "parse_netlink_messages",
+]
+
+from collections import defaultdict
+import errno
+import socket
+import struct
+
+from provisioningserver.logger import (
+    get_maas_logger,
+    LegacyLogger,
+)
+from twisted.application.service import Service
+from twisted.internet import reactor
+from twisted.internet.interfaces import IReadDescriptor
+from zope.interface import implementer
+
+
+maaslog = get_maas_logger("netlink")
+log = LegacyLogger()
+
+# See netlink(7) and rtnetlink(7).
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+NLMSG_OVERRUN = 4
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MASTER = 10
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+IFF_UP = 0x1
+
+NLMSGHDR = struct.Struct("=LHHLL")
+IFINFOMSG = struct.Struct("=BxHiII")
+IFADDRMSG = struct.Struct("=BBBBI")
+RTATTR = struct.Struct("=HH")
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def parse_netlink_messages(data):
+    """Yield a (type, payload) tuple for each netlink message in `data`."""
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        yield msg_type, data[offset + NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+
+def parse_attributes(data):
+    """Return a dict of {type: value} for the rtattrs in `data`."""
+    attributes = {}
+    offset = 0
+    while offset + RTATTR.size <= len(data):
+        length, attr_type = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attributes[attr_type] = data[offset + RTATTR.size:offset + length]
+        offset += _align(length)
+    return attributes
+
+
+def parse_link(payload):
+    """Parse an RTM_NEWLINK or RTM_DELLINK payload.
+
+    :return: The interface index, and a tuple of its name, whether it's up,
+        its MAC address, and the index of its master (if it's bonded or
+        bridged).
+    """
+    _, _, index, flags, _ = IFINFOMSG.unpack_from(payload)
+    attributes = parse_attributes(payload[IFINFOMSG.size:])
+    name = attributes.get(IFLA_IFNAME, b"").rstrip(b"\0").decode("utf-8")
+    mac = ":".join("%02x" % byte for byte in attributes.get(IFLA_ADDRESS, b""))
+    master = attributes.get(IFLA_MASTER)
+    if master is not None:
+        master, = struct.unpack("=I", master[:4])
+    return index, (name, bool(flags & IFF_UP), mac, master)
+
+
+def parse_address(payload):
+    """Parse an RTM_NEWADDR or RTM_DELADDR payload.
+
+    :return: The interface index, and the address in CIDR notation.
+    """
+    family, prefixlen, _, _, index = IFADDRMSG.unpack_from(payload)
+    attributes = parse_attributes(payload[IFADDRMSG.size:])
+    # For IPv4, IFA_ADDRESS is the peer of point-to-point links.
+    address = attributes.get(IFA_LOCAL, attributes.get(IFA_ADDRESS))
+    if address is None:
+        return index, None
+    return index, "%s/%d" % (socket.inet_ntop(family, address), prefixlen)
+
+
+class InterfaceModel:
+    """What rtnetlink has said about each interface.
+
+    Only what's reflected in MAAS's interface definitions is kept: an
+    interface's name, whether it's up, its MAC address, its master, and its
+    addresses. Changes to anything else, like statistics or carrier, are
+    ignored.
+    """
+
+    def __init__(self):
+        super(InterfaceModel, self).__init__()
+        self.links = {}
+        self.addresses = defaultdict(set)
+
+    def apply(self, msg_type, payload):
+        """Apply a message to the model.
+
+        :return: True if the message changed the model.
+        """
+        if msg_type == RTM_NEWLINK:
+            index, link = parse_link(payload)
+            changed = self.links.get(index) != link
+            self.links[index] = link
+            return changed
+        elif msg_type == RTM_DELLINK:
+            index, _ = parse_link(payload)
+            self.links.pop(index, None)
+            self.addresses.pop(index, None)
+            # The interface may have existed before we were watching.
+            return True
+        elif msg_type in (RTM_NEWADDR, RTM_DELADDR):
+            index, address = parse_address(payload)
+            if address is None:
+                return False
+            addresses = self.addresses[index]
+            if msg_type == RTM_NEWADDR:
+                changed = address not in addresses
+                addresses.add(address)
+            else:
+                changed = True
+                addresses.discard(address)
+            return changed
+        else:
+            return False
+
+
+@implementer(IReadDescriptor)
+class NetlinkMonitorService(Service):
+    """Call `callback` when network interfaces change.
+
+    This subscribes to link and address changes from rtnetlink, and keeps an
+    `InterfaceModel` up to date with them. If the model changes, or if
+    changes are missed because the socket's buffer filled up, `callback` is
+    called with no arguments.
+
+    If rtnetlink is not available `listening` remains false after the
+    service has been started.
+    """
+
+    groups = RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR
+    bufsize = 2 ** 16
+
+    def __init__(self, callback, clock=reactor):
+        super(NetlinkMonitorService, self).__init__()
+        self.callback = callback
+        self.clock = clock
+        self.model = InterfaceModel()
+        self.socket = None
+
+    @property
+    def listening(self):
+        return self.socket is not None
+
+    def startService(self):
+        super(NetlinkMonitorService, self).startService()
+        try:
+            sock = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_NONBLOCK,
+                NETLINK_ROUTE)
+            try:
+                sock.bind((0, self.groups))
+            except:
+                sock.close()
+                raise
+        except (AttributeError, OSError) as error:
+            maaslog.warning(
+                "Unable to watch for network interface changes; they will "
+                "be polled for instead: %s", error)
+            return
+        self.socket = sock
+        self.clock.addReader(self)
+
+    def stopService(self):
+        if self.socket is not None:
+            self.clock.removeReader(self)
+            self.socket.close()
+            self.socket = None
+        return super(NetlinkMonitorService, self).stopService()
+
+    def fileno(self):
+        return -1 if self.socket is None else self.socket.fileno()
+
+    def logPrefix(self):
+        return "netlink"
+
+    def connectionLost(self, reason):
+        # The reactor has already stopped reading.
+        log.err(reason, "Stopped watching for network interface changes.")
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def doRead(self):
+        changed = False
+        while self.socket is not None:
+            try:
+                data = self.socket.recv(self.bufsize)
+            except BlockingIOError:
+                break
+            except OSError as error:
+                if error.errno == errno.ENOBUFS:
+                    # Messages were dropped; assume something changed.
+                    changed = True
+                    continue
+                raise
+            for msg_type, payload in parse_netlink_messages(data):
+                if msg_type == NLMSG_OVERRUN:
+                    changed = True
+                elif self.model.apply(msg_type, payload):
+                    changed = True
+        if changed:
+            self.callback()
@@ -0,0 +1,499 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Sampling profiler for finding what blocks the reactor.
+
+When enabled, a background thread periodically samples the stacks of the
+reactor thread and of the thread-pool threads. For each thread group it
+keeps a histogram of how long each call-site ran for without interruption,
+and it records the stack of the reactor whenever the reactor hasn't run a
+scheduled call for longer than the stall threshold.
+
+The profiler is off by default. It can be started from the configuration
+of regiond or rackd, or at runtime: through the ``profiler`` operation of
+the MAAS API on the region, and through the ``profiler`` HTTP resource on
+rackd. The ``profiler`` command of ``maas-region`` and ``maas-rack`` talks
+to these.
+"""
+
+__all__ = [
+    "add_arguments",
+    "fetch_profile",
+    "format_report",
+    "get_profiler_token",
+    "PROFILER",
+    "ProfilerResource",
+    "run",
+    "SamplingProfiler",
+]
+
+from collections import deque
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from urllib.parse import urlencode
+from urllib.request import (
+    Request,
+    urlopen,
+)
+
+from provisioningserver.logger import LegacyLogger
+from provisioningserver.security import (
+    calculate_digest,
+    get_shared_secret_from_filesystem,
+    to_hex,
+)
+from twisted.internet.task import LoopingCall
+from twisted.web import resource
+
+
+log = LegacyLogger()
+
+# Upper bounds, in seconds, of the call-site histogram buckets.
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+# Packages whose frames are preferred when choosing a call-site; the
+# innermost frame is used when none of a stack is in these.
+OWN_PACKAGES = tuple(
+    os.sep + package + os.sep
+    for package in ("maasserver", "metadataserver", "provisioningserver"))
+
+# Innermost frames of threads that are waiting rather than working.
+IDLE_FRAMES = frozenset({
+    ("epollreactor.py", "doPoll"),
+    ("pollreactor.py", "doPoll"),
+    ("selectreactor.py", "doSelect"),
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+})
+
+# Twisted names thread-pool threads "PoolThread-<pool name>-<number>".
+POOL_THREAD_PREFIX = "PoolThread-"
+
+# The header that carries the token from `get_profiler_token`.
+TOKEN_HEADER = "X-MAAS-Profiler-Token"
+
+
+def get_callsite(frame):
+    """Return a description of the call-site that `frame` is executing.
+
+    The call-site is the innermost function from MAAS's own packages, or the
+    innermost function if there are none. Functions are identified by their
+    first line rather than the current line so that a single long-running
+    call counts as one call-site.
+    """
+    innermost = frame
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if any(package in filename for package in OWN_PACKAGES):
+            break
+        frame = frame.f_back
+    if frame is None:
+        frame = innermost
+    code = frame.f_code
+    return "%s:%d(%s)" % (
+        shorten_path(code.co_filename), code.co_firstlineno, code.co_name)
+
+
+def shorten_path(filename):
+    """Strip the installation prefix from `filename`."""
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        index = filename.rfind(marker)
+        if index != -1:
+            return filename[index + len(marker):]
+    for package in OWN_PACKAGES:
+        index = filename.rfind(package)
+        if index != -1:
+            return filename[index + 1:]
+    return filename
+
+
+def is_idle(frame):
+    """Return True if the thread running `frame` is waiting for work."""
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+class CallsiteStats:
+    """Histogram of uninterrupted run times of a single call-site."""
+
+    def __init__(self):
+        super(CallsiteStats, self).__init__()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        for index, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                self.buckets[index] += 1
+                break
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+            "histogram": list(self.buckets),
+        }
+
+
+class SamplingProfiler:
+    """Sample the reactor and thread-pool stacks on a background thread.
+
+    :ivar interval: Seconds between samples.
+    :ivar stall_threshold: The reactor is considered stalled when it hasn't
+        run a scheduled call for this many seconds.
+    """
+
+    # How often the reactor records that it's alive, in seconds.
+    heartbeat_interval = 0.05
+
+    def __init__(
+            self, interval=0.01, stall_threshold=0.25, max_stalls=20,
+            clock=None):
+        super(SamplingProfiler, self).__init__()
+        self.clock = clock
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.stalls = deque(maxlen=max_stalls)
+        self.callsites = {}
+        self.started = None
+        self.sampling_time = 0.0
+        self._lock = threading.Lock()
+        self._runs = {}
+        self._stall = None
+        self._last_beat = None
+        self._reactor_thread = None
+        self._heartbeat = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        """Start sampling. Must be called from the reactor thread."""
+        if self.running:
+            return
+        if self.clock is None:
+            from twisted.internet import reactor
+            self.clock = reactor
+        self._reactor_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._heartbeat = LoopingCall(self._beat)
+        self._heartbeat.clock = self.clock
+        self._heartbeat.start(self.heartbeat_interval)
+        self.started = time.time()
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._sample_forever, name="SamplingProfiler")
+        self._thread.daemon = True
+        self._thread.start()
+        log.msg(
+            "Sampling profiler started; reporting reactor stalls over "
+            "%.2f seconds." % self.stall_threshold)
+
+    def stop(self):
+        """Stop sampling, keeping the data collected so far."""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        self._heartbeat.stop()
+        self._heartbeat = None
+        with self._lock:
+            now = time.monotonic()
+            for ident in list(self._runs):
+                self._end_run(ident, now)
+        log.msg("Sampling profiler stopped.")
+
+    def reset(self):
+        """Discard the data collected so far."""
+        with self._lock:
+            self.callsites.clear()
+            self.stalls.clear()
+            self._runs.clear()
+            self._stall = None
+            self.sampling_time = 0.0
+            if self.running:
+                self.started = time.time()
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+
+    def _sample_forever(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                # Never let the profiler take anything else down with it.
+                log.err(None, "Sampling profiler failed to take a sample.")
+
+    def _get_threads(self):
+        """Return a dict of thread idents to their group name."""
+        groups = {self._reactor_thread: "reactor"}
+        for thread in threading.enumerate():
+            if thread.name.startswith(POOL_THREAD_PREFIX):
+                name = thread.name[len(POOL_THREAD_PREFIX):]
+                groups[thread.ident] = name.rpartition("-")[0] or name
+        return groups
+
+    def sample(self):
+        """Take one sample of the stacks of the threads being profiled."""
+        started = time.monotonic()
+        groups = self._get_threads()
+        frames = sys._current_frames()
+        with self._lock:
+            now = time.monotonic()
+            for ident, group in groups.items():
+                frame = frames.get(ident)
+                if frame is None or is_idle(frame):
+                    self._end_run(ident, now)
+                    continue
+                callsite = get_callsite(frame)
+                run = self._runs.get(ident)
+                if run is None or run[1] != callsite:
+                    self._end_run(ident, now)
+                    self._runs[ident] = (group, callsite, now)
+            for ident in set(self._runs) - set(groups):
+                self._end_run(ident, now)
+            self._check_stall(frames.get(self._reactor_thread), now)
+            self.sampling_time += time.monotonic() - started
+
+    def _end_run(self, ident, now):
+        run = self._runs.pop(ident, None)
+        if run is not None:
+            group, callsite, started = run
+            stats = self.callsites.setdefault(group, {})
+            if callsite not in stats:
+                stats[callsite] = CallsiteStats()
+            stats[callsite].observe(now - started)
+
+    def _check_stall(self, frame, now):
+        last_beat = self._last_beat
+        lag = now - last_beat - self.heartbeat_interval
+        if self._stall is not None:
+            if self._stall["beat"] == last_beat:
+                # Still stalled.
+                self._stall["duration"] = lag
+            else:
+                stall, self._stall = self._stall, None
+                self.clock.callFromThread(
+                    log.msg, "Reactor stalled for %.2f seconds in %s." % (
+                        stall["duration"], stall["callsite"]))
+        elif lag > self.stall_threshold and frame is not None:
+            self._stall = {
+                "beat": last_beat,
+                "started": time.time() - lag,
+                "duration": lag,
+                "callsite": get_callsite(frame),
+                "stack": traceback.format_stack(frame),
+            }
+            self.stalls.append(self._stall)
+
+    def get_report(self):
+        """Return the data collected so far as a JSON-compatible dict."""
+        with self._lock:
+            callsites = {
+                group: {
+                    callsite: stats.as_dict()
+                    for callsite, stats in group_stats.items()
+                }
+                for group, group_stats in self.callsites.items()
+            }
+            stalls = [
+                {
+                    key: value for key, value in stall.items()
+                    if key != "beat"
+                }
+                for stall in self.stalls
+            ]
+            return {
+                "pid": os.getpid(),
+                "running": self.running,
+                "started": self.started,
+                "interval": self.interval,
+                "stall_threshold": self.stall_threshold,
+                "sampling_time": self.sampling_time,
+                "buckets": [
+                    "+Inf" if bound == float("inf") else str(bound)
+                    for bound in BUCKETS
+                ],
+                "callsites": callsites,
+                "stalls": stalls,
+            }
+
+
+def format_report(report, limit=10):
+    """Return a human-readable rendering of a profiler report.
+
+    :param limit: The number of call-sites to show per thread group.
+    """
+    lines = [
+        "Process %d: profiler %s, sampling every %.3fs, "
+        "stall threshold %.2fs." % (
+            report["pid"], "running" if report["running"] else "stopped",
+            report["interval"], report["stall_threshold"]),
+    ]
+    buckets = " ".join("%7s" % bound for bound in report["buckets"])
+    for group, callsites in sorted(report["callsites"].items()):
+        lines.append("")
+        lines.append("Busiest call-sites in %s:" % group)
+        lines.append("%9s %7s %9s  %s  %s" % (
+            "total(s)", "count", "max(s)", buckets, "call-site"))
+        ranked = sorted(
+            callsites.items(), key=lambda item: item[1]["total"],
+            reverse=True)
+        for callsite, stats in ranked[:limit]:
+            histogram = " ".join(
+                "%7d" % count for count in stats["histogram"])
+            lines.append("%9.3f %7d %9.3f  %s  %s" % (
+                stats["total"], stats["count"], stats["max"], histogram,
+                callsite))
+    for stall in report["stalls"]:
+        lines.append("")
+        lines.append("Reactor stalled for %.2fs at %s in %s:" % (
+            stall["duration"],
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(
+                stall["started"])),
+            stall["callsite"]))
+        lines.extend(line.rstrip("\n") for line in stall["stack"])
+    return "\n".join(lines)
+
+
+def get_profiler_token(secret):
+    """Return the token that authorizes use of a `ProfilerResource`.
+
+    It's derived from the shared secret, so that only those who can read
+    the secret can use the profiler, without the secret being sent.
+    """
+    return to_hex(calculate_digest(secret, b"profiler", b""))
+
+
+class ProfilerResource(resource.Resource):
+    """Report on and control the profiler of this process.
+
+    Requests must carry, in the ``X-MAAS-Profiler-Token`` header, the token
+    that `get_profiler_token` derives from the shared secret. ``GET`` returns
+    the report as JSON; ``POST`` with an ``action`` of ``start``, ``stop`` or
+    ``reset`` controls the profiler, then returns the report.
+
+    :param get_secret: Returns the shared secret, or `None` if there's none
+        yet, in which case all requests are refused.
+    """
+
+    isLeaf = True
+
+    actions = frozenset({b"start", b"stop", b"reset"})
+
+    def __init__(
+            self, profiler=None,
+            get_secret=get_shared_secret_from_filesystem):
+        super(ProfilerResource, self).__init__()
+        self.profiler = PROFILER if profiler is None else profiler
+        self.get_secret = get_secret
+
+    def render(self, request):
+        if not self.isAuthorized(request):
+            request.setResponseCode(403)
+            return b""
+        return super(ProfilerResource, self).render(request)
+
+    def isAuthorized(self, request):
+        token = request.getHeader(TOKEN_HEADER.encode("ascii"))
+        if token is None:
+            return False
+        secret = self.get_secret()
+        if secret is None:
+            return False
+        expected = get_profiler_token(secret).encode("ascii")
+        return hmac.compare_digest(token, expected)
+
+    def render_GET(self, request):
+        request.setHeader(b"Content-Type", b"application/json")
+        return json.dumps(self.profiler.get_report()).encode("utf-8")
+
+    def render_POST(self, request):
+        action = request.args.get(b"action", [None])[0]
+        if action not in self.actions:
+            request.setResponseCode(400)
+            return b"Unknown action."
+        getattr(self.profiler, action.decode("ascii"))()
+        return self.render_GET(request)
+
+
+def fetch_profile(url, action=None, timeout=30, headers=None):
+    """Fetch a profiler report from a ``ProfilerResource`` at `url`.
+
+    :param action: If given, ask the profiler to "start", "stop" or "reset"
+        before reporting.
+    :param headers: HTTP headers that authorize the request.
+    """
+    data = None if action is None else urlencode(
+        {"action": action}).encode("ascii")
+    request = Request(url, data=data, headers=(
+        {} if headers is None else headers))
+    with urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def add_arguments(parser):
+    """Add this command's options to the `ArgumentParser`.
+
+    Specified by the `ActionScript` interface.
+    """
+    parser.description = (
+        "Show or control the sampling profiler of a running daemon. The "
+        "daemon records how long code runs in the reactor and thread-pools, "
+        "and captures the stack whenever the reactor stalls.")
+    parser.add_argument(
+        "action", nargs="?", choices=("show", "start", "stop", "reset"),
+        default="show", help="What to do. Defaults to showing the report.")
+    parser.add_argument(
+        "--url", default="http://localhost:5249/profiler",
+        help="URL of the daemon's profiler resource (default: %(default)s).")
+    parser.add_argument(
+        "--json", action="store_true", default=False,
+        help="Output the raw report as JSON.")
+    parser.add_argument(
+        "--limit", type=int, default=10,
+        help="Number of call-sites to show per thread-pool.")
+
+
+def run(args, stdout=sys.stdout, headers=None):
+    """Show or control the profiler of a running daemon.
+
+    Specified by the `ActionScript` interface.
+
+    :param headers: HTTP headers that authorize the requests. By default
+        they carry the token that rackd expects, which needs the shared
+        secret to be readable.
+    """
+    if headers is None:
+        secret = get_shared_secret_from_filesystem()
+        if secret is None:
+            raise SystemExit("There is no shared secret on this machine.")
+        headers = {TOKEN_HEADER: get_profiler_token(secret)}
+    action = None if args.action == "show" else args.action
+    report = fetch_profile(args.url, action, headers=headers)
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True), file=stdout)
+    else:
+        print(format_report(report, limit=args.limit), file=stdout)
+
+
+# The profiler for this process.
+PROFILER = SamplingProfiler()
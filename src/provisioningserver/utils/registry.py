@@ -1,36 +1,85 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Registry base class for registry singletons."""
 
 __all__ = [
+    "LazyItem",
     "Registry",
 ]
 
 from collections import defaultdict
+from importlib import import_module
 
 
 _registry = defaultdict(dict)
 
 
+class LazyItem:
+    """An item that is only imported when it is first looked up.
+
+    :param path: The item's factory, as ``package.module:name`` like an
+        entry point. It is called without arguments to create the item.
+    """
+
+    def __init__(self, path):
+        super(LazyItem, self).__init__()
+        self.path = path
+        self.item = None
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.path)
+
+    def load(self):
+        """Import and create the item, once."""
+        if self.item is None:
+            module_name, factory_name = self.path.split(":")
+            factory = getattr(import_module(module_name), factory_name)
+            self.item = factory()
+        return self.item
+
+
 class RegistryType(type):
     """This exists to subvert ``type``'s builtins."""
 
+    def _load_item(cls, name, item):
+        if isinstance(item, LazyItem):
+            item = _registry[cls][name] = item.load()
+        return item
+
     def __getitem__(cls, name):
-        return _registry[cls][name]
+        return cls._load_item(name, _registry[cls][name])
 
     def __contains__(cls, name):
         return name in _registry[cls]
 
     def __iter__(cls):
-        return iter(_registry[cls].items())
+        for name, item in list(_registry[cls].items()):
+            yield name, cls._load_item(name, item)
+
+    def peek_items(cls):
+        """Iterate over the items without importing the lazy ones.
+
+        Items not yet imported are returned as their `LazyItem`.
+        """
+        return iter(list(_registry[cls].items()))
 
     def get_item(cls, name, default=None):
-        return _registry[cls].get(name, default)
+        item = _registry[cls].get(name, None)
+        if item is None:
+            return default
+        return cls._load_item(name, item)
 
     def register_item(cls, name, item):
         _registry[cls][name] = item
 
+    def register_lazy_item(cls, name, path):
+        """Register the item created by `path` when it is first looked up.
+
+        See `LazyItem` for the format of `path`.
+        """
+        _registry[cls][name] = LazyItem(path)
+
     def unregister_item(cls, name):
         _registry[cls].pop(name, None)
 
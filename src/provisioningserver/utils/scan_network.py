@@ -1,29 +1,49 @@
-# Copyright 2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2016-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Utilities for scanning attached networks."""
 
 __all__ = [
     "add_arguments",
-    "run"
+    "run",
+    "ScanProgress",
 ]
 
-from collections import namedtuple
+from collections import (
+    namedtuple,
+    OrderedDict,
+)
 import json
 from multiprocessing import cpu_count
 from multiprocessing.pool import ThreadPool
 import os
+import select
+import socket
+import struct
 import subprocess
 import sys
 from textwrap import dedent
 import time
 
 from netaddr import (
+    IPAddress,
     IPNetwork,
     IPSet,
 )
 from netaddr.core import AddrFormatError
-from provisioningserver.utils.network import get_all_interfaces_definition
+from provisioningserver.utils.arp import (
+    ARP,
+    ARP_OPERATION,
+    SIZEOF_ARP_PACKET,
+)
+from provisioningserver.utils.ethernet import (
+    Ethernet,
+    ETHERTYPE,
+)
+from provisioningserver.utils.network import (
+    format_eui,
+    get_all_interfaces_definition,
+)
 from provisioningserver.utils.script import ActionScriptError
 from provisioningserver.utils.shell import (
     get_env_with_locale,
@@ -37,6 +57,26 @@ PingParameters = namedtuple('PingParameters', ('interface', 'ip'))
 NmapParameters = namedtuple('NmapParameters', ('interface', 'cidr', 'slow'))
 
 
+# Ethernet protocol number for ARP, used to open packet sockets.
+ETH_P_ARP = 0x0806
+
+# Default packets per second for ARP sweeps: over all subnets, and per subnet.
+SWEEP_RATE = 1000
+SWEEP_SUBNET_RATE = 100
+
+# Packets per second per subnet for slow ARP sweeps; the same as `nmap`.
+SWEEP_SUBNET_RATE_SLOW = 9
+
+# Maximum packets sent on each subnet at once.
+SWEEP_BATCH = 32
+
+# Seconds to wait for replies after the last request on a subnet is sent.
+SWEEP_WAIT = 1.0
+
+# Seconds between progress events for each subnet.
+SWEEP_PROGRESS_INTERVAL = 1.0
+
+
 def add_arguments(parser):
     """Add this command's options to the `ArgumentParser`.
 
@@ -61,7 +101,8 @@ def add_arguments(parser):
         """)
     parser.add_argument(
         '-s', '--slow', action='store_true', required=False,
-        help='Scan slower. Only applies to nmap scans; ping is slow already.')
+        help='Scan slower. Only applies to nmap scans and ARP sweeps; ping '
+             'is slow already.')
     parser.add_argument(
         '-t', '--threads', required=False, type=int,
         help='Number of concurrent threads to spawn during a scan. '
@@ -69,7 +110,20 @@ def add_arguments(parser):
              'ping, or one times the number of CPUs when using nmap.')
     parser.add_argument(
         '-p', '--ping', action='store_true', required=False,
-        help='Scan using ping. (Default is to scan with nmap, if installed.)')
+        help='Scan using ping. (Default is to sweep with ARP when running '
+             'as root; otherwise, to scan with nmap, if installed.)')
+    parser.add_argument(
+        '-n', '--nmap', action='store_true', required=False,
+        help='Scan using nmap, if installed, rather than sweeping with ARP.')
+    parser.add_argument(
+        '-r', '--rate', required=False, type=int, default=SWEEP_RATE,
+        help='Maximum packets per second to send, over all subnets, when '
+             'sweeping with ARP. Default: %(default)s.')
+    parser.add_argument(
+        '--subnet-rate', required=False, type=int, default=None,
+        help='Maximum packets per second to send on each subnet when '
+             'sweeping with ARP. Default: %d, or %d with --slow.' % (
+                 SWEEP_SUBNET_RATE, SWEEP_SUBNET_RATE_SLOW))
     parser.add_argument(
         'interface', type=str, nargs='?',
         help="Ethernet interface to ping from. Optional if all interfaces are "
@@ -331,6 +385,284 @@ def ping_scan(to_scan: dict, threads=None, threads_per_cpu=4):
             yield from pool.imap(run_ping, jobs)
 
 
+class RateLimiter:
+    """Token bucket allowing `rate` packets per second, `burst` at once."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> int:
+        """Return the number of packets that may be sent now."""
+        self._refill()
+        return int(self.tokens)
+
+    def consume(self, count):
+        """Record that `count` packets were sent."""
+        self.tokens -= count
+
+    def delay(self) -> float:
+        """Return the seconds until another packet may be sent."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+def make_arp_request(source_mac: bytes, source_ip: IPAddress, ip: IPAddress):
+    """Return a broadcast Ethernet frame asking who has `ip`."""
+    return (
+        b"\xff" * 6 + source_mac + ETHERTYPE.ARP +
+        struct.pack("!HHBBH", 1, 0x0800, 6, 4, ARP_OPERATION.REQUEST) +
+        source_mac + source_ip.packed + b"\0" * 6 + ip.packed)
+
+
+def get_source_ip(ifname: str, network: IPNetwork, interfaces: dict):
+    """Return the address to send ARP requests on `network` from.
+
+    This is the interface's address on that network, if it has one. Otherwise
+    it's 0.0.0.0, making the requests ARP probes (RFC 5227), which hosts
+    answer without learning a binding.
+    """
+    for link in yield_ipv4_networks_on_link(ifname, interfaces):
+        address = IPNetwork(link)
+        if address.ip in network:
+            return address.ip
+    return IPAddress("0.0.0.0")
+
+
+def open_arp_socket(ifname: str):
+    """Open a packet socket sending and receiving ARP on `ifname`."""
+    sock = socket.socket(
+        socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+    try:
+        sock.bind((ifname, ETH_P_ARP))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class SubnetSweep:
+    """The state of an ARP sweep of one subnet on one interface."""
+
+    def __init__(self, ifname, network, source_mac, source_ip, limiter):
+        self.ifname = ifname
+        self.network = network
+        self.source_mac = source_mac
+        self.source_ip = source_ip
+        self.limiter = limiter
+        self.targets = network.iter_hosts()
+        if network.prefixlen >= 31:
+            self.hosts = network.size
+        else:
+            self.hosts = network.size - 2
+        self.probed = 0
+        self.up = set()
+        self.started = time.monotonic()
+        self.finished_sending = None
+        self.reported = None
+
+    def nextRequests(self, count):
+        """Return up to `count` more requests to send."""
+        requests = []
+        for ip in self.targets:
+            requests.append(make_arp_request(
+                self.source_mac, self.source_ip, ip))
+            if len(requests) == count:
+                break
+        self.probed += len(requests)
+        if len(requests) < count or self.probed == self.hosts:
+            self.finished_sending = time.monotonic()
+        return requests
+
+    def isDone(self, now):
+        return (
+            self.finished_sending is not None and
+            now - self.finished_sending >= SWEEP_WAIT)
+
+    def getProgress(self, now):
+        self.reported = now
+        return {
+            "scan_type": "arp",
+            "interface": self.ifname,
+            "cidr": str(self.network.cidr),
+            "hosts": self.hosts,
+            "probed": self.probed,
+            "up": len(self.up),
+            "seconds": int(now - self.started),
+            "done": self.isDone(now),
+        }
+
+
+def receive_arp_replies(sock, count=1000):
+    """Yield each ARP reply waiting on `sock`, without blocking."""
+    for _ in range(count):
+        try:
+            packet = sock.recv(65535, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            break
+        ethernet = Ethernet(packet)
+        if not ethernet.is_valid() or ethernet.ethertype != ETHERTYPE.ARP:
+            continue
+        if len(ethernet.payload) < SIZEOF_ARP_PACKET:
+            continue
+        arp = ARP(ethernet.payload)
+        if arp.is_valid() and arp.operation == ARP_OPERATION.REPLY:
+            yield arp
+
+
+def arp_sweep(
+        to_scan: dict, interfaces: dict, rate=SWEEP_RATE,
+        subnet_rate=SWEEP_SUBNET_RATE, open_socket=open_arp_socket):
+    """Sweeps the specified networks with ARP requests, from this process.
+
+    The `to_scan` dictionary must be in the format:
+
+        {<interface_name>: <iterable-of-cidr-strings>, ...}
+
+    Requests are sent on every subnet at once, at up to `subnet_rate`
+    packets per second on each, and `rate` packets per second in all. One
+    packet socket per interface sends requests and receives replies.
+
+    Yields an event for each host that replies, as it does, and progress
+    events for each subnet every `SWEEP_PROGRESS_INTERVAL` seconds and
+    when it's done. Interfaces that cannot be swept yield an error event.
+    """
+    sockets = {}
+    sweeps = []
+    try:
+        for ifname in to_scan:
+            for cidr in to_scan[ifname]:
+                network = IPNetwork(cidr)
+                if network.version != 4:
+                    continue
+                if ifname not in sockets:
+                    try:
+                        sockets[ifname] = open_socket(ifname)
+                    except OSError as error:
+                        yield {
+                            "scan_type": "arp",
+                            "interface": ifname,
+                            "error": str(error),
+                        }
+                        break
+                source_mac = sockets[ifname].getsockname()[4]
+                sweeps.append(SubnetSweep(
+                    ifname, network, source_mac,
+                    get_source_ip(ifname, network, interfaces),
+                    RateLimiter(subnet_rate, SWEEP_BATCH)))
+        limiter = RateLimiter(rate, SWEEP_BATCH)
+        for sweep in sweeps:
+            yield sweep.getProgress(time.monotonic())
+        yield from _sweep(sweeps, sockets, limiter)
+    finally:
+        for sock in sockets.values():
+            sock.close()
+
+
+def _sweep(sweeps, sockets, limiter):
+    """Send requests for, and receive replies to, `sweeps`."""
+    by_socket = {sockets[sweep.ifname]: [] for sweep in sweeps}
+    for sweep in sweeps:
+        by_socket[sockets[sweep.ifname]].append(sweep)
+    pending = list(sweeps)
+    while len(pending) > 0:
+        # Send what the rate limits allow, sharing them between subnets.
+        for sweep in pending:
+            if sweep.finished_sending is None:
+                count = min(
+                    limiter.available(), sweep.limiter.available())
+                if count > 0:
+                    sock = sockets[sweep.ifname]
+                    for request in sweep.nextRequests(count):
+                        sock.send(request)
+                    sweep.limiter.consume(count)
+                    limiter.consume(count)
+        # Take turns to be first to send.
+        pending.append(pending.pop(0))
+        # Wait for replies until more requests may be sent.
+        now = time.monotonic()
+        sending = [
+            sweep for sweep in pending if sweep.finished_sending is None]
+        if len(sending) > 0:
+            timeout = max(limiter.delay(), min(
+                sweep.limiter.delay() for sweep in sending))
+        else:
+            timeout = min(
+                sweep.finished_sending + SWEEP_WAIT - now
+                for sweep in pending)
+        timeout = min(max(0.0, timeout), SWEEP_PROGRESS_INTERVAL)
+        readable, _, _ = select.select(list(by_socket), [], [], timeout)
+        for sock in readable:
+            for arp in receive_arp_replies(sock):
+                for sweep in by_socket[sock]:
+                    ip = arp.source_ip
+                    if ip in sweep.network and ip not in sweep.up:
+                        sweep.up.add(ip)
+                        yield {
+                            "scan_type": "arp",
+                            "interface": sweep.ifname,
+                            "ip": str(ip),
+                            "mac": format_eui(arp.source_eui),
+                            "result": True,
+                        }
+        now = time.monotonic()
+        for sweep in list(pending):
+            if sweep.isDone(now):
+                pending.remove(sweep)
+                yield sweep.getProgress(now)
+            elif now - sweep.reported >= SWEEP_PROGRESS_INTERVAL:
+                yield sweep.getProgress(now)
+
+
+class ScanProgress:
+    """The progress of a network scan, from the events it writes out.
+
+    Only ARP sweeps write out their progress.
+    """
+
+    def __init__(self):
+        self.scanning = False
+        self.subnets = OrderedDict()
+
+    def start(self):
+        """Forget any previous scan; a new one is starting."""
+        self.scanning = True
+        self.subnets.clear()
+
+    def update(self, events):
+        """Update progress from events written out by the scan."""
+        for event in events:
+            if "probed" in event:
+                key = event["interface"], event["cidr"]
+                self.subnets[key] = {
+                    "interface": event["interface"],
+                    "cidr": event["cidr"],
+                    "hosts": event["hosts"],
+                    "probed": event["probed"],
+                    "up": event["up"],
+                    "done": event["done"],
+                }
+
+    def finish(self):
+        """The scan has finished."""
+        self.scanning = False
+
+    def getProgress(self) -> dict:
+        return {
+            "scanning": self.scanning,
+            "subnets": list(self.subnets.values()),
+        }
+
+
 def write_event(event, output=sys.stdout):
     """Writes an event dictionary to the specified stream in JSON format.
 
@@ -389,6 +721,11 @@ def adjust_scanning_parameters(
     return ifname_to_scan
 
 
+def can_sweep():
+    """Return True if this process can open packet sockets to sweep with."""
+    return os.geteuid() == 0
+
+
 def scan_networks(args, to_scan, stderr, stdout):
     """Interprets the specified `args` and `to_scan` dict to perform the scan.
 
@@ -396,11 +733,41 @@ def scan_networks(args, to_scan, stderr, stdout):
     """
     # Start the clock. (We want to measure how long the scan takes.)
     clock = time.monotonic()
-    # The user must explicitly opt out of using `nmap` by selecting --ping,
-    # unless `nmap` is not installed.
+    # Sweep with ARP from this process unless the user explicitly selected
+    # --ping or --nmap, or this process cannot. Otherwise the user must
+    # explicitly opt out of using `nmap` by selecting --ping, unless `nmap`
+    # is not installed.
     use_nmap = has_command_available('nmap')
     use_ping = args.ping
-    if use_nmap and not use_ping:
+    if not (args.ping or args.nmap) and can_sweep():
+        tool = 'arp'
+        subnet_rate = args.subnet_rate
+        if subnet_rate is None:
+            subnet_rate = (
+                SWEEP_SUBNET_RATE_SLOW if args.slow else SWEEP_SUBNET_RATE)
+        # Count the hosts probed, and how many replied, once each subnet is
+        # done.
+        count = 0
+        hosts = 0
+        for event in arp_sweep(
+                to_scan, get_all_interfaces_definition(
+                    annotate_with_monitored=False),
+                rate=args.rate, subnet_rate=subnet_rate):
+            if event.get('done') is True:
+                count += event['probed']
+                hosts += event['up']
+            elif 'error' in event:
+                stderr.write("Unable to sweep %s: %s\n" % (
+                    event['interface'], event['error']))
+                stderr.flush()
+            write_event(event, stdout)
+        clock_diff = time.monotonic() - clock
+        if count > 0:
+            stderr.write(
+                "Swept %d hosts (%d up) in %d second(s).\n" % (
+                    count, hosts, clock_diff))
+            stderr.flush()
+    elif use_nmap and not use_ping:
         tool = 'nmap'
         scanner = nmap_scan(to_scan, slow=args.slow, threads=args.threads)
         count = 0
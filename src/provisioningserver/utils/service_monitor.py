@@ -40,6 +40,7 @@ from provisioningserver.utils.twisted import (
     deferWithTimeout,
     getProcessOutputAndValue,
 )
+from twisted.internet import reactor
 from twisted.internet.defer import (
     CancelledError,
     DeferredList,
@@ -47,6 +48,7 @@ from twisted.internet.defer import (
     inlineCallbacks,
     maybeDeferred,
     returnValue,
+    succeed,
 )
 
 
@@ -257,6 +259,13 @@ class ServiceMonitor:
         SERVICE_STATE.DEAD: "Result: exit-code",
     }
 
+    # The unit properties `systemctl show` is asked for.
+    SYSTEMD_PROPERTIES = ("LoadState", "ActiveState", "SubState", "Result")
+
+    # How long, in seconds, a state loaded from systemd along with those of
+    # all other services can be used in place of asking systemd again.
+    SYSTEMD_STATE_CACHE_TIME = 2.0
+
     def __init__(self, *services):
         for service in services:
             assert isinstance(service, Service)
@@ -266,6 +275,9 @@ class ServiceMonitor:
         }
         self._serviceStates = defaultdict(ServiceState)
         self._serviceLocks = defaultdict(DeferredLock)
+        # Unit properties loaded by `_loadSystemDServiceStates`, and when.
+        self._systemdStates = {}
+        self.clock = reactor
 
     def _getServiceLock(self, name):
         """Return the lock for the named service."""
@@ -334,7 +346,9 @@ class ServiceMonitor:
         def cb_buildResult(results):
             return dict(result for _, result in results)
 
-        d = DeferredList(map(ensureService, self._services))
+        d = self._preloadServiceStates()
+        d.addCallback(lambda _: DeferredList(
+            map(ensureService, self._services)))
         d.addCallback(cb_buildResult)
         return d
 
@@ -467,6 +481,20 @@ class ServiceMonitor:
         cmd.append(service_name)
         return self._execCmd(cmd, env)
 
+    @asynchronous
+    def _execSystemDShow(self, service_names):
+        """Show the state of the given services with the systemctl command.
+
+        :return: tuple (exit code, std-output, std-error)
+        """
+        env = get_env_with_bytes_locale()
+        cmd = [
+            "systemctl", "show",
+            "--property=%s" % ",".join(self.SYSTEMD_PROPERTIES),
+        ]
+        cmd.extend(service_names)
+        return self._execCmd(cmd, env)
+
     @asynchronous
     def _execSupervisorServiceAction(self, service_name, action):
         """Perform the action with the run-supervisorctl command.
@@ -490,6 +518,8 @@ class ServiceMonitor:
             service_name = service.service_name
         exit_code, output, error = yield lock.run(
             exec_action, service_name, action)
+        # Any state loaded along with those of all services is now stale.
+        self._systemdStates.pop(service.name, None)
         if exit_code != 0:
             error_msg = (
                 "Service '%s' failed to %s: %s" % (
@@ -504,9 +534,84 @@ class ServiceMonitor:
         else:
             return self._loadSystemDServiceState(service)
 
+    def _preloadServiceStates(self):
+        """Load the states of all services from systemd in one go.
+
+        Errors are logged and suppressed: each service's state is then loaded
+        on its own instead.
+        """
+        if snappy.running_in_snap() or len(self._services) == 0:
+            return succeed(None)
+
+        def eb_loadStates(failure):
+            log.warn(
+                "Unable to load the states of all services from systemd; "
+                "loading them one at a time instead: {error}",
+                error=failure.getErrorMessage())
+
+        d = self._loadSystemDServiceStates(list(self._services.values()))
+        d.addErrback(eb_loadStates)
+        return d
+
+    @inlineCallbacks
+    def _loadSystemDServiceStates(self, services):
+        """Load the states of `services` with one `systemctl show`.
+
+        Each is used by the next `_loadSystemDServiceState` call for that
+        service, if made within `SYSTEMD_STATE_CACHE_TIME` seconds.
+        """
+        exit_code, output, error = yield self._execSystemDShow(
+            [service.service_name for service in services])
+        if exit_code != 0:
+            raise ServiceParsingError(
+                "Unable to load the states of services from systemd; "
+                "systemctl exited '%d': %s" % (exit_code, error))
+        # Units are shown in the order given, separated by blank lines.
+        units = [
+            dict(
+                line.split("=", 1) for line in block.splitlines()
+                if "=" in line)
+            for block in output.strip().split("\n\n")
+        ]
+        if len(units) != len(services):
+            raise ServiceParsingError(
+                "Unable to parse the output from systemd; expected the "
+                "states of %d services, got %d." % (len(services), len(units)))
+        loaded_at = self.clock.seconds()
+        for service, properties in zip(services, units):
+            self._systemdStates[service.name] = loaded_at, properties
+
+    def _getSystemDServiceState(self, service, properties):
+        """Return service status from the unit properties systemd shows."""
+        if properties.get("LoadState") != "loaded":
+            raise ServiceUnknownError("'%s' is unknown to systemd." % (
+                service.service_name))
+        active_state = properties.get("ActiveState")
+        active_state_enum = self.SYSTEMD_TO_STATE.get(active_state)
+        if active_state_enum is None:
+            raise ServiceParsingError(
+                "Unable to parse the active state from systemd for "
+                "service '%s', active state reported as '%s'." % (
+                    service.service_name, active_state))
+        # This matches what `systemctl status` shows in parentheses.
+        if active_state == "failed":
+            process_state = "Result: %s" % properties.get("Result")
+        else:
+            process_state = properties.get("SubState")
+        return active_state_enum, process_state
+
     @inlineCallbacks
     def _loadSystemDServiceState(self, service):
         """Return service status from systemd."""
+        # Use, just once, a state loaded along with those of all services.
+        loaded_at, properties = self._systemdStates.pop(
+            service.name, (None, None))
+        if loaded_at is not None:
+            age = self.clock.seconds() - loaded_at
+            if age < self.SYSTEMD_STATE_CACHE_TIME:
+                returnValue(
+                    self._getSystemDServiceState(service, properties))
+
         # Ignore the exit_code because systemd will return 0 for anything
         # other than a active service.
         exit_code, output, error = (
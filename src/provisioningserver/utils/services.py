@@ -1,4 +1,4 @@
-# Copyright 2016-2017 Canonical Ltd.  This software is licensed under the
+# Copyright 2016-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Networks monitoring service."""
@@ -28,6 +28,7 @@ from provisioningserver.logger import (
     get_maas_logger,
     LegacyLogger,
 )
+from provisioningserver.utils import sudo
 from provisioningserver.utils.beaconing import (
     age_out_uuid_queue,
     BEACON_IPV4_MULTICAST,
@@ -43,6 +44,7 @@ from provisioningserver.utils.fs import (
     get_maas_common_command,
     NamedLock,
 )
+from provisioningserver.utils.netlink import NetlinkMonitorService
 from provisioningserver.utils.network import (
     enumerate_ipv4_addresses,
     get_all_interfaces_definition,
@@ -56,10 +58,13 @@ from provisioningserver.utils.twisted import (
 )
 from twisted.application.internet import TimerService
 from twisted.application.service import MultiService
+from twisted.internet import reactor
 from twisted.internet.defer import (
     Deferred,
+    DeferredLock,
     inlineCallbacks,
     maybeDeferred,
+    succeed,
 )
 from twisted.internet.error import (
     ProcessDone,
@@ -147,47 +152,36 @@ class JSONPerLineProtocol(ProcessProtocol):
             self.done.errback(reason)
 
 
-class ProtocolForObserveARP(JSONPerLineProtocol):
-    """Protocol used when spawning `maas-rack observe-arp`.
+class ProtocolForObserveNetwork(JSONPerLineProtocol):
+    """Protocol used when spawning `maas-common observe-network`.
 
-    The difference between `JSONPerLineProtocol` and `ProtocolForObserveARP`
-    is that the neighbour observation protocol needs to insert the interface
-    metadata into the resultant object before the callback.
+    The process writes out both neighbours and beacons. Each lot of output is
+    sorted into the two, and they're passed to their own callbacks together,
+    rather than one at a time.
     """
 
-    def __init__(self, interface, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.interface = interface
-
-    def objectReceived(self, obj):
-        obj['interface'] = self.interface
-        super().objectReceived(obj)
-
-    def errLineReceived(self, line):
-        line = line.decode("utf-8").rstrip()
-        log.msg("observe-arp[%s]:" % self.interface, line)
+    def __init__(self, neighbours_callback, beacons_callback):
+        super().__init__(callback=None)
+        self._neighbours_callback = neighbours_callback
+        self._beacons_callback = beacons_callback
 
-
-class ProtocolForObserveBeacons(JSONPerLineProtocol):
-    """Protocol used when spawning `maas-rack observe-beacons`.
-
-    The difference between `JSONPerLineProtocol` and
-    `ProtocolForObserveBeacons` is that the beacon observation protocol needs
-    to insert the interface metadata into the resultant object before the
-    callback.
-    """
-
-    def __init__(self, interface, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.interface = interface
+    def outReceived(self, data):
+        self._neighbours, self._beacons = [], []
+        super().outReceived(data)
+        if len(self._neighbours) > 0:
+            self._neighbours_callback(self._neighbours)
+        if len(self._beacons) > 0:
+            self._beacons_callback(self._beacons)
 
     def objectReceived(self, obj):
-        obj['interface'] = self.interface
-        super().objectReceived(obj)
+        if "neighbour" in obj:
+            self._neighbours.append(obj["neighbour"])
+        elif "beacon" in obj:
+            self._beacons.append(obj["beacon"])
 
     def errLineReceived(self, line):
         line = line.decode("utf-8").rstrip()
-        log.msg("observe-beacons[%s]:" % self.interface, line)
+        log.msg("observe-network:", line)
 
 
 class ProtocolForObserveMDNS(JSONPerLineProtocol):
@@ -283,52 +277,51 @@ class ProcessProtocolService(TimerService, metaclass=ABCMeta):
         return super().stopService()
 
 
-class NeighbourDiscoveryService(ProcessProtocolService):
-    """Service to spawn the per-interface device discovery subprocess."""
+class NetworkObservationService(ProcessProtocolService):
+    """Service to spawn the device discovery and beaconing subprocess.
 
-    def __init__(self, ifname: str, callback: callable):
-        self.ifname = ifname
-        self.callback = callback
+    One process observes every interface. It's told which interfaces to
+    observe neighbours and beacons on when it starts, and again whenever
+    `setInterfaces` is called.
+    """
+
+    def __init__(self, neighbours_callback, beacons_callback):
+        self.neighbours_callback = neighbours_callback
+        self.beacons_callback = beacons_callback
+        self.neighbour_interfaces = frozenset()
+        self.beacon_interfaces = frozenset()
         super().__init__()
 
     def getDescription(self) -> str:
-        return "Neighbour observation process for %s" % self.ifname
+        return "Network observation process"
 
     def getProcessParameters(self):
-        maas_rack_cmd = get_maas_common_command().encode("utf-8")
-        return [
-            maas_rack_cmd,
-            b"observe-arp",
-            self.ifname.encode("utf-8")
-        ]
+        args = sudo([get_maas_common_command(), "observe-network"])
+        return [arg.encode("utf-8") for arg in args]
 
     def createProcessProtocol(self):
-        return ProtocolForObserveARP(
-            self.ifname, callback=self.callback)
+        return ProtocolForObserveNetwork(
+            self.neighbours_callback, self.beacons_callback)
 
+    def startProcess(self):
+        d = super().startProcess()
+        self._writeInterfaces()
+        return d
 
-class BeaconingService(ProcessProtocolService):
-    """Service to spawn the per-interface device discovery subprocess."""
-
-    def __init__(self, ifname: str, callback: callable):
-        self.ifname = ifname
-        self.callback = callback
-        super().__init__()
-
-    def getDescription(self) -> str:
-        return "Beaconing process for %s" % self.ifname
+    def setInterfaces(self, neighbour_interfaces, beacon_interfaces):
+        """Observe neighbours and beacons on the given interfaces."""
+        self.neighbour_interfaces = frozenset(neighbour_interfaces)
+        self.beacon_interfaces = frozenset(beacon_interfaces)
+        self._writeInterfaces()
 
-    def getProcessParameters(self):
-        maas_rack_cmd = get_maas_common_command().encode("utf-8")
-        return [
-            maas_rack_cmd,
-            b"observe-beacons",
-            self.ifname.encode("utf-8")
-        ]
-
-    def createProcessProtocol(self):
-        return ProtocolForObserveBeacons(
-            self.ifname, callback=self.callback)
+    def _writeInterfaces(self):
+        if self._process is not None and self._process.pid is not None:
+            selection = {
+                "neighbours": sorted(self.neighbour_interfaces),
+                "beacons": sorted(self.beacon_interfaces),
+            }
+            self._process.write(
+                json.dumps(selection, sort_keys=True).encode("utf-8") + b"\n")
 
 
 class MDNSResolverService(ProcessProtocolService):
@@ -940,6 +933,92 @@ class BeaconingSocketProtocol(DatagramProtocol):
             self.beaconReceived(beacon_json)
 
 
+class NeighbourAggregator:
+    """Coalesces neighbour observations before they're reported.
+
+    Observations are coalesced per (interface, IP address, VID); the last
+    MAC address observed wins. New and moved bindings are reported together
+    `window` seconds after the first is observed.
+
+    Bindings that were merely seen again -- which, once a network is stable,
+    is almost everything observed -- are reported every `refresh_interval`
+    seconds instead, each with the time it was last seen and a `count` of
+    the times it was seen since it was last reported.
+
+    :param callback: Called with each list of neighbours to report.
+    :param clock: An `IReactor` instance.
+    """
+
+    window = 5.0
+    refresh_interval = timedelta(minutes=5).total_seconds()
+
+    def __init__(self, callback, clock=None):
+        self.callback = callback
+        self.clock = reactor if clock is None else clock
+        self._changes = OrderedDict()
+        self._refreshes = OrderedDict()
+        self._changes_call = None
+        self._refreshes_call = None
+
+    def add(self, neighbours):
+        """Aggregate the given neighbour observations."""
+        for neighbour in neighbours:
+            key = (
+                neighbour.get("interface"), neighbour["ip"],
+                neighbour.get("vid"))
+            if neighbour.get("event") != "REFRESHED":
+                # Anything not yet reported for this binding is obsolete.
+                self._refreshes.pop(key, None)
+                self._changes[key] = neighbour
+            elif key in self._changes:
+                # It's yet to be reported at all; report the latest time.
+                self._changes[key]["time"] = neighbour["time"]
+            else:
+                refresh = self._refreshes.get(key)
+                if refresh is None or refresh["mac"] != neighbour["mac"]:
+                    self._refreshes[key] = dict(neighbour, count=1)
+                else:
+                    refresh["time"] = max(refresh["time"], neighbour["time"])
+                    refresh["count"] += 1
+        if len(self._changes) > 0 and self._changes_call is None:
+            self._changes_call = self.clock.callLater(
+                self.window, self._reportChanges)
+        if len(self._refreshes) > 0 and self._refreshes_call is None:
+            self._refreshes_call = self.clock.callLater(
+                self.refresh_interval, self._reportRefreshes)
+
+    def flush(self):
+        """Report everything aggregated so far, now."""
+        for call in (self._changes_call, self._refreshes_call):
+            if call is not None and call.active():
+                call.cancel()
+        neighbours = list(self._changes.values())
+        neighbours.extend(self._refreshes.values())
+        self._changes_call = self._refreshes_call = None
+        self._changes.clear()
+        self._refreshes.clear()
+        return self._report(neighbours)
+
+    def _reportChanges(self):
+        self._changes_call = None
+        neighbours = list(self._changes.values())
+        self._changes.clear()
+        return self._report(neighbours)
+
+    def _reportRefreshes(self):
+        self._refreshes_call = None
+        neighbours = list(self._refreshes.values())
+        self._refreshes.clear()
+        return self._report(neighbours)
+
+    def _report(self, neighbours):
+        if len(neighbours) == 0:
+            return succeed(None)
+        d = maybeDeferred(self.callback, neighbours)
+        d.addErrback(log.err, "Failed to report neighbours.")
+        return d
+
+
 class NetworksMonitoringLock(NamedLock):
     """Host scoped lock to ensure only one network monitoring service runs."""
 
@@ -953,13 +1032,21 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
     Parse ``/etc/network/interfaces`` and the output from ``ip addr show`` to
     update MAAS's records of network interfaces on this host.
 
+    When rtnetlink is available, interfaces are only parsed again when it
+    reports a change, after waiting `netlink_debounce` seconds for further
+    changes, or once every `netlink_fallback_interval`. Otherwise they're
+    parsed every `interval`.
+
     :param clock: An `IReactor` instance.
     """
 
     interval = timedelta(seconds=30).total_seconds()
+    netlink_debounce = 2.0
+    netlink_fallback_interval = timedelta(minutes=10).total_seconds()
 
     def __init__(
-            self, clock=None, enable_monitoring=True, enable_beaconing=True):
+            self, clock=None, enable_monitoring=True, enable_beaconing=True,
+            enable_netlink=True):
         # Order is very important here. First we set the clock to the passed-in
         # reactor, so that unit tests can fake out the clock if necessary.
         # Then we call super(). The superclass will set up the structures
@@ -973,6 +1060,12 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
         self.enable_beaconing = enable_beaconing
         # The last successfully recorded interfaces.
         self._recorded = None
+        # The last interfaces read, when, and whether they've changed since.
+        self._interfaces = None
+        self._interfaces_read_at = None
+        self._interfaces_changed = True
+        self._updating = DeferredLock()
+        self._debounced_update = None
         self._monitored = frozenset()
         self._beaconing = frozenset()
         self._monitoring_state = {}
@@ -989,28 +1082,78 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
         self.interface_monitor.setName("updateInterfaces")
         self.interface_monitor.clock = self.clock
         self.interface_monitor.setServiceParent(self)
+        # Set up child service to watch for interface changes.
+        if enable_netlink:
+            self.netlink_monitor = NetlinkMonitorService(
+                self._interfacesChanged, self._getClock())
+            self.netlink_monitor.setName("netlink")
+            self.netlink_monitor.setServiceParent(self)
+        else:
+            self.netlink_monitor = None
         self.beaconing_protocol = None
+        # Neighbours observed are aggregated before being reported.
+        self.neighbour_aggregator = NeighbourAggregator(
+            self.reportNeighbours, self._getClock())
+
+    def _getClock(self):
+        return reactor if self.clock is None else self.clock
 
-    @inlineCallbacks
     def updateInterfaces(self):
         """Update interfaces, catching and logging errors.
 
+        Updates are made one at a time.
+
         This can be overridden by subclasses to conditionally update based on
         some external configuration.
         """
+        return self._updating.run(self._tryUpdateInterfaces)
+
+    @inlineCallbacks
+    def _tryUpdateInterfaces(self):
         responsible = self._assumeSoleResponsibility()
         if responsible:
             interfaces = None
             try:
-                interfaces = yield maybeDeferred(self.getInterfaces)
+                if self._shouldReadInterfaces():
+                    # Changes from here on need another read.
+                    self._interfaces_changed = False
+                    interfaces = yield maybeDeferred(self.getInterfaces)
+                    self._interfaces = interfaces
+                    self._interfaces_read_at = self._getClock().seconds()
+                else:
+                    interfaces = self._interfaces
                 yield self._updateInterfaces(interfaces)
             except BaseException as e:
+                self._interfaces_changed = True
                 msg = (
                     "Failed to update and/or record network interface "
                     "configuration: %s; interfaces: %r" % (e, interfaces)
                 )
                 log.err(None, msg)
 
+    def _shouldReadInterfaces(self):
+        """Should interfaces be read, or are the last ones still current?"""
+        if self.netlink_monitor is None or not self.netlink_monitor.listening:
+            return True
+        elif self._interfaces_changed or self._interfaces_read_at is None:
+            return True
+        else:
+            elapsed = self._getClock().seconds() - self._interfaces_read_at
+            return elapsed >= self.netlink_fallback_interval
+
+    def _interfacesChanged(self):
+        """Called by the netlink monitor when interfaces have changed.
+
+        Updates interfaces once they've stopped changing for a moment.
+        """
+        self._interfaces_changed = True
+        call = self._debounced_update
+        if call is not None and call.active():
+            call.reset(self.netlink_debounce)
+        else:
+            self._debounced_update = self._getClock().callLater(
+                self.netlink_debounce, self.updateInterfaces)
+
     def getInterfaces(self):
         """Get the current network interfaces configuration.
 
@@ -1057,6 +1200,11 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
         Ensures that sole responsibility for monitoring networks is released.
         """
         d = super().stopService()
+        if self._debounced_update is not None:
+            if self._debounced_update.active():
+                self._debounced_update.cancel()
+            self._debounced_update = None
+        self.neighbour_aggregator.flush()
         if self.beaconing_protocol is not None:
             self.beaconing_protocol.stopProtocol()
         d.addBoth(callOut, self._releaseSoleResponsibility)
@@ -1164,19 +1312,29 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
         }
         return monitored_interfaces
 
-    def _startNeighbourDiscovery(self, ifname):
-        """"Start neighbour discovery service on the specified interface."""
-        service = NeighbourDiscoveryService(ifname, self.reportNeighbours)
-        service.clock = self.clock
-        service.setName("neighbour_discovery:" + ifname)
-        service.setServiceParent(self)
+    def _configureNetworkObservation(self):
+        """Observe neighbours and beacons on the interfaces that need it.
 
-    def _startBeaconing(self, ifname):
-        """"Start neighbour discovery service on the specified interface."""
-        service = BeaconingService(ifname, self.reportBeacons)
-        service.clock = self.clock
-        service.setName("beaconing:" + ifname)
-        service.setServiceParent(self)
+        One process observes all of them. It's started when the first
+        interface needs observing, and stopped once none do.
+        """
+        try:
+            service = self.getServiceNamed("network_observation")
+        except KeyError:
+            service = None
+        if len(self._monitored) == 0 and len(self._beaconing) == 0:
+            if service is not None:
+                service.disownServiceParent()
+                maaslog.info("Stopped network observation service.")
+        elif service is None:
+            service = NetworkObservationService(
+                self.neighbour_aggregator.add, self.reportBeacons)
+            service.clock = self.clock
+            service.setName("network_observation")
+            service.setInterfaces(self._monitored, self._beaconing)
+            service.setServiceParent(self)
+        else:
+            service.setInterfaces(self._monitored, self._beaconing)
 
     def _startMDNSDiscoveryService(self):
         """Start resolving mDNS entries on attached networks."""
@@ -1201,54 +1359,6 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
             service.disownServiceParent()
             maaslog.info("Stopped mDNS resolver service.")
 
-    def _startNeighbourDiscoveryServices(self, new_interfaces):
-        """Start monitoring services for the specified set of interfaces."""
-        for ifname in new_interfaces:
-            # Sanity check to ensure the service isn't already started.
-            try:
-                self.getServiceNamed("neighbour_discovery:" + ifname)
-            except KeyError:
-                # This is an expected exception. (The call inside the `try`
-                # is only necessary to ensure the service doesn't exist.)
-                self._startNeighbourDiscovery(ifname)
-
-    def _stopNeighbourDiscoveryServices(self, deleted_interfaces):
-        """Stop monitoring services for the specified set of interfaces."""
-        for ifname in deleted_interfaces:
-            try:
-                service = self.getServiceNamed("neighbour_discovery:" + ifname)
-            except KeyError:
-                # Service doesn't exist, so no need to stop it.
-                pass
-            else:
-                service.disownServiceParent()
-                maaslog.info(
-                    "Stopped neighbour observation service for %s." % ifname)
-
-    def _startBeaconingServices(self, new_interfaces):
-        """Start monitoring services for the specified set of interfaces."""
-        for ifname in new_interfaces:
-            # Sanity check to ensure the service isn't already started.
-            try:
-                self.getServiceNamed("beaconing:" + ifname)
-            except KeyError:
-                # This is an expected exception. (The call inside the `try`
-                # is only necessary to ensure the service doesn't exist.)
-                self._startBeaconing(ifname)
-
-    def _stopBeaconingServices(self, deleted_interfaces):
-        """Stop monitoring services for the specified set of interfaces."""
-        for ifname in deleted_interfaces:
-            try:
-                service = self.getServiceNamed("beaconing:" + ifname)
-            except KeyError:
-                # Service doesn't exist, so no need to stop it.
-                pass
-            else:
-                service.disownServiceParent()
-                maaslog.info(
-                    "Stopped beaconing service for %s." % ifname)
-
     def _shouldMonitorMDNS(self, monitoring_state):
         # If any interface is configured for mDNS, we must start the monitoring
         # process. (You cannot select interfaces when using `avahi-browse`.)
@@ -1316,12 +1426,11 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
         deleted_interfaces = self._beaconing.difference(beaconing_interfaces)
         if len(new_interfaces) > 0:
             log.msg("Starting beaconing for interfaces: %r" % (new_interfaces))
-            self._startBeaconingServices(new_interfaces)
         if len(deleted_interfaces) > 0:
             log.msg(
                 "Stopping beaconing for interfaces: %r" % (deleted_interfaces))
-            self._stopBeaconingServices(deleted_interfaces)
         self._beaconing = beaconing_interfaces
+        self._configureNetworkObservation()
         if self.beaconing_protocol is None:
             self.beaconing_protocol = BeaconingSocketProtocol(
                 self.clock, interfaces=interfaces)
@@ -1344,13 +1453,12 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
         if len(new_interfaces) > 0:
             log.msg("Starting neighbour discovery for interfaces: %r" % (
                 new_interfaces))
-            self._startNeighbourDiscoveryServices(new_interfaces)
         if len(deleted_interfaces) > 0:
             log.msg(
                 "Stopping neighbour discovery for interfaces: %r" % (
                     deleted_interfaces))
-            self._stopNeighbourDiscoveryServices(deleted_interfaces)
         self._monitored = monitored_interfaces
+        self._configureNetworkObservation()
 
     def _interfacesRecorded(self, interfaces):
         """The given `interfaces` were recorded successfully."""
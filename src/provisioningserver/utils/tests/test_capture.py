@@ -0,0 +1,233 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.utils.capture`."""
+
+__all__ = []
+
+import io
+import json
+import os
+import socket
+import struct
+
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from provisioningserver.utils import capture as capture_module
+from provisioningserver.utils.arp import ARP_OPERATION
+from provisioningserver.utils.beaconing import (
+    BEACON_PORT,
+    create_beacon_payload,
+)
+from provisioningserver.utils.capture import (
+    attach_filter,
+    get_vid,
+    make_capture_filter,
+    NetworkObserver,
+    observe_network,
+    PACKET_AUXDATA,
+    SOL_PACKET,
+    TP_STATUS_VLAN_VALID,
+    TPACKET_AUXDATA,
+)
+from provisioningserver.utils.ethernet import ETHERTYPE
+from provisioningserver.utils.tests.test_arp import make_arp_packet
+from provisioningserver.utils.tests.test_ethernet import make_ethernet_packet
+from provisioningserver.utils.tests.test_tcpip import (
+    make_ipv4_packet,
+    make_ipv6_packet,
+)
+from testtools.matchers import (
+    Equals,
+    HasLength,
+)
+
+
+def make_udp_packet(port, payload=b""):
+    return struct.pack("!HHHH", port, port, 8 + len(payload), 0) + payload
+
+
+def make_beacon_packet(port=BEACON_PORT, vid=None, ipv6=False, payload=None):
+    if payload is None:
+        payload = create_beacon_payload("solicitation").bytes
+    udp = make_udp_packet(port, payload)
+    if ipv6:
+        return make_ethernet_packet(
+            ethertype=ETHERTYPE.IPV6, vid=vid, payload=make_ipv6_packet(
+                payload=udp))
+    else:
+        return make_ethernet_packet(
+            ethertype=ETHERTYPE.IPV4, vid=vid, payload=make_ipv4_packet(
+                payload=udp))
+
+
+def make_arp_request(vid=None, ip="192.168.0.1", mac="02:00:00:00:00:01"):
+    return make_ethernet_packet(
+        src_mac=mac, vid=vid, payload=make_arp_packet(
+            ip, mac, "192.168.0.2", op=ARP_OPERATION.REQUEST))
+
+
+class TestMakeCaptureFilter(MAASTestCase):
+
+    def accepts(self, packet):
+        # Classic BPF filters work on datagram sockets too.
+        reader, writer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(reader.close)
+        self.addCleanup(writer.close)
+        attach_filter(reader, make_capture_filter())
+        reader.setblocking(False)
+        writer.send(packet)
+        try:
+            return reader.recv(len(packet)) == packet
+        except BlockingIOError:
+            return False
+
+    def test_accepts_arp(self):
+        self.assertTrue(self.accepts(make_arp_request()))
+        self.assertTrue(self.accepts(make_arp_request(vid=100)))
+
+    def test_accepts_beacons(self):
+        self.assertTrue(self.accepts(make_beacon_packet()))
+        self.assertTrue(self.accepts(make_beacon_packet(vid=100)))
+        self.assertTrue(self.accepts(make_beacon_packet(ipv6=True)))
+        self.assertTrue(self.accepts(make_beacon_packet(vid=100, ipv6=True)))
+
+    def test_accepts_beacons_after_ipv4_options(self):
+        udp = make_udp_packet(BEACON_PORT)
+        ipv4 = make_ipv4_packet(ihl=6, payload=b"\x01" * 4 + udp)
+        self.assertTrue(self.accepts(make_ethernet_packet(
+            ethertype=ETHERTYPE.IPV4, payload=ipv4)))
+
+    def test_rejects_other_udp(self):
+        self.assertFalse(self.accepts(
+            make_beacon_packet(port=BEACON_PORT + 1)))
+        self.assertFalse(self.accepts(make_beacon_packet(
+            port=BEACON_PORT + 1, vid=100, ipv6=True)))
+
+    def test_rejects_other_protocols(self):
+        packet = make_ethernet_packet(
+            ethertype=ETHERTYPE.IPV6, payload=make_ipv6_packet(
+                protocol=6, payload=make_udp_packet(BEACON_PORT)))
+        self.assertFalse(self.accepts(packet))
+        self.assertFalse(self.accepts(make_ethernet_packet(
+            ethertype=b"\x88\xcc", payload=factory.make_bytes(60))))
+
+    def test_rejects_later_ipv4_fragments(self):
+        ipv4 = make_ipv4_packet(payload=make_udp_packet(BEACON_PORT))
+        ipv4 = ipv4[:6] + b"\x00\x10" + ipv4[8:]
+        self.assertFalse(self.accepts(make_ethernet_packet(
+            ethertype=ETHERTYPE.IPV4, payload=ipv4)))
+
+
+class TestGetVID(MAASTestCase):
+
+    def make_auxdata(self, status, tci):
+        return (SOL_PACKET, PACKET_AUXDATA, TPACKET_AUXDATA.pack(
+            status, 60, 60, 0, 0, tci, 0x8100))
+
+    def test_returns_vid_of_stripped_tag(self):
+        self.assertThat(
+            get_vid([self.make_auxdata(TP_STATUS_VLAN_VALID, 0x2064)]),
+            Equals(100))
+        self.assertThat(
+            get_vid([self.make_auxdata(TP_STATUS_VLAN_VALID, 0)]), Equals(0))
+        self.assertThat(get_vid([self.make_auxdata(0, 100)]), Equals(100))
+
+    def test_returns_none_if_not_tagged(self):
+        self.assertIsNone(get_vid([self.make_auxdata(0, 0)]))
+        self.assertIsNone(get_vid([]))
+
+
+class TestNetworkObserver(MAASTestCase):
+
+    def test_observes_neighbours_on_selected_interfaces(self):
+        observer = NetworkObserver(neighbours=["eth0"])
+        packet = make_arp_request()
+        self.assertThat(observer.observe("eth0", packet, time=10), Equals([{
+            "neighbour": {
+                "ip": "192.168.0.1", "mac": "02:00:00:00:00:01", "time": 10,
+                "event": "NEW", "vid": None, "interface": "eth0",
+            },
+        }]))
+        self.assertThat(observer.observe("eth0", packet, time=11), Equals([]))
+        self.assertThat(observer.observe("eth1", packet, time=12), Equals([]))
+
+    def test_tracks_neighbours_on_each_interface_and_vlan(self):
+        observer = NetworkObserver(neighbours=["eth0", "eth1"])
+        observations = [
+            observer.observe("eth0", make_arp_request(), time=10),
+            observer.observe("eth0", make_arp_request(vid=100), time=10),
+            observer.observe("eth0", make_arp_request(), vid=200, time=10),
+            observer.observe("eth1", make_arp_request(), time=10),
+        ]
+        self.assertThat(
+            [(observation["neighbour"]["interface"],
+              observation["neighbour"]["vid"])
+             for [observation] in observations],
+            Equals([
+                ("eth0", None), ("eth0", 100), ("eth0", 200), ("eth1", None),
+            ]))
+
+    def test_forgets_neighbours_on_deselected_interfaces(self):
+        observer = NetworkObserver(neighbours=["eth0"])
+        observer.observe("eth0", make_arp_request(), time=10)
+        observer.select(neighbours=[])
+        observer.select(neighbours=["eth0"])
+        self.assertThat(
+            observer.observe("eth0", make_arp_request(), time=11),
+            HasLength(1))
+
+    def test_observes_beacons_on_selected_interfaces(self):
+        observer = NetworkObserver(beacons=["eth0"])
+        packet = make_beacon_packet()
+        [observation] = observer.observe("eth0", packet, vid=100, time=10)
+        self.assertThat(observation, Equals({"beacon": {
+            "source_mac": "01:02:03:04:05:06",
+            "destination_mac": "ff:ff:ff:ff:ff:ff",
+            "source_ip": "0.0.0.0",
+            "destination_ip": "0.0.0.0",
+            "source_port": BEACON_PORT,
+            "destination_port": BEACON_PORT,
+            "time": 10,
+            "vid": 100,
+            "version": 1,
+            "type": "solicitation",
+            "payload": None,
+            "interface": "eth0",
+        }}))
+        self.assertThat(observer.observe("eth1", packet), Equals([]))
+
+    def test_ignores_outgoing_and_invalid_beacons(self):
+        observer = NetworkObserver(beacons=["eth0"])
+        self.assertThat(
+            observer.observe("eth0", make_beacon_packet(), outgoing=True),
+            Equals([]))
+        self.assertThat(
+            observer.observe("eth0", make_beacon_packet(payload=b"\n")),
+            Equals([]))
+        self.assertThat(
+            observer.observe("eth0", b"\0" * 10), Equals([]))
+
+
+class TestObserveNetwork(MAASTestCase):
+
+    def test_observes_until_control_is_closed(self):
+        sock, writer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        self.addCleanup(writer.close)
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        packet = make_arp_request()
+
+        def receive_packets(sock):
+            yield "eth0", sock.recv(len(packet)), None, False
+
+        self.patch(capture_module, "receive_packets", receive_packets)
+        writer.send(packet)
+        os.write(write_fd, json.dumps({"neighbours": ["eth0"]}).encode(
+            "utf-8") + b"\n")
+        os.close(write_fd)
+        output = io.StringIO()
+        observe_network(sock, read_fd, output)
+        [observation] = map(json.loads, output.getvalue().splitlines())
+        self.assertThat(observation["neighbour"]["interface"], Equals("eth0"))
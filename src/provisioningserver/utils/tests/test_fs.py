@@ -5,6 +5,7 @@
 
 __all__ = []
 
+import errno
 import io
 import os
 import os.path
@@ -47,6 +48,7 @@ from provisioningserver.path import (
 from provisioningserver.utils.fs import (
     atomic_copy,
     atomic_delete,
+    atomic_link,
     atomic_symlink,
     atomic_write,
     FileLock,
@@ -247,6 +249,59 @@ class TestAtomicCopy(MAASTestCase):
         self.assertThat(dest, FileContains(contents))
 
 
+class TestAtomicLink(MAASTestCase):
+
+    def test_links_file(self):
+        contents = factory.make_bytes()
+        source = self.make_file(contents=contents)
+        dest = os.path.join(self.make_dir(), factory.make_name('file'))
+        atomic_link(source, dest)
+        self.assertThat(dest, FileContains(contents))
+        self.assertTrue(os.path.samefile(source, dest))
+        self.assertEqual(2, os.stat(source).st_nlink)
+
+    def test_replaces_existing_file(self):
+        contents = factory.make_bytes()
+        source = self.make_file(contents=contents)
+        dest = self.make_file(contents="Old contents")
+        atomic_link(source, dest)
+        self.assertTrue(os.path.samefile(source, dest))
+
+    def test_skips_existing_link(self):
+        source = self.make_file()
+        dest = os.path.join(self.make_dir(), factory.make_name('file'))
+        os.link(source, dest)
+        os_link = self.patch(fs_module.os, 'link')
+        atomic_link(source, dest)
+        self.assertThat(os_link, MockNotCalled())
+
+    def test_sweeps_aside_dot_new_if_any(self):
+        source = self.make_file()
+        dest = os.path.join(self.make_dir(), factory.make_name('file'))
+        factory.make_file(
+            os.path.dirname(dest), name=os.path.basename(dest) + '.new')
+        atomic_link(source, dest)
+        self.assertTrue(os.path.samefile(source, dest))
+
+    def test_clones_across_filesystems(self):
+        contents = factory.make_bytes()
+        source = self.make_file(contents=contents)
+        dest = os.path.join(self.make_dir(), factory.make_name('file'))
+        self.patch(fs_module.os, 'link').side_effect = OSError(
+            errno.EXDEV, "Invalid cross-device link")
+        atomic_link(source, dest)
+        self.assertThat(dest, FileContains(contents))
+        self.assertFalse(os.path.samefile(source, dest))
+
+    def test_propagates_other_errors(self):
+        source = self.make_file()
+        dest = os.path.join(self.make_dir(), factory.make_name('file'))
+        self.patch(fs_module.os, 'link').side_effect = OSError(
+            errno.EIO, "Input/output error")
+        error = self.assertRaises(OSError, atomic_link, source, dest)
+        self.assertEqual(errno.EIO, error.errno)
+
+
 class TestAtomicDelete(MAASTestCase):
     """Test `atomic_delete`."""
 
@@ -0,0 +1,225 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.utils.netlink`."""
+
+__all__ = []
+
+import errno
+import socket
+import struct
+from unittest.mock import Mock
+
+from maastesting.factory import factory
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockNotCalled,
+)
+from maastesting.testcase import MAASTestCase
+from provisioningserver.utils import netlink
+from provisioningserver.utils.netlink import (
+    IFA_ADDRESS,
+    IFA_LOCAL,
+    IFADDRMSG,
+    IFF_UP,
+    IFINFOMSG,
+    IFLA_ADDRESS,
+    IFLA_IFNAME,
+    IFLA_MASTER,
+    InterfaceModel,
+    NetlinkMonitorService,
+    NLMSG_OVERRUN,
+    NLMSGHDR,
+    parse_netlink_messages,
+    RTATTR,
+    RTM_DELADDR,
+    RTM_DELLINK,
+    RTM_NEWADDR,
+    RTM_NEWLINK,
+)
+from testtools.matchers import Equals
+
+
+def make_attribute(attr_type, value):
+    data = RTATTR.pack(RTATTR.size + len(value), attr_type) + value
+    return data + b"\0" * (-len(data) % 4)
+
+
+def make_message(msg_type, payload):
+    data = NLMSGHDR.pack(NLMSGHDR.size + len(payload), msg_type, 0, 0, 0)
+    return data + payload + b"\0" * (-len(payload) % 4)
+
+
+def make_link_payload(index, name, flags=IFF_UP, mac=None, master=None):
+    payload = IFINFOMSG.pack(socket.AF_UNSPEC, 1, index, flags, 0)
+    payload += make_attribute(IFLA_IFNAME, name.encode("utf-8") + b"\0")
+    if mac is not None:
+        payload += make_attribute(
+            IFLA_ADDRESS, bytes(int(byte, 16) for byte in mac.split(":")))
+    if master is not None:
+        payload += make_attribute(IFLA_MASTER, struct.pack("=I", master))
+    return payload
+
+
+def make_address_payload(index, address, prefixlen, peer=None):
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+    payload = IFADDRMSG.pack(family, prefixlen, 0, 0, index)
+    if peer is not None:
+        payload += make_attribute(
+            IFA_ADDRESS, socket.inet_pton(family, peer))
+        payload += make_attribute(
+            IFA_LOCAL, socket.inet_pton(family, address))
+    else:
+        payload += make_attribute(
+            IFA_ADDRESS, socket.inet_pton(family, address))
+    return payload
+
+
+class TestParseNetlinkMessages(MAASTestCase):
+
+    def test_yields_type_and_payload_of_each_message(self):
+        payloads = [factory.make_bytes(size) for size in (5, 8, 13)]
+        data = b"".join(
+            make_message(RTM_NEWLINK + index, payload)
+            for index, payload in enumerate(payloads))
+        self.assertThat(
+            list(parse_netlink_messages(data)), Equals([
+                (RTM_NEWLINK + index, payload)
+                for index, payload in enumerate(payloads)
+            ]))
+
+    def test_stops_at_truncated_message(self):
+        data = make_message(RTM_NEWLINK, b"payload")
+        self.assertThat(
+            list(parse_netlink_messages(data + data[:10])),
+            Equals([(RTM_NEWLINK, b"payload")]))
+
+
+class TestInterfaceModel(MAASTestCase):
+
+    def test_new_link_changes_model(self):
+        model = InterfaceModel()
+        mac = factory.make_mac_address()
+        self.assertTrue(model.apply(
+            RTM_NEWLINK, make_link_payload(2, "eth0", mac=mac, master=5)))
+        self.assertThat(model.links, Equals({2: ("eth0", True, mac, 5)}))
+
+    def test_unchanged_link_does_not_change_model(self):
+        model = InterfaceModel()
+        model.apply(RTM_NEWLINK, make_link_payload(2, "eth0"))
+        self.assertFalse(model.apply(
+            RTM_NEWLINK, make_link_payload(2, "eth0")))
+
+    def test_ignores_flags_other_than_up(self):
+        model = InterfaceModel()
+        model.apply(RTM_NEWLINK, make_link_payload(2, "eth0", flags=IFF_UP))
+        self.assertFalse(model.apply(
+            RTM_NEWLINK, make_link_payload(2, "eth0", flags=IFF_UP | 0x40)))
+        self.assertTrue(model.apply(
+            RTM_NEWLINK, make_link_payload(2, "eth0", flags=0)))
+
+    def test_deleted_link_changes_model(self):
+        model = InterfaceModel()
+        model.apply(RTM_NEWLINK, make_link_payload(2, "eth0"))
+        model.apply(RTM_NEWADDR, make_address_payload(2, "10.0.0.1", 24))
+        self.assertTrue(model.apply(
+            RTM_DELLINK, make_link_payload(2, "eth0")))
+        self.assertThat(model.links, Equals({}))
+        self.assertThat(dict(model.addresses), Equals({}))
+
+    def test_new_addresses_change_model(self):
+        model = InterfaceModel()
+        self.assertTrue(model.apply(
+            RTM_NEWADDR, make_address_payload(2, "10.0.0.1", 24)))
+        self.assertTrue(model.apply(
+            RTM_NEWADDR, make_address_payload(2, "fe80::1", 64)))
+        self.assertFalse(model.apply(
+            RTM_NEWADDR, make_address_payload(2, "10.0.0.1", 24)))
+        self.assertThat(
+            dict(model.addresses),
+            Equals({2: {"10.0.0.1/24", "fe80::1/64"}}))
+
+    def test_uses_local_address_of_point_to_point_links(self):
+        model = InterfaceModel()
+        model.apply(
+            RTM_NEWADDR, make_address_payload(
+                2, "10.0.0.1", 32, peer="10.0.0.2"))
+        self.assertThat(dict(model.addresses), Equals({2: {"10.0.0.1/32"}}))
+
+    def test_deleted_address_changes_model(self):
+        model = InterfaceModel()
+        model.apply(RTM_NEWADDR, make_address_payload(2, "10.0.0.1", 24))
+        self.assertTrue(model.apply(
+            RTM_DELADDR, make_address_payload(2, "10.0.0.1", 24)))
+        self.assertThat(dict(model.addresses), Equals({2: set()}))
+
+
+class TestNetlinkMonitorService(MAASTestCase):
+
+    def makeService(self):
+        callback = Mock()
+        service = NetlinkMonitorService(callback, clock=Mock())
+        service.socket, self.writer = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_DGRAM)
+        service.socket.setblocking(False)
+        self.addCleanup(service.socket.close)
+        self.addCleanup(self.writer.close)
+        return service, callback
+
+    def test_start_falls_back_when_netlink_is_not_available(self):
+        self.patch(netlink.socket, "socket").side_effect = OSError(
+            errno.EPROTONOSUPPORT, "Protocol not supported")
+        clock = Mock()
+        service = NetlinkMonitorService(Mock(), clock=clock)
+        service.startService()
+        self.assertFalse(service.listening)
+        self.assertThat(clock.addReader, MockNotCalled())
+
+    def test_start_and_stop_reading(self):
+        sock = self.patch(netlink.socket, "socket").return_value
+        clock = Mock()
+        service = NetlinkMonitorService(Mock(), clock=clock)
+        service.startService()
+        self.assertTrue(service.listening)
+        self.assertThat(sock.bind, MockCalledOnceWith((0, service.groups)))
+        self.assertThat(clock.addReader, MockCalledOnceWith(service))
+        service.stopService()
+        self.assertFalse(service.listening)
+        self.assertThat(clock.removeReader, MockCalledOnceWith(service))
+        self.assertThat(sock.close, MockCalledOnceWith())
+
+    def test_calls_back_once_for_changes(self):
+        service, callback = self.makeService()
+        self.writer.send(
+            make_message(RTM_NEWLINK, make_link_payload(2, "eth0")) +
+            make_message(RTM_NEWLINK, make_link_payload(3, "eth1")))
+        self.writer.send(
+            make_message(RTM_NEWADDR, make_address_payload(2, "::1", 128)))
+        service.doRead()
+        self.assertThat(callback, MockCalledOnceWith())
+
+    def test_does_not_call_back_without_changes(self):
+        service, callback = self.makeService()
+        message = make_message(RTM_NEWLINK, make_link_payload(2, "eth0"))
+        self.writer.send(message)
+        service.doRead()
+        callback.reset_mock()
+        self.writer.send(message)
+        service.doRead()
+        self.assertThat(callback, MockNotCalled())
+
+    def test_calls_back_on_overrun(self):
+        service, callback = self.makeService()
+        self.writer.send(make_message(NLMSG_OVERRUN, b""))
+        service.doRead()
+        self.assertThat(callback, MockCalledOnceWith())
+
+    def test_calls_back_when_messages_are_dropped(self):
+        service = NetlinkMonitorService(Mock(), clock=Mock())
+        service.socket = Mock()
+        service.socket.recv.side_effect = [
+            OSError(errno.ENOBUFS, "No buffer space available"),
+            BlockingIOError(),
+        ]
+        service.doRead()
+        self.assertThat(service.callback, MockCalledOnceWith())
@@ -0,0 +1,309 @@
+# Copyright 2018 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.utils.profiler`."""
+
+__all__ = []
+
+from argparse import Namespace
+import io
+import json
+import sys
+import threading
+import time
+from unittest.mock import (
+    ANY,
+    Mock,
+)
+
+from maastesting.matchers import (
+    MockCalledOnce,
+    MockCalledOnceWith,
+)
+from maastesting.testcase import MAASTestCase
+from provisioningserver.utils import profiler as profiler_module
+from provisioningserver.utils.profiler import (
+    CallsiteStats,
+    format_report,
+    get_callsite,
+    get_profiler_token,
+    is_idle,
+    ProfilerResource,
+    SamplingProfiler,
+    shorten_path,
+)
+from testtools.matchers import (
+    Contains,
+    StartsWith,
+)
+from twisted.internet.task import Clock
+from twisted.web.test.requesthelper import DummyRequest
+
+
+def make_foreign_frame():
+    """Return a frame from code outside of MAAS, called from here."""
+    namespace = {"sys": sys}
+    code = compile(
+        "def get_frame():\n    return sys._getframe()\n",
+        "/usr/lib/python3/dist-packages/foreign.py", "exec")
+    exec(code, namespace)
+    return namespace["get_frame"]()
+
+
+class TestHelpers(MAASTestCase):
+
+    def test_get_callsite_prefers_maas_code(self):
+        frame = make_foreign_frame()
+        self.assertThat(
+            get_callsite(frame), StartsWith(
+                "provisioningserver/utils/tests/test_profiler.py:"))
+        self.assertThat(get_callsite(frame), Contains("(make_foreign_frame)"))
+
+    def test_get_callsite_falls_back_to_innermost_frame(self):
+        frame = make_foreign_frame()
+        frame_without_maas = Mock(f_back=None, f_code=frame.f_code)
+        self.assertEqual(
+            "foreign.py:1(get_frame)", get_callsite(frame_without_maas))
+
+    def test_shorten_path(self):
+        self.assertEqual(
+            "twisted/internet/base.py", shorten_path(
+                "/usr/lib/python3/dist-packages/twisted/internet/base.py"))
+        self.assertEqual(
+            "maasserver/api/machines.py", shorten_path(
+                "/home/user/maas/src/maasserver/api/machines.py"))
+        self.assertEqual("/tmp/other.py", shorten_path("/tmp/other.py"))
+
+    def test_is_idle(self):
+        self.assertTrue(is_idle(Mock(f_code=Mock(
+            co_filename="/usr/lib/python3.6/threading.py", co_name="wait"))))
+        self.assertFalse(is_idle(sys._getframe()))
+
+    def test_callsite_stats_histogram(self):
+        stats = CallsiteStats()
+        for duration in (0.005, 0.02, 0.3, 10):
+            stats.observe(duration)
+        self.assertEqual(4, stats.count)
+        self.assertAlmostEqual(10.325, stats.total)
+        self.assertEqual(10, stats.max)
+        self.assertEqual([1, 1, 0, 1, 0, 0, 1], stats.buckets)
+
+
+class TestSamplingProfiler(MAASTestCase):
+
+    def make_profiler(self):
+        profiler = SamplingProfiler(clock=Clock())
+        # Treat the test's thread as the reactor.
+        profiler._reactor_thread = threading.get_ident()
+        profiler._last_beat = time.monotonic()
+        return profiler
+
+    def test_start_and_stop(self):
+        profiler = SamplingProfiler(clock=Clock())
+        profiler.start()
+        self.addCleanup(profiler.stop)
+        self.assertTrue(profiler.running)
+        self.assertTrue(profiler._heartbeat.running)
+        profiler.stop()
+        self.assertFalse(profiler.running)
+        self.assertIsNone(profiler._heartbeat)
+
+    def test_sample_records_runs_on_reactor(self):
+        profiler = self.make_profiler()
+        profiler.sample()
+        group, callsite, started = profiler._runs[threading.get_ident()]
+        self.assertEqual("reactor", group)
+        profiler._end_run(threading.get_ident(), started + 0.2)
+        stats = profiler.callsites["reactor"][callsite]
+        self.assertEqual(1, stats.count)
+        self.assertAlmostEqual(0.2, stats.total)
+
+    def test_sample_groups_pool_threads_by_pool(self):
+        profiler = self.make_profiler()
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=stop.wait, name="PoolThread-database-3")
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+        self.assertEqual(
+            "database", profiler._get_threads()[thread.ident])
+
+    def test_sample_records_reactor_stall(self):
+        profiler = self.make_profiler()
+        profiler._last_beat = time.monotonic() - 1
+        profiler.sample()
+        [stall] = profiler.stalls
+        self.assertGreater(stall["duration"], profiler.stall_threshold)
+        self.assertThat(stall["callsite"], Contains("(sample)"))
+        self.assertThat("".join(stall["stack"]), Contains("test_profiler.py"))
+
+    def test_sample_logs_end_of_stall(self):
+        profiler = self.make_profiler()
+        profiler.clock = Mock()
+        profiler._last_beat = time.monotonic() - 1
+        profiler.sample()
+        profiler._beat()
+        profiler.sample()
+        self.assertIsNone(profiler._stall)
+        self.assertEqual(1, len(profiler.stalls))
+        self.assertThat(profiler.clock.callFromThread, MockCalledOnce())
+        [log_msg, message], _ = profiler.clock.callFromThread.call_args
+        self.assertEqual(profiler_module.log.msg, log_msg)
+        self.assertThat(message, StartsWith("Reactor stalled for"))
+
+    def test_reset(self):
+        profiler = self.make_profiler()
+        profiler._last_beat = time.monotonic() - 1
+        profiler.sample()
+        profiler._end_run(threading.get_ident(), time.monotonic())
+        profiler.reset()
+        self.assertEqual({}, profiler.callsites)
+        self.assertEqual(0, len(profiler.stalls))
+
+    def test_get_report_is_json_serialisable(self):
+        profiler = self.make_profiler()
+        profiler._last_beat = time.monotonic() - 1
+        profiler.sample()
+        profiler._end_run(threading.get_ident(), time.monotonic())
+        report = json.loads(json.dumps(profiler.get_report()))
+        self.assertFalse(report["running"])
+        self.assertEqual("+Inf", report["buckets"][-1])
+        self.assertEqual(["reactor"], list(report["callsites"]))
+        self.assertNotIn("beat", report["stalls"][0])
+
+    def test_format_report(self):
+        profiler = self.make_profiler()
+        profiler._last_beat = time.monotonic() - 1
+        profiler.sample()
+        profiler._end_run(threading.get_ident(), time.monotonic())
+        output = format_report(profiler.get_report())
+        self.assertThat(output, Contains("Busiest call-sites in reactor:"))
+        self.assertThat(output, Contains("profiler.py"))
+        self.assertThat(output, Contains("Reactor stalled for"))
+
+
+class TestProfilerResource(MAASTestCase):
+
+    secret = b"secret"
+
+    def make_resource(self, profiler=None, secret=secret):
+        if profiler is None:
+            profiler = SamplingProfiler()
+        return ProfilerResource(profiler, get_secret=lambda: secret)
+
+    def make_request(self, method=b"GET", args=None, token=None):
+        request = DummyRequest([])
+        request.method = method
+        if token is None:
+            token = get_profiler_token(self.secret)
+        if token is not False:
+            request.requestHeaders.addRawHeader(
+                b"X-MAAS-Profiler-Token", token.encode("ascii"))
+        if args is not None:
+            request.args = args
+        return request
+
+    def test_render_GET_returns_report(self):
+        resource = self.make_resource()
+        request = self.make_request()
+        report = json.loads(resource.render(request).decode("utf-8"))
+        self.assertFalse(report["running"])
+        self.assertEqual(
+            [b"application/json"],
+            request.responseHeaders.getRawHeaders(b"Content-Type"))
+
+    def test_render_refuses_requests_without_token(self):
+        resource = self.make_resource()
+        request = self.make_request(token=False)
+        self.assertEqual(b"", resource.render(request))
+        self.assertEqual(403, request.responseCode)
+
+    def test_render_refuses_requests_with_wrong_token(self):
+        resource = self.make_resource()
+        request = self.make_request(token=get_profiler_token(b"wrong"))
+        self.assertEqual(b"", resource.render(request))
+        self.assertEqual(403, request.responseCode)
+
+    def test_render_refuses_requests_without_shared_secret(self):
+        resource = self.make_resource(secret=None)
+        request = self.make_request()
+        self.assertEqual(b"", resource.render(request))
+        self.assertEqual(403, request.responseCode)
+
+    def test_render_POST_runs_action(self):
+        profiler = SamplingProfiler()
+        reset = self.patch(profiler, "reset")
+        resource = self.make_resource(profiler)
+        request = self.make_request(b"POST", args={b"action": [b"reset"]})
+        resource.render(request)
+        self.assertThat(reset, MockCalledOnceWith())
+
+    def test_render_POST_rejects_unknown_action(self):
+        resource = self.make_resource()
+        request = self.make_request(b"POST", args={b"action": [b"explode"]})
+        resource.render(request)
+        self.assertEqual(400, request.responseCode)
+
+
+class TestRun(MAASTestCase):
+
+    def setUp(self):
+        super(TestRun, self).setUp()
+        self.patch(
+            profiler_module,
+            "get_shared_secret_from_filesystem").return_value = b"secret"
+        self.headers = {
+            "X-MAAS-Profiler-Token": get_profiler_token(b"secret")}
+
+    def make_report(self):
+        return SamplingProfiler().get_report()
+
+    def test_shows_report(self):
+        fetch_profile = self.patch(profiler_module, "fetch_profile")
+        fetch_profile.return_value = self.make_report()
+        args = Namespace(
+            action="show", url="http://localhost:5249/profiler",
+            json=False, limit=10)
+        stdout = io.StringIO()
+        profiler_module.run(args, stdout=stdout)
+        self.assertThat(
+            fetch_profile,
+            MockCalledOnceWith(
+                "http://localhost:5249/profiler", None,
+                headers=self.headers))
+        self.assertThat(stdout.getvalue(), Contains("profiler stopped"))
+
+    def test_runs_action_and_outputs_json(self):
+        fetch_profile = self.patch(profiler_module, "fetch_profile")
+        fetch_profile.return_value = self.make_report()
+        args = Namespace(
+            action="start", url="http://localhost:5249/profiler",
+            json=True, limit=10)
+        stdout = io.StringIO()
+        profiler_module.run(args, stdout=stdout)
+        self.assertThat(
+            fetch_profile,
+            MockCalledOnceWith(
+                "http://localhost:5249/profiler", "start",
+                headers=self.headers))
+        self.assertEqual(
+            fetch_profile.return_value, json.loads(stdout.getvalue()))
+
+    def test_uses_given_headers(self):
+        fetch_profile = self.patch(profiler_module, "fetch_profile")
+        fetch_profile.return_value = self.make_report()
+        args = Namespace(
+            action="show", url="http://localhost:5240/MAAS/api/2.0/maas/",
+            json=True, limit=10)
+        headers = {"Authorization": "OAuth ..."}
+        profiler_module.run(args, stdout=io.StringIO(), headers=headers)
+        self.assertThat(
+            fetch_profile, MockCalledOnceWith(ANY, None, headers=headers))
+
+    def test_exits_without_shared_secret(self):
+        profiler_module.get_shared_secret_from_filesystem.return_value = None
+        args = Namespace(
+            action="show", url="http://localhost:5249/profiler",
+            json=False, limit=10)
+        self.assertRaises(SystemExit, profiler_module.run, args)
@@ -1,15 +1,27 @@
-# Copyright 2014-2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2014-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for the Registry"""
 
 __all__ = []
 
-from unittest.mock import sentinel
+from unittest.mock import (
+    Mock,
+    sentinel,
+)
 
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase
-from provisioningserver.utils.registry import Registry
+from provisioningserver.utils import registry as registry_module
+from provisioningserver.utils.registry import (
+    LazyItem,
+    Registry,
+)
 from provisioningserver.utils.testing import RegistryFixture
+from testtools.matchers import IsInstance
 
 
 class TestRegistry(MAASTestCase):
@@ -82,3 +94,61 @@ class TestRegistry(MAASTestCase):
         self.assertEqual(sentinel.item, Registry.get_item(name))
         self.assertEqual(sentinel.item_in_one, RegistryOne.get_item(name))
         self.assertEqual(sentinel.item_in_two, RegistryTwo.get_item(name))
+
+
+class TestRegistryLazyItems(MAASTestCase):
+
+    def setUp(self):
+        super(TestRegistryLazyItems, self).setUp()
+        # Ensure the global registry is empty for each test run.
+        self.useFixture(RegistryFixture())
+        self.module = Mock(Factory=Mock(return_value=sentinel.item))
+        self.import_module = self.patch(registry_module, "import_module")
+        self.import_module.return_value = self.module
+
+    def test_register_does_not_import(self):
+        Registry.register_lazy_item("resource", "package.module:Factory")
+        self.assertIn("resource", Registry)
+        self.assertThat(self.import_module, MockNotCalled())
+
+    def test___getitem__imports_and_creates_item_once(self):
+        Registry.register_lazy_item("resource", "package.module:Factory")
+        self.assertEqual(sentinel.item, Registry["resource"])
+        self.assertEqual(sentinel.item, Registry["resource"])
+        self.assertThat(
+            self.import_module, MockCalledOnceWith("package.module"))
+        self.assertThat(self.module.Factory, MockCalledOnceWith())
+
+    def test_get_item_imports_item(self):
+        Registry.register_lazy_item("resource", "package.module:Factory")
+        self.assertEqual(sentinel.item, Registry.get_item("resource"))
+
+    def test___iter__imports_items(self):
+        Registry.register_lazy_item("resource", "package.module:Factory")
+        self.assertEqual([("resource", sentinel.item)], list(Registry))
+
+    def test_peek_items_does_not_import(self):
+        Registry.register_lazy_item("resource", "package.module:Factory")
+        [(name, item)] = Registry.peek_items()
+        self.assertEqual("resource", name)
+        self.assertThat(item, IsInstance(LazyItem))
+        self.assertEqual("package.module:Factory", item.path)
+        self.assertThat(self.import_module, MockNotCalled())
+
+    def test_peek_items_returns_imported_items(self):
+        Registry.register_lazy_item("resource", "package.module:Factory")
+        Registry["resource"]
+        self.assertEqual(
+            [("resource", sentinel.item)], list(Registry.peek_items()))
+
+    def test_item_shared_between_registries_is_created_once(self):
+
+        class RegistryOne(Registry):
+            """A registry distinct from the base `Registry`."""
+
+        Registry.register_lazy_item("resource", "package.module:Factory")
+        [(_, item)] = Registry.peek_items()
+        RegistryOne.register_item("resource", item)
+        self.assertEqual(sentinel.item, RegistryOne["resource"])
+        self.assertEqual(sentinel.item, Registry["resource"])
+        self.assertThat(self.module.Factory, MockCalledOnceWith())
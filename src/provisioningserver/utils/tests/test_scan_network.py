@@ -1,4 +1,4 @@
-# Copyright 2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2016-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for ``provisioningserver.utils.scan_network``."""
@@ -7,8 +7,10 @@ __all__ = []
 
 from argparse import ArgumentParser
 import io
+import json
 import os
 import random
+import socket
 import subprocess
 from unittest.mock import (
     ANY,
@@ -22,27 +24,46 @@ from maastesting.matchers import (
     MockCalledOnceWith,
 )
 from maastesting.testcase import MAASTestCase
-from netaddr import IPNetwork
+from netaddr import (
+    IPAddress,
+    IPNetwork,
+)
 from provisioningserver.utils import scan_network as scan_network_module
+from provisioningserver.utils.arp import (
+    ARP,
+    ARP_OPERATION,
+)
+from provisioningserver.utils.ethernet import Ethernet
 from provisioningserver.utils.scan_network import (
     add_arguments,
+    arp_sweep,
     get_nmap_arguments,
     get_ping_arguments,
+    get_source_ip,
+    make_arp_request,
     NmapParameters,
     PingParameters,
+    RateLimiter,
+    receive_arp_replies,
     run,
     run_nmap,
     run_ping,
+    ScanProgress,
+    SubnetSweep,
+    SWEEP_RATE,
     yield_nmap_parameters,
     yield_ping_parameters,
 )
 from provisioningserver.utils.script import ActionScriptError
 from provisioningserver.utils.shell import get_env_with_locale
+from provisioningserver.utils.tests.test_arp import make_arp_packet
+from provisioningserver.utils.tests.test_ethernet import make_ethernet_packet
 from testtools import ExpectedException
 from testtools.matchers import (
     AfterPreprocessing,
     Contains,
     Equals,
+    HasLength,
     MatchesStructure,
 )
 
@@ -90,15 +111,26 @@ class TestScanNetworkCommand(MAASTestCase):
         return run(parsed_args, stdout=self.output, stderr=self.error_output)
 
     def test__interprets_long_arguments(self):
-        self.run_command('--ping', '--threads', '37', '--slow')
+        self.run_command(
+            '--ping', '--threads', '37', '--slow', '--rate', '500',
+            '--subnet-rate', '50')
         self.assertThat(self.scan_networks_mock, MockCalledOnceWith(
-            ArgumentsMatching(threads=37, slow=True, ping=True),
+            ArgumentsMatching(
+                threads=37, slow=True, ping=True, nmap=False, rate=500,
+                subnet_rate=50),
             ANY, ANY, ANY))
 
+    def test__interprets_nmap_argument(self):
+        self.run_command('--nmap')
+        self.assertThat(self.scan_networks_mock, MockCalledOnceWith(
+            ArgumentsMatching(nmap=True, ping=False), ANY, ANY, ANY))
+
     def test__default_arguments(self):
         self.run_command()
         self.assertThat(self.scan_networks_mock, MockCalledOnceWith(
-            ArgumentsMatching(threads=None, slow=False, ping=False),
+            ArgumentsMatching(
+                threads=None, slow=False, ping=False, nmap=False,
+                rate=SWEEP_RATE, subnet_rate=None),
             ANY, ANY, ANY))
 
     def test__scans_all_interface_cidrs_when_zero_parameters_passed(self):
@@ -163,6 +195,8 @@ class TestScanNetworkCommandEndToEnd(MAASTestCase):
             scan_network_module, 'get_all_interfaces_definition')
         self.has_command_available_mock = self.patch(
             scan_network_module, 'has_command_available')
+        # Scan with nmap or ping rather than sweeping with ARP.
+        self.patch(scan_network_module, 'can_sweep').return_value = False
         self.all_interfaces_mock.return_value = TEST_INTERFACES
         self.popen = self.patch(scan_network_module.subprocess, 'Popen')
         self.popen.return_value.poll = Mock()
@@ -335,3 +369,278 @@ class TestYieldPingParameters(MAASTestCase):
             PingParameters(interface='eth0', ip='192.168.0.1'),
             PingParameters(interface='eth0', ip='192.168.0.2'),
         }))
+
+
+class FakeARPSocket:
+    """A packet socket on which `hosts`, a dict of IP to MAC, reply."""
+
+    def __init__(self, test, hosts=None, mac="02:00:00:00:00:01"):
+        self.sock, self.peer = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_DGRAM)
+        test.addCleanup(self.sock.close)
+        test.addCleanup(self.peer.close)
+        self.hosts = {} if hosts is None else hosts
+        self.mac = mac
+        self.sent = []
+        self.closed = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def getsockname(self):
+        return "eth1", 0x0806, 0, 1, bytes.fromhex(self.mac.replace(":", ""))
+
+    def send(self, packet):
+        self.sent.append(packet)
+        ip = str(ARP(Ethernet(packet).payload).target_ip)
+        if ip in self.hosts:
+            self.peer.send(make_ethernet_packet(
+                src_mac=self.hosts[ip], payload=make_arp_packet(
+                    ip, self.hosts[ip], "0.0.0.0", target_mac=self.mac,
+                    op=ARP_OPERATION.REPLY)))
+
+    def recv(self, size, flags=0):
+        return self.sock.recv(size, flags)
+
+    def close(self):
+        self.closed = True
+
+
+class TestScanNetworksSweep(MAASTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.output = io.StringIO()
+        self.error_output = io.StringIO()
+        self.patch(
+            scan_network_module,
+            'get_all_interfaces_definition').return_value = TEST_INTERFACES
+        self.patch(scan_network_module, 'can_sweep').return_value = True
+        self.arp_sweep = self.patch(scan_network_module, 'arp_sweep')
+        self.arp_sweep.return_value = []
+        self.popen = self.patch(scan_network_module.subprocess, 'Popen')
+        self.parser = ArgumentParser()
+        add_arguments(self.parser)
+
+    def run_command(self, *args):
+        parsed_args = self.parser.parse_args([*args])
+        return run(parsed_args, stdout=self.output, stderr=self.error_output)
+
+    def test__sweeps_by_default(self):
+        self.run_command('eth1')
+        self.assertThat(self.arp_sweep, MockCalledOnceWith(
+            {'eth1': MatchesCIDRs('192.168.0.0/24')}, TEST_INTERFACES,
+            rate=SWEEP_RATE, subnet_rate=100))
+        self.assertThat(self.popen.call_args_list, HasLength(0))
+
+    def test__sweeps_slowly(self):
+        self.run_command('--slow', 'eth1')
+        self.assertThat(self.arp_sweep, MockCalledOnceWith(
+            ANY, ANY, rate=SWEEP_RATE, subnet_rate=9))
+        self.run_command('--slow', '--subnet-rate', '20', 'eth1')
+        self.assertThat(self.arp_sweep.call_args[1]['subnet_rate'], Equals(20))
+
+    def test__does_not_sweep_if_ping_or_nmap_selected(self):
+        self.run_command('--ping', 'eth0', '192.168.0.1/32')
+        self.run_command('--nmap', 'eth0', '192.168.0.1/32')
+        self.assertThat(self.arp_sweep.call_args_list, HasLength(0))
+
+    def test__does_not_sweep_if_unable(self):
+        scan_network_module.can_sweep.return_value = False
+        self.run_command('eth0', '192.168.0.1/32')
+        self.assertThat(self.arp_sweep.call_args_list, HasLength(0))
+
+    def test__writes_events_and_prints_summary(self):
+        events = [
+            {"scan_type": "arp", "interface": "eth1", "ip": "192.168.0.5",
+             "mac": "02:00:00:00:00:05", "result": True},
+            {"scan_type": "arp", "interface": "eth1", "cidr": "192.168.0.0/24",
+             "hosts": 254, "probed": 254, "up": 1, "seconds": 3,
+             "done": True},
+        ]
+        self.arp_sweep.return_value = events
+        self.run_command('eth1')
+        self.assertThat(
+            [json.loads(line) for line in self.output.getvalue().splitlines()],
+            Equals(events))
+        self.assertThat(self.error_output.getvalue(), DocTestMatches(
+            "Swept 254 hosts (1 up) in ... second(s)."))
+
+    def test__prints_sweep_errors(self):
+        self.arp_sweep.return_value = [
+            {"scan_type": "arp", "interface": "eth1", "error": "Nope"}]
+        self.run_command('eth1')
+        self.assertThat(self.error_output.getvalue(), DocTestMatches(
+            "Unable to sweep eth1: Nope\n"
+            "Requested network(s) not available to scan: eth1"))
+
+
+class TestRateLimiter(MAASTestCase):
+
+    def test__allows_burst_then_rate(self):
+        now = [100.0]
+        limiter = RateLimiter(10, 5, clock=lambda: now[0])
+        self.assertThat(limiter.available(), Equals(5))
+        limiter.consume(5)
+        self.assertThat(limiter.available(), Equals(0))
+        self.assertThat(limiter.delay(), Equals(0.1))
+        now[0] += 0.25
+        self.assertThat(limiter.available(), Equals(2))
+        now[0] += 60
+        self.assertThat(limiter.available(), Equals(5))
+        self.assertThat(limiter.delay(), Equals(0.0))
+
+
+class TestMakeARPRequest(MAASTestCase):
+
+    def test__makes_broadcast_request(self):
+        packet = make_arp_request(
+            b"\x02\x00\x00\x00\x00\x01", IPAddress("192.168.0.1"),
+            IPAddress("192.168.0.7"))
+        ethernet = Ethernet(packet)
+        arp = ARP(ethernet.payload)
+        self.assertTrue(ethernet.is_valid())
+        self.assertThat(ethernet.dst_mac, Equals(b"\xff" * 6))
+        self.assertTrue(arp.is_valid())
+        self.assertThat(arp.operation, Equals(ARP_OPERATION.REQUEST))
+        self.assertThat(str(arp.source_eui), Equals("02-00-00-00-00-01"))
+        self.assertThat(arp.source_ip, Equals(IPAddress("192.168.0.1")))
+        self.assertThat(arp.target_ip, Equals(IPAddress("192.168.0.7")))
+
+
+class TestGetSourceIP(MAASTestCase):
+
+    def test__returns_address_on_network(self):
+        self.assertThat(
+            get_source_ip(
+                "eth2", IPNetwork("192.168.3.0/28"), TEST_INTERFACES),
+            Equals(IPAddress("192.168.3.1")))
+
+    def test__returns_unspecified_address_if_not_on_network(self):
+        self.assertThat(
+            get_source_ip(
+                "eth1", IPNetwork("192.168.3.0/24"), TEST_INTERFACES),
+            Equals(IPAddress("0.0.0.0")))
+
+
+class TestSubnetSweep(MAASTestCase):
+
+    def make_sweep(self, cidr):
+        return SubnetSweep(
+            "eth1", IPNetwork(cidr), b"\x02\x00\x00\x00\x00\x01",
+            IPAddress("0.0.0.0"), RateLimiter(10, 10))
+
+    def test__requests_each_host_in_batches(self):
+        sweep = self.make_sweep("192.168.0.0/29")
+        self.assertThat(sweep.hosts, Equals(6))
+        self.assertThat(sweep.nextRequests(4), HasLength(4))
+        self.assertIsNone(sweep.finished_sending)
+        requests = sweep.nextRequests(4)
+        self.assertThat(
+            [str(ARP(Ethernet(request).payload).target_ip)
+             for request in requests],
+            Equals(["192.168.0.5", "192.168.0.6"]))
+        self.assertIsNotNone(sweep.finished_sending)
+        self.assertThat(sweep.probed, Equals(6))
+
+    def test__counts_single_host_network(self):
+        sweep = self.make_sweep("192.168.0.9/32")
+        self.assertThat(sweep.hosts, Equals(1))
+        self.assertThat(sweep.nextRequests(1), HasLength(1))
+        self.assertIsNotNone(sweep.finished_sending)
+
+    def test__is_done_after_waiting_for_replies(self):
+        self.patch(scan_network_module, "SWEEP_WAIT", 1.0)
+        sweep = self.make_sweep("192.168.0.9/32")
+        sweep.nextRequests(1)
+        self.assertFalse(sweep.isDone(sweep.finished_sending + 0.5))
+        self.assertTrue(sweep.isDone(sweep.finished_sending + 1.0))
+
+
+class TestReceiveARPReplies(MAASTestCase):
+
+    def test__yields_only_replies(self):
+        sock = FakeARPSocket(self)
+        sock.peer.send(make_ethernet_packet(payload=make_arp_packet(
+            "192.168.0.2", "02:00:00:00:00:02", "192.168.0.1")))
+        sock.peer.send(b"\x00" * 10)
+        sock.peer.send(make_ethernet_packet(payload=make_arp_packet(
+            "192.168.0.3", "02:00:00:00:00:03", "192.168.0.1",
+            op=ARP_OPERATION.REPLY)))
+        [reply] = receive_arp_replies(sock)
+        self.assertThat(reply.source_ip, Equals(IPAddress("192.168.0.3")))
+
+
+class TestARPSweep(MAASTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.patch(scan_network_module, "SWEEP_WAIT", 0.0)
+
+    def test__yields_replies_and_progress(self):
+        sock = FakeARPSocket(self, hosts={"192.168.0.5": "02:00:00:00:00:05"})
+        events = list(arp_sweep(
+            {"eth1": ["192.168.0.0/28"]}, TEST_INTERFACES, rate=1000,
+            subnet_rate=1000, open_socket=lambda ifname: sock))
+        self.assertThat(sock.sent, HasLength(14))
+        self.assertThat(
+            ARP(Ethernet(sock.sent[0]).payload).source_ip,
+            Equals(IPAddress("192.168.0.1")))
+        self.assertTrue(sock.closed)
+        self.assertThat(events[0]["probed"], Equals(0))
+        self.assertThat(events, Contains({
+            "scan_type": "arp", "interface": "eth1", "ip": "192.168.0.5",
+            "mac": "02:00:00:00:00:05", "result": True}))
+        last = events[-1]
+        del last["seconds"]
+        self.assertThat(last, Equals({
+            "scan_type": "arp", "interface": "eth1",
+            "cidr": "192.168.0.0/28", "hosts": 14, "probed": 14, "up": 1,
+            "done": True}))
+
+    def test__ignores_ipv6_networks(self):
+        sock = FakeARPSocket(self)
+        events = list(arp_sweep(
+            {"eth2": ["2001:db8::/64"]}, TEST_INTERFACES,
+            open_socket=lambda ifname: sock))
+        self.assertThat(events, Equals([]))
+        self.assertThat(sock.sent, Equals([]))
+
+    def test__yields_error_if_unable_to_open_socket(self):
+
+        def open_socket(ifname):
+            raise PermissionError("Operation not permitted")
+
+        events = list(arp_sweep(
+            {"eth1": ["192.168.0.0/28"]}, TEST_INTERFACES,
+            open_socket=open_socket))
+        self.assertThat(events, Equals([{
+            "scan_type": "arp", "interface": "eth1",
+            "error": "Operation not permitted"}]))
+
+
+class TestScanProgress(MAASTestCase):
+
+    def test__tracks_subnets_of_current_scan(self):
+        progress = ScanProgress()
+        self.assertThat(progress.getProgress(), Equals(
+            {"scanning": False, "subnets": []}))
+        progress.start()
+        progress.update([
+            {"scan_type": "arp", "interface": "eth1",
+             "cidr": "192.168.0.0/24", "hosts": 254, "probed": 32, "up": 0,
+             "seconds": 0, "done": False},
+            {"scan_type": "arp", "interface": "eth1", "ip": "192.168.0.5",
+             "mac": "02:00:00:00:00:05", "result": True},
+            {"scan_type": "arp", "interface": "eth1",
+             "cidr": "192.168.0.0/24", "hosts": 254, "probed": 254, "up": 1,
+             "seconds": 3, "done": True},
+        ])
+        self.assertThat(progress.getProgress(), Equals({
+            "scanning": True, "subnets": [{
+                "interface": "eth1", "cidr": "192.168.0.0/24", "hosts": 254,
+                "probed": 254, "up": 1, "done": True}]}))
+        progress.finish()
+        self.assertFalse(progress.getProgress()["scanning"])
+        progress.start()
+        self.assertThat(progress.getProgress()["subnets"], Equals([]))
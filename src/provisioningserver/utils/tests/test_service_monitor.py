@@ -22,7 +22,10 @@ from maastesting.matchers import (
 )
 from maastesting.runtest import MAASTwistedRunTest
 from maastesting.testcase import MAASTestCase
-from maastesting.twisted import always_fail_with
+from maastesting.twisted import (
+    always_fail_with,
+    TwistedLoggerFixture,
+)
 from provisioningserver.utils import (
     service_monitor as service_monitor_module,
     snappy,
@@ -53,7 +56,10 @@ from twisted.internet.defer import (
     inlineCallbacks,
     succeed,
 )
-from twisted.internet.task import deferLater
+from twisted.internet.task import (
+    Clock,
+    deferLater,
+)
 
 
 EMPTY_SET = frozenset()
@@ -278,6 +284,8 @@ class TestServiceMonitor(MAASTestCase):
             expected_states[service.name] = ServiceState(
                 active_state, process_state)
         service_monitor = self.make_service_monitor(fake_services)
+        self.patch(service_monitor, "_preloadServiceStates").return_value = (
+            succeed(None))
         self.patch(service_monitor, "ensureService").side_effect = (
             lambda name: succeed(expected_states[name]))
         observed = yield service_monitor.ensureServices()
@@ -295,6 +303,8 @@ class TestServiceMonitor(MAASTestCase):
             for service in services
         }
         service_monitor._serviceStates.update(service_states)
+        self.patch(service_monitor, "_preloadServiceStates").return_value = (
+            succeed(None))
 
         # Make both service monitor checks fail with a distinct error.
         self.patch(service_monitor, "ensureService")
@@ -607,6 +617,17 @@ class TestServiceMonitor(MAASTestCase):
             mock_execSupervisorServiceAction,
             MockCalledOnceWith(service.service_name, action))
 
+    @inlineCallbacks
+    def test___performServiceAction_discards_loaded_state(self):
+        service = make_fake_service(SERVICE_STATE.ON)
+        service_monitor = self.make_service_monitor([service])
+        service_monitor._systemdStates[service.name] = 0.0, {}
+        self.patch(
+            service_monitor, "_execSystemDServiceAction").return_value = (
+                0, "", "")
+        yield service_monitor._performServiceAction(service, "restart")
+        self.assertThat(service_monitor._systemdStates, Equals({}))
+
     @inlineCallbacks
     def test___performServiceAction_raises_ServiceActionError_if_fails(self):
         service = make_fake_service(SERVICE_STATE.ON)
@@ -804,6 +825,127 @@ class TestServiceMonitor(MAASTestCase):
         with ExpectedException(ServiceParsingError):
             yield service_monitor._loadSystemDServiceState(service)
 
+    @inlineCallbacks
+    def test___execSystemDShow_calls_systemctl_once(self):
+        service_monitor = self.make_service_monitor()
+        service_names = [factory.make_name("service") for _ in range(3)]
+        mock_getProcessOutputAndValue = self.patch(
+            service_monitor_module, "getProcessOutputAndValue")
+        mock_getProcessOutputAndValue.return_value = succeed((b"", b"", 0))
+        yield service_monitor._execSystemDShow(service_names)
+        self.assertThat(
+            mock_getProcessOutputAndValue, MockCalledOnceWith(
+                "systemctl", [
+                    "show", "--property=LoadState,ActiveState,SubState,Result",
+                    *service_names,
+                ], env=get_env_with_bytes_locale()))
+
+    def make_systemd_show_output(self, *units):
+        return "\n".join(
+            "LoadState=%s\nActiveState=%s\nSubState=%s\nResult=%s\n" % unit
+            for unit in units)
+
+    @inlineCallbacks
+    def test___loadSystemDServiceState_uses_states_loaded_together(self):
+        services = [make_fake_service() for _ in range(4)]
+        service_monitor = self.make_service_monitor(services)
+        service_monitor.clock = Clock()
+        mock_execSystemDShow = self.patch(service_monitor, "_execSystemDShow")
+        mock_execSystemDShow.return_value = succeed((
+            0, self.make_systemd_show_output(
+                ("loaded", "active", "running", "success"),
+                ("loaded", "inactive", "dead", "success"),
+                ("loaded", "failed", "failed", "exit-code"),
+                ("not-found", "inactive", "dead", "success"),
+            ), ""))
+        mock_execSystemDServiceAction = self.patch(
+            service_monitor, "_execSystemDServiceAction")
+        yield service_monitor._loadSystemDServiceStates(services)
+        self.assertThat(mock_execSystemDShow, MockCalledOnceWith(
+            [service.service_name for service in services]))
+        states = []
+        for service in services[:3]:
+            state = yield service_monitor._loadSystemDServiceState(service)
+            states.append(state)
+        self.assertThat(states, Equals([
+            (SERVICE_STATE.ON, "running"),
+            (SERVICE_STATE.OFF, "dead"),
+            (SERVICE_STATE.DEAD, "Result: exit-code"),
+        ]))
+        with ExpectedException(ServiceUnknownError):
+            yield service_monitor._loadSystemDServiceState(services[3])
+        self.assertThat(mock_execSystemDServiceAction, MockNotCalled())
+
+    @inlineCallbacks
+    def test___loadSystemDServiceState_uses_loaded_state_once(self):
+        service = make_fake_service()
+        service_monitor = self.make_service_monitor([service])
+        service_monitor.clock = Clock()
+        service_monitor._systemdStates[service.name] = 0.0, {}
+        exception = factory.make_exception()
+        self.patch(
+            service_monitor, "_execSystemDServiceAction").side_effect = (
+                exception)
+        with ExpectedException(ServiceUnknownError):
+            yield service_monitor._loadSystemDServiceState(service)
+        with ExpectedException(type(exception)):
+            yield service_monitor._loadSystemDServiceState(service)
+
+    @inlineCallbacks
+    def test___loadSystemDServiceState_ignores_stale_loaded_state(self):
+        service = make_fake_service()
+        service_monitor = self.make_service_monitor([service])
+        service_monitor.clock = Clock()
+        service_monitor._systemdStates[service.name] = 0.0, {}
+        service_monitor.clock.advance(
+            service_monitor.SYSTEMD_STATE_CACHE_TIME)
+        exception = factory.make_exception()
+        self.patch(
+            service_monitor, "_execSystemDServiceAction").side_effect = (
+                exception)
+        with ExpectedException(type(exception)):
+            yield service_monitor._loadSystemDServiceState(service)
+
+    @inlineCallbacks
+    def test___loadSystemDServiceStates_raises_error_for_bad_output(self):
+        services = [make_fake_service() for _ in range(2)]
+        service_monitor = self.make_service_monitor(services)
+        self.patch(service_monitor, "_execSystemDShow").return_value = (
+            succeed((0, self.make_systemd_show_output(
+                ("loaded", "active", "running", "success")), "")))
+        with ExpectedException(ServiceParsingError):
+            yield service_monitor._loadSystemDServiceStates(services)
+        self.assertThat(service_monitor._systemdStates, Equals({}))
+
+    @inlineCallbacks
+    def test__ensureServices_loads_all_states_first(self):
+        services = [make_fake_service() for _ in range(3)]
+        service_monitor = self.make_service_monitor(services)
+        mock_loadSystemDServiceStates = self.patch(
+            service_monitor, "_loadSystemDServiceStates")
+        mock_loadSystemDServiceStates.return_value = succeed(None)
+        self.patch(service_monitor, "ensureService").side_effect = (
+            lambda name: succeed(ServiceState()))
+        yield service_monitor.ensureServices()
+        self.assertThat(
+            mock_loadSystemDServiceStates, MockCalledOnceWith(services))
+
+    @inlineCallbacks
+    def test__ensureServices_logs_failure_to_load_all_states(self):
+        service = make_fake_service()
+        service_monitor = self.make_service_monitor([service])
+        self.patch(
+            service_monitor, "_loadSystemDServiceStates").side_effect = (
+                always_fail_with(ServiceParsingError("bad output")))
+        self.patch(service_monitor, "ensureService").side_effect = (
+            lambda name: succeed(ServiceState()))
+        with TwistedLoggerFixture() as logger:
+            observed = yield service_monitor.ensureServices()
+        self.assertThat(observed, Equals({service.name: ServiceState()}))
+        self.assertThat(logger.output, Equals(
+            "Unable to load the states of all services from systemd; "
+            "loading them one at a time instead: bad output"))
+
     @inlineCallbacks
     def test___loadSupervisorServiceState_status_calls_supervisorctl(self):
         service = make_fake_service(SERVICE_STATE.ON)
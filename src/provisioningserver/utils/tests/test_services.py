@@ -1,4 +1,4 @@
-# Copyright 2016 Canonical Ltd.  This software is licensed under the
+# Copyright 2016-2018 Canonical Ltd.  This software is licensed under the
 # GNU Affero General Public License version 3 (see the file LICENSE).
 
 """Tests for services."""
@@ -36,17 +36,18 @@ from provisioningserver.utils.beaconing import (
     create_beacon_payload,
     TopologyHint,
 )
+from provisioningserver.utils.fs import get_maas_common_command
+from provisioningserver.utils.netlink import NetlinkMonitorService
 from provisioningserver.utils.services import (
-    BeaconingService,
     BeaconingSocketProtocol,
     JSONPerLineProtocol,
     MDNSResolverService,
-    NeighbourDiscoveryService,
+    NeighbourAggregator,
+    NetworkObservationService,
     NetworksMonitoringLock,
     NetworksMonitoringService,
     ProcessProtocolService,
-    ProtocolForObserveARP,
-    ProtocolForObserveBeacons,
+    ProtocolForObserveNetwork,
 )
 from testtools import ExpectedException
 from testtools.matchers import (
@@ -78,10 +79,11 @@ class StubNetworksMonitoringService(NetworksMonitoringService):
 
     def __init__(
             self, enable_monitoring=False, enable_beaconing=False,
-            *args, **kwargs):
+            enable_netlink=False, *args, **kwargs):
         super().__init__(
             *args, enable_monitoring=enable_monitoring,
-            enable_beaconing=enable_beaconing, **kwargs)
+            enable_beaconing=enable_beaconing, enable_netlink=enable_netlink,
+            **kwargs)
         self.iterations = DeferredQueue()
         self.interfaces = []
         self.update_interface__calls = 0
@@ -303,6 +305,113 @@ class TestNetworksMonitoringService(MAASTestCase):
         # ... interfaces ARE recorded.
         self.assertThat(service.interfaces, Not(Equals([])))
 
+    def test_observes_all_interfaces_with_one_service(self):
+        service = self.makeService()
+        service._monitored = frozenset({"eth0"})
+        service._beaconing = frozenset({"eth0", "eth1"})
+        service._configureNetworkObservation()
+        observation = service.getServiceNamed("network_observation")
+        self.assertThat(observation, IsInstance(NetworkObservationService))
+        self.assertThat(
+            observation.neighbours_callback,
+            Equals(service.neighbour_aggregator.add))
+        self.assertThat(observation.neighbour_interfaces, Equals({"eth0"}))
+        self.assertThat(
+            observation.beacon_interfaces, Equals({"eth0", "eth1"}))
+        service._monitored = frozenset()
+        service._configureNetworkObservation()
+        self.assertThat(
+            service.getServiceNamed("network_observation"), Is(observation))
+        self.assertThat(observation.neighbour_interfaces, Equals(set()))
+        service._beaconing = frozenset()
+        service._configureNetworkObservation()
+        self.assertRaises(
+            KeyError, service.getServiceNamed, "network_observation")
+
+
+class TestNetworksMonitoringServiceWithNetlink(MAASTestCase):
+    """Tests of `NetworksMonitoringService` when rtnetlink is available."""
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def setUp(self):
+        super(TestNetworksMonitoringServiceWithNetlink, self).setUp()
+        self.patch(NetlinkMonitorService, "listening", True)
+        self.get_interfaces = self.patch(
+            services, "get_all_interfaces_definition")
+        self.get_interfaces.return_value = {}
+
+    def makeService(self, clock):
+        service = StubNetworksMonitoringService(
+            clock=clock, enable_netlink=True)
+        self.addCleanup(service._releaseSoleResponsibility)
+        return service
+
+    def test_init(self):
+        service = self.makeService(Clock())
+        self.assertThat(
+            service.netlink_monitor, IsInstance(NetlinkMonitorService))
+        self.assertThat(
+            service.netlink_monitor.callback,
+            Equals(service._interfacesChanged))
+
+    @inlineCallbacks
+    def test_reuses_interfaces_until_they_change(self):
+        service = self.makeService(Clock())
+        yield service.updateInterfaces()
+        yield service.updateInterfaces()
+        self.assertThat(self.get_interfaces, MockCalledOnceWith())
+        self.assertThat(service.interfaces, Equals([{}]))
+
+    @inlineCallbacks
+    def test_reads_interfaces_again_once_changes_settle(self):
+        clock = Clock()
+        service = self.makeService(clock)
+        yield service.updateInterfaces()
+        self.get_interfaces.return_value = {"eth0": {}}
+        service._interfacesChanged()
+        clock.advance(service.netlink_debounce / 2)
+        service._interfacesChanged()
+        clock.advance(service.netlink_debounce / 2)
+        self.assertThat(service.update_interface__calls, Equals(1))
+        clock.advance(service.netlink_debounce / 2)
+        yield service.iterations.get()
+        yield service.iterations.get()
+        self.assertThat(service.update_interface__calls, Equals(2))
+        self.assertThat(service.interfaces, Equals([{}, {"eth0": {}}]))
+
+    @inlineCallbacks
+    def test_reads_interfaces_again_after_fallback_interval(self):
+        clock = Clock()
+        service = self.makeService(clock)
+        yield service.updateInterfaces()
+        clock.advance(service.netlink_fallback_interval)
+        yield service.updateInterfaces()
+        self.assertThat(self.get_interfaces, MockCallsMatch(call(), call()))
+
+    @inlineCallbacks
+    def test_reads_interfaces_again_after_failure(self):
+        service = self.makeService(Clock())
+        recordInterfaces = self.patch(service, "recordInterfaces")
+        recordInterfaces.side_effect = [Exception, None]
+        with TwistedLoggerFixture():
+            yield service.updateInterfaces()
+            yield service.updateInterfaces()
+        self.assertThat(self.get_interfaces, MockCallsMatch(call(), call()))
+        self.assertThat(recordInterfaces, MockCallsMatch(
+            call({}, None), call({}, None)))
+
+    @inlineCallbacks
+    def test_stopping_service_cancels_pending_update(self):
+        clock = Clock()
+        service = self.makeService(clock)
+        self.patch(service.netlink_monitor, "startService")
+        self.patch(service.netlink_monitor, "stopService")
+        yield service.startService()
+        service._interfacesChanged()
+        yield service.stopService()
+        self.assertThat(clock.getDelayedCalls(), Equals([]))
+
 
 class TestJSONPerLineProtocol(MAASTestCase):
     """Tests for `JSONPerLineProtocol`."""
@@ -395,34 +504,111 @@ class TestJSONPerLineProtocol(MAASTestCase):
             yield proto.done
 
 
-class TestProtocolForObserveARP(MAASTestCase):
-    """Tests for `ProtocolForObserveARP`."""
+def make_neighbour(event, time, mac="02:00:00:00:00:01", vid=None):
+    return {
+        "interface": "eth0", "ip": "192.168.0.1", "mac": mac, "vid": vid,
+        "event": event, "time": time,
+    }
 
-    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
 
-    def test_adds_interface(self):
-        callback = Mock()
-        ifname = factory.make_name('eth')
-        proto = ProtocolForObserveARP(ifname, callback=callback)
-        proto.makeConnection(Mock(pid=None))
-        proto.outReceived(b"{}\n")
-        self.expectThat(
-            callback, MockCallsMatch(call([{"interface": ifname}])))
+class TestNeighbourAggregator(MAASTestCase):
+    """Tests for `NeighbourAggregator`."""
+
+    def makeAggregator(self):
+        callback = Mock(return_value=succeed(None))
+        clock = Clock()
+        return NeighbourAggregator(callback, clock), callback, clock
+
+    def test_reports_changes_after_window(self):
+        aggregator, callback, clock = self.makeAggregator()
+        aggregator.add([make_neighbour("NEW", 10)])
+        aggregator.add([make_neighbour("REFRESHED", 11)])
+        aggregator.add([make_neighbour("NEW", 12, vid=100)])
+        clock.advance(aggregator.window - 1)
+        self.assertThat(callback, MockNotCalled())
+        clock.advance(1)
+        self.assertThat(callback, MockCalledOnceWith([
+            make_neighbour("NEW", 11), make_neighbour("NEW", 12, vid=100),
+        ]))
+
+    def test_reports_latest_binding_for_each_ip(self):
+        aggregator, callback, clock = self.makeAggregator()
+        aggregator.add([make_neighbour("NEW", 10)])
+        moved = make_neighbour("MOVED", 11, mac="02:00:00:00:00:02")
+        aggregator.add([moved])
+        clock.advance(aggregator.window)
+        self.assertThat(callback, MockCalledOnceWith([moved]))
+
+    def test_summarises_refreshes(self):
+        aggregator, callback, clock = self.makeAggregator()
+        aggregator.add([make_neighbour("REFRESHED", 10)])
+        aggregator.add([make_neighbour("REFRESHED", 20)])
+        clock.advance(aggregator.window)
+        self.assertThat(callback, MockNotCalled())
+        clock.advance(aggregator.refresh_interval)
+        self.assertThat(callback, MockCalledOnceWith([
+            dict(make_neighbour("REFRESHED", 20), count=2),
+        ]))
+
+    def test_discards_refreshes_of_moved_bindings(self):
+        aggregator, callback, clock = self.makeAggregator()
+        aggregator.add([make_neighbour("REFRESHED", 10)])
+        moved = make_neighbour("MOVED", 11, mac="02:00:00:00:00:02")
+        aggregator.add([moved])
+        clock.advance(aggregator.refresh_interval)
+        self.assertThat(callback, MockCalledOnceWith([moved]))
+
+    def test_flush_reports_everything_now(self):
+        aggregator, callback, clock = self.makeAggregator()
+        aggregator.add([
+            make_neighbour("REFRESHED", 10),
+            make_neighbour("NEW", 10, vid=100),
+        ])
+        aggregator.flush()
+        self.assertThat(callback, MockCalledOnceWith([
+            make_neighbour("NEW", 10, vid=100),
+            dict(make_neighbour("REFRESHED", 10), count=1),
+        ]))
+        self.assertThat(clock.getDelayedCalls(), Equals([]))
+
+    def test_logs_failures_to_report(self):
+        aggregator, callback, clock = self.makeAggregator()
+        callback.side_effect = factory.make_exception()
+        with TwistedLoggerFixture() as logger:
+            aggregator.add([make_neighbour("NEW", 10)])
+            clock.advance(aggregator.window)
+        self.assertThat(
+            logger.output, DocTestMatches(
+                "Failed to report neighbours.\n..."))
 
 
-class TestProtocolForObserveBeacons(MAASTestCase):
-    """Tests for `ProtocolForObserveBeacons`."""
+class TestProtocolForObserveNetwork(MAASTestCase):
+    """Tests for `ProtocolForObserveNetwork`."""
 
     run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
 
-    def test_adds_interface(self):
-        callback = Mock()
-        ifname = factory.make_name('eth')
-        proto = ProtocolForObserveBeacons(ifname, callback=callback)
+    def test_passes_neighbours_and_beacons_to_callbacks_together(self):
+        neighbours_callback, beacons_callback = Mock(), Mock()
+        proto = ProtocolForObserveNetwork(
+            neighbours_callback, beacons_callback)
         proto.makeConnection(Mock(pid=None))
-        proto.outReceived(b"{}\n")
+        proto.outReceived(
+            b'{"neighbour": {"ip": "1"}}\n{"beacon": {"type": "2"}}\n'
+            b'{"neighbour": {"ip": "3"}}\n{"neigh')
+        proto.outReceived(b'bour": {"ip": "4"}}\n')
         self.expectThat(
-            callback, MockCallsMatch(call([{"interface": ifname}])))
+            neighbours_callback, MockCallsMatch(
+                call([{"ip": "1"}, {"ip": "3"}]), call([{"ip": "4"}])))
+        self.expectThat(
+            beacons_callback, MockCalledOnceWith([{"type": "2"}]))
+
+    def test_logs_stderr_with_prefix(self):
+        logger = self.useFixture(TwistedLoggerFixture())
+        proto = ProtocolForObserveNetwork(Mock(), Mock())
+        proto.makeConnection(Mock(pid=None))
+        proto.errReceived(b"Something happened.\n")
+        self.assertThat(
+            logger.output, Equals("observe-network: Something happened."))
 
 
 class MockProcessProtocolService(ProcessProtocolService):
@@ -557,76 +743,56 @@ class TestProcessProtocolService(MAASTestCase):
         self.assertThat(result, Is(None))
 
 
-class TestNeighbourDiscoveryService(MAASTestCase):
-    """Tests for `NeighbourDiscoveryService`."""
+class TestNetworkObservationService(MAASTestCase):
+    """Tests for `NetworkObservationService`."""
 
     run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
 
     def test__returns_expected_arguments(self):
-        ifname = factory.make_name('eth')
-        service = NeighbourDiscoveryService(ifname, Mock())
+        service = NetworkObservationService(Mock(), Mock())
         args = service.getProcessParameters()
-        self.assertThat(args, HasLength(3))
-        self.assertTrue(args[0].endswith(b'maas-common'))
-        self.assertTrue(args[1], Equals(b"observe-arp"))
-        self.assertTrue(args[2], Equals(ifname.encode('utf-8')))
+        self.assertThat(args[-2:], Equals([
+            get_maas_common_command().encode("utf-8"), b"observe-network"]))
 
     @inlineCallbacks
-    def test__restarts_process_after_finishing(self):
-        ifname = factory.make_name('eth')
-        service = NeighbourDiscoveryService(ifname, Mock())
+    def test__writes_interfaces_to_process(self):
+        logger = self.useFixture(TwistedLoggerFixture())
+        service = NetworkObservationService(Mock(), Mock())
+        service.setInterfaces({"eth1", "eth0"}, {"eth0"})
         mock_process_params = self.patch(service, 'getProcessParameters')
-        mock_process_params.return_value = [b'/bin/echo', b'{}']
+        mock_process_params.return_value = [
+            b"sh", b"-c", b"exec head -n 2 >&2"]
         service.clock = Clock()
         service.startService()
-        # Wait for the protocol to finish
         service.clock.advance(0.0)
+        service.setInterfaces({"eth0"}, set())
         yield service._protocol.done
-        # Advance the clock (should start the service again)
-        interval = service.step
-        service.clock.advance(interval)
-        # The Deferred should have been recreated.
-        self.assertThat(service._protocol.done, Not(IsFiredDeferred()))
-        yield service._protocol.done
+        self.assertThat(logger.output, DocTestMatches(
+            '...\n'
+            'observe-network: '
+            '{"beacons": ["eth0"], "neighbours": ["eth0", "eth1"]}\n'
+            '---\n'
+            'observe-network: {"beacons": [], "neighbours": ["eth0"]}\n'
+            '...'))
         service.stopService()
 
     @inlineCallbacks
-    def test__protocol_logs_stderr(self):
-        logger = self.useFixture(TwistedLoggerFixture())
-        ifname = factory.make_name('eth')
-        service = NeighbourDiscoveryService(ifname, lambda _: None)
-        protocol = service.createProcessProtocol()
-        reactor.spawnProcess(protocol, b"sh", (b"sh", b"-c", b"exec cat >&2"))
-        protocol.transport.write(
-            b"Lines written to stderr are logged\n"
-            b"with a prefix, with no exceptions.\n")
-        protocol.transport.closeStdin()
-        yield protocol.done
-        self.assertThat(logger.output, Equals(
-            "observe-arp[%s]: Lines written to stderr are logged\n"
-            "---\n"
-            "observe-arp[%s]: with a prefix, with no exceptions."
-            % (ifname, ifname)))
-
-
-class TestBeaconingService(MAASTestCase):
-    """Tests for `BeaconingService`."""
-
-    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
-
-    def test__returns_expected_arguments(self):
-        ifname = factory.make_name('eth')
-        service = BeaconingService(ifname, Mock())
-        args = service.getProcessParameters()
-        self.assertThat(args, HasLength(3))
-        self.assertTrue(args[0].endswith(b'maas-common'))
-        self.assertTrue(args[1], Equals(b"observe-beacons"))
-        self.assertTrue(args[2], Equals(ifname.encode('utf-8')))
+    def test__passes_observations_to_callbacks(self):
+        service = NetworkObservationService(Mock(), Mock())
+        mock_process_params = self.patch(service, 'getProcessParameters')
+        mock_process_params.return_value = [
+            b'/bin/echo', b'{"neighbour": {}}\n{"beacon": {}}']
+        service.clock = Clock()
+        service.startService()
+        service.clock.advance(0.0)
+        yield service._protocol.done
+        self.assertThat(service.neighbours_callback, MockCalledOnceWith([{}]))
+        self.assertThat(service.beacons_callback, MockCalledOnceWith([{}]))
+        service.stopService()
 
     @inlineCallbacks
     def test__restarts_process_after_finishing(self):
-        ifname = factory.make_name('eth')
-        service = BeaconingService(ifname, Mock())
+        service = NetworkObservationService(Mock(), Mock())
         mock_process_params = self.patch(service, 'getProcessParameters')
         mock_process_params.return_value = [b'/bin/echo', b'{}']
         service.clock = Clock()
@@ -642,24 +808,6 @@ class TestBeaconingService(MAASTestCase):
         yield service._protocol.done
         service.stopService()
 
-    @inlineCallbacks
-    def test__protocol_logs_stderr(self):
-        logger = self.useFixture(TwistedLoggerFixture())
-        ifname = factory.make_name('eth')
-        service = BeaconingService(ifname, lambda _: None)
-        protocol = service.createProcessProtocol()
-        reactor.spawnProcess(protocol, b"sh", (b"sh", b"-c", b"exec cat >&2"))
-        protocol.transport.write(
-            b"Lines written to stderr are logged\n"
-            b"with a prefix, with no exceptions.\n")
-        protocol.transport.closeStdin()
-        yield protocol.done
-        self.assertThat(logger.output, Equals(
-            "observe-beacons[%s]: Lines written to stderr are logged\n"
-            "---\n"
-            "observe-beacons[%s]: with a prefix, with no exceptions."
-            % (ifname, ifname)))
-
 
 class TestMDNSResolverService(MAASTestCase):
     """Tests for `MDNSResolverService`."""
@@ -48,6 +48,7 @@ from maastesting.twisted import (
 )
 from provisioningserver.utils import twisted as twisted_module
 from provisioningserver.utils.twisted import (
+    AdaptiveThreadPool,
     asynchronous,
     call,
     callInReactor,
@@ -1510,6 +1511,129 @@ class TestThreadPool(MAASTestCase):
             """))
 
 
+class TestAdaptiveThreadPool(MAASTestCase):
+    """Tests for `AdaptiveThreadPool`."""
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def make_pool(self, **kwargs):
+        pool = AdaptiveThreadPool(clock=Clock(), **kwargs)
+        # Pretend to have started, with a fake team of workers.
+        pool.started = True
+        pool._team = Mock()
+        pool._team.statistics.return_value = Mock(
+            idleWorkerCount=0, busyWorkerCount=0, backloggedWorkCount=0)
+        return pool
+
+    def test__init(self):
+        pool = AdaptiveThreadPool(maxthreads=8, floor=2)
+        self.assertThat(pool, MatchesStructure.byEquality(
+            min=0, max=2, floor=2, ceiling=8, targetWait=0.05,
+            queueWait=0.0))
+
+    @inlineCallbacks
+    def test__records_waits_and_busy_threads(self):
+        pool = AdaptiveThreadPool(minthreads=1, maxthreads=1)
+        self.addCleanup(stop_pool_if_running, pool)
+        pool.start()
+        result = yield deferToThreadPool(reactor, pool, lambda: sentinel.foo)
+        self.assertThat(result, Is(sentinel.foo))
+        self.assertThat(pool, MatchesStructure.byEquality(
+            _waitCount=1, _queued=0, _busy=0, _busyPeak=1))
+
+    def test__grows_pool_when_work_would_wait(self):
+        pool = self.make_pool(maxthreads=8, floor=2)
+        pool._busy = 2
+        pool.callInThreadWithCallback(None, sentinel.func)
+        self.assertThat(pool, MatchesStructure.byEquality(max=3, _queued=1))
+
+    def test__does_not_grow_pool_when_a_thread_is_free(self):
+        pool = self.make_pool(maxthreads=8, floor=2)
+        pool._busy = 1
+        pool.callInThreadWithCallback(None, sentinel.func)
+        self.assertThat(pool.max, Equals(2))
+
+    def test__does_not_grow_beyond_ceiling(self):
+        pool = self.make_pool(maxthreads=5, floor=4)
+        pool._busy, pool._queued = 4, 3
+        pool.callInThreadWithCallback(None, sentinel.func)
+        self.assertThat(pool.max, Equals(5))
+
+    def test__adjust_records_queue_wait(self):
+        pool = self.make_pool(maxthreads=8, floor=2, targetWait=1.0)
+        pool._waitTotal, pool._waitCount, pool._busyPeak = 1.0, 2, 2
+        pool.adjust()
+        self.assertThat(pool, MatchesStructure.byEquality(
+            max=2, queueWait=0.5, _waitCount=0, _busyPeak=0))
+
+    def test__adjust_shrinks_pool_when_demand_falls(self):
+        pool = self.make_pool(maxthreads=8, floor=1)
+        pool.adjustPoolsize(maxthreads=6)
+        pool._busyPeak = 1
+        pool.adjust()
+        self.assertThat(pool.max, Equals(5))
+
+    def test__adjust_does_not_shrink_pool_while_work_is_queued(self):
+        pool = self.make_pool(maxthreads=8, floor=1)
+        pool.adjustPoolsize(maxthreads=6)
+        pool._busyPeak, pool._queued = 1, 1
+        pool.adjust()
+        self.assertThat(pool.max, Equals(6))
+
+    def test__adjust_grows_pool_when_work_waited(self):
+        pool = self.make_pool(maxthreads=8, floor=2, targetWait=0.05)
+        pool._waitTotal, pool._waitCount, pool._busyPeak = 0.2, 2, 2
+        pool.adjust()
+        self.assertThat(pool.max, Equals(3))
+
+    def test__adjust_does_not_grow_beyond_ceiling(self):
+        pool = self.make_pool(maxthreads=2, floor=2, targetWait=0.05)
+        pool._waitTotal, pool._waitCount = 0.2, 2
+        pool.adjust()
+        self.assertThat(pool.max, Equals(2))
+
+    def test__adjust_does_not_shrink_pool_when_work_waited(self):
+        pool = self.make_pool(maxthreads=6, floor=1, targetWait=0.05)
+        pool.adjustPoolsize(maxthreads=6)
+        pool._waitTotal, pool._waitCount, pool._busyPeak = 0.2, 2, 1
+        pool.adjust()
+        self.assertThat(pool.max, Equals(6))
+
+    def test__adjust_does_not_shrink_below_floor(self):
+        pool = self.make_pool(maxthreads=8, floor=2)
+        pool.adjust()
+        self.assertThat(pool.max, Equals(2))
+
+    def test__adjust_reaps_threads_idle_for_idleTimeout(self):
+        pool = self.make_pool(maxthreads=8, idleTimeout=60)
+        pool._team.statistics.return_value.idleWorkerCount = 3
+        pool.adjust()
+        pool.clock.advance(30)
+        pool.adjust()
+        self.assertThat(pool._team.shrink, MockNotCalled())
+        pool.clock.advance(30)
+        pool.adjust()
+        self.assertThat(pool._team.shrink, MockCalledOnceWith(3))
+
+    def test__adjust_keeps_threads_needed_recently(self):
+        pool = self.make_pool(maxthreads=8, idleTimeout=60)
+        pool._team.statistics.return_value.idleWorkerCount = 3
+        pool._busyPeak = 2
+        pool.adjust()
+        pool.clock.advance(60)
+        pool.adjust()
+        self.assertThat(pool._team.shrink, MockCalledOnceWith(1))
+
+    def test__install_adjusts_periodically(self):
+        pool = self.make_pool()
+        adjust = self.patch(pool, "adjust")
+        pool.install()
+        self.addCleanup(pool._adjusting.stop)
+        self.assertThat(adjust, MockNotCalled())
+        pool.clock.advance(pool.adjustInterval)
+        self.assertThat(adjust, MockCalledOnceWith())
+
+
 def stop_pool_if_running(pool):
     """Stop the given thread-pool if it's running."""
     if pool.started:
@@ -4,6 +4,7 @@
 """Utilities related to the Twisted/Crochet execution environment."""
 
 __all__ = [
+    'AdaptiveThreadPool',
     'asynchronous',
     'call',
     'callInReactor',
@@ -31,6 +32,7 @@ __all__ = [
 
 from collections import (
     defaultdict,
+    deque,
     Iterable,
 )
 from functools import (
@@ -58,6 +60,7 @@ from netaddr import (
     IPAddress,
 )
 from provisioningserver.logger import LegacyLogger
+from twisted.internet import task
 from twisted.internet.defer import (
     AlreadyCalledError,
     CancelledError,
@@ -888,6 +891,135 @@ class ThreadPool(threadpool.ThreadPool, object):
             onResult, callInContext, self.context, func, *args, **kwargs)
 
 
+class AdaptiveThreadPool(ThreadPool):
+    """Thread-pool that sizes itself according to demand.
+
+    Twisted's thread-pool starts a new thread whenever work arrives and no
+    thread is idle, up to `max`, then keeps that thread forever. Here `max`
+    floats between `floor` and `ceiling` instead: it's raised as soon as
+    work arrives that would otherwise have to wait for a thread, raised a
+    little more when work has still waited longer than `targetWait` seconds,
+    e.g. for new threads to connect, and lowered again when demand falls.
+    Threads that haven't been needed for `idleTimeout` seconds are stopped,
+    releasing whatever they hold, like connections.
+
+    Waits are considered, and the pool shrunk, in `adjust`, which should be
+    called periodically from the reactor; `install` arranges that.
+
+    :ivar queueWait: The mean time work spent queued during the last period.
+    """
+
+    adjustInterval = 1.0
+
+    def __init__(
+            self, minthreads=0, maxthreads=20, name=None,
+            contextFactory=None, *, floor=1, targetWait=0.05,
+            idleTimeout=60.0, clock=None):
+        super(AdaptiveThreadPool, self).__init__(
+            minthreads, max(minthreads, floor), name, contextFactory)
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        self.floor = max(minthreads, floor)
+        self.ceiling = max(self.floor, maxthreads)
+        self.targetWait = targetWait
+        self.idleTimeout = idleTimeout
+        self.queueWait = 0.0
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._busy = 0
+        self._busyPeak = 0
+        self._waitTotal = 0.0
+        self._waitCount = 0
+        # (time, peak) of recent periods, for deciding which threads to reap.
+        self._peaks = deque()
+        self._watchingSince = None
+        self._adjusting = None
+
+    def install(self):
+        """Start adjusting this pool periodically."""
+        self._adjusting = task.LoopingCall(self.adjust)
+        self._adjusting.clock = self.clock
+        self._adjusting.start(self.adjustInterval, now=False)
+
+    def stop(self):
+        if self._adjusting is not None and self._adjusting.running:
+            self._adjusting.stop()
+        super(AdaptiveThreadPool, self).stop()
+
+    def callInThreadWithCallback(self, onResult, func, *args, **kwargs):
+        """See :class:`twisted.python.threadpool.ThreadPool`.
+
+        In addition, this grows the pool, up to `ceiling`, when there would
+        otherwise be no thread for the work, and records how long the work
+        waited for a thread and how many threads are busy.
+        """
+        queued = self.clock.seconds()
+
+        def callAndTrack(*args, **kwargs):
+            self._taskStarted(self.clock.seconds() - queued)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._taskFinished()
+
+        with self._lock:
+            self._queued += 1
+            demand = self._busy + self._queued
+        if self.started and demand > self.max and self.max < self.ceiling:
+            self.adjustPoolsize(maxthreads=min(self.ceiling, demand))
+        return super(AdaptiveThreadPool, self).callInThreadWithCallback(
+            onResult, callAndTrack, *args, **kwargs)
+
+    def _taskStarted(self, wait):
+        with self._lock:
+            self._waitTotal += wait
+            self._waitCount += 1
+            self._queued -= 1
+            self._busy += 1
+            self._busyPeak = max(self._busyPeak, self._busy)
+
+    def _taskFinished(self):
+        with self._lock:
+            self._busy -= 1
+
+    def adjust(self):
+        """Resize the pool according to demand since the last call."""
+        if not self.started:
+            return
+        now = self.clock.seconds()
+        with self._lock:
+            waitTotal, self._waitTotal = self._waitTotal, 0.0
+            waitCount, self._waitCount = self._waitCount, 0
+            peak, self._busyPeak = self._busyPeak, self._busy
+            queued = self._queued
+        stats = self._team.statistics()
+        self.queueWait = (waitTotal / waitCount) if waitCount > 0 else 0.0
+        waiting = self.queueWait > self.targetWait
+        if waiting and self.max < self.ceiling:
+            # Work waited even so; keep a thread in hand for the next lot.
+            self.adjustPoolsize(maxthreads=self.max + 1)
+        elif not waiting and queued == 0 and (
+                peak < self.max and self.max > self.floor):
+            self.adjustPoolsize(
+                maxthreads=max(self.floor, peak, self.max - 1))
+        self._reapIdleThreads(now, peak, stats.idleWorkerCount)
+
+    def _reapIdleThreads(self, now, peak, idle):
+        self._peaks.append((now, peak))
+        if self._watchingSince is None:
+            self._watchingSince = now
+        if now - self._watchingSince < self.idleTimeout:
+            # Not yet watched demand for long enough.
+            return
+        while now - self._peaks[0][0] > self.idleTimeout:
+            self._peaks.popleft()
+        needed = max(self.min, max(peak for _, peak in self._peaks))
+        excess = min(idle, self.workers - needed)
+        if excess > 0:
+            self._team.shrink(excess)
+
+
 class ThreadWorkerContext(threading.local):
     """Helper to manage context in workers.
 